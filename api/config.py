@@ -3,38 +3,98 @@
 管理所有配置项
 """
 import os
-from dotenv import load_dotenv
-
-load_dotenv()
+import threading
 
 
 class Settings:
     """应用配置"""
 
-    # Telegram配置
-    BOT_TOKEN: str = os.getenv('BOT_TOKEN', '')
-
-    # 多群组配置
-    CHAT_ID_ZH: str = os.getenv('CHAT_ID_ZH', '')  # 中文群组
-    CHAT_ID_EN: str = os.getenv('CHAT_ID_EN', '')  # 英文群组
-    DEFAULT_CHAT_ID: str = os.getenv('CHAT_ID', os.getenv('CHAT_ID_ZH', ''))  # 默认使用中文群组
-
-    # API服务器配置
-    API_HOST: str = os.getenv('API_HOST', '0.0.0.0')
-    API_PORT: int = int(os.getenv('API_PORT', 8032))
-    API_DEBUG: bool = os.getenv('API_DEBUG', 'False').lower() == 'true'
-
-    # 日志配置
-    LOG_LEVEL: str = os.getenv('LOG_LEVEL', 'INFO')
-
-    # Telegram消息配置
-    MESSAGE_PARSE_MODE: str = 'Markdown'
-    MESSAGE_RETRY_COUNT: int = 3
-    MESSAGE_RETRY_DELAY: float = 1.0
-    MESSAGE_BATCH_DELAY: float = 0.1
-
     def __init__(self):
-        """验证配置"""
+        """加载并验证配置"""
+        from dotenv import load_dotenv
+        load_dotenv()
+
+        # Telegram配置
+        self.BOT_TOKEN: str = os.getenv('BOT_TOKEN', '')
+
+        # 多群组配置
+        self.CHAT_ID_ZH: str = os.getenv('CHAT_ID_ZH', '')  # 中文群组
+        self.CHAT_ID_EN: str = os.getenv('CHAT_ID_EN', '')  # 英文群组
+        self.DEFAULT_CHAT_ID: str = os.getenv('CHAT_ID', os.getenv('CHAT_ID_ZH', ''))  # 默认使用中文群组
+        self.CHAT_TOPICS_ZH: str = os.getenv('CHAT_TOPICS_ZH', '')  # 中文群组各类消息的话题ID，如 trade=11,liquidation=12,recap=13
+        self.CHAT_TOPICS_EN: str = os.getenv('CHAT_TOPICS_EN', '')  # 英文群组各类消息的话题ID，格式同上
+
+        # API服务器配置
+        self.API_HOST: str = os.getenv('API_HOST', '0.0.0.0')
+        self.API_PORT: int = int(os.getenv('API_PORT', 8032))
+        self.API_DEBUG: bool = os.getenv('API_DEBUG', 'False').lower() == 'true'
+        self.API_KEYS_PATH: str = os.getenv('API_KEYS_PATH', '')  # API密钥文件（JSON，tools/api_keys.py 生成），为空时发送接口不认证
+        self.API_KEY_QUOTA_SYNC_INTERVAL: float = float(os.getenv('API_KEY_QUOTA_SYNC_INTERVAL', 1.0))  # 设置 RATE_STATE_PATH 时密钥配额在进程内判断、每隔该秒数与共享SQLite同步，0为每次请求都执行SQLite事务
+        self.WEBHOOK_SECRETS: str = os.getenv('WEBHOOK_SECRETS', '')  # 巨鲸提醒请求签名的共享密钥（逗号分隔，轮换时可配置多个），为空不校验
+        self.WEBHOOK_TOLERANCE: int = int(os.getenv('WEBHOOK_TOLERANCE', 300))  # 签名时间戳允许的偏差（秒）
+        self.WEBHOOK_MAX_NONCES: int = int(os.getenv('WEBHOOK_MAX_NONCES', 100000))  # 防重放在进程内保存的随机串上限（设置 RATE_STATE_PATH 时保存在共享SQLite中），应远大于几秒内的请求数
+
+        # 日志配置
+        self.LOG_LEVEL: str = os.getenv('LOG_LEVEL', 'INFO')
+        self.LOG_FORMAT: str = os.getenv('LOG_FORMAT', 'text')  # 'text' 或 'json'（结构化日志）
+        self.LOG_SAMPLE_BURST: int = int(os.getenv('LOG_SAMPLE_BURST', 50))  # 每秒全部保留的成功日志条数
+        self.LOG_SAMPLE_RATE: int = int(os.getenv('LOG_SAMPLE_RATE', 100))  # 超出后每N条成功日志保留1条
+        self.TRACE_SAMPLE_RATE: float = float(os.getenv('TRACE_SAMPLE_RATE', 0.01))  # 请求追踪的采样比例，0为关闭
+        self.TRACE_EXPORT_PATH: str = os.getenv('TRACE_EXPORT_PATH', '')  # 追踪导出文件（OTLP/JSON，每行一批），为空不导出
+        self.TRACE_OTLP_ENDPOINT: str = os.getenv('TRACE_OTLP_ENDPOINT', '')  # OTLP/HTTP 收集器地址，如 http://localhost:4318
+        self.DEBUG_TOKEN: str = os.getenv('DEBUG_TOKEN', '')  # 调试接口（/debug/*）的访问令牌，为空时不开放采样分析
+        self.LOOP_SLOW_CALLBACK_MS: float = float(os.getenv('LOOP_SLOW_CALLBACK_MS', 100))  # 发送事件循环阻塞超过该时间时记录调用栈，0为关闭监控
+
+        # Telegram消息配置
+        self.MESSAGE_PARSE_MODE: str = 'Markdown'
+        self.MESSAGE_RETRY_COUNT: int = 3
+        self.MESSAGE_RETRY_DELAY: float = 1.0
+        self.MESSAGE_BATCH_DELAY: float = 0.1
+        self.MESSAGE_MAX_PARTS: int = int(os.getenv('MESSAGE_MAX_PARTS', 10))  # 超长消息最大分段数
+        self.MESSAGE_DEDUP_WINDOW: float = float(os.getenv('MESSAGE_DEDUP_WINDOW', 0))  # 相同消息去重窗口（秒），0为关闭
+        self.MESSAGE_SEND_TIMEOUT: float = float(os.getenv('MESSAGE_SEND_TIMEOUT', 60))  # 接口等待发送完成的最长时间（秒）
+
+        # 限流配置（Telegram限制：全局约30条/秒，单个群组约20条/分钟）
+        self.RATE_LIMIT_GLOBAL: float = float(os.getenv('RATE_LIMIT_GLOBAL', 30))  # 全局每秒发送数
+        self.RATE_LIMIT_PER_CHAT: float = float(os.getenv('RATE_LIMIT_PER_CHAT', 20))  # 单个群组每分钟发送数
+        self.RATE_LIMIT_CHAT_BURST: int = int(os.getenv('RATE_LIMIT_CHAT_BURST', 3))  # 单个群组突发条数
+        self.RATE_STATE_PATH: str = os.getenv('RATE_STATE_PATH', '')  # 多worker共享限流状态的SQLite文件，为空则进程内限流
+        self.GUNICORN_WORKERS: int = int(os.getenv('GUNICORN_WORKERS', 1))  # gunicorn worker数（gunicorn.conf.py 设置），只支持单worker的功能据此检查
+        self.ADMISSION_MAX_IN_FLIGHT: int = int(os.getenv('ADMISSION_MAX_IN_FLIGHT', 64))  # 同时执行的发送请求数，0为不做准入控制
+        self.ADMISSION_MAX_QUEUE: int = int(os.getenv('ADMISSION_MAX_QUEUE', 256))  # 排队的发送请求上限，超出时低优先级请求返回429
+        self.ADMISSION_HIGH_PRIORITY_RESERVE: int = int(os.getenv('ADMISSION_HIGH_PRIORITY_RESERVE', 256))  # 高价值提醒额外的排队名额
+        self.ADMISSION_HIGH_VALUE: float = float(os.getenv('ADMISSION_HIGH_VALUE', 1000000))  # 金额不低于该值（USD）的巨鲸提醒为高优先级
+
+        # 巨鲸提醒配置
+        self.ADDRESS_LABELS_PATH: str = os.getenv('ADDRESS_LABELS_PATH', '')  # 地址标签索引（tools/build_labels.py 生成），为空时不显示标签
+        self.TOKEN_INFO_SOURCE: str = os.getenv('TOKEN_INFO_SOURCE', '')  # 代币名称和价格数据源：JSON文件路径或 http(s) 接口（{token} 占位），为空时不补充
+        self.TOKEN_INFO_TTL: float = float(os.getenv('TOKEN_INFO_TTL', 30))  # 代币信息缓存新鲜期（秒）
+        self.TOKEN_INFO_STALE_TTL: float = float(os.getenv('TOKEN_INFO_STALE_TTL', 300))  # 过期后仍可使用旧值并后台刷新的时长（秒）
+        self.ENRICHMENT_BUDGET_MS: float = float(os.getenv('ENRICHMENT_BUDGET_MS', 150))  # 等待代币信息的最长时间（毫秒），超时不补充
+        self.STATS_MAX_TRADERS: int = int(os.getenv('STATS_MAX_TRADERS', 10000))  # 滚动统计最多跟踪的交易员数（每个约3KB），0为关闭
+        self.STATS_MAX_TOKENS: int = int(os.getenv('STATS_MAX_TOKENS', 2000))  # 滚动统计最多跟踪的代币数
+        self.EVENT_STORE_DIR: str = os.getenv('EVENT_STORE_DIR', 'data/events')  # 事件存储目录（每日分区的列式文件），为空不保存
+        self.RECAP_PERIODS: str = os.getenv('RECAP_PERIODS', '')  # 定时汇总周期，逗号分隔: hourly,daily；为空不发送
+        self.RECAP_TOP_N: int = int(os.getenv('RECAP_TOP_N', 5))  # 汇总中各排行的条数
+        self.THRESHOLD_PERCENTILE: float = float(os.getenv('THRESHOLD_PERCENTILE', 0))  # 低于该代币金额分位数的事件为低优先级，0为关闭
+        self.THRESHOLD_WINDOW: float = float(os.getenv('THRESHOLD_WINDOW', 86400))  # 统计分位数的滚动窗口（秒）
+        self.THRESHOLD_MIN_SAMPLES: int = int(os.getenv('THRESHOLD_MIN_SAMPLES', 100))  # 样本少于该数时不设阈值
+        self.LOW_PRIORITY_ACTION: str = os.getenv('LOW_PRIORITY_ACTION', 'digest')  # 低优先级事件: 'digest' 并入摘要 或 'suppress' 丢弃
+        self.DIGEST_INTERVAL: float = float(os.getenv('DIGEST_INTERVAL', 900))  # 低优先级摘要发送间隔（秒）
+        self.ROUTES_PATH: str = os.getenv('ROUTES_PATH', '')  # 路由配置文件（JSON），为空时发往中英文两个群组
+        self.POSITION_UPDATE_WINDOW: float = float(os.getenv('POSITION_UPDATE_WINDOW', 0))  # 同一持仓连续交易合并为编辑的窗口（秒），0为关闭
+        self.POSITION_EDIT_DEBOUNCE: float = float(os.getenv('POSITION_EDIT_DEBOUNCE', 5))  # 同一条消息两次编辑的最小间隔（秒）
+
+        self.REPLY_THREADS_SIZE: int = int(os.getenv('REPLY_THREADS_SIZE', 200000))  # 回复串联记录的 (群组, 交易员) 上限，0为关闭
+        self.REPLY_THREADS_PATH: str = os.getenv('REPLY_THREADS_PATH', 'data/reply_threads.json')  # 回复串联快照文件（未设置 RATE_STATE_PATH 时），留空不持久化
+
+        # 优雅关闭配置
+        self.SHUTDOWN_DRAIN_TIMEOUT: float = float(os.getenv('SHUTDOWN_DRAIN_TIMEOUT', 20))  # 关闭时排空发送队列的最长时间（秒）
+        self.SPILL_DIR: str = os.getenv('SPILL_DIR', 'data/spill')  # 未发完消息的溢出目录，下次启动重放
+        self.DELIVERY_INDEX_PATH: str = os.getenv('DELIVERY_INDEX_PATH', 'data/deliveries.db')  # 投递记录索引，留空关闭
+        self.SCHEDULE_JOURNAL_PATH: str = os.getenv('SCHEDULE_JOURNAL_PATH', 'data/scheduled.jsonl')  # 定时发送日志（多worker共享），留空只保存在内存中
+        self.SCHEDULE_MAX_PENDING: int = int(os.getenv('SCHEDULE_MAX_PENDING', 100000))  # 待发送的定时消息上限
+
         if not self.BOT_TOKEN:
             raise ValueError("BOT_TOKEN is required in .env file")
 
@@ -48,6 +108,17 @@ class Settings:
             'parse_mode': self.MESSAGE_PARSE_MODE,
             'retry_count': self.MESSAGE_RETRY_COUNT,
             'retry_delay': self.MESSAGE_RETRY_DELAY,
+            'max_message_parts': self.MESSAGE_MAX_PARTS,
+            'dedup_window': self.MESSAGE_DEDUP_WINDOW,
+        }
+
+    def get_rate_limit_config(self) -> dict:
+        """获取限流配置"""
+        return {
+            'state_path': self.RATE_STATE_PATH,
+            'global_rate': self.RATE_LIMIT_GLOBAL,
+            'chat_rate': self.RATE_LIMIT_PER_CHAT / 60.0,
+            'chat_burst': self.RATE_LIMIT_CHAT_BURST,
         }
 
     def get_api_config(self) -> dict:
@@ -93,5 +164,27 @@ class Settings:
         return chat_ids
 
 
+class LazySettings:
+    """
+    延迟加载的配置代理
+
+    首次访问配置项时才读取 .env 并验证，导入本模块没有副作用。
+    """
+
+    def __init__(self):
+        self._settings = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> Settings:
+        if self._settings is None:
+            with self._lock:
+                if self._settings is None:
+                    self._settings = Settings()
+        return self._settings
+
+    def __getattr__(self, name):
+        return getattr(self._load(), name)
+
+
 # 全局配置实例
-settings = Settings()
+settings = LazySettings()
@@ -0,0 +1,170 @@
+"""
+准入控制模块
+
+Telegram变慢时，请求线程会在 run_async() 中越积越多直至超时。准入控制给发送设上限：
+    - 同时在发送事件循环中执行的发送不超过 max_in_flight，其余按优先级排队（高优先级先执行）
+    - 排队的请求超过 max_queue 时，低优先级请求直接拒绝（429），
+      按当前的排空速度计算 Retry-After，告诉调用方多久后重试
+    - 高价值的巨鲸提醒另有 high_priority_reserve 个排队名额，过载时仍然发送
+等待中的请求数（即被占用的请求线程数）始终有上限，过载时服务按优先级降级而不是全部超时。
+"""
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+from typing import Awaitable, Callable, Optional
+
+from api.utils.metrics import metrics
+from api.utils.tracing import span
+
+
+class Overloaded(Exception):
+    """发送已满，请求被拒绝"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Send queue is full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    发送准入控制
+
+    try_acquire()/release() 在请求线程中调用；guard() 在发送事件循环中限制并发。
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int = 64,
+        max_queue: int = 256,
+        high_priority_reserve: int = 256,
+        rate_window: int = 10,
+        max_retry_after: int = 60,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        初始化准入控制
+
+        Args:
+            max_in_flight: 同时执行的发送数
+            max_queue: 排队等待的请求上限，超出时拒绝低优先级请求
+            high_priority_reserve: 高优先级请求额外的排队名额
+            rate_window: 统计排空速度的窗口（秒）
+            max_retry_after: Retry-After 的上限（秒）
+            clock: 时钟函数
+        """
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.high_priority_reserve = high_priority_reserve
+        self.max_retry_after = max_retry_after
+        self.clock = clock
+        self.pending = 0
+        self._lock = threading.Lock()
+        # 每秒完成数的环形计数 [(秒, 完成数)]
+        self._completions = deque(maxlen=rate_window)
+        # 以下只在发送事件循环中访问
+        self._running = 0
+        self._waiters = (deque(), deque())
+
+    def drain_rate(self) -> float:
+        """最近每秒完成的发送请求数"""
+        with self._lock:
+            return self._drain_rate(int(self.clock()))
+
+    def _drain_rate(self, now: int) -> float:
+        window = self._completions.maxlen
+        done = sum(count for second, count in self._completions if now - second < window)
+        return done / window
+
+    def retry_after(self) -> int:
+        """按排空速度估计排队降到上限以下所需的秒数"""
+        with self._lock:
+            return self._retry_after(int(self.clock()))
+
+    def _retry_after(self, now: int) -> int:
+        excess = self.pending - (self.max_in_flight + self.max_queue) + 1
+        rate = self._drain_rate(now)
+        if rate <= 0:
+            return self.max_retry_after
+        return min(max(1, math.ceil(excess / rate)), self.max_retry_after)
+
+    def try_acquire(self, high_priority: bool = False) -> Optional[int]:
+        """
+        申请发送名额
+
+        Returns:
+            int: 被拒绝时建议的重试等待秒数，获准时返回None
+        """
+        limit = self.max_in_flight + self.max_queue
+        if high_priority:
+            limit += self.high_priority_reserve
+        priority = 'high' if high_priority else 'low'
+        with self._lock:
+            if self.pending >= limit:
+                retry_after = self._retry_after(int(self.clock()))
+                rejected = True
+            else:
+                self.pending += 1
+                rejected = False
+        if rejected:
+            metrics.inc('admission_rejected_total', priority=priority)
+            return retry_after
+        metrics.inc('admission_admitted_total', priority=priority)
+        return None
+
+    def release(self):
+        """发送请求结束（成功、失败或超时）"""
+        now = int(self.clock())
+        with self._lock:
+            self.pending -= 1
+            if self._completions and self._completions[-1][0] == now:
+                self._completions[-1] = (now, self._completions[-1][1] + 1)
+            else:
+                self._completions.append((now, 1))
+
+    async def guard(self, coro: Awaitable, high_priority: bool = False):
+        """在发送事件循环中执行协程，同时执行的不超过 max_in_flight 个，高优先级先获得执行名额"""
+        if self._running >= self.max_in_flight:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters[0 if high_priority else 1].append(waiter)
+            try:
+                with span('admission.wait', high_priority=high_priority):
+                    await waiter
+            except asyncio.CancelledError:
+                waiters = self._waiters[0 if high_priority else 1]
+                if waiter.done() and not waiter.cancelled():
+                    # 已被唤醒但随即取消，把名额交给下一个
+                    self._wake()
+                elif waiter in waiters:
+                    waiters.remove(waiter)
+                coro.close()
+                raise
+        else:
+            self._running += 1
+        try:
+            return await coro
+        finally:
+            self._wake()
+
+    def _wake(self):
+        """把执行名额交给下一个等待者，没有等待者时归还"""
+        for waiters in self._waiters:
+            while waiters:
+                waiter = waiters.popleft()
+                if not waiter.done():
+                    waiter.set_result(None)
+                    return
+        self._running -= 1
+
+    def snapshot(self) -> dict:
+        """当前状态"""
+        with self._lock:
+            now = int(self.clock())
+            return {
+                'pending': self.pending,
+                'max_in_flight': self.max_in_flight,
+                'max_queue': self.max_queue,
+                'high_priority_reserve': self.high_priority_reserve,
+                'drain_rate': round(self._drain_rate(now), 2),
+            }
@@ -0,0 +1,308 @@
+"""
+API密钥认证模块
+
+消息发送接口（/api/v1/send*、/api/v1/whale/*）按API密钥认证，每个密钥有独立的配额和可发送的群组。
+密钥文件为JSON，只保存密钥的 SHA-256，不保存明文（tools/api_keys.py 生成）：
+
+    {
+        "keys": [
+            {"name": "producer-a", "sha256": "9f86d08...", "requests_per_minute": 600, "request_burst": 30,
+             "messages_per_minute": 120, "message_burst": 20, "destinations": [-1001, "@whale_liq"]}
+        ]
+    }
+
+    - requests_per_minute: 每分钟请求数，0或不填为不限
+    - messages_per_minute: 每分钟发出的Telegram消息数（每个目标群组计一条），0或不填为不限
+    - destinations: 允许发往的群组，不填为全部
+
+认证只做一次哈希和一次字典查找（先哈希再查找，查找耗时与密钥内容无关），
+配额使用与发送限流相同的GCRA，每个密钥只保存一个理论到达时间。配额状态按密钥的哈希保存在
+限流器中：配置了 RATE_STATE_PATH 时多个worker共享，密钥的配额是所有worker合计的。
+密钥文件被替换后自动重新加载，已有密钥的配额状态保留。
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Union
+
+from api.core.rate_limiter import BatchedQuota, RateLimiter
+from api.core.routing import to_chat_id
+from api.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# 当前请求使用的密钥（未开启认证时为None）
+current_api_key: ContextVar[Optional['ApiKey']] = ContextVar('api_key', default=None)
+
+
+class AccessDenied(Exception):
+    """请求被认证或配额拒绝（由应用转换为响应）"""
+
+    def __init__(self, message: str, status: int = 403, retry_after: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+def hash_key(raw_key: str) -> str:
+    """密钥的 SHA-256（十六进制）"""
+    return hashlib.sha256(raw_key.encode('utf-8')).hexdigest()
+
+
+class ApiKey:
+    """一个API密钥及其配额状态"""
+
+    __slots__ = (
+        'name', 'sha256', 'request_interval', 'request_burst', 'message_interval', 'message_burst', 'destinations'
+    )
+
+    def __init__(
+        self,
+        name: str,
+        sha256: str,
+        requests_per_minute: float = 0,
+        request_burst: int = 10,
+        messages_per_minute: float = 0,
+        message_burst: int = 10,
+        destinations: Optional[Iterable[Union[int, str]]] = None
+    ):
+        """
+        Args:
+            name: 密钥名称（用于日志和指标）
+            sha256: 密钥的 SHA-256
+            requests_per_minute: 每分钟请求数，0为不限
+            request_burst: 请求的突发条数
+            messages_per_minute: 每分钟消息数，0为不限
+            message_burst: 消息的突发条数
+            destinations: 允许发往的群组，None为全部
+        """
+        if not name or len(sha256) != 64:
+            raise ValueError(f"API key {name!r} needs a name and a 64-character sha256")
+        self.name = name
+        self.sha256 = sha256.lower()
+        self.request_interval = 60.0 / requests_per_minute if requests_per_minute > 0 else 0.0
+        self.request_burst = max(int(request_burst), 1)
+        self.message_interval = 60.0 / messages_per_minute if messages_per_minute > 0 else 0.0
+        self.message_burst = max(int(message_burst), 1)
+        self.destinations = frozenset(to_chat_id(chat_id) for chat_id in destinations) if destinations else None
+
+    def allows(self, chat_id: Union[int, str]) -> bool:
+        """是否允许发往该群组"""
+        return self.destinations is None or to_chat_id(chat_id) in self.destinations
+
+
+class ApiKeys:
+    """
+    API密钥表
+
+    线程安全：重新加载时整体换入新的字典；配额状态由限流器原子更新。
+    """
+
+    def __init__(
+        self,
+        path: str,
+        check_interval: float = 5.0,
+        limiter: Optional[Union[RateLimiter, BatchedQuota]] = None,
+        clock: Callable[[], float] = time.time
+    ):
+        """
+        初始化密钥表
+
+        Args:
+            path: 密钥文件
+            check_interval: 检查文件是否被替换的间隔（秒）
+            limiter: 保存配额状态的限流器，多worker部署时传入共享限流器或按批同步的 BatchedQuota
+            clock: 未传入限流器时进程内配额使用的时钟
+        """
+        self.path = path
+        self.check_interval = check_interval
+        self.limiter = limiter or RateLimiter(clock=clock)
+        self._keys: Dict[str, ApiKey] = {}
+        self._stat = None
+        self._lock = threading.Lock()
+        self._next_check = 0.0
+        self.reload()
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    @staticmethod
+    def parse(path: str) -> Dict[str, ApiKey]:
+        """
+        读取密钥文件
+
+        Raises:
+            ValueError: 文件格式不正确时抛出
+        """
+        with open(path, encoding='utf-8') as f:
+            config = json.load(f)
+        try:
+            keys = [ApiKey(**entry) for entry in config['keys']]
+        except (KeyError, TypeError) as e:
+            raise ValueError(f"Invalid API key file {path}: {e}")
+        return {key.sha256: key for key in keys}
+
+    def reload(self) -> bool:
+        """
+        重新加载密钥文件（文件未变化时不做任何事）
+
+        Returns:
+            bool: 是否换入了新的密钥表
+        """
+        self._next_check = time.monotonic() + self.check_interval
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            if self._stat is None:
+                logger.warning("⚠️ API key file %s not found, all requests will be rejected", self.path)
+            return False
+
+        if self._stat is not None and (self._stat.st_ino, self._stat.st_mtime_ns) == (stat.st_ino, stat.st_mtime_ns):
+            return False
+
+        try:
+            keys = self.parse(self.path)
+        except (OSError, ValueError) as e:
+            logger.error("❌ Failed to load API keys: %s", e)
+            self._stat = stat
+            return False
+
+        with self._lock:
+            # 配额状态按密钥哈希保存在限流器中，已有密钥的状态保留
+            self._keys = keys
+            self._stat = stat
+        logger.info("🔑 Loaded %d API keys from %s", len(keys), self.path)
+        return True
+
+    def authenticate(self, raw_key: Optional[str]) -> ApiKey:
+        """
+        认证密钥并扣除一次请求配额
+
+        Raises:
+            AccessDenied: 密钥无效（401）或请求配额用完（429）
+        """
+        if time.monotonic() >= self._next_check:
+            self.reload()
+        key = self._keys.get(hash_key(raw_key)) if raw_key else None
+        if key is None:
+            metrics.inc('api_key_rejected_total', key='unknown', reason='unauthorized')
+            raise AccessDenied('Invalid or missing API key', status=401)
+
+        if key.request_interval:
+            wait = self.limiter.acquire(f"api_key:requests:{key.sha256}", key.request_interval, key.request_burst)
+            if wait:
+                metrics.inc('api_key_rejected_total', key=key.name, reason='request_quota')
+                raise AccessDenied(f"Request quota exceeded for API key {key.name}", 429, _retry_after(wait))
+        metrics.inc('api_key_requests_total', key=key.name)
+        return key
+
+    def charge_messages(self, key: ApiKey, count: int):
+        """
+        扣除消息配额（配额不足时不扣除）
+
+        Raises:
+            AccessDenied: 一次发往的群组数超过消息突发条数（403，等待也不会成功）或消息配额用完（429）
+        """
+        if count <= 0:
+            return
+        if key.message_interval:
+            check_message_burst(key, count)
+            wait = self.limiter.acquire(
+                f"api_key:messages:{key.sha256}", key.message_interval, key.message_burst, count
+            )
+            if wait:
+                metrics.inc('api_key_rejected_total', key=key.name, reason='message_quota')
+                raise AccessDenied(f"Message quota exceeded for API key {key.name}", 429, _retry_after(wait))
+        metrics.inc('api_key_messages_total', count, key=key.name)
+
+
+def check_message_burst(key: ApiKey, count: int):
+    """
+    一次发往的群组数不能超过消息突发条数（超过时配额永远不够，不能返回429让客户端重试）
+
+    Raises:
+        AccessDenied: 超过消息突发条数（403）
+    """
+    if key.message_interval and count > key.message_burst:
+        metrics.inc('api_key_rejected_total', key=key.name, reason='message_burst')
+        raise AccessDenied(
+            f"API key {key.name} may send at most {key.message_burst} messages per request, got {count}"
+        )
+
+
+def _retry_after(wait: float) -> int:
+    return max(1, int(wait + 0.999))
+
+
+# 全局密钥表（未配置 API_KEYS_PATH 时为None，不认证）
+api_keys: Optional[ApiKeys] = None
+
+
+def set_api_keys(keys: Optional[ApiKeys]):
+    """设置密钥表"""
+    global api_keys
+    api_keys = keys
+
+
+def authorize(chat_ids: List[Union[int, str]], partial: bool = False) -> List[Union[int, str]]:
+    """
+    校验当前请求的密钥能否发往这些群组（不扣除配额，发送前由 charge() 扣除）
+
+    Args:
+        chat_ids: 目标群组
+        partial: True 时去掉不允许的群组（按路由表发送时），否则有任何不允许的群组就拒绝
+
+    Returns:
+        list: 允许发往的群组（未开启认证时原样返回）
+
+    Raises:
+        AccessDenied: 没有可发往的群组，或群组数超过消息突发条数（403）
+    """
+    key = current_api_key.get()
+    if key is None or api_keys is None:
+        return chat_ids
+    allowed = [chat_id for chat_id in chat_ids if key.allows(chat_id)]
+    if len(allowed) < len(chat_ids) and (not partial or not allowed):
+        denied = [chat_id for chat_id in chat_ids if not key.allows(chat_id)]
+        metrics.inc('api_key_rejected_total', key=key.name, reason='destination')
+        raise AccessDenied(f"API key {key.name} may not send to {', '.join(map(str, denied))}")
+    check_message_burst(key, len(allowed))
+    return allowed
+
+
+def charge(chat_ids: List[Union[int, str]]):
+    """
+    按群组数扣除当前请求的密钥的消息配额
+
+    在获得发送名额之后调用，被准入控制拒绝（429）的请求不消耗配额。
+
+    Raises:
+        AccessDenied: 消息配额用完（429）
+    """
+    key = current_api_key.get()
+    if key is not None and api_keys is not None:
+        api_keys.charge_messages(key, len(chat_ids))
+
+
+def authenticate_request(headers) -> Optional[ApiKey]:
+    """
+    认证请求头中的密钥（X-API-Key 或 Authorization: Bearer），并设为当前请求的密钥
+
+    Raises:
+        AccessDenied: 密钥无效（401）或请求配额用完（429）
+    """
+    current_api_key.set(None)
+    if api_keys is None:
+        return None
+    supplied = headers.get('X-API-Key')
+    if not supplied:
+        authorization = headers.get('Authorization', '')
+        if authorization.startswith('Bearer '):
+            supplied = authorization[len('Bearer '):]
+    key = api_keys.authenticate(supplied)
+    current_api_key.set(key)
+    return key
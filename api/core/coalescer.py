@@ -0,0 +1,180 @@
+"""
+持仓更新合并模块
+
+同一交易员在同一群组、同一代币、同一方向上连续加仓时，不再每笔发一条新消息，
+而是编辑窗口内最近发出的那条提醒，显示累计笔数和累计金额：
+    - 窗口从最近一笔开始计算，超过窗口后的下一笔重新发送新消息
+    - 编辑做防抖，同一条消息至多每 debounce 秒编辑一次，期间的更新合并为一次编辑
+
+所有方法都在发送事件循环中调用。
+"""
+import asyncio
+import logging
+import time
+from typing import Callable, Dict, Optional, Tuple, Union
+
+from api.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# 渲染函数: (累计笔数, 累计金额) -> 消息文本
+Renderer = Callable[[int, float], str]
+
+
+class _Position:
+    """一条正在合并更新的提醒"""
+
+    __slots__ = (
+        'message_id', 'parse_mode', 'count', 'total', 'text', 'last_seen', 'last_edit', 'edited_text', 'ready',
+        'edit_task',
+    )
+
+    def __init__(self, now: float, parse_mode: Optional[str] = 'Markdown'):
+        self.message_id: Optional[int] = None
+        # 编辑时使用首条消息的解析模式（HTML / MarkdownV2 路由的消息不能按 Markdown 编辑）
+        self.parse_mode = parse_mode
+        self.count = 0
+        self.total = 0.0
+        self.text = ''
+        self.last_seen = now
+        self.last_edit = now
+        self.edited_text = ''
+        self.ready: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.edit_task: Optional[asyncio.Task] = None
+
+
+class PositionCoalescer:
+    """
+    持仓更新合并器
+    """
+
+    def __init__(
+        self,
+        sender,
+        window: float = 300.0,
+        debounce: float = 5.0,
+        max_entries: int = 10000,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        初始化合并器
+
+        Args:
+            sender: TelegramSender实例
+            window: 合并窗口（秒），距上一笔超过该时间则发送新消息
+            debounce: 同一条消息两次编辑的最小间隔（秒）
+            max_entries: 跟踪的最大提醒数，超出时清理过期项
+            clock: 时钟函数
+        """
+        self.sender = sender
+        self.window = window
+        self.debounce = debounce
+        self.max_entries = max_entries
+        self.clock = clock
+        self._positions: Dict[tuple, _Position] = {}
+
+    async def send(
+        self,
+        chat_id: Union[int, str],
+        key: Tuple,
+        value_usd: float,
+        render: Renderer,
+        parse_mode: Optional[str] = 'Markdown',
+        meta: Optional[dict] = None,
+        message_thread_id: Optional[int] = None
+    ) -> dict:
+        """
+        发送一笔提醒：窗口内有同一持仓的提醒则合并编辑，否则发送新消息
+
+        Args:
+            chat_id: 目标群组ID
+            key: 持仓键，如 (trader_address, token, direction)
+            value_usd: 本笔金额
+            render: 根据累计笔数和金额生成消息文本
+            parse_mode: 解析模式
+            meta: 写入投递索引的事件信息
+            message_thread_id: 话题ID，不同话题中的同一持仓分别合并
+
+        Returns:
+            dict: {'updated': 是否合并为编辑, 'message_id', 'count', 'total', 'record': 新消息的投递记录}
+        """
+        full_key = (chat_id, message_thread_id) + tuple(key)
+        position = self._positions.get(full_key)
+        now = self.clock()
+
+        if position is not None and not position.ready.done():
+            # 首条消息还在发送中，等待其结果
+            await asyncio.shield(position.ready)
+            position = self._positions.get(full_key)
+
+        if position is not None and now - position.last_seen <= self.window:
+            position.count += 1
+            position.total += value_usd
+            position.last_seen = now
+            position.text = render(position.count, position.total)
+            self._schedule_edit(chat_id, position)
+            metrics.inc('telegram_position_updates_total')
+            return {
+                'updated': True,
+                'message_id': position.message_id,
+                'count': position.count,
+                'total': position.total,
+                'record': None,
+            }
+
+        if len(self._positions) >= self.max_entries:
+            self._prune(now)
+
+        position = _Position(now, parse_mode)
+        position.count = 1
+        position.total = value_usd
+        position.text = position.edited_text = render(1, value_usd)
+        self._positions[full_key] = position
+        try:
+            record = await self.sender.send_message(
+                chat_id, position.text, parse_mode=parse_mode, meta=meta, message_thread_id=message_thread_id
+            )
+        except BaseException:
+            self._positions.pop(full_key, None)
+            raise
+        finally:
+            position.ready.set_result(None)
+
+        if record is not None and record.message_id is not None and len(record.message_ids) == 1:
+            position.message_id = record.message_id
+            position.last_edit = self.clock()
+        else:
+            # 失败或分段发送的消息无法整体编辑，不参与合并
+            self._positions.pop(full_key, None)
+
+        return {
+            'updated': False,
+            'message_id': record.message_id if record else None,
+            'count': 1,
+            'total': value_usd,
+            'record': record,
+        }
+
+    def _schedule_edit(self, chat_id: Union[int, str], position: _Position):
+        """安排一次防抖编辑，已有待执行的编辑时只更新文本"""
+        if position.edit_task is None or position.edit_task.done():
+            position.edit_task = asyncio.ensure_future(self._edit_later(chat_id, position))
+
+    async def _edit_later(self, chat_id: Union[int, str], position: _Position):
+        while position.text != position.edited_text:
+            delay = position.last_edit + self.debounce - self.clock()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            text = position.text
+            position.last_edit = self.clock()
+            if not await self.sender.edit_message(chat_id, position.message_id, text, parse_mode=position.parse_mode):
+                return
+            position.edited_text = text
+
+    def _prune(self, now: float):
+        """清理过期且没有待执行编辑的提醒"""
+        self._positions = {
+            key: position for key, position in self._positions.items()
+            if now - position.last_seen <= self.window
+            or (position.edit_task is not None and not position.edit_task.done())
+        }
@@ -0,0 +1,227 @@
+"""
+投递记录模块
+
+每次成功发送生成一条投递记录（群组、Telegram消息ID、时间戳、尝试次数），
+并写入本地SQLite索引，可按事件ID、交易员地址、代币查询已发送的消息。
+"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+from typing import List, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+# 参与计算事件ID的字段（不含语言、群组等投递参数）
+EVENT_ID_FIELDS = (
+    'message_type', 'action', 'direction', 'position_type', 'value_usd', 'position_value',
+    'token', 'trader_address', 'liquidation_price', 'timestamp',
+)
+
+
+class DeliveryRecord:
+    """一条消息（可能分多段）投递到一个群组的记录"""
+
+    __slots__ = (
+        'chat_id', 'message_thread_id', 'message_ids', 'sent_at', 'completed_at', 'attempts',
+        'event_id', 'trader_address', 'token',
+    )
+
+    def __init__(
+        self,
+        chat_id: Union[int, str],
+        message_ids: Optional[List[int]] = None,
+        sent_at: float = 0.0,
+        completed_at: float = 0.0,
+        attempts: int = 0,
+        event_id: Optional[str] = None,
+        trader_address: Optional[str] = None,
+        token: Optional[str] = None,
+        message_thread_id: Optional[int] = None
+    ):
+        self.chat_id = chat_id
+        self.message_thread_id = message_thread_id
+        self.message_ids = message_ids if message_ids is not None else []
+        self.sent_at = sent_at
+        self.completed_at = completed_at
+        self.attempts = attempts
+        self.event_id = event_id
+        self.trader_address = trader_address
+        self.token = token
+
+    @property
+    def message_id(self) -> Optional[int]:
+        """第一段消息的ID（回复、编辑时引用）"""
+        return self.message_ids[0] if self.message_ids else None
+
+    def to_dict(self) -> dict:
+        """转换为可JSON序列化的字典"""
+        data = {name: getattr(self, name) for name in self.__slots__}
+        data['message_id'] = self.message_id
+        return data
+
+
+def event_id_for(data: dict) -> str:
+    """
+    计算事件ID：优先使用请求中的 event_id，否则取事件字段的哈希
+
+    Args:
+        data: 请求数据
+
+    Returns:
+        str: 事件ID
+    """
+    if data.get('event_id'):
+        return str(data['event_id'])
+    payload = {k: data[k] for k in EVENT_ID_FIELDS if k in data}
+    encoded = json.dumps(payload, sort_keys=True, default=str).encode('utf-8')
+    return hashlib.blake2b(encoded, digest_size=12).hexdigest()
+
+
+class DeliveryIndex:
+    """
+    投递记录索引
+
+    记录先写入内存缓冲区，由后台线程每 flush_interval 秒（或累计 batch_size 条时）批量写入，
+    发送事件循环中不执行SQLite写操作；event_id、trader_address、token 和 (chat_id, message_id) 均建有索引。
+    """
+
+    def __init__(self, path: str, batch_size: int = 100, flush_interval: float = 1.0):
+        """
+        初始化投递索引并启动后台写入线程
+
+        Args:
+            path: SQLite文件路径
+            batch_size: 批量写入条数
+            flush_interval: 最长缓冲时间（秒）
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._buffer: List[DeliveryRecord] = []
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
+        self._conn = sqlite3.connect(path, timeout=5.0, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS deliveries (
+                id INTEGER PRIMARY KEY,
+                event_id TEXT,
+                chat_id TEXT NOT NULL,
+                message_id INTEGER,
+                message_ids TEXT NOT NULL,
+                trader_address TEXT,
+                token TEXT,
+                sent_at REAL NOT NULL,
+                completed_at REAL NOT NULL,
+                attempts INTEGER NOT NULL,
+                message_thread_id INTEGER
+            );
+            CREATE INDEX IF NOT EXISTS idx_deliveries_event ON deliveries (event_id);
+            CREATE INDEX IF NOT EXISTS idx_deliveries_trader ON deliveries (trader_address, sent_at);
+            CREATE INDEX IF NOT EXISTS idx_deliveries_token ON deliveries (token, sent_at);
+            CREATE INDEX IF NOT EXISTS idx_deliveries_message ON deliveries (chat_id, message_id);
+        """)
+        # 旧版本创建的数据库没有话题ID列
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(deliveries)")}
+        if 'message_thread_id' not in columns:
+            with self._conn:
+                self._conn.execute("ALTER TABLE deliveries ADD COLUMN message_thread_id INTEGER")
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._writer = threading.Thread(target=self._run_writer, name='delivery-index-writer', daemon=True)
+        self._writer.start()
+
+    def add(self, record: DeliveryRecord):
+        """添加一条投递记录（只写入内存缓冲区）"""
+        with self._lock:
+            self._buffer.append(record)
+            full = len(self._buffer) >= self.batch_size
+        if full:
+            self._wakeup.set()
+
+    def _run_writer(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error("❌ Failed to write delivery records to %s: %s", self.path, e)
+
+    def flush(self):
+        """把缓冲区中的记录写入数据库"""
+        with self._write_lock:
+            with self._lock:
+                records, self._buffer = self._buffer, []
+            if not records:
+                return
+            rows = [
+                (
+                    r.event_id, str(r.chat_id), r.message_id, json.dumps(r.message_ids),
+                    r.trader_address.lower() if r.trader_address else None,
+                    r.token.upper() if r.token else None,
+                    r.sent_at, r.completed_at, r.attempts, r.message_thread_id,
+                )
+                for r in records
+            ]
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT INTO deliveries (event_id, chat_id, message_id, message_ids, trader_address, "
+                    "token, sent_at, completed_at, attempts, message_thread_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    rows
+                )
+
+    def _query(self, where: str, params: tuple, limit: int) -> List[DeliveryRecord]:
+        self.flush()
+        with self._write_lock:
+            rows = self._conn.execute(
+                "SELECT chat_id, message_ids, sent_at, completed_at, attempts, event_id, trader_address, token, "
+                "message_thread_id "
+                f"FROM deliveries WHERE {where} ORDER BY sent_at DESC LIMIT ?",
+                params + (limit,)
+            ).fetchall()
+        return [
+            DeliveryRecord(
+                chat_id=int(chat_id) if chat_id.lstrip('-').isdigit() else chat_id,
+                message_ids=json.loads(message_ids),
+                sent_at=sent_at,
+                completed_at=completed_at,
+                attempts=attempts,
+                event_id=event_id,
+                trader_address=trader_address,
+                token=token,
+                message_thread_id=message_thread_id,
+            )
+            for (
+                chat_id, message_ids, sent_at, completed_at, attempts, event_id, trader_address, token,
+                message_thread_id,
+            ) in rows
+        ]
+
+    def by_event(self, event_id: str, limit: int = 100) -> List[DeliveryRecord]:
+        """按事件ID查询投递记录"""
+        return self._query("event_id = ?", (event_id,), limit)
+
+    def by_trader(self, trader_address: str, limit: int = 100) -> List[DeliveryRecord]:
+        """按交易员地址查询最近的投递记录"""
+        return self._query("trader_address = ?", (trader_address.lower(),), limit)
+
+    def by_token(self, token: str, limit: int = 100) -> List[DeliveryRecord]:
+        """按代币查询最近的投递记录"""
+        return self._query("token = ?", (token.upper(),), limit)
+
+    def close(self):
+        """停止后台写入线程，写入剩余记录并关闭数据库"""
+        self._closed = True
+        self._wakeup.set()
+        self._writer.join(timeout=5)
+        self.flush()
+        self._conn.close()
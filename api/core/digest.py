@@ -0,0 +1,82 @@
+"""
+低优先级摘要模块
+
+低于动态阈值的巨鲸事件不单独发送，先在内存中累积，每隔 interval 秒汇总为一条摘要发送。
+关闭服务时立即发送剩余的摘要。
+"""
+import asyncio
+import logging
+import threading
+import time
+from typing import Awaitable, Callable, List
+
+logger = logging.getLogger(__name__)
+
+
+class AlertDigest:
+    """
+    低优先级事件摘要
+    """
+
+    def __init__(
+        self,
+        flush: Callable[[List[dict], float], Awaitable],
+        interval: float = 900.0,
+        max_entries: int = 10000,
+        clock: Callable[[], float] = time.time
+    ):
+        """
+        初始化摘要
+
+        Args:
+            flush: 发送摘要的协程函数 flush(事件列表, 覆盖时长秒数)
+            interval: 摘要发送间隔（秒）
+            max_entries: 最多累积的事件数，超出时丢弃最早的
+            clock: 时钟函数（回放模拟时可替换为模拟时钟）
+        """
+        self.flush = flush
+        self.interval = interval
+        self.max_entries = max_entries
+        self.clock = clock
+        self.dropped = 0
+        self._entries: List[dict] = []
+        self._lock = threading.Lock()
+        self._started_at = clock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, entry: dict):
+        """加入一条低优先级事件（可在任意线程调用）"""
+        with self._lock:
+            self._entries.append(entry)
+            if len(self._entries) > self.max_entries:
+                del self._entries[0]
+                self.dropped += 1
+
+    async def run(self, stopping: Callable[[], bool]):
+        """
+        定时发送摘要，stopping() 为True时发送剩余事件后退出（在发送事件循环中运行）
+
+        Args:
+            stopping: 返回是否正在关闭的函数
+        """
+        next_flush = self.clock() + self.interval
+        while not stopping():
+            await asyncio.sleep(min(1.0, self.interval))
+            if self.clock() >= next_flush:
+                next_flush = self.clock() + self.interval
+                await self.flush_now()
+        await self.flush_now()
+
+    async def flush_now(self):
+        """立即发送已累积的事件"""
+        with self._lock:
+            entries, self._entries = self._entries, []
+            started_at, self._started_at = self._started_at, self.clock()
+        if not entries:
+            return
+        try:
+            await self.flush(entries, self.clock() - started_at)
+        except Exception as e:
+            logger.error("❌ Failed to send digest of %d events: %s", len(entries), e)
@@ -0,0 +1,307 @@
+"""
+发送调度模块
+
+所有Telegram调用都在一个专用的后台事件循环线程中执行：
+    - 应用启动时立即返回，Bot握手(get_me)在后台完成，失败时指数退避重试
+    - 握手完成前提交的发送排队等待，握手完成后依次执行
+    - Flask请求线程通过 run_async() 把协程提交到该事件循环并等待结果
+    - 关闭时停止接收请求，在截止时间内并行排空发送队列，
+      未发完的任务写入溢出文件，下次启动时重放
+"""
+import asyncio
+import concurrent.futures
+import contextlib
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Awaitable, Iterator, Optional
+from api.core.admission import AdmissionController, Overloaded
+from api.utils.logger import log_context
+from api.utils.tracing import current_span, record_span
+
+logger = logging.getLogger(__name__)
+
+# 当前请求已获得的发送名额的优先级（admit() 内的 run_send 不再重复申请）
+_admitted: ContextVar[Optional[bool]] = ContextVar('admitted', default=None)
+
+
+class SendDispatcher:
+    """
+    后台事件循环调度器
+    """
+
+    def __init__(self):
+        self.sender = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.send_timeout: float = 60.0
+        self.spill_dir: Optional[str] = None
+        self.admission: Optional[AdmissionController] = None
+        self.connected = False
+        self.stopping = False
+        self._thread: Optional[threading.Thread] = None
+        self._started = threading.Event()
+        self._handshake_task: Optional[asyncio.Task] = None
+        self._background = set()
+
+    @property
+    def running(self) -> bool:
+        """事件循环线程是否在运行"""
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(
+        self,
+        sender,
+        send_timeout: float = 60.0,
+        spill_dir: Optional[str] = None,
+        admission: Optional[AdmissionController] = None
+    ):
+        """
+        启动事件循环线程并在后台完成Bot握手
+
+        Args:
+            sender: TelegramSender实例
+            send_timeout: run_async() 默认的等待超时（秒）
+            spill_dir: 溢出文件目录，启动时重放其中的未完成任务
+            admission: 发送的准入控制，为空时不限制
+        """
+        self.sender = sender
+        self.send_timeout = send_timeout
+        self.spill_dir = spill_dir
+        self.admission = admission
+        if self.running:
+            return
+
+        self.stopping = False
+        self.connected = False
+        sender.deferred_handshake = True
+        self.loop = asyncio.new_event_loop()
+        self._started.clear()
+        self._thread = threading.Thread(
+            target=self._run_loop, name='telegram-dispatcher', daemon=True
+        )
+        self._thread.start()
+        self._started.wait()
+
+        asyncio.run_coroutine_threadsafe(self._startup(), self.loop)
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self._started.set()
+        self.loop.run_forever()
+
+    async def _startup(self):
+        self._handshake_task = asyncio.current_task()
+        await self._handshake()
+        self._replay_spill()
+
+    async def _handshake(self):
+        """后台完成Bot握手，失败时指数退避重试"""
+        delay = 1.0
+        while not await self.sender.initialize():
+            logger.warning("⚠️ Bot handshake failed, retrying in %.0fs", delay)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30.0)
+        self.connected = True
+
+    def submit(self, coro: Awaitable) -> concurrent.futures.Future:
+        """
+        提交协程到事件循环（握手完成前的发送在发送器内排队）
+
+        Args:
+            coro: 要执行的协程
+
+        Returns:
+            concurrent.futures.Future: 执行结果
+        """
+        if not self.running:
+            raise RuntimeError("Send dispatcher is not running")
+        return asyncio.run_coroutine_threadsafe(
+            _with_context(log_context.get(), current_span.get(), time.time_ns(), coro), self.loop
+        )
+
+    def run(self, coro: Awaitable, timeout: Optional[float] = None) -> Any:
+        """
+        提交协程并阻塞等待结果
+
+        Args:
+            coro: 要执行的协程
+            timeout: 等待超时（秒），默认使用 send_timeout
+
+        Raises:
+            TimeoutError: 超时未完成时抛出
+        """
+        future = self.submit(coro)
+        try:
+            return future.result(timeout if timeout is not None else self.send_timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise TimeoutError("Telegram send timed out")
+        except concurrent.futures.CancelledError:
+            raise RuntimeError("Send interrupted by shutdown, queued for replay on next start")
+
+    @contextlib.contextmanager
+    def admit(self, high_priority: bool = False) -> Iterator[None]:
+        """
+        申请一个发送名额，with块结束时释放；块内的 run_admitted() 使用该名额
+
+        请求在写入事件历史等副作用之前先申请名额，被拒绝（429）的请求不留下任何记录。
+
+        Raises:
+            Overloaded: 发送已满，低优先级请求被拒绝
+        """
+        admission = self.admission
+        if admission is None or _admitted.get() is not None:
+            yield
+            return
+        retry_after = admission.try_acquire(high_priority)
+        if retry_after is not None:
+            raise Overloaded(retry_after)
+        token = _admitted.set(high_priority)
+        try:
+            yield
+        finally:
+            _admitted.reset(token)
+            admission.release()
+
+    def run_admitted(self, coro: Awaitable, high_priority: bool = False, timeout: Optional[float] = None) -> Any:
+        """
+        经过准入控制执行一次发送并等待结果（已在 admit() 内时使用已获得的名额）
+
+        Raises:
+            Overloaded: 发送已满，低优先级请求被拒绝
+            TimeoutError: 超时未完成时抛出
+        """
+        admission = self.admission
+        if admission is None:
+            return self.run(coro, timeout)
+        try:
+            with self.admit(high_priority):
+                return self.run(admission.guard(coro, _admitted.get()), timeout)
+        except Overloaded:
+            coro.close()
+            raise
+
+    def shutdown(self, deadline: float = 20.0):
+        """
+        优雅关闭：停止接收请求，排空发送队列，溢出剩余任务，关闭Bot连接池
+
+        Args:
+            deadline: 排空发送队列的最长时间（秒）
+        """
+        if not self.running or self.stopping:
+            return
+        self.stopping = True
+        logger.info("⏳ Draining send queue (deadline %.0fs)...", deadline)
+
+        future = asyncio.run_coroutine_threadsafe(self._drain(deadline), self.loop)
+        try:
+            future.result(deadline + 10)
+        except Exception as e:
+            logger.error("❌ Drain failed: %s", e)
+
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=5)
+        self._thread = None
+        logger.info("✅ Send dispatcher stopped")
+
+    async def _drain(self, deadline: float):
+        """等待在途发送完成，超时后取消并写入溢出文件"""
+        current = asyncio.current_task()
+        tasks = [
+            task for task in asyncio.all_tasks()
+            if task is not current and task is not self._handshake_task
+        ]
+
+        if tasks:
+            # 在途任务本就在同一事件循环中并发执行，这里只需等待
+            done, remaining = await asyncio.wait(tasks, timeout=deadline)
+            logger.info("📤 Drained %d sends, %d still pending", len(done), len(remaining))
+            self.sender.closing = True
+            for task in remaining:
+                task.cancel()
+            if remaining:
+                await asyncio.wait(remaining, timeout=5)
+
+        if self._handshake_task and not self._handshake_task.done():
+            self._handshake_task.cancel()
+
+        self._write_spill()
+        await self.sender.close()
+
+    def _spill_path(self) -> str:
+        return os.path.join(self.spill_dir, f"spill-{os.getpid()}.jsonl")
+
+    def _write_spill(self):
+        """把未完成的发送任务写入溢出文件"""
+        jobs = [job for job in self.sender.pending.values() if job['parts']]
+        if not jobs:
+            return
+        if not self.spill_dir:
+            logger.error("❌ %d unsent messages lost (no spill directory configured)", len(jobs))
+            return
+
+        os.makedirs(self.spill_dir, exist_ok=True)
+        path = self._spill_path()
+        with open(path, 'a', encoding='utf-8') as f:
+            for job in jobs:
+                f.write(json.dumps(job, ensure_ascii=False) + '\n')
+        logger.warning("💾 Spilled %d unsent messages to %s", len(jobs), path)
+
+    def _replay_spill(self):
+        """重放上次关闭时溢出的发送任务（多个worker通过原子重命名认领文件）"""
+        if not self.spill_dir or not os.path.isdir(self.spill_dir):
+            return
+
+        for path in glob.glob(os.path.join(self.spill_dir, 'spill-*.jsonl')):
+            claimed = f"{path}.replaying-{os.getpid()}"
+            try:
+                os.rename(path, claimed)
+            except OSError:
+                continue
+
+            with open(claimed, encoding='utf-8') as f:
+                jobs = [json.loads(line) for line in f if line.strip()]
+            os.remove(claimed)
+
+            logger.info("🔁 Replaying %d spilled messages from %s", len(jobs), os.path.basename(path))
+            for job in jobs:
+                self.spawn(self.sender.replay(job))
+
+    def spawn(self, coro: Awaitable) -> asyncio.Task:
+        """在事件循环内创建后台任务并保持引用（须在事件循环线程中调用）"""
+        task = asyncio.ensure_future(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+        return task
+
+
+async def _with_context(fields: dict, span, submitted: int, coro: Awaitable) -> Any:
+    """在事件循环任务中恢复提交方的日志上下文和追踪区间，并记录在事件循环中排队的时间"""
+    log_context.set(fields)
+    if span is not None:
+        current_span.set(span)
+        record_span('dispatch.queue', submitted)
+    return await coro
+
+
+# 全局调度器实例
+dispatcher = SendDispatcher()
+
+
+def run_async(coro: Awaitable, timeout: Optional[float] = None) -> Any:
+    """在发送事件循环中执行协程并等待结果"""
+    return dispatcher.run(coro, timeout)
+
+
+def run_send(coro: Awaitable, high_priority: bool = False, timeout: Optional[float] = None) -> Any:
+    """在发送事件循环中执行发送（经过准入控制）并等待结果，过载时抛出 Overloaded"""
+    return dispatcher.run_admitted(coro, high_priority, timeout)
+
+
+def admit(high_priority: bool = False):
+    """申请发送名额（见 SendDispatcher.admit），过载时抛出 Overloaded"""
+    return dispatcher.admit(high_priority)
@@ -0,0 +1,195 @@
+"""
+代币信息补充模块
+
+为巨鲸提醒补充代币的显示名称和当前价格（用于显示现价和距强平价的百分比）：
+    - 按代币缓存，TTL内直接返回；过期但在 stale_ttl 内时先返回旧值，后台刷新
+    - 同一代币同一时刻只有一个加载请求（single-flight），突发的100条BTC强平只查询一次
+    - 加载超过延迟预算时放弃补充，提醒照常发送，加载结果仍会写入缓存供后续使用
+
+数据源可替换：本地JSON文件（测试和离线使用）或HTTP接口。
+所有协程都在发送事件循环中执行。
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Callable, Dict, Optional
+
+from api.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class TokenProvider:
+    """代币信息数据源"""
+
+    async def fetch(self, token: str) -> Optional[dict]:
+        """
+        查询代币信息
+
+        Returns:
+            dict: {'name': 显示名称, 'price': 当前价格}，未知代币返回None
+        """
+        raise NotImplementedError
+
+    async def close(self):
+        """释放资源"""
+        pass
+
+
+class FileTokenProvider(TokenProvider):
+    """
+    本地JSON文件数据源，文件变化后自动重新读取
+
+        {"BTC": {"name": "Bitcoin", "price": 67250.5}, "ETH": {"name": "Ethereum", "price": 3120.0}}
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._mtime = None
+        self._data: Dict[str, dict] = {}
+
+    async def fetch(self, token: str) -> Optional[dict]:
+        mtime = os.path.getmtime(self.path)
+        if mtime != self._mtime:
+            with open(self.path, encoding='utf-8') as f:
+                self._data = {key.upper(): value for key, value in json.load(f).items()}
+            self._mtime = mtime
+        return self._data.get(token)
+
+
+class HttpTokenProvider(TokenProvider):
+    """
+    HTTP数据源：GET url（{token} 替换为代币符号），返回 {"name": ..., "price": ...}
+    """
+
+    def __init__(self, url: str, timeout: float = 5.0):
+        self.url = url
+        self.timeout = timeout
+        self._session = None
+
+    async def fetch(self, token: str) -> Optional[dict]:
+        import aiohttp
+
+        if self._session is None:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout))
+        async with self._session.get(self.url.format(token=token)) as response:
+            if response.status == 404:
+                return None
+            response.raise_for_status()
+            return await response.json()
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+class TokenCache:
+    """
+    代币信息缓存
+    """
+
+    def __init__(
+        self,
+        provider: TokenProvider,
+        ttl: float = 30.0,
+        stale_ttl: float = 300.0,
+        budget: float = 0.15,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        初始化缓存
+
+        Args:
+            provider: 数据源
+            ttl: 缓存新鲜期（秒）
+            stale_ttl: 过期后仍可返回旧值的时长（秒），期间后台刷新
+            budget: 等待加载的最长时间（秒），超时则本条提醒不补充
+            clock: 时钟函数
+        """
+        self.provider = provider
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.budget = budget
+        self.clock = clock
+        # {代币: (加载时间, 信息或None)}
+        self._entries: Dict[str, tuple] = {}
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    async def get(self, token: str) -> Optional[dict]:
+        """
+        获取代币信息，不会等待超过延迟预算
+
+        Args:
+            token: 代币符号
+
+        Returns:
+            dict: 代币信息，未知代币、加载失败或超时返回None
+        """
+        token = token.upper()
+        entry = self._entries.get(token)
+        now = self.clock()
+
+        if entry is not None:
+            age = now - entry[0]
+            if age < self.ttl:
+                metrics.inc('token_enrichment_total', outcome='hit')
+                return entry[1]
+            if age < self.ttl + self.stale_ttl:
+                self._load(token)
+                metrics.inc('token_enrichment_total', outcome='stale')
+                return entry[1]
+
+        try:
+            info = await asyncio.wait_for(asyncio.shield(self._load(token)), self.budget)
+        except asyncio.TimeoutError:
+            metrics.inc('token_enrichment_total', outcome='timeout')
+            return None
+        metrics.inc('token_enrichment_total', outcome='miss')
+        return info
+
+    def _load(self, token: str) -> asyncio.Task:
+        """启动加载任务，同一代币已有加载进行中时复用"""
+        task = self._inflight.get(token)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(token))
+            self._inflight[token] = task
+            task.add_done_callback(lambda _: self._inflight.pop(token, None))
+        return task
+
+    async def _fetch(self, token: str) -> Optional[dict]:
+        try:
+            info = await self.provider.fetch(token)
+        except Exception as e:
+            # 失败不缓存，下一条提醒重新加载
+            logger.warning("⚠️ Token info lookup for %s failed: %s", token, e)
+            metrics.inc('token_enrichment_total', outcome='error')
+            return None
+        # 未知代币同样缓存，避免反复查询
+        self._entries[token] = (self.clock(), info)
+        return info
+
+    async def close(self):
+        """取消进行中的加载并关闭数据源"""
+        for task in list(self._inflight.values()):
+            task.cancel()
+        await self.provider.close()
+
+
+def create_token_provider(source: str) -> Optional[TokenProvider]:
+    """
+    根据配置创建数据源
+
+    Args:
+        source: http(s)://... 使用HTTP接口（{token} 为代币占位符），其他值视为本地JSON文件路径
+
+    Returns:
+        TokenProvider: 数据源，source为空时返回None
+    """
+    if not source:
+        return None
+    if source.startswith(('http://', 'https://')):
+        return HttpTokenProvider(source)
+    return FileTokenProvider(source)
@@ -0,0 +1,299 @@
+"""
+事件历史索引模块
+
+为事件存储的每个日分区建立索引，历史查询只访问索引命中的范围，不做全表扫描：
+    - 时间主索引: 按 (时间, 行号) 排序的行号数组
+    - 代币/交易员二级索引: 按 (代币, 时间, 行号) 排序的行号数组 + 每个ID的起止偏移
+查询先选最窄的索引（交易员 > 代币 > 时间），在其中二分出时间范围，再按批向量化地应用
+其余条件（消息类型、方向、金额），从新到旧返回，凑满一页即停止。
+
+已结束的分区（UTC日期早于一小时前）索引只建一次，保存为 <分区>/index.<行数>/*.npy 后映射读取；
+当天的分区索引只在内存中，新写入的行先作为“尾部”单独排序，尾部超过 TAIL_ROWS 行时重建。
+"""
+import heapq
+import os
+import shutil
+import threading
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from api.core.event_store import EventStore, day_of
+
+# 当天分区未建索引的尾部超过该行数时重建索引
+TAIL_ROWS = 65536
+
+# 每批检查的行数
+CHUNK_ROWS = 1024
+
+# 分区结束后多久视为不再写入（秒）
+SEAL_DELAY = 3600
+
+INDEX_ARRAYS = ('time', 'token', 'token_offsets', 'trader', 'trader_offsets')
+
+
+def build_index(segment: Dict[str, np.ndarray], rows: int) -> Dict[str, np.ndarray]:
+    """
+    为分区的前 rows 行建索引
+
+    Returns:
+        dict: {'time', 'token', 'token_offsets', 'trader', 'trader_offsets'}
+    """
+    ts = np.asarray(segment['ts'][:rows])
+    time_order = np.argsort(ts, kind='stable').astype(np.int32)
+    index = {'time': time_order}
+    for name in ('token', 'trader'):
+        # 按时间排好的行再按ID稳定排序，同一ID内仍按时间排列
+        ids = np.asarray(segment[name][:rows])[time_order]
+        index[name] = time_order[np.argsort(ids, kind='stable')]
+        counts = np.bincount(ids, minlength=int(ids.max()) + 1 if rows else 0)
+        index[f"{name}_offsets"] = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+    return index
+
+
+class _DayIndex:
+    """一个分区的索引（覆盖前 rows 行）"""
+
+    __slots__ = ('rows', 'arrays')
+
+    def __init__(self, rows: int, arrays: Dict[str, np.ndarray]):
+        self.rows = rows
+        self.arrays = arrays
+
+    def path_for(self, name: Optional[str], key: int) -> np.ndarray:
+        """取得某个索引中 ID 为 key 的行（按时间排列）；name 为None时返回时间主索引"""
+        if name is None:
+            return self.arrays['time']
+        offsets = self.arrays[f"{name}_offsets"]
+        if key < 0 or key + 1 >= len(offsets):
+            return self.arrays['time'][:0]
+        return self.arrays[name][offsets[key]:offsets[key + 1]]
+
+
+class HistoryQuery:
+    """一次历史查询的条件"""
+
+    def __init__(
+        self,
+        token: Optional[str] = None,
+        trader: Optional[str] = None,
+        message_type: Optional[int] = None,
+        side: Optional[int] = None,
+        min_value: Optional[float] = None,
+        max_value: Optional[float] = None,
+        start: float = 0.0,
+        end: float = float('inf')
+    ):
+        self.token = token.upper() if token else None
+        self.trader = trader.lower() if trader else None
+        self.message_type = message_type
+        self.side = side
+        self.min_value = min_value
+        self.max_value = max_value
+        self.start = start
+        self.end = end
+
+
+def encode_cursor(day: str, ts: float, row: int) -> str:
+    return f"{day}:{ts!r}:{row}"
+
+
+def decode_cursor(cursor: str) -> Tuple[str, float, int]:
+    """
+    解析分页游标
+
+    Raises:
+        ValueError: 游标格式错误
+    """
+    day, ts, row = cursor.split(':')
+    if not day.isdigit():
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return day, float(ts), int(row)
+
+
+class EventIndex:
+    """
+    事件存储的查询索引
+    """
+
+    def __init__(self, store: EventStore):
+        self.store = store
+        self._indexes: Dict[str, _DayIndex] = {}
+        self._lock = threading.Lock()
+
+    def _index_dir(self, day: str, rows: int) -> str:
+        return os.path.join(self.store.directory, day, f"index.{rows}")
+
+    def _load_or_build(self, day: str, segment: Dict[str, np.ndarray]) -> _DayIndex:
+        """取得分区的索引，必要时建立（已结束的分区保存到磁盘）"""
+        rows = len(segment['ts'])
+        with self._lock:
+            index = self._indexes.get(day)
+            if index is not None and (index.rows == rows or rows - index.rows <= TAIL_ROWS):
+                return index
+
+            sealed = day < day_of(self.store.clock() - SEAL_DELAY)
+            directory = self._index_dir(day, rows)
+            if sealed and os.path.isdir(directory):
+                arrays = {
+                    name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode='r') for name in INDEX_ARRAYS
+                }
+            else:
+                arrays = build_index(segment, rows)
+                if sealed:
+                    self._save(day, rows, arrays)
+            index = self._indexes[day] = _DayIndex(rows, arrays)
+            return index
+
+    def _save(self, day: str, rows: int, arrays: Dict[str, np.ndarray]):
+        """原子地保存分区索引，并删除旧行数的索引"""
+        directory = self._index_dir(day, rows)
+        tmp_dir = f"{directory}.tmp-{os.getpid()}"
+        os.makedirs(tmp_dir, exist_ok=True)
+        for name, array in arrays.items():
+            np.save(os.path.join(tmp_dir, f"{name}.npy"), array)
+        try:
+            os.rename(tmp_dir, directory)
+        except OSError:
+            # 其他进程已保存同样的索引
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        for name in os.listdir(os.path.join(self.store.directory, day)):
+            if name.startswith('index.') and name != f"index.{rows}" and '.tmp-' not in name:
+                shutil.rmtree(os.path.join(self.store.directory, day, name), ignore_errors=True)
+
+    def search(
+        self,
+        query: HistoryQuery,
+        limit: int = 100,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[dict], Optional[str]]:
+        """
+        按条件查询事件，从新到旧
+
+        Args:
+            query: 查询条件
+            limit: 每页条数
+            cursor: 上一页返回的游标
+
+        Returns:
+            tuple: (事件列表, 下一页游标；没有更多时为None)
+        """
+        self.store.flush()
+        self.store.tokens.sync()
+        self.store.traders.sync()
+        after = decode_cursor(cursor) if cursor else None
+        token_id = self.store.tokens.lookup(query.token) if query.token else None
+        trader_id = self.store.traders.lookup(query.trader) if query.trader else None
+        if token_id == -1 or trader_id == -1:
+            return [], None
+
+        found = []
+        for day in reversed(self.store.days(query.start, query.end if query.end != float('inf') else None)):
+            if after and day > after[0]:
+                continue
+            upper = (after[1], after[2]) if after and day == after[0] else (query.end, -1)
+            segment = self.store.segment(day)
+            for row in self._day_rows(day, segment, query, token_id, trader_id, upper):
+                found.append((day, segment, row))
+                if len(found) > limit:
+                    break
+            if len(found) > limit:
+                break
+
+        self.store.tokens.sync()
+        self.store.traders.sync()
+        next_cursor = None
+        if len(found) > limit:
+            found = found[:limit]
+            day, segment, row = found[-1]
+            next_cursor = encode_cursor(day, float(segment['ts'][row]), row)
+        return [self._event(segment, row) for _, segment, row in found], next_cursor
+
+    def _event(self, segment: Dict[str, np.ndarray], row: int) -> dict:
+        return {
+            'timestamp': float(segment['ts'][row]),
+            'token': self.store.tokens.decode(segment['token'][row]),
+            'trader_address': self.store.traders.decode(segment['trader'][row]),
+            'message_type': int(segment['message_type'][row]),
+            'direction': int(segment['side'][row]),
+            'value_usd': float(segment['value'][row]),
+        }
+
+    def _day_rows(
+        self,
+        day: str,
+        segment: Dict[str, np.ndarray],
+        query: HistoryQuery,
+        token_id: Optional[int],
+        trader_id: Optional[int],
+        upper: Tuple[float, int]
+    ) -> Iterator[int]:
+        """分区中满足条件且 (时间, 行号) < upper 的行，从新到旧"""
+        index = self._load_or_build(day, segment)
+        if trader_id is not None:
+            name, key = 'trader', trader_id
+        elif token_id is not None:
+            name, key = 'token', token_id
+        else:
+            name, key = None, -1
+        path = index.path_for(name, key)
+
+        # 尚未建索引的尾部行：先按索引列过滤，再按时间排序
+        tail = np.arange(index.rows, len(segment['ts']), dtype=np.int32)
+        if name is not None and len(tail):
+            tail = tail[np.asarray(segment[name][tail]) == key]
+        if len(tail):
+            tail = tail[np.argsort(np.asarray(segment['ts'][tail]), kind='stable')]
+
+        # 走交易员索引时代币作为附加条件
+        check_token = token_id if name == 'trader' else None
+        sources = [self._scan(path, segment, query, check_token, upper)]
+        if len(tail):
+            sources.append(self._scan(tail, segment, query, check_token, upper))
+            ts = segment['ts']
+            return heapq.merge(*sources, key=lambda row: (ts[row], row), reverse=True)
+        return sources[0]
+
+    @staticmethod
+    def _bound(path: np.ndarray, ts: np.ndarray, key: Tuple[float, int]) -> int:
+        """path 中第一个 (时间, 行号) >= key 的位置（二分查找）"""
+        lo, hi = 0, len(path)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            row = int(path[mid])
+            if (ts[row], row) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _scan(
+        self,
+        path: np.ndarray,
+        segment: Dict[str, np.ndarray],
+        query: HistoryQuery,
+        token_id: Optional[int],
+        upper: Tuple[float, int]
+    ) -> Iterator[int]:
+        """在按时间排列的 path 中，从 upper 往前逐批过滤（token_id 不为None时同时检查代币）"""
+        ts = segment['ts']
+        lo = self._bound(path, ts, (query.start, -1))
+        hi = self._bound(path, ts, upper)
+        while hi > lo:
+            start = max(lo, hi - CHUNK_ROWS)
+            rows = np.asarray(path[start:hi])[::-1]
+            mask = np.ones(len(rows), dtype=bool)
+            if token_id is not None:
+                mask &= np.asarray(segment['token'][rows]) == token_id
+            if query.message_type is not None:
+                mask &= np.asarray(segment['message_type'][rows]) == query.message_type
+            if query.side is not None:
+                mask &= np.asarray(segment['side'][rows]) == query.side
+            if query.min_value is not None or query.max_value is not None:
+                values = np.asarray(segment['value'][rows])
+                if query.min_value is not None:
+                    mask &= values >= query.min_value
+                if query.max_value is not None:
+                    mask &= values <= query.max_value
+            yield from rows[mask].tolist()
+            hi = start
@@ -0,0 +1,284 @@
+"""
+事件存储模块
+
+每个被接受的巨鲸/强平事件都追加到磁盘上的列式存储，供汇总、分析和回放使用：
+
+    events/
+        tokens.txt          代币字典，每行一个符号，行号即ID
+        traders.txt         交易员地址字典
+        .lock               写入锁（gunicorn的多个worker共用一个目录）
+        20261018/           每天（UTC）一个分区
+            ts.col  token.col  trader.col  message_type.col  side.col  value.col
+
+每列是定长的小端二进制数组，各列行号对齐（每个事件26字节，1亿条约2.6GB）；
+读取时用 np.memmap 映射，由操作系统页缓存负责加载，扫描速度取决于磁盘和内存带宽。
+
+写入不在请求路径上：append() 只把事件放入内存缓冲区，后台线程每隔 flush_interval 秒
+（或缓冲满 batch_size 条时）持文件锁批量写入——先追加字典，再追加各列。
+进程崩溃可能留下长短不一的列，下次写入该分区前按最短的列截齐。
+
+多个进程交替写入同一分区，分区内的时间只是近似递增（偏差不超过 MAX_SKEW 秒），
+按时间范围读取时先二分定位、再在边界附近精确过滤。
+"""
+import fcntl
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from api.core.history import COLUMNS, Dictionary
+
+logger = logging.getLogger(__name__)
+
+# 磁盘上的列类型（固定小端）
+DTYPES = {name: np.dtype(dtype).newbyteorder('<') for name, dtype in COLUMNS}
+
+# 分区内时间顺序的最大偏差（秒）
+MAX_SKEW = 60.0
+
+
+def day_of(ts: float) -> str:
+    """时间戳所在的分区名（UTC日期）"""
+    return time.strftime('%Y%m%d', time.gmtime(ts))
+
+
+class DictionaryFile(Dictionary):
+    """
+    持久化的字典编码：追加写入文本文件，行号即ID
+
+    线程安全：请求线程（查询前 sync()）和后台写入线程（sync(repair=True)、encode_many()）
+    共用一个锁，文件中的每一行只读入一次，ID与值始终对应。values 只会在末尾追加，
+    已取得的ID可以直接用 values[ID] 读取。
+    """
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+        self._offset = 0
+        self._lock = threading.Lock()
+        self.sync()
+
+    def sync(self, repair: bool = False):
+        """
+        读入其他进程追加的新值
+
+        Args:
+            repair: 截掉末尾不完整的行（崩溃遗留，只能在持有写入锁时修复）
+        """
+        with self._lock:
+            if not os.path.exists(self.path):
+                return
+            with open(self.path, 'rb') as f:
+                f.seek(self._offset)
+                data = f.read()
+            complete = data.rfind(b'\n') + 1
+            if complete:
+                for line in data[:complete].decode('utf-8').split('\n')[:-1]:
+                    self._ids.setdefault(line, len(self.values))
+                    self.values.append(line)
+                self._offset += complete
+            if repair and complete < len(data):
+                os.truncate(self.path, self._offset)
+
+    def encode(self, value: str) -> int:
+        """取得ID，新值追加到文件（调用方持有写入锁）"""
+        return int(self.encode_many([value])[0])
+
+    def encode_many(self, values: List[str]) -> np.ndarray:
+        """取得一批值的ID，新值追加到文件（调用方持有写入锁）"""
+        added = []
+        ids = np.empty(len(values), dtype=np.int32)
+        with self._lock:
+            for i, value in enumerate(values):
+                index = self._ids.get(value)
+                if index is None:
+                    index = self._ids[value] = len(self.values)
+                    self.values.append(value)
+                    added.append(value)
+                ids[i] = index
+            if added:
+                data = ''.join(f"{value}\n" for value in added).encode('utf-8')
+                with open(self.path, 'ab') as f:
+                    f.write(data)
+                self._offset += len(data)
+        return ids
+
+    def lookup(self, value: str) -> int:
+        with self._lock:
+            return self._ids.get(value, -1)
+
+    def decode(self, index: int) -> str:
+        """ID对应的值"""
+        with self._lock:
+            return self.values[index]
+
+
+class EventStore:
+    """
+    列式事件存储（接口与 EventHistory 相同，可直接用于定时汇总）
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        batch_size: int = 4096,
+        flush_interval: float = 1.0,
+        clock: Callable[[], float] = time.time
+    ):
+        """
+        初始化事件存储并启动后台写入线程
+
+        Args:
+            directory: 存储目录
+            batch_size: 缓冲达到该条数时立即写入
+            flush_interval: 最长缓冲时间（秒）
+            clock: 时钟函数
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.clock = clock
+        self.tokens = DictionaryFile(os.path.join(directory, 'tokens.txt'))
+        self.traders = DictionaryFile(os.path.join(directory, 'traders.txt'))
+        self._buffer: List[tuple] = []
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        # {分区: (行数, {列名: memmap})}
+        self._segments: Dict[str, tuple] = {}
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._writer = threading.Thread(target=self._run_writer, name='event-store-writer', daemon=True)
+        self._writer.start()
+
+    def append(self, token: str, trader: str, message_type: int, side: int, value: float):
+        """追加一个事件（只写入内存缓冲区）"""
+        row = (self.clock(), token.upper().replace('\n', ' '), trader.lower().replace('\n', ' '),
+               message_type, side, value)
+        with self._lock:
+            self._buffer.append(row)
+            full = len(self._buffer) >= self.batch_size
+        if full:
+            self._wakeup.set()
+
+    def _run_writer(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error("❌ Failed to write events to %s: %s", self.directory, e)
+
+    def flush(self):
+        """把缓冲区中的事件写入磁盘"""
+        with self._write_lock:
+            with self._lock:
+                rows, self._buffer = self._buffer, []
+            if not rows:
+                return
+            ts, tokens, traders, message_types, sides, values = zip(*rows)
+            batch = {
+                'ts': np.array(ts, dtype=DTYPES['ts']),
+                'message_type': np.array(message_types, dtype=DTYPES['message_type']),
+                'side': np.array(sides, dtype=DTYPES['side']),
+                'value': np.array(values, dtype=DTYPES['value']),
+            }
+            days = np.array([day_of(t) for t in ts])
+
+            with open(os.path.join(self.directory, '.lock'), 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                # 字典先于列数据落盘，列中引用的ID一定能在字典中找到
+                self.tokens.sync(repair=True)
+                self.traders.sync(repair=True)
+                batch['token'] = self.tokens.encode_many(list(tokens)).astype(DTYPES['token'])
+                batch['trader'] = self.traders.encode_many(list(traders)).astype(DTYPES['trader'])
+                for day in np.unique(days):
+                    selected = days == day
+                    self._write_segment(str(day), {name: column[selected] for name, column in batch.items()})
+
+    def _column_path(self, day: str, name: str) -> str:
+        return os.path.join(self.directory, day, f"{name}.col")
+
+    def _rows(self, day: str) -> int:
+        """分区中完整的行数（按最短的列计算）"""
+        sizes = []
+        for name, dtype in DTYPES.items():
+            path = self._column_path(day, name)
+            sizes.append(os.path.getsize(path) // dtype.itemsize if os.path.exists(path) else 0)
+        return min(sizes)
+
+    def _write_segment(self, day: str, batch: Dict[str, np.ndarray]):
+        """向分区追加一批事件（调用方持有写入锁）"""
+        os.makedirs(os.path.join(self.directory, day), exist_ok=True)
+        rows = self._rows(day)
+        for name, dtype in DTYPES.items():
+            with open(self._column_path(day, name), 'ab') as f:
+                if f.tell() != rows * dtype.itemsize:
+                    # 上次写入中途崩溃，截掉多出的部分
+                    f.truncate(rows * dtype.itemsize)
+                    f.seek(0, os.SEEK_END)
+                f.write(batch[name].tobytes())
+
+    def days(self, start: float = 0, end: Optional[float] = None) -> List[str]:
+        """时间范围内已有的分区，按日期排序"""
+        first = day_of(max(start, 0))
+        last = day_of(end if end is not None else self.clock())
+        return sorted(
+            name for name in os.listdir(self.directory)
+            if name.isdigit() and first <= name <= last
+        )
+
+    def segment(self, day: str) -> Dict[str, np.ndarray]:
+        """
+        映射一个分区的全部列（只读，不复制）
+
+        Returns:
+            dict: {列名: 数组}
+        """
+        rows = self._rows(day)
+        cached = self._segments.get(day)
+        if cached is None or cached[0] != rows:
+            if rows == 0:
+                columns = {name: np.zeros(0, dtype=dtype) for name, dtype in DTYPES.items()}
+            else:
+                columns = {
+                    name: np.memmap(self._column_path(day, name), dtype=dtype, mode='r', shape=(rows,))
+                    for name, dtype in DTYPES.items()
+                }
+            cached = self._segments[day] = (rows, columns)
+        return cached[1]
+
+    def columns(self, start: float, end: float) -> Dict[str, np.ndarray]:
+        """
+        时间范围 [start, end) 内的事件（包括其他进程写入的）
+
+        Returns:
+            dict: {列名: 数组}
+        """
+        self.flush()
+        parts = []
+        for day in self.days(start, end):
+            segment = self.segment(day)
+            ts = segment['ts']
+            lo = int(np.searchsorted(ts, start - MAX_SKEW, side='left'))
+            hi = int(np.searchsorted(ts, end + MAX_SKEW, side='left'))
+            window = ts[lo:hi]
+            selected = np.flatnonzero((window >= start) & (window < end)) + lo
+            parts.append({name: column[selected] for name, column in segment.items()})
+        # 列数据中引用的ID都已写入字典文件
+        self.tokens.sync()
+        self.traders.sync()
+        if not parts:
+            return {name: np.zeros(0, dtype=dtype) for name, dtype in DTYPES.items()}
+        return {name: np.concatenate([part[name] for part in parts]) for name in DTYPES}
+
+    def close(self):
+        """停止后台写入线程并写入剩余事件"""
+        self._closed = True
+        self._wakeup.set()
+        self._writer.join(timeout=5)
+        self.flush()
@@ -0,0 +1,43 @@
+"""
+巨鲸事件字段解析
+
+/send 接口使用整数参数，/trade 和 /liquidation 接口使用中英文文本，
+这里把两种写法统一为统计和存储使用的数值。
+"""
+import math
+from typing import Optional
+
+# 方向: 交易为买入/卖出，强平为多头/空头仓位
+SIDE_LONG = 1
+SIDE_SHORT = 2
+
+_SHORT_WORDS = ('short', '卖出', '做空')
+
+
+def event_value(data: dict) -> Optional[float]:
+    """事件金额（交易价值或仓位价值），不是有限数值时返回None"""
+    value = data.get('value_usd', data.get('position_value'))
+    try:
+        value = float(value)
+    except (TypeError, ValueError, OverflowError):
+        return None
+    return value if math.isfinite(value) else None
+
+
+def event_side(data: dict, message_type: int) -> int:
+    """
+    事件方向
+
+    交易取 action（买入/卖出），强平取 direction 或 position_type（多头/空头仓位）。
+
+    Returns:
+        int: SIDE_LONG 或 SIDE_SHORT
+    """
+    if message_type == 1:
+        value = data.get('action', data.get('direction'))
+    else:
+        value = data.get('direction', data.get('position_type'))
+    if isinstance(value, int):
+        return SIDE_SHORT if value == 2 else SIDE_LONG
+    text = str(value).lower()
+    return SIDE_SHORT if any(word in text for word in _SHORT_WORDS) else SIDE_LONG
@@ -0,0 +1,120 @@
+"""
+事件历史模块
+
+按列保存最近的巨鲸事件，供定时汇总（小时/日报）做向量化聚合：
+    - 每列一个 NumPy 数组（时间、代币、交易员、消息类型、方向、金额），按到达顺序追加
+    - 代币和交易员地址用字典编码为整数ID，聚合时直接 bincount
+    - 超过保留时长的事件在数组写满时整体前移丢弃，追加为均摊O(1)
+时间列按到达顺序递增，按时间范围取数据是两次二分查找加切片。
+"""
+import threading
+import time
+from typing import Callable, Dict, List
+
+import numpy as np
+
+# 列名和类型
+COLUMNS = (
+    ('ts', np.float64),
+    ('token', np.int32),
+    ('trader', np.int32),
+    ('message_type', np.int8),
+    ('side', np.int8),
+    ('value', np.float64),
+)
+
+
+class Dictionary:
+    """字符串 ↔ 整数ID 的字典编码"""
+
+    def __init__(self, values: List[str] = None):
+        self.values: List[str] = list(values or [])
+        self._ids: Dict[str, int] = {value: i for i, value in enumerate(self.values)}
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def encode(self, value: str) -> int:
+        """取得ID，新值追加到字典末尾"""
+        index = self._ids.get(value)
+        if index is None:
+            index = self._ids[value] = len(self.values)
+            self.values.append(value)
+        return index
+
+    def lookup(self, value: str) -> int:
+        """已有值的ID，不存在时返回-1"""
+        return self._ids.get(value, -1)
+
+
+class EventHistory:
+    """
+    内存中的列式事件历史
+    """
+
+    def __init__(
+        self,
+        retention: float = 2 * 86400,
+        initial_capacity: int = 65536,
+        clock: Callable[[], float] = time.time
+    ):
+        """
+        初始化事件历史
+
+        Args:
+            retention: 保留时长（秒），至少覆盖最长的汇总周期
+            initial_capacity: 初始容量，不够时按倍数扩容
+            clock: 时钟函数
+        """
+        self.retention = retention
+        self.clock = clock
+        self.tokens = Dictionary()
+        self.traders = Dictionary()
+        self._columns = {name: np.zeros(initial_capacity, dtype=dtype) for name, dtype in COLUMNS}
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def append(self, token: str, trader: str, message_type: int, side: int, value: float):
+        """追加一个事件"""
+        with self._lock:
+            if self._size == len(self._columns['ts']):
+                self._make_room()
+            i = self._size
+            columns = self._columns
+            columns['ts'][i] = self.clock()
+            columns['token'][i] = self.tokens.encode(token.upper())
+            columns['trader'][i] = self.traders.encode(trader.lower())
+            columns['message_type'][i] = message_type
+            columns['side'][i] = side
+            columns['value'][i] = value
+            self._size = i + 1
+
+    def _make_room(self):
+        """丢弃超过保留时长的事件；仍不足一半空间时扩容"""
+        cutoff = self.clock() - self.retention
+        start = int(np.searchsorted(self._columns['ts'][:self._size], cutoff, side='left'))
+        keep = self._size - start
+        capacity = len(self._columns['ts'])
+        if keep > capacity // 2:
+            capacity *= 2
+        for name, dtype in COLUMNS:
+            column = np.zeros(capacity, dtype=dtype) if capacity != len(self._columns[name]) else self._columns[name]
+            column[:keep] = self._columns[name][start:self._size]
+            self._columns[name] = column
+        self._size = keep
+
+    def columns(self, start: float, end: float) -> Dict[str, np.ndarray]:
+        """
+        时间范围 [start, end) 内的事件
+
+        Returns:
+            dict: {列名: 数组副本}
+        """
+        with self._lock:
+            ts = self._columns['ts'][:self._size]
+            lo = int(np.searchsorted(ts, start, side='left'))
+            hi = int(np.searchsorted(ts, end, side='left'))
+            return {name: self._columns[name][lo:hi].copy() for name, _ in COLUMNS}
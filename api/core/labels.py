@@ -0,0 +1,173 @@
+"""
+地址标签模块
+
+把交易员地址解析为已知实体的标签（交易所、基金、知名钱包等）。
+标签数据（可达数百万行）由 tools/build_labels.py 预先编译为排序好的二进制文件，
+启动时只做内存映射，不解析CSV。
+
+文件格式（小端序）:
+    头部      8字节魔数 + uint32 记录数 + uint32 保留
+    前缀表    65537 个 uint32，前缀表[p] 为首2字节等于 p 的第一条记录的下标
+    记录      每条 24 字节: 20字节地址键 + uint32 标签偏移（按地址键排序）
+    标签区    每个标签: uint16 长度 + UTF-8 字节
+
+查找时先用前缀表定位到很小的区间，再在区间内二分查找，热点地址另有LRU缓存。
+文件被替换（原子重命名）后自动重新映射，查找不中断。
+"""
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'TGLABEL1'
+HEADER = struct.Struct('<8sII')
+PREFIX_COUNT = 65537
+PREFIX_TABLE = struct.Struct(f'<{PREFIX_COUNT}I')
+KEY_SIZE = 20
+RECORD = struct.Struct('<20sI')
+LABEL_LENGTH = struct.Struct('<H')
+DATA_OFFSET = HEADER.size + PREFIX_TABLE.size
+
+
+def address_key(address: str) -> bytes:
+    """
+    计算地址的20字节查找键
+
+    0x开头的EVM地址直接取其字节，其他格式（如Solana地址）取哈希。
+    """
+    address = address.strip()
+    if len(address) == 42 and address[:2] in ('0x', '0X'):
+        try:
+            return bytes.fromhex(address[2:])
+        except ValueError:
+            pass
+    return hashlib.blake2b(address.encode('utf-8'), digest_size=KEY_SIZE).digest()
+
+
+class LabelTable:
+    """一个已映射的标签文件（只读）"""
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as f:
+            self.stat = os.fstat(f.fileno())
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count, _ = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a label index file")
+        self._prefix = PREFIX_TABLE.unpack_from(self._mmap, HEADER.size)
+        self._labels_offset = DATA_OFFSET + self.count * RECORD.size
+
+    def get(self, key: bytes) -> Optional[str]:
+        """按20字节地址键查找标签"""
+        buf = self._mmap
+        prefix = (key[0] << 8) | key[1]
+        lo, hi = self._prefix[prefix], self._prefix[prefix + 1]
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = DATA_OFFSET + mid * RECORD.size
+            current = buf[start:start + KEY_SIZE]
+            if current < key:
+                lo = mid + 1
+            elif current > key:
+                hi = mid
+            else:
+                (offset,) = struct.unpack_from('<I', buf, start + KEY_SIZE)
+                position = self._labels_offset + offset
+                (length,) = LABEL_LENGTH.unpack_from(buf, position)
+                position += LABEL_LENGTH.size
+                return buf[position:position + length].decode('utf-8')
+        return None
+
+
+class AddressLabels:
+    """
+    地址标签查询
+
+    线程安全：替换文件时整体换入新的 LabelTable，旧映射在不再被引用后释放。
+    """
+
+    def __init__(self, path: str, cache_size: int = 65536, check_interval: float = 5.0):
+        """
+        初始化地址标签
+
+        Args:
+            path: tools/build_labels.py 生成的标签文件
+            cache_size: 热点地址缓存条数
+            check_interval: 检查文件是否被替换的间隔（秒）
+        """
+        self.path = path
+        self.cache_size = cache_size
+        self.check_interval = check_interval
+        self._table: Optional[LabelTable] = None
+        self._cache: 'OrderedDict[str, Optional[str]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._next_check = 0.0
+        self.reload()
+
+    def __len__(self) -> int:
+        return self._table.count if self._table else 0
+
+    def reload(self) -> bool:
+        """
+        重新映射标签文件（文件未变化时不做任何事）
+
+        Returns:
+            bool: 是否换入了新文件
+        """
+        self._next_check = time.monotonic() + self.check_interval
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            if self._table is None:
+                logger.warning("⚠️ Address label file %s not found", self.path)
+            return False
+
+        current = self._table
+        if current is not None and (current.stat.st_ino, current.stat.st_mtime_ns) == (stat.st_ino, stat.st_mtime_ns):
+            return False
+
+        try:
+            table = LabelTable(self.path)
+        except (OSError, ValueError, struct.error) as e:
+            logger.error("❌ Failed to load address labels: %s", e)
+            return False
+
+        with self._lock:
+            self._table = table
+            self._cache.clear()
+        logger.info("🏷️ Loaded %d address labels from %s", table.count, self.path)
+        return True
+
+    def get(self, address: str) -> Optional[str]:
+        """
+        查询地址的标签
+
+        Args:
+            address: 交易员地址
+
+        Returns:
+            str: 标签，未知地址返回None
+        """
+        if time.monotonic() >= self._next_check:
+            self.reload()
+
+        with self._lock:
+            if address in self._cache:
+                self._cache.move_to_end(address)
+                return self._cache[address]
+            table = self._table
+
+        label = table.get(address_key(address)) if table is not None else None
+
+        with self._lock:
+            self._cache[address] = label
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return label
@@ -0,0 +1,398 @@
+"""
+限流与去重模块
+
+按Telegram的发送限制（全局约30条/秒，单个群组约20条/分钟）为每次发送预约时间槽。
+使用GCRA算法，每个限流键只需保存一个“理论到达时间”(TAT)：
+    - RateLimiter: 进程内存储，单进程使用
+    - SharedRateLimiter: SQLite文件存储，gunicorn多个worker共享同一份限流、去重、API密钥配额和签名随机串状态
+    - BatchedQuota: API密钥配额在进程内判断，按批与 SharedRateLimiter 同步，认证不必每次请求都写SQLite
+"""
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple, Union
+
+# 全局限流键
+GLOBAL_KEY = '__global__'
+
+# 清理过期签名随机串的间隔（秒）
+NONCE_PRUNE_INTERVAL = 10.0
+
+
+class RateLimiter:
+    """
+    进程内限流器
+
+    每个限流键由 (发送间隔, 突发容量) 描述，reserve() 预约下一个可用时间槽并返回需要等待的秒数。
+    """
+
+    def __init__(
+        self,
+        global_rate: float = 30.0,
+        chat_rate: float = 20.0 / 60.0,
+        chat_burst: int = 3,
+        clock: Callable[[], float] = time.time
+    ):
+        """
+        初始化限流器
+
+        Args:
+            global_rate: 全局每秒最大发送数
+            chat_rate: 单个群组每秒最大发送数
+            chat_burst: 单个群组允许的突发条数
+            clock: 时钟函数（回放模拟时可替换为模拟时钟）
+        """
+        self.global_interval = 1.0 / global_rate if global_rate > 0 else 0.0
+        self.global_burst = max(int(global_rate), 1)
+        self.chat_interval = 1.0 / chat_rate if chat_rate > 0 else 0.0
+        self.chat_burst = max(chat_burst, 1)
+        self.clock = clock
+        self._tat: Dict[str, float] = {}
+        self._seen: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def reserve(self, chat_id: Union[int, str]) -> float:
+        """
+        为一次发送预约全局和群组时间槽
+
+        Args:
+            chat_id: 目标群组ID
+
+        Returns:
+            float: 发送前需要等待的秒数
+        """
+        now = self.clock()
+        with self._lock:
+            wait_global = self._reserve_key(GLOBAL_KEY, now, self.global_interval, self.global_burst)
+            wait_chat = self._reserve_key(str(chat_id), now, self.chat_interval, self.chat_burst)
+        return max(wait_global, wait_chat)
+
+    def _reserve_key(self, key: str, now: float, interval: float, burst: int) -> float:
+        tat = self._tat.get(key, now)
+        new_tat, wait = gcra(tat, now, interval, burst)
+        self._tat[key] = new_tat
+        return wait
+
+    def acquire(self, key: str, interval: float, burst: int, cost: int = 1) -> float:
+        """
+        配额检查（如API密钥的请求和消息配额）：为 key 占用 cost 个名额，需要等待时不占用
+
+        Args:
+            key: 配额键
+            interval: 平均间隔（秒）
+            burst: 突发容量
+            cost: 占用的名额数
+
+        Returns:
+            float: 0表示已占用，否则为名额恢复前需要等待的秒数
+        """
+        now = self.clock()
+        with self._lock:
+            tat, wait = gcra(self._tat.get(key, now), now, interval, burst, cost)
+            if not wait:
+                self._tat[key] = tat
+        return wait
+
+    def seen(self, key: str, window: float) -> bool:
+        """
+        去重检查：key在window秒内出现过则返回True，否则记录并返回False
+
+        Args:
+            key: 去重键（如群组ID与消息内容的哈希）
+            window: 去重窗口（秒）
+        """
+        now = self.clock()
+        with self._lock:
+            expires = self._seen.get(key)
+            if expires is not None and expires > now:
+                return True
+            self._seen[key] = now + window
+            if len(self._seen) > 10000:
+                self._seen = {k: v for k, v in self._seen.items() if v > now}
+            return False
+
+    def forget(self, key: str):
+        """撤销 seen() 记录的去重键（发送失败时调用，生产者重试不会被当作重复）"""
+        with self._lock:
+            self._seen.pop(key, None)
+
+    def close(self):
+        """释放资源"""
+        pass
+
+
+class SharedRateLimiter(RateLimiter):
+    """
+    跨进程共享的限流器
+
+    状态保存在本地SQLite文件中，每次预约在一个 BEGIN IMMEDIATE 事务内完成读-改-写，
+    多个worker进程合计不会超过Telegram的限制。
+    """
+
+    def __init__(self, path: str, **kwargs):
+        """
+        初始化共享限流器
+
+        Args:
+            path: SQLite文件路径
+            **kwargs: 传给 RateLimiter 的限流参数
+        """
+        super().__init__(**kwargs)
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS rate_state (key TEXT PRIMARY KEY, tat REAL NOT NULL)")
+        conn.execute("CREATE TABLE IF NOT EXISTS dedup_state (key TEXT PRIMARY KEY, expires REAL NOT NULL)")
+        conn.execute("CREATE TABLE IF NOT EXISTS nonce_state (nonce TEXT PRIMARY KEY, expires REAL NOT NULL)")
+        self._next_nonce_prune = 0.0
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA synchronous=OFF")
+            self._local.conn = conn
+        return conn
+
+    def reserve(self, chat_id: Union[int, str]) -> float:
+        now = self.clock()
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            wait_global = self._reserve_row(conn, GLOBAL_KEY, now, self.global_interval, self.global_burst)
+            wait_chat = self._reserve_row(conn, str(chat_id), now, self.chat_interval, self.chat_burst)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return max(wait_global, wait_chat)
+
+    @staticmethod
+    def _reserve_row(conn: sqlite3.Connection, key: str, now: float, interval: float, burst: int) -> float:
+        row = conn.execute("SELECT tat FROM rate_state WHERE key = ?", (key,)).fetchone()
+        new_tat, wait = gcra(row[0] if row else now, now, interval, burst)
+        conn.execute("INSERT OR REPLACE INTO rate_state (key, tat) VALUES (?, ?)", (key, new_tat))
+        return wait
+
+    def acquire(self, key: str, interval: float, burst: int, cost: int = 1) -> float:
+        now = self.clock()
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tat FROM rate_state WHERE key = ?", (key,)).fetchone()
+            tat, wait = gcra(row[0] if row else now, now, interval, burst, cost)
+            if not wait:
+                conn.execute("INSERT OR REPLACE INTO rate_state (key, tat) VALUES (?, ?)", (key, tat))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return wait
+
+    def seen(self, key: str, window: float) -> bool:
+        now = self.clock()
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT expires FROM dedup_state WHERE key = ?", (key,)).fetchone()
+            if row and row[0] > now:
+                conn.execute("COMMIT")
+                return True
+            conn.execute("INSERT OR REPLACE INTO dedup_state (key, expires) VALUES (?, ?)", (key, now + window))
+            conn.execute("DELETE FROM dedup_state WHERE expires < ?", (now - window,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return False
+
+    def forget(self, key: str):
+        self._connection().execute("DELETE FROM dedup_state WHERE key = ?", (key,))
+
+    def claim_nonce(self, nonce: str, expires: float, now: float) -> bool:
+        """
+        记录请求签名的随机串（INSERT OR IGNORE，多个worker中只有一个能记录成功）
+
+        Args:
+            nonce: 随机串
+            expires: 过期时间（此后签名时间戳已超出允许范围，记录可以删除）
+            now: 当前时间
+
+        Returns:
+            bool: 首次出现返回True，已被任何一个worker记录过返回False
+        """
+        conn = self._connection()
+        if now >= self._next_nonce_prune:
+            self._next_nonce_prune = now + NONCE_PRUNE_INTERVAL
+            conn.execute("DELETE FROM nonce_state WHERE expires < ?", (now,))
+        cursor = conn.execute("INSERT OR IGNORE INTO nonce_state (nonce, expires) VALUES (?, ?)", (nonce, expires))
+        return cursor.rowcount == 1
+
+    def load_tat(self, key: str) -> Optional[float]:
+        """读取限流键的理论到达时间，没有记录时返回None"""
+        row = self._connection().execute("SELECT tat FROM rate_state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def merge_usage(self, usage: Dict[str, Tuple[float, int, float]]) -> Dict[str, float]:
+        """
+        在一个事务内写入各配额键在进程内已占用的名额，并读回合计后的理论到达时间
+
+        Args:
+            usage: 配额键 -> (平均间隔, 已占用名额数, 首次占用时间)，名额数为0时只读取
+
+        Returns:
+            dict: 配额键 -> 合计所有worker占用后的理论到达时间（没有记录的键不返回）
+        """
+        merged = {}
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for key, (interval, cost, since) in usage.items():
+                row = conn.execute("SELECT tat FROM rate_state WHERE key = ?", (key,)).fetchone()
+                if cost:
+                    # 名额已在进程内发放，这里只从首次占用的时间起累加，不再检查突发容量
+                    tat = max(row[0] if row else since, since) + interval * cost
+                    conn.execute("INSERT OR REPLACE INTO rate_state (key, tat) VALUES (?, ?)", (key, tat))
+                    merged[key] = tat
+                elif row:
+                    merged[key] = row[0]
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return merged
+
+    def nonce_count(self) -> int:
+        """保存的随机串条数（含尚未清理的过期记录）"""
+        return self._connection().execute("SELECT COUNT(*) FROM nonce_state").fetchone()[0]
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+class BatchedQuota:
+    """
+    按批同步的共享配额（API密钥的请求和消息配额）
+
+    每个worker在进程内按GCRA判断并发放名额，占用的名额每 sync_interval 秒在一个事务内累加到
+    SharedRateLimiter 的SQLite中，同时读回其他worker的占用。认证不再每次请求执行SQLite事务；
+    代价是两次同步之间各worker互相看不到新的占用，N个worker合计最多在一个同步间隔内多发放约 (N-1) 倍突发容量。
+    """
+
+    def __init__(self, shared: SharedRateLimiter, sync_interval: float = 1.0):
+        """
+        初始化共享配额
+
+        Args:
+            shared: 保存合计配额状态的共享限流器
+            sync_interval: 与共享状态同步的间隔（秒）
+        """
+        self.shared = shared
+        self.sync_interval = sync_interval
+        self.clock = shared.clock
+        # 配额键 -> [进程内的理论到达时间, 尚未同步的名额数, 平均间隔, 尚未同步的首次占用时间]
+        self._entries: Dict[str, list] = {}
+        self._next_sync = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self, key: str, interval: float, burst: int, cost: int = 1) -> float:
+        """与 RateLimiter.acquire() 相同：为 key 占用 cost 个名额，需要等待时不占用"""
+        now = self.clock()
+        with self._lock:
+            if now >= self._next_sync:
+                self._sync(now)
+            entry = self._entries.get(key)
+            if entry is None:
+                # 首次使用的键先读取其他worker的占用
+                tat = self.shared.load_tat(key)
+                entry = self._entries[key] = [now if tat is None else tat, 0, interval, now]
+            entry[2] = interval
+            tat, wait = gcra(entry[0], now, interval, burst, cost)
+            if not wait:
+                if not entry[1]:
+                    entry[3] = now
+                entry[0] = tat
+                entry[1] += cost
+        return wait
+
+    def sync(self):
+        """立即与共享状态同步（如worker退出前写入尚未同步的占用）"""
+        with self._lock:
+            self._sync(self.clock())
+
+    def _sync(self, now: float):
+        self._next_sync = now + self.sync_interval
+        if not self._entries:
+            return
+        merged = self.shared.merge_usage(
+            {key: (entry[2], entry[1], entry[3]) for key, entry in self._entries.items()}
+        )
+        for key in list(self._entries):
+            tat = merged.get(key)
+            if tat is None or tat <= now:
+                # 配额已完全恢复的键不再缓存
+                del self._entries[key]
+            else:
+                self._entries[key][0:2] = [tat, 0]
+
+
+def gcra(tat: float, now: float, interval: float, burst: int, cost: int = 1) -> Tuple[float, float]:
+    """
+    GCRA限流计算
+
+    Args:
+        tat: 当前的理论到达时间
+        now: 当前时间
+        interval: 两次发送的最小平均间隔
+        burst: 允许的突发条数
+        cost: 本次占用的条数
+
+    Returns:
+        tuple: (新的理论到达时间, 需要等待的秒数)
+    """
+    if interval <= 0:
+        return now, 0.0
+    tat = max(tat, now)
+    new_tat = tat + interval * cost
+    wait = max(0.0, new_tat - now - interval * burst)
+    return new_tat, wait
+
+
+def create_rate_limiter(state_path: Optional[str] = None, **kwargs) -> RateLimiter:
+    """
+    根据配置创建限流器
+
+    Args:
+        state_path: 共享状态SQLite文件路径，为空时使用进程内限流器
+        **kwargs: 限流参数
+
+    Returns:
+        RateLimiter: 限流器实例
+    """
+    if state_path:
+        return SharedRateLimiter(state_path, **kwargs)
+    return RateLimiter(**kwargs)
+
+
+def create_quota(limiter: RateLimiter, sync_interval: float = 1.0) -> Union[RateLimiter, BatchedQuota]:
+    """
+    根据配置创建API密钥配额使用的限流器
+
+    Args:
+        limiter: 发送使用的限流器
+        sync_interval: 共享配额的同步间隔（秒），0为每次检查都执行SQLite事务
+
+    Returns:
+        共享限流器且同步间隔大于0时返回 BatchedQuota，否则直接使用 limiter
+    """
+    if isinstance(limiter, SharedRateLimiter) and sync_interval > 0:
+        return BatchedQuota(limiter, sync_interval)
+    return limiter
@@ -0,0 +1,241 @@
+"""
+回复串联模块
+
+记录每个群组中每个交易员最近一条提醒的消息ID，同一交易员的下一条提醒以回复形式发送，
+用户可以顺着回复链查看该交易员的全部动作。
+
+    - ReplyThreads: 进程内容量固定的LRU（OrderedDict，查找和更新均为O(1)），超出容量时淘汰最久未出现的交易员；
+      定期在后台线程写入快照文件，重启后从快照恢复。只适合单worker
+    - SharedReplyThreads: 保存在共享SQLite文件（RATE_STATE_PATH）中，gunicorn多个worker共用一份映射，
+      同一交易员的两条提醒由不同worker发送时也能串联
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+
+class ReplyThreads:
+    """
+    (群组, 交易员) → 最近一条提醒消息ID 的LRU映射
+    """
+
+    def __init__(
+        self,
+        capacity: int = 200000,
+        snapshot_path: Optional[str] = None,
+        snapshot_interval: float = 60.0,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        初始化回复映射
+
+        Args:
+            capacity: 最多保存的 (群组, 交易员) 条数
+            snapshot_path: 快照文件路径，为空时不持久化
+            snapshot_interval: 两次快照的最小间隔（秒）
+            clock: 时钟函数
+        """
+        self.capacity = capacity
+        self.snapshot_path = snapshot_path
+        self.snapshot_interval = snapshot_interval
+        self.clock = clock
+        self._entries: 'OrderedDict[str, int]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._dirty = False
+        self._last_snapshot = clock()
+        if snapshot_path:
+            self.load()
+
+    @staticmethod
+    def _key(chat_id: Union[int, str], trader_address: str) -> str:
+        # 单个字符串键比元组占用更少内存
+        return f"{chat_id}|{trader_address.lower()}"
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, chat_id: Union[int, str], trader_address: str) -> Optional[int]:
+        """
+        查询交易员在群组中最近一条提醒的消息ID
+
+        Returns:
+            int: 消息ID，没有记录返回None
+        """
+        key = self._key(chat_id, trader_address)
+        with self._lock:
+            message_id = self._entries.get(key)
+            if message_id is not None:
+                self._entries.move_to_end(key)
+            return message_id
+
+    def put(self, chat_id: Union[int, str], trader_address: str, message_id: int):
+        """记录交易员在群组中最新一条提醒的消息ID"""
+        key = self._key(chat_id, trader_address)
+        with self._lock:
+            self._entries[key] = message_id
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+            self._dirty = True
+            due = self.snapshot_path and self.clock() - self._last_snapshot >= self.snapshot_interval
+            if due:
+                self._last_snapshot = self.clock()
+                items = list(self._entries.items())
+        if due:
+            threading.Thread(target=self._write, args=(items,), name='reply-threads-snapshot', daemon=True).start()
+
+    def load(self):
+        """从快照文件恢复映射（按LRU顺序保存，恢复后顺序不变）"""
+        if not os.path.exists(self.snapshot_path):
+            return
+        try:
+            with open(self.snapshot_path, encoding='utf-8') as f:
+                items = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning("⚠️ Failed to load reply thread snapshot: %s", e)
+            return
+        with self._lock:
+            self._entries = OrderedDict(items[-self.capacity:])
+        logger.info("🧵 Restored %d reply threads", len(self._entries))
+
+    def snapshot(self):
+        """立即写入快照文件（关闭时调用）"""
+        if not self.snapshot_path or not self._dirty:
+            return
+        with self._lock:
+            items = list(self._entries.items())
+        self._write(items)
+
+    def _write(self, items: List[Tuple[str, int]]):
+        """原子写入快照：先写临时文件再重命名"""
+        with self._write_lock:
+            directory = os.path.dirname(self.snapshot_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = f"{self.snapshot_path}.tmp-{os.getpid()}"
+            try:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(items, f, separators=(',', ':'))
+                os.replace(tmp_path, self.snapshot_path)
+                self._dirty = False
+            except OSError as e:
+                logger.error("❌ Failed to write reply thread snapshot: %s", e)
+
+
+class SharedReplyThreads:
+    """
+    多worker共享的 (群组, 交易员) → 最近一条提醒消息ID 映射
+
+    接口与 ReplyThreads 相同。按最近一次记录的时间保留 capacity 条，超出的部分定期清理；
+    数据本身保存在文件中，不需要快照。
+    """
+
+    def __init__(
+        self,
+        path: str,
+        capacity: int = 200000,
+        prune_interval: float = 60.0,
+        clock: Callable[[], float] = time.time
+    ):
+        """
+        初始化共享回复映射
+
+        Args:
+            path: SQLite文件路径（与共享限流状态同一个文件）
+            capacity: 最多保存的 (群组, 交易员) 条数
+            prune_interval: 两次清理的最小间隔（秒）
+            clock: 时钟函数（各worker之间比较，须为墙上时间）
+        """
+        self.path = path
+        self.capacity = capacity
+        self.prune_interval = prune_interval
+        self.clock = clock
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        self._next_prune = 0.0
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS reply_threads (key TEXT PRIMARY KEY, message_id INTEGER NOT NULL, "
+            "updated REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_reply_threads_updated ON reply_threads (updated)")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA synchronous=OFF")
+            self._local.conn = conn
+        return conn
+
+    def __len__(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM reply_threads").fetchone()[0]
+
+    def get(self, chat_id: Union[int, str], trader_address: str) -> Optional[int]:
+        """
+        查询交易员在群组中最近一条提醒的消息ID（任何worker记录的）
+
+        Returns:
+            int: 消息ID，没有记录返回None
+        """
+        row = self._connection().execute(
+            "SELECT message_id FROM reply_threads WHERE key = ?", (ReplyThreads._key(chat_id, trader_address),)
+        ).fetchone()
+        return row[0] if row else None
+
+    def put(self, chat_id: Union[int, str], trader_address: str, message_id: int):
+        """记录交易员在群组中最新一条提醒的消息ID"""
+        now = self.clock()
+        conn = self._connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO reply_threads (key, message_id, updated) VALUES (?, ?, ?)",
+            (ReplyThreads._key(chat_id, trader_address), message_id, now)
+        )
+        if now >= self._next_prune:
+            self._next_prune = now + self.prune_interval
+            conn.execute(
+                "DELETE FROM reply_threads WHERE key IN "
+                "(SELECT key FROM reply_threads ORDER BY updated DESC LIMIT -1 OFFSET ?)",
+                (self.capacity,)
+            )
+
+    def snapshot(self):
+        """数据已保存在文件中，不需要快照"""
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def create_reply_threads(
+    capacity: int,
+    snapshot_path: Optional[str] = None,
+    state_path: Optional[str] = None
+) -> Union[ReplyThreads, SharedReplyThreads]:
+    """
+    根据配置创建回复映射
+
+    Args:
+        capacity: 最多保存的 (群组, 交易员) 条数
+        snapshot_path: 进程内映射的快照文件
+        state_path: 共享状态SQLite文件路径，不为空时使用共享映射（多worker）
+
+    Returns:
+        回复映射实例
+    """
+    if state_path:
+        return SharedReplyThreads(state_path, capacity)
+    return ReplyThreads(capacity, snapshot_path=snapshot_path)
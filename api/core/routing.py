@@ -0,0 +1,207 @@
+"""
+消息路由模块
+
+描述一条巨鲸事件要发往哪些群组，以及每个群组使用的语言、解析模式和模板。
+路由表可以从JSON文件加载，未配置时使用 CHAT_ID_ZH / CHAT_ID_EN 两个群组：
+
+    {
+        "destinations": [
+            {"chat_id": -1001, "language": "zh"},
+            {"chat_id": -1002, "language": "en", "parse_mode": "Markdown", "variant": "default"},
+            {"chat_id": "@whale_liq", "language": "en", "message_types": [2]},
+            {"chat_id": -1003, "language": "zh", "topics": {"trade": 11, "liquidation": 12, "recap": 13}}
+        ]
+    }
+
+开启话题（Forum）的超级群组可以用 message_thread_id 指定默认话题，用 topics 把不同类型的消息
+发往不同话题；未配置的类型发往默认话题（为空时即 General）。限流仍按群组计算，不按话题。
+
+发送时按 (语言, 解析模式, 模板) 对目标分组，每组只渲染一次，同一个字符串发往组内所有群组。
+"""
+import json
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+# 分组键: (语言, 解析模式, 模板)
+RenderKey = Tuple[str, Optional[str], str]
+
+# 可以单独指定话题的消息种类
+TOPICS = ('trade', 'liquidation', 'recap', 'digest')
+
+# 巨鲸消息类型对应的话题: 1=交易, 2=清算
+MESSAGE_TOPICS = {1: 'trade', 2: 'liquidation'}
+
+
+class Destination:
+    """一个发送目标"""
+
+    __slots__ = ('chat_id', 'language', 'parse_mode', 'variant', 'message_types', 'message_thread_id', 'topics')
+
+    def __init__(
+        self,
+        chat_id: Union[int, str],
+        language: str = 'zh',
+        parse_mode: Optional[str] = 'Markdown',
+        variant: str = 'default',
+        message_types: Optional[Iterable[int]] = None,
+        message_thread_id: Optional[int] = None,
+        topics: Optional[Dict[str, int]] = None
+    ):
+        """
+        Args:
+            chat_id: 群组ID或频道用户名
+            language: 消息语言
+            parse_mode: 解析模式
+            variant: 模板名称
+            message_types: 接收的消息类型，为空表示全部
+            message_thread_id: 默认话题ID，为空时发往 General
+            topics: 各类消息的话题ID，如 {"trade": 11, "liquidation": 12}
+
+        Raises:
+            ValueError: 话题名称未知或话题ID不是整数时抛出
+        """
+        self.chat_id = to_chat_id(chat_id)
+        self.language = language
+        self.parse_mode = parse_mode
+        self.variant = variant
+        self.message_types = frozenset(message_types) if message_types else None
+        self.message_thread_id = int(message_thread_id) if message_thread_id is not None else None
+        self.topics = {}
+        for name, thread_id in (topics or {}).items():
+            if name not in TOPICS:
+                raise ValueError(f"Unknown topic {name!r}, expected one of {', '.join(TOPICS)}")
+            self.topics[name] = int(thread_id)
+
+    @property
+    def render_key(self) -> RenderKey:
+        return (self.language, self.parse_mode, self.variant)
+
+    def thread_for(self, topic: str) -> Optional[int]:
+        """该类消息发往的话题ID，未单独配置时使用默认话题"""
+        return self.topics.get(topic, self.message_thread_id)
+
+    def to_dict(self) -> dict:
+        """保存定时发送时使用（不含消息类型）"""
+        return {
+            'chat_id': self.chat_id,
+            'language': self.language,
+            'parse_mode': self.parse_mode,
+            'variant': self.variant,
+            'message_thread_id': self.message_thread_id,
+            'topics': dict(self.topics),
+        }
+
+    def accepts(self, message_type: int) -> bool:
+        """是否接收该类型的消息"""
+        return self.message_types is None or message_type in self.message_types
+
+    def __repr__(self) -> str:
+        return f"Destination({self.chat_id!r}, {self.language!r}, {self.parse_mode!r}, {self.variant!r})"
+
+
+class RoutingTable:
+    """
+    路由表
+    """
+
+    def __init__(self, destinations: List[Destination]):
+        self.destinations = destinations
+
+    @classmethod
+    def from_file(cls, path: str) -> 'RoutingTable':
+        """
+        从JSON文件加载路由表
+
+        Raises:
+            ValueError: 文件格式不正确时抛出
+        """
+        with open(path, encoding='utf-8') as f:
+            config = json.load(f)
+        try:
+            return cls([Destination(**entry) for entry in config['destinations']])
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"Invalid routing config {path}: {e}")
+
+    @classmethod
+    def from_settings(cls, settings) -> 'RoutingTable':
+        """
+        使用中英文两个群组的默认路由
+
+        Raises:
+            ValueError: CHAT_TOPICS_ZH / CHAT_TOPICS_EN 格式不正确时抛出
+        """
+        destinations = []
+        if settings.CHAT_ID_ZH:
+            destinations.append(Destination(settings.CHAT_ID_ZH, 'zh', topics=parse_topics(settings.CHAT_TOPICS_ZH)))
+        if settings.CHAT_ID_EN:
+            destinations.append(Destination(settings.CHAT_ID_EN, 'en', topics=parse_topics(settings.CHAT_TOPICS_EN)))
+        return cls(destinations)
+
+    def destinations_for(self, message_type: int) -> List[Destination]:
+        """返回接收该类型消息的所有目标"""
+        return [d for d in self.destinations if d.accepts(message_type)]
+
+
+def group_destinations(destinations: Iterable[Destination]) -> Dict[RenderKey, List[Destination]]:
+    """
+    按 (语言, 解析模式, 模板) 对目标分组，保持原有顺序
+
+    Returns:
+        dict: {分组键: [目标列表]}
+    """
+    groups: Dict[RenderKey, List[Destination]] = {}
+    for destination in destinations:
+        groups.setdefault(destination.render_key, []).append(destination)
+    return groups
+
+
+def to_chat_id(chat_id: Union[int, str]) -> Union[int, str]:
+    """把配置或请求中的群组ID转换为整数（@频道名保持不变）"""
+    try:
+        if isinstance(chat_id, str) and not chat_id.startswith('@'):
+            return int(chat_id)
+    except ValueError:
+        pass
+    return chat_id
+
+
+def to_thread_id(value) -> Optional[int]:
+    """
+    把请求中的 message_thread_id 转换为整数（为空时返回None）
+
+    Raises:
+        ValueError: 不是正整数时抛出
+    """
+    if value is None or value == '':
+        return None
+    if isinstance(value, bool) or not str(value).isdigit() or int(value) <= 0:
+        raise ValueError('message_thread_id must be a positive integer')
+    return int(value)
+
+
+def parse_topics(value: str) -> Dict[str, int]:
+    """
+    解析 "trade=11,liquidation=12,recap=13" 格式的话题配置
+
+    Raises:
+        ValueError: 格式不正确时抛出
+    """
+    topics = {}
+    for entry in filter(None, (part.strip() for part in (value or '').split(','))):
+        name, sep, thread_id = entry.partition('=')
+        if not sep or not thread_id.strip().isdigit():
+            raise ValueError(f"Invalid topic {entry!r}, expected name=thread_id")
+        topics[name.strip()] = int(thread_id)
+    return topics
+
+
+def load_routing(path: Optional[str], settings) -> RoutingTable:
+    """
+    加载路由表：配置了文件则从文件加载，否则使用默认的中英文群组
+
+    Args:
+        path: 路由配置文件路径
+        settings: 应用配置
+    """
+    if path:
+        return RoutingTable.from_file(path)
+    return RoutingTable.from_settings(settings)
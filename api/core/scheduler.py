@@ -0,0 +1,455 @@
+"""
+定时发送模块
+
+请求带 send_at / delay_seconds 时不立即发送，到时间后由发送事件循环发出。
+
+    - TimerWheel: 哈希时间轮，每秒一格，插入 O(1)；每次只检查到期的那一格，
+      超过一圈的条目在经过时留在原格。整个调度只有一个按秒运行的协程，不为每条消息创建任务
+    - 日志文件（JSONL，每行一条 add / cancel / done 记录）保存待发送的消息，重启后重新加载：
+      各个worker都向同一个文件追加，并按偏移读取其他worker追加的记录，内存中保持相同的状态，
+      因此任何worker都能查询和取消；只有持有锁文件的worker发送到期的消息并压缩日志
+      （锁的持有者退出后由其他worker接替）
+"""
+import asyncio
+import datetime
+import fcntl
+import heapq
+import json
+import logging
+import math
+import os
+import threading
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from api.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# 最远可预约的时间（秒）
+MAX_DELAY = 30 * 86400
+
+
+def parse_schedule(data: dict, now: Optional[float] = None) -> Tuple[Optional[float], Optional[str]]:
+    """
+    解析请求中的 send_at（Unix秒或ISO 8601时间，未带时区按UTC）/ delay_seconds
+
+    Returns:
+        tuple: (发送时间, 错误信息)；未要求定时或时间已到时发送时间为None
+    """
+    send_at, delay = data.get('send_at'), data.get('delay_seconds')
+    if send_at is None and delay is None:
+        return None, None
+    if send_at is not None and delay is not None:
+        return None, 'Use either send_at or delay_seconds, not both'
+    now = time.time() if now is None else now
+
+    if delay is not None:
+        if isinstance(delay, bool) or not isinstance(delay, (int, float)) or not _finite(delay) or delay < 0:
+            return None, 'delay_seconds must be a non-negative number'
+        due = now + delay
+    elif isinstance(send_at, (int, float)) and not isinstance(send_at, bool):
+        if not _finite(send_at):
+            return None, 'send_at must be Unix seconds or an ISO 8601 time'
+        due = float(send_at)
+    elif isinstance(send_at, str):
+        try:
+            moment = datetime.datetime.fromisoformat(send_at.replace('Z', '+00:00'))
+        except ValueError:
+            return None, 'send_at must be Unix seconds or an ISO 8601 time'
+        if moment.tzinfo is None:
+            moment = moment.replace(tzinfo=datetime.timezone.utc)
+        due = moment.timestamp()
+    else:
+        return None, 'send_at must be Unix seconds or an ISO 8601 time'
+
+    if due - now > MAX_DELAY:
+        return None, f'Cannot schedule more than {MAX_DELAY // 86400} days ahead'
+    if due <= now:
+        return None, None
+    return due, None
+
+
+def _finite(value) -> bool:
+    """是否为有限的数（NaN、inf 和超出float范围的整数都不是）"""
+    try:
+        return math.isfinite(value)
+    except OverflowError:
+        return False
+
+
+class ScheduledSend:
+    """一条定时发送"""
+
+    __slots__ = ('id', 'due', 'kind', 'payload', 'created_at', 'key', 'cancelled')
+
+    def __init__(self, id: str, due: float, kind: str, payload: dict, created_at: float, key: Optional[str] = None):
+        """
+        Args:
+            id: 定时发送ID
+            due: 发送时间（Unix秒）
+            kind: 发送类型（'message' / 'whale'），决定由哪个函数发送
+            payload: 发送所需的数据
+            created_at: 创建时间
+            key: 创建它的API密钥名称
+        """
+        self.id = id
+        self.due = due
+        self.kind = kind
+        self.payload = payload
+        self.created_at = created_at
+        self.key = key
+        self.cancelled = False
+
+    def to_record(self) -> dict:
+        """日志中的 add 记录"""
+        return {
+            'op': 'add', 'id': self.id, 'due': self.due, 'kind': self.kind,
+            'payload': self.payload, 'created_at': self.created_at, 'key': self.key
+        }
+
+    def to_dict(self) -> dict:
+        return {
+            'id': self.id,
+            'send_at': self.due,
+            'kind': self.kind,
+            'payload': self.payload,
+            'created_at': self.created_at,
+            'key': self.key,
+        }
+
+
+class TimerWheel:
+    """
+    哈希时间轮
+    """
+
+    def __init__(self, slots: int = 4096, resolution: float = 1.0, now: float = 0.0):
+        """
+        Args:
+            slots: 格数
+            resolution: 每格的时长（秒）
+            now: 当前时间
+        """
+        self.resolution = resolution
+        self._slots: List[list] = [[] for _ in range(slots)]
+        self._cursor = int(now // resolution)
+
+    def add(self, item: ScheduledSend):
+        """加入条目（已到期的放在下一格）"""
+        tick = max(int(item.due // self.resolution), self._cursor + 1)
+        self._slots[tick % len(self._slots)].append(item)
+
+    def advance(self, now: float) -> List[ScheduledSend]:
+        """
+        前进到 now，返回到期的条目（已取消的条目直接丢弃）
+        """
+        target = int(now // self.resolution)
+        if target <= self._cursor:
+            return []
+        count = len(self._slots)
+        ticks = range(self._cursor + 1, target + 1) if target - self._cursor < count else range(count)
+        self._cursor = target
+        due = []
+        for tick in ticks:
+            index = tick % count
+            slot = self._slots[index]
+            if not slot:
+                continue
+            remaining = []
+            for item in slot:
+                if item.cancelled:
+                    continue
+                if item.due < (target + 1) * self.resolution:
+                    due.append(item)
+                else:
+                    remaining.append(item)
+            self._slots[index] = remaining
+        due.sort(key=lambda item: item.due)
+        return due
+
+
+class Overbooked(Exception):
+    """待发送的定时消息已达上限"""
+
+    def __init__(self, limit: int, retry_after: int):
+        super().__init__(f"Too many scheduled sends (limit {limit}), retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class SendScheduler:
+    """
+    定时发送调度
+
+    schedule() / cancel() / list() 可在请求线程中调用；run() 在发送事件循环中运行，
+    日志的加锁、读写和压缩都在线程池中执行，不阻塞事件循环中的其他发送。
+    """
+
+    def __init__(
+        self,
+        handlers: Dict[str, Callable[[ScheduledSend], Awaitable]],
+        journal_path: Optional[str] = None,
+        max_pending: int = 100000,
+        clock: Callable[[], float] = time.time
+    ):
+        """
+        初始化调度
+
+        Args:
+            handlers: 发送类型 -> 发送协程函数
+            journal_path: 日志文件，为空时只保存在内存中（单进程）
+            max_pending: 待发送的上限
+            clock: 时钟函数
+        """
+        self.handlers = handlers
+        self.journal_path = journal_path
+        self.max_pending = max_pending
+        self.clock = clock
+        self.pending: Dict[str, ScheduledSend] = {}
+        self._lock = threading.Lock()
+        self._wheel = self._new_wheel()
+        self._offset = 0
+        self._inode = None
+        self._dead = 0
+        self._lock_file = None
+        if journal_path:
+            os.makedirs(os.path.dirname(os.path.abspath(journal_path)), exist_ok=True)
+            with self._lock:
+                self._sync()
+            if self.pending:
+                logger.info("⏰ Loaded %d scheduled sends from %s", len(self.pending), journal_path)
+
+    def __len__(self) -> int:
+        return len(self.pending)
+
+    def _new_wheel(self) -> TimerWheel:
+        """新的时间轮，加入时已到期的条目在下一次前进时取出"""
+        return TimerWheel(now=self.clock() - 1.0)
+
+    # ---- 日志 ----
+
+    def _append(self, records: List[dict]):
+        """追加记录（持有日志文件的排他锁；文件被压缩替换时重新打开）"""
+        data = ''.join(json.dumps(record, ensure_ascii=False) + '\n' for record in records)
+        while True:
+            with open(self.journal_path, 'a', encoding='utf-8') as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                if os.fstat(f.fileno()).st_ino != os.stat(self.journal_path).st_ino:
+                    continue
+                f.write(data)
+                return
+
+    def _sync(self):
+        """读取日志中尚未应用的记录（调用方持有 self._lock）"""
+        try:
+            stat = os.stat(self.journal_path)
+        except FileNotFoundError:
+            return
+        if stat.st_ino != self._inode:
+            # 首次加载或日志已被其他worker压缩，重新加载
+            self.pending = {}
+            self._wheel = self._new_wheel()
+            self._offset = 0
+            self._dead = 0
+            self._inode = stat.st_ino
+        if stat.st_size <= self._offset:
+            return
+        with open(self.journal_path, 'rb') as f:
+            f.seek(self._offset)
+            data = f.read()
+        # 只处理完整的行
+        end = data.rfind(b'\n') + 1
+        self._offset += end
+        for line in data[:end].splitlines():
+            if not line.strip():
+                continue
+            try:
+                self._apply(json.loads(line))
+            except (ValueError, KeyError, TypeError, OverflowError) as e:
+                # 损坏的记录（如写入中途崩溃或手工编辑）跳过，不影响其他记录
+                logger.warning("⚠️ Skipping malformed scheduled send record in %s: %s", self.journal_path, e)
+
+    def _apply(self, record: dict):
+        if record['op'] == 'add':
+            if record['id'] in self.pending:
+                return
+            item = ScheduledSend(
+                record['id'], record['due'], record['kind'], record['payload'], record['created_at'], record.get('key')
+            )
+            # 先放入时间轮（发送时间不合法时抛出），成功后才计入待发送
+            self._wheel.add(item)
+            self.pending[item.id] = item
+        else:
+            item = self.pending.pop(record['id'], None)
+            if item is not None:
+                item.cancelled = True
+            self._dead += 2
+
+    def _record(self, record: dict):
+        """写入并应用一条记录（调用方持有 self._lock）"""
+        if self.journal_path:
+            self._append([record])
+            self._sync()
+        else:
+            self._apply(record)
+
+    def _compact(self):
+        """用待发送的条目重写日志（调用方持有 self._lock，且本进程是发送方）"""
+        tmp = f"{self.journal_path}.{os.getpid()}.tmp"
+        with open(self.journal_path, 'a', encoding='utf-8') as journal:
+            fcntl.flock(journal, fcntl.LOCK_EX)
+            self._sync()
+            with open(tmp, 'w', encoding='utf-8') as f:
+                for item in self.pending.values():
+                    f.write(json.dumps(item.to_record(), ensure_ascii=False) + '\n')
+            os.replace(tmp, self.journal_path)
+            stat = os.stat(self.journal_path)
+            self._inode, self._offset, self._dead = stat.st_ino, stat.st_size, 0
+
+    # ---- 接口 ----
+
+    def schedule(self, kind: str, payload: dict, due: float, key: Optional[str] = None) -> ScheduledSend:
+        """
+        预约发送
+
+        Raises:
+            Overbooked: 待发送的数量已达上限
+        """
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown scheduled send kind: {kind}")
+        record = ScheduledSend(os.urandom(8).hex(), due, kind, payload, self.clock(), key).to_record()
+        with self._lock:
+            if self.journal_path:
+                self._sync()
+            if len(self.pending) >= self.max_pending:
+                metrics.inc('scheduled_sends_total', kind=kind, outcome='rejected')
+                # 下一条到期发送后才有空位
+                next_due = min((item.due for item in self.pending.values()), default=self.clock())
+                raise Overbooked(self.max_pending, max(1, math.ceil(next_due - self.clock())))
+            self._record(record)
+            item = self.pending[record['id']]
+        metrics.inc('scheduled_sends_total', kind=kind, outcome='scheduled')
+        return item
+
+    def get(self, id: str) -> Optional[ScheduledSend]:
+        with self._lock:
+            if self.journal_path:
+                self._sync()
+            return self.pending.get(id)
+
+    def cancel(self, id: str) -> bool:
+        """
+        取消定时发送
+
+        Returns:
+            bool: 是否取消成功（不存在或已发送时返回False）
+        """
+        with self._lock:
+            if self.journal_path:
+                self._sync()
+            if id not in self.pending:
+                return False
+            self._record({'op': 'cancel', 'id': id})
+        metrics.inc('scheduled_sends_total', kind='all', outcome='cancelled')
+        return True
+
+    def list(self, limit: int = 100, key: Optional[str] = None) -> List[ScheduledSend]:
+        """按发送时间排序的待发送条目（key 不为空时只返回该密钥创建的）"""
+        with self._lock:
+            if self.journal_path:
+                self._sync()
+            items = [item for item in self.pending.values() if key is None or item.key == key]
+        return heapq.nsmallest(limit, items, key=lambda item: item.due)
+
+    # ---- 发送 ----
+
+    def is_leader(self) -> bool:
+        """是否由本进程发送（持有锁文件；锁的持有者退出后由其他进程接替）"""
+        if not self.journal_path or self._lock_file is not None:
+            return True
+        lock_file = open(f"{self.journal_path}.lock", 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        # 成为发送方前时间轮只用于清理，按待发送的条目重建
+        with self._lock:
+            self._wheel = self._new_wheel()
+            for item in self.pending.values():
+                self._wheel.add(item)
+        return True
+
+    def take_due(self) -> List[ScheduledSend]:
+        """取出到期的条目并记为已发送（只在发送方调用）"""
+        with self._lock:
+            if self.journal_path:
+                self._sync()
+            due = self._wheel.advance(self.clock())
+            if not due:
+                return due
+            for item in due:
+                self.pending.pop(item.id, None)
+            if self.journal_path:
+                self._append([{'op': 'done', 'id': item.id} for item in due])
+                self._sync()
+                if self._dead > max(1000, len(self.pending)):
+                    self._compact()
+        return due
+
+    async def run(self, stopping: Callable[[], bool]):
+        """
+        每秒发送到期的消息，stopping() 为True时退出（在发送事件循环中运行）
+
+        Args:
+            stopping: 返回是否正在关闭的函数
+        """
+        loop = asyncio.get_running_loop()
+        sending = set()
+        while not stopping():
+            await asyncio.sleep(self._wheel.resolution)
+            try:
+                due = await loop.run_in_executor(None, self._poll)
+            except Exception as e:
+                logger.error("❌ Failed to read scheduled sends: %s", e)
+                continue
+            if due:
+                logger.info("⏰ Sending %d scheduled messages", len(due))
+                task = asyncio.ensure_future(asyncio.gather(*(self._send(item) for item in due)))
+                sending.add(task)
+                task.add_done_callback(sending.discard)
+
+    def _poll(self) -> List[ScheduledSend]:
+        """读取日志并取出到期的条目（在线程池中执行：文件锁、追加和压缩都可能阻塞）"""
+        if not self.is_leader():
+            # 其他worker发送；这里只读取日志并丢弃时间轮中已过期的引用
+            with self._lock:
+                self._sync()
+                self._wheel.advance(self.clock())
+            return []
+        return self.take_due()
+
+    async def _send(self, item: ScheduledSend):
+        try:
+            await self.handlers[item.kind](item)
+            metrics.inc('scheduled_sends_total', kind=item.kind, outcome='sent')
+        except Exception as e:
+            metrics.inc('scheduled_sends_total', kind=item.kind, outcome='failed')
+            logger.error("❌ Scheduled send %s failed: %s", item.id, e)
+
+    def snapshot(self) -> dict:
+        """当前状态"""
+        with self._lock:
+            next_due = min((item.due for item in self.pending.values()), default=None)
+            return {'pending': len(self.pending), 'next_send_at': next_due}
+
+
+# 全局定时发送调度（未创建时不支持定时发送）
+send_scheduler: Optional[SendScheduler] = None
+
+
+def set_send_scheduler(scheduler: Optional[SendScheduler]):
+    """设置定时发送调度"""
+    global send_scheduler
+    send_scheduler = scheduler
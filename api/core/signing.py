@@ -0,0 +1,249 @@
+"""
+请求签名校验模块
+
+生产者与服务不在同一网段时，用共享密钥对巨鲸提醒请求做 HMAC-SHA256 签名（不需要TLS客户端证书）：
+
+    X-Signature-Timestamp: 1760000000          Unix秒
+    X-Signature-Nonce: 3f9c2a71d4e8b605        每个请求不同的随机串（8~128个字母、数字、-、_）
+    X-Signature: sha256=<hex>                  HMAC-SHA256(密钥, "时间戳.随机串.方法.路径\n" + 原始请求体)
+
+签名覆盖请求方法和路径（不含查询串），签给一个接口的请求不能转发到另一个接口。
+校验直接使用原始请求体的字节，不重新序列化JSON；签名比较为常数时间。
+时间戳与服务器时间相差超过 tolerance 的请求被拒绝；在此范围内用随机串防重放：
+    - 配置了 RATE_STATE_PATH 时随机串保存在共享限流器的SQLite文件中（SharedNonceStore），
+      发给任何一个worker的请求都不能再重放给其他worker
+    - 否则保存在进程内（NonceCache）：随机串按（已签名的）时间戳分桶保存，重放的请求时间戳相同，只需检查一个桶；
+      过期的桶整桶丢弃，总条数达到上限时提前丢弃最早的桶，并同时拒绝该桶及更早的时间戳，内存始终有上限
+"""
+import hashlib
+import hmac
+import math
+import threading
+import time
+from typing import Callable, Dict, Iterable, Optional, Union
+
+from api.core.auth import AccessDenied
+from api.core.rate_limiter import RateLimiter, SharedRateLimiter
+from api.utils.metrics import metrics
+
+SIGNATURE_PREFIX = 'sha256='
+
+
+def sign(
+    secret: Union[str, bytes],
+    body: bytes,
+    timestamp: Union[int, str],
+    nonce: str,
+    method: str,
+    path: str
+) -> str:
+    """
+    计算请求签名（生产者使用）
+
+    Args:
+        secret: 共享密钥
+        body: 原始请求体
+        timestamp: Unix秒
+        nonce: 随机串
+        method: 请求方法（如 POST）
+        path: 请求路径，不含查询串（如 /api/v1/whale/send）
+
+    Returns:
+        str: X-Signature 请求头的值
+    """
+    if isinstance(secret, str):
+        secret = secret.encode('utf-8')
+    mac = hmac.new(secret, f"{timestamp}.{nonce}.{method.upper()}.{path}\n".encode('utf-8'), hashlib.sha256)
+    mac.update(body)
+    return SIGNATURE_PREFIX + mac.hexdigest()
+
+
+class NonceCache:
+    """
+    按时间分桶的随机串缓存
+    """
+
+    def __init__(self, tolerance: float, max_entries: int = 100000, buckets: int = 60):
+        """
+        Args:
+            tolerance: 时间戳允许的偏差（秒）
+            max_entries: 保存的随机串上限
+            buckets: tolerance 内划分的桶数
+        """
+        self.width = max(tolerance / buckets, 1.0)
+        self.tolerance = tolerance
+        self.max_entries = max_entries
+        self._buckets: Dict[int, set] = {}
+        self._size = 0
+        # 小于该编号的桶已被丢弃，对应的时间戳一律拒绝
+        self._floor = -math.inf
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, nonce: str, timestamp: float, now: float) -> bool:
+        """
+        记录随机串
+
+        Returns:
+            bool: 首次出现返回True；重复（重放）、所在的桶已被丢弃或缓存已满返回False
+        """
+        index = int(timestamp // self.width)
+        with self._lock:
+            self._expire(int((now - self.tolerance) // self.width))
+            if index < self._floor:
+                return False
+            bucket = self._buckets.get(index)
+            if bucket is not None and nonce in bucket:
+                return False
+            while self._size >= self.max_entries:
+                oldest = min(self._buckets)
+                if oldest >= index:
+                    # 比本请求更早的桶都已丢弃仍然放不下，拒绝
+                    return False
+                self._size -= len(self._buckets.pop(oldest))
+                self._floor = oldest + 1
+            if bucket is None:
+                bucket = self._buckets[index] = set()
+            bucket.add(nonce)
+            self._size += 1
+            return True
+
+    def _expire(self, floor: int):
+        """丢弃编号小于 floor 的桶"""
+        if floor <= self._floor:
+            return
+        self._floor = floor
+        for index in [index for index in self._buckets if index < floor]:
+            self._size -= len(self._buckets.pop(index))
+
+
+class SharedNonceStore:
+    """
+    保存在共享限流器SQLite文件中的随机串（多个worker共同防重放）
+    """
+
+    def __init__(self, limiter: SharedRateLimiter, tolerance: float):
+        """
+        Args:
+            limiter: 共享限流器
+            tolerance: 时间戳允许的偏差（秒）
+        """
+        self.limiter = limiter
+        self.tolerance = tolerance
+
+    def __len__(self) -> int:
+        return self.limiter.nonce_count()
+
+    def add(self, nonce: str, timestamp: float, now: float) -> bool:
+        """
+        记录随机串（保存到时间戳超出允许范围为止）
+
+        Returns:
+            bool: 首次出现返回True，重复（重放）返回False
+        """
+        return self.limiter.claim_nonce(nonce, timestamp + self.tolerance, now)
+
+
+class SignatureVerifier:
+    """
+    请求签名校验
+    """
+
+    def __init__(
+        self,
+        secrets: Iterable[str],
+        tolerance: float = 300,
+        max_nonces: int = 100000,
+        clock: Callable[[], float] = time.time,
+        limiter: Optional[RateLimiter] = None
+    ):
+        """
+        Args:
+            secrets: 共享密钥（可配置多个，轮换期间新旧密钥同时有效）
+            tolerance: 时间戳允许的偏差（秒）
+            max_nonces: 防重放保存的随机串上限（进程内保存时）
+            clock: 时钟函数
+            limiter: 限流器，为共享限流器时随机串保存在其SQLite文件中，多个worker共享
+        """
+        self.secrets = [secret.encode('utf-8') for secret in secrets if secret]
+        if not self.secrets:
+            raise ValueError("At least one signing secret is required")
+        self.tolerance = tolerance
+        self.clock = clock
+        if isinstance(limiter, SharedRateLimiter):
+            self.nonces = SharedNonceStore(limiter, tolerance)
+        else:
+            self.nonces = NonceCache(tolerance, max_nonces)
+
+    def verify(
+        self,
+        body: bytes,
+        timestamp: Optional[str],
+        nonce: Optional[str],
+        signature: Optional[str],
+        method: str,
+        path: str
+    ):
+        """
+        校验签名、时间戳和随机串
+
+        Raises:
+            AccessDenied: 校验失败（401）
+        """
+        if not timestamp or not nonce or not signature:
+            self._reject('missing', 'Missing request signature headers')
+        if not 8 <= len(nonce) <= 128 or not nonce.isascii() or not nonce.replace('-', '').replace('_', '').isalnum():
+            self._reject('malformed', 'Invalid signature nonce')
+        if not timestamp.isascii() or not timestamp.isdigit():
+            self._reject('malformed', 'Invalid signature timestamp')
+        signed_at = int(timestamp)
+        now = self.clock()
+        if abs(now - signed_at) > self.tolerance:
+            self._reject('expired', 'Request signature timestamp out of range')
+
+        supplied = signature.encode('utf-8')
+        # 逐个比较所有密钥，不提前返回
+        valid = False
+        for secret in self.secrets:
+            valid |= hmac.compare_digest(sign(secret, body, timestamp, nonce, method, path).encode('ascii'), supplied)
+        if not valid:
+            self._reject('invalid', 'Invalid request signature')
+
+        if not self.nonces.add(nonce, signed_at, now):
+            self._reject('replayed', 'Request signature already used')
+
+    @staticmethod
+    def _reject(reason: str, message: str):
+        metrics.inc('signature_rejected_total', reason=reason)
+        raise AccessDenied(message, status=401)
+
+
+# 全局签名校验（未配置 WEBHOOK_SECRETS 时为None，不校验）
+signature_verifier: Optional[SignatureVerifier] = None
+
+
+def set_signature_verifier(verifier: Optional[SignatureVerifier]):
+    """设置签名校验"""
+    global signature_verifier
+    signature_verifier = verifier
+
+
+def verify_request(body: bytes, headers, method: str, path: str):
+    """
+    校验请求签名（未开启时不做任何事）
+
+    Raises:
+        AccessDenied: 校验失败（401）
+    """
+    if signature_verifier is None:
+        return
+    signature_verifier.verify(
+        body,
+        headers.get('X-Signature-Timestamp'),
+        headers.get('X-Signature-Nonce'),
+        headers.get('X-Signature'),
+        method,
+        path
+    )
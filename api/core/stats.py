@@ -0,0 +1,269 @@
+"""
+滚动聚合统计模块
+
+每个巨鲸事件都计入交易员和代币的滚动窗口统计（1分钟/15分钟/1小时/24小时），
+用于在提醒中显示“15分钟内第3笔买入，合计 $8.4M”，以及 /api/v1/whale/stats 接口。
+
+每个窗口由若干时间片组成（环形数组），记录时只更新当前时间片，过期时间片在被覆盖时清零：
+    - 所有交易员（或代币）的时间片存放在一个 NumPy 数组 [行, 时间片, 字段] 中
+    - 一次记录是对4个窗口的一次向量化更新，与窗口长度和历史事件数无关
+    - 行数有上限，满时批量淘汰最久未活动的行，内存固定
+    - 按代币排行等跨行查询直接在整个数组上向量化计算
+"""
+import threading
+import time
+from typing import Callable, Dict, Hashable, List, Optional
+
+import numpy as np
+
+from api.core.events import SIDE_LONG
+
+# 窗口: (名称, 时长秒数, 时间片数)
+WINDOWS = (
+    ('1m', 60, 6),
+    ('15m', 900, 15),
+    ('1h', 3600, 12),
+    ('24h', 86400, 24),
+)
+
+# 每个时间片记录的字段
+FIELDS = ('buys', 'buy_volume', 'sells', 'sell_volume', 'liquidations', 'liquidation_volume')
+BUYS, BUY_VOLUME, SELLS, SELL_VOLUME, LIQUIDATIONS, LIQUIDATION_VOLUME = range(len(FIELDS))
+
+WINDOW_NAMES = tuple(name for name, _, _ in WINDOWS)
+_SPANS = np.array([seconds / slots for _, seconds, slots in WINDOWS])
+_SLOTS = np.array([slots for _, _, slots in WINDOWS], dtype=np.int64)
+_OFFSETS = np.concatenate(([0], np.cumsum(_SLOTS)[:-1]))
+_TOTAL_SLOTS = int(_SLOTS.sum())
+_FIELD_RANGE = np.arange(len(FIELDS))
+
+
+def event_increments(message_type: int, side: int, value: float) -> np.ndarray:
+    """把一个事件转换为各窗口当前时间片的字段增量 [窗口 × 字段]"""
+    if message_type == 2:
+        count, volume = LIQUIDATIONS, LIQUIDATION_VOLUME
+    elif side == SIDE_LONG:
+        count, volume = BUYS, BUY_VOLUME
+    else:
+        count, volume = SELLS, SELL_VOLUME
+    increments = np.zeros(len(WINDOWS) * len(FIELDS))
+    increments[count::len(FIELDS)] = 1
+    increments[volume::len(FIELDS)] = value
+    return increments
+
+
+def _cells(slots: np.ndarray) -> np.ndarray:
+    """时间片下标转换为行内 (时间片, 字段) 展平后的下标"""
+    return (slots[:, None] * len(FIELDS) + _FIELD_RANGE).ravel()
+
+
+class SlotPosition:
+    """某一时刻各窗口的当前时间片"""
+
+    __slots__ = ('epochs', 'slots', 'cells', 'tick')
+
+    def __init__(self, now: float):
+        self.epochs = (now // _SPANS).astype(np.int64)
+        self.slots = _OFFSETS + self.epochs % _SLOTS
+        self.cells = _cells(self.slots)
+        # 最细时间片的编号：各窗口时长都是它的整数倍，编号不变时所有窗口的当前时间片都不变
+        self.tick = int(self.epochs[0])
+
+
+class RollingStats:
+    """
+    一组实体（交易员或代币）的滚动窗口统计（非线程安全，由 AggregateStats 加锁）
+    """
+
+    def __init__(self, max_rows: int, initial_rows: int = 64):
+        """
+        Args:
+            max_rows: 最多跟踪的实体数，满时淘汰最久未活动的
+            initial_rows: 初始分配的行数，不够时按倍数扩容
+        """
+        self.max_rows = max_rows
+        self.evicted = 0
+        self._rows: Dict[Hashable, int] = {}
+        self._keys: List[Optional[Hashable]] = []
+        self._free: List[int] = []
+        # 每行最近一次记录时的 SlotPosition.tick
+        self._ticks: List[int] = []
+        self._allocate(min(initial_rows, max_rows))
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, key) -> bool:
+        return key in self._rows
+
+    def _allocate(self, capacity: int):
+        """分配（或扩容到）capacity 行"""
+        old = len(self._keys)
+        # 每行展平存放 [时间片, 字段]，一次记录只需一次花式索引加法
+        values = np.zeros((capacity, _TOTAL_SLOTS * len(FIELDS)))
+        epochs = np.full((capacity, _TOTAL_SLOTS), -1, dtype=np.int64)
+        last_seen = np.full(capacity, -np.inf)
+        if old:
+            values[:old], epochs[:old], last_seen[:old] = self._values, self._epochs, self._last_seen
+        self._values, self._epochs, self._last_seen = values, epochs, last_seen
+        self._keys.extend([None] * (capacity - old))
+        self._ticks.extend([-1] * (capacity - old))
+        self._free.extend(range(capacity - 1, old - 1, -1))
+
+    def _evict(self):
+        """淘汰最久未活动的一批行（每次约1/16，淘汰开销均摊到后续插入）"""
+        count = max(1, self.max_rows // 16)
+        for row in np.argpartition(self._last_seen, count - 1)[:count]:
+            row = int(row)
+            del self._rows[self._keys[row]]
+            self._keys[row] = None
+            self._ticks[row] = -1
+            self._values[row] = 0
+            self._epochs[row] = -1
+            self._last_seen[row] = -np.inf
+            self._free.append(row)
+        self.evicted += count
+
+    def _row_for(self, key: Hashable) -> int:
+        row = self._rows.get(key)
+        if row is not None:
+            return row
+        if not self._free:
+            if len(self._keys) < self.max_rows:
+                self._allocate(min(len(self._keys) * 2, self.max_rows))
+            else:
+                self._evict()
+        row = self._free.pop()
+        self._rows[key] = row
+        self._keys[row] = key
+        return row
+
+    def add(self, key: Hashable, increments: np.ndarray, position: SlotPosition, now: float):
+        """
+        把事件计入实体所有窗口的当前时间片
+
+        Args:
+            key: 实体
+            increments: event_increments() 的结果
+            position: 当前时间片
+            now: 当前时间
+        """
+        row = self._row_for(key)
+        values = self._values[row]
+        if self._ticks[row] != position.tick:
+            # 进入新的时间片：先清零其中过期的数据
+            row_epochs = self._epochs[row]
+            stale = row_epochs[position.slots] != position.epochs
+            if stale.any():
+                values[_cells(position.slots[stale])] = 0
+                row_epochs[position.slots] = position.epochs
+            self._ticks[row] = position.tick
+        values[position.cells] += increments
+        self._last_seen[row] = now
+
+    def window(self, key: Hashable, name: str, now: float) -> Optional[np.ndarray]:
+        """实体在指定窗口内的各字段合计，未知实体返回None"""
+        row = self._rows.get(key)
+        if row is None:
+            return None
+        w = WINDOW_NAMES.index(name)
+        start, end = _OFFSETS[w], _OFFSETS[w] + _SLOTS[w]
+        valid = int(now // _SPANS[w]) - self._epochs[row, start:end] < _SLOTS[w]
+        return self._values[row].reshape(_TOTAL_SLOTS, len(FIELDS))[start:end][valid].sum(axis=0)
+
+    def key_of(self, row: int) -> Optional[Hashable]:
+        return self._keys[row]
+
+    def totals(self, name: str, now: float) -> np.ndarray:
+        """所有行在指定窗口内的各字段合计 [行, 字段]（空闲行为0）"""
+        w = WINDOW_NAMES.index(name)
+        start, end = _OFFSETS[w], _OFFSETS[w] + _SLOTS[w]
+        valid = int(now // _SPANS[w]) - self._epochs[:, start:end] < _SLOTS[w]
+        values = self._values.reshape(len(self._keys), _TOTAL_SLOTS, len(FIELDS))
+        return np.einsum('rsf,rs->rf', values[:, start:end], valid)
+
+
+def describe(totals: np.ndarray) -> dict:
+    """把字段合计转换为接口返回的字典"""
+    result = {field: float(value) for field, value in zip(FIELDS, totals)}
+    for field in ('buys', 'sells', 'liquidations'):
+        result[field] = int(result[field])
+    result['events'] = result['buys'] + result['sells'] + result['liquidations']
+    result['volume'] = result['buy_volume'] + result['sell_volume'] + result['liquidation_volume']
+    result['net_flow'] = result['buy_volume'] - result['sell_volume']
+    return result
+
+
+class AggregateStats:
+    """
+    交易员和代币的滚动聚合统计
+    """
+
+    def __init__(
+        self,
+        max_traders: int = 10000,
+        max_tokens: int = 2000,
+        clock: Callable[[], float] = time.time
+    ):
+        """
+        初始化统计
+
+        Args:
+            max_traders: 最多跟踪的交易员数（每个约3KB）
+            max_tokens: 最多跟踪的代币数
+            clock: 时钟函数
+        """
+        self.clock = clock
+        self.traders = RollingStats(max_traders)
+        self.tokens = RollingStats(max_tokens)
+        self._lock = threading.Lock()
+
+    def record(self, trader: str, token: str, message_type: int, side: int, value: float,
+               window: str = '15m') -> dict:
+        """
+        记录一个事件
+
+        Returns:
+            dict: 记录后该交易员在 window 窗口内的统计（用于提醒中的累计信息）
+        """
+        increments = event_increments(message_type, side, value)
+        now = self.clock()
+        position = SlotPosition(now)
+        trader = trader.lower()
+        with self._lock:
+            self.traders.add(trader, increments, position, now)
+            self.tokens.add(token.upper(), increments, position, now)
+            return describe(self.traders.window(trader, window, now))
+
+    def snapshot(self, token: Optional[str] = None, trader: Optional[str] = None, limit: int = 10) -> dict:
+        """
+        接口返回的统计
+
+        Args:
+            token: 返回该代币各窗口的统计
+            trader: 返回该交易员各窗口的统计
+            limit: 都未指定时，返回各窗口成交额最大的 limit 个代币
+
+        Returns:
+            dict: {'token': {...}, 'trader': {...}} 或 {'top_tokens': {...}}
+        """
+        now = self.clock()
+        result = {}
+        with self._lock:
+            for name, key, table in (('token', token and token.upper(), self.tokens),
+                                     ('trader', trader and trader.lower(), self.traders)):
+                if key and key in table:
+                    result[name] = {window: describe(table.window(key, window, now)) for window in WINDOW_NAMES}
+                elif key:
+                    result[name] = None
+            if not token and not trader:
+                result['top_tokens'] = {}
+                for window in WINDOW_NAMES:
+                    totals = self.tokens.totals(window, now)
+                    volume = totals[:, BUY_VOLUME] + totals[:, SELL_VOLUME] + totals[:, LIQUIDATION_VOLUME]
+                    rows = [row for row in np.argsort(-volume)[:limit] if volume[row] > 0]
+                    result['top_tokens'][window] = [
+                        dict(describe(totals[row]), token=self.tokens.key_of(row)) for row in rows
+                    ]
+            result['tracked'] = {'traders': len(self.traders), 'tokens': len(self.tokens)}
+        return result
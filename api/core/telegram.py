@@ -3,39 +3,123 @@ Telegram核心模块
 封装Telegram Bot功能
 """
 import asyncio
+import hashlib
+import itertools
 import logging
-from typing import Optional, Union, List
-from telegram import Bot
-from telegram.error import TelegramError
+import time
+from typing import Dict, Optional, Union, List, Tuple
+from api.core.delivery import DeliveryIndex, DeliveryRecord
+from api.core.rate_limiter import RateLimiter
+from api.core.reply_threads import ReplyThreads, SharedReplyThreads
+from api.utils.logger import SAMPLED
+from api.utils.markdown import MAX_MESSAGE_LENGTH, PARSE_MODES, sanitize_message, split_message
+from api.utils.metrics import metrics
+from api.utils.tracing import KIND_CLIENT, span
 
 logger = logging.getLogger(__name__)
 
 
+def prepare_message(
+    text: str,
+    parse_mode: Optional[str] = 'Markdown',
+    max_parts: int = 10
+) -> Tuple[List[str], Optional[str]]:
+    """
+    发送前校验消息并切分为不超过Telegram长度限制的多段
+
+    Markdown无法解析的消息会先被自动修复，无法修复时降级为纯文本。
+
+    Args:
+        text: 消息文本
+        parse_mode: 解析模式
+        max_parts: 允许的最大分段数
+
+    Returns:
+        tuple: (切分后的消息段列表, 实际使用的解析模式)
+
+    Raises:
+        ValueError: 消息不可能发送成功时抛出（空消息、解析模式无效、分段过多）
+    """
+    if not isinstance(text, str) or not text.strip():
+        raise ValueError("Message text cannot be empty")
+    if parse_mode is not None and parse_mode not in PARSE_MODES:
+        raise ValueError(f"Invalid parse_mode: {parse_mode}")
+
+    text, parse_mode, outcome = sanitize_message(text, parse_mode)
+    if outcome != 'ok':
+        metrics.inc('telegram_markdown_sanitized_total', outcome=outcome)
+        logger.warning("⚠️ Markdown could not be parsed, %s", 'auto-fixed' if outcome == 'fixed' else 'sending as plain text')
+
+    parts = split_message(text, parse_mode, MAX_MESSAGE_LENGTH)
+    if len(parts) > max_parts:
+        raise ValueError(
+            f"Message too long: {len(parts)} parts exceeds limit of {max_parts}"
+        )
+    return parts, parse_mode
+
+
 class TelegramSender:
     """
     Telegram消息发送器
     """
 
-    def __init__(self, bot_token: str):
+    def __init__(
+        self,
+        bot_token: str,
+        max_message_parts: int = 10,
+        rate_limiter: Optional[RateLimiter] = None,
+        dedup_window: float = 0,
+        delivery_index: Optional[DeliveryIndex] = None,
+        reply_threads: Optional[Union[ReplyThreads, SharedReplyThreads]] = None
+    ):
         """
         初始化Telegram发送器
 
         Args:
             bot_token: Telegram Bot Token
+            max_message_parts: 超长消息允许切分的最大段数
+            rate_limiter: 限流器，多worker部署时传入共享限流器
+            dedup_window: 相同消息去重窗口（秒），0为关闭
+            delivery_index: 投递记录索引，为空时不记录
+            reply_threads: 交易员回复映射，设置后同一交易员的提醒回复其上一条提醒
         """
+        # python-telegram-bot导入较慢，延迟到创建发送器时
+        from telegram import Bot
+
         self.bot = Bot(token=bot_token)
+        self.max_message_parts = max_message_parts
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.dedup_window = dedup_window
+        self.delivery_index = delivery_index
+        self.reply_threads = reply_threads
         self._initialized = False
+
+        # 由调度器在后台完成握手时为True，发送等待握手完成而不是自行初始化
+        self.deferred_handshake = False
+        self._ready: Optional[asyncio.Event] = None
+
+        # 未完成的发送任务 {任务ID: {'chat_id', 'parts', 'parse_mode', 'disable_web_page_preview'}}
+        # 关闭时未能发完的任务写入溢出文件，下次启动重放
+        self.pending: Dict[int, dict] = {}
+        self.closing = False
+        self._job_ids = itertools.count(1)
         logger.info("TelegramSender initialized")
 
+    def _ready_event(self) -> asyncio.Event:
+        if self._ready is None:
+            self._ready = asyncio.Event()
+        return self._ready
+
     async def initialize(self):
         """初始化Bot连接"""
         try:
             bot_info = await self.bot.get_me()
             self._initialized = True
-            logger.info(f"✅ Bot connected: @{bot_info.username}")
+            self._ready_event().set()
+            logger.info("✅ Bot connected: @%s", bot_info.username)
             return True
         except Exception as e:
-            logger.error(f"❌ Bot initialization failed: {e}")
+            logger.error("❌ Bot initialization failed: %s", e)
             return False
 
     async def send_message(
@@ -45,11 +129,15 @@ class TelegramSender:
         parse_mode: Optional[str] = 'Markdown',
         disable_web_page_preview: bool = True,
         retry_count: int = 3,
-        retry_delay: float = 1.0
-    ) -> bool:
+        retry_delay: float = 1.0,
+        meta: Optional[dict] = None,
+        message_thread_id: Optional[int] = None
+    ) -> Optional[DeliveryRecord]:
         """
         发送消息到指定的群组/频道
 
+        超过Telegram长度限制的消息会按Markdown安全边界切分后依次发送。
+
         Args:
             chat_id: 目标群组ID或频道用户名
             text: 消息文本
@@ -57,46 +145,283 @@ class TelegramSender:
             disable_web_page_preview: 是否禁用网页预览
             retry_count: 失败重试次数
             retry_delay: 重试延迟（秒）
+            meta: 写入投递索引的事件信息 {'event_id', 'trader_address', 'token'}
+            message_thread_id: 论坛超级群组的话题ID，为空发往群组的默认话题
 
         Returns:
-            bool: 发送是否成功
+            DeliveryRecord: 投递记录，发送失败返回None
         """
-        if not self._initialized:
-            logger.warning("Bot not initialized, attempting to initialize...")
-            if not await self.initialize():
-                return False
+        try:
+            parts, parse_mode = prepare_message(text, parse_mode, self.max_message_parts)
+        except ValueError as e:
+            logger.error("❌ Message rejected before sending: %s", e, extra={'chat_id': chat_id})
+            return None
+
+        return await self._send_parts(
+            chat_id, parts, parse_mode, disable_web_page_preview, retry_count, retry_delay, meta, message_thread_id
+        )
+
+    async def _send_parts(
+        self,
+        chat_id: Union[int, str],
+        parts: List[str],
+        parse_mode: Optional[str],
+        disable_web_page_preview: bool = True,
+        retry_count: int = 3,
+        retry_delay: float = 1.0,
+        meta: Optional[dict] = None,
+        message_thread_id: Optional[int] = None
+    ) -> Optional[DeliveryRecord]:
+        """按顺序发送已切分的消息段，任一段失败即停止"""
+        job_id = next(self._job_ids)
+        job = {
+            'chat_id': chat_id,
+            'parts': parts,
+            'parse_mode': parse_mode,
+            'disable_web_page_preview': disable_web_page_preview,
+            'meta': meta,
+            'message_thread_id': message_thread_id,
+        }
+        self.pending[job_id] = job
+        finished = False
+        dedup_key = None
+        try:
+            if not self._initialized:
+                if self.deferred_handshake:
+                    await self._ready_event().wait()
+                else:
+                    logger.warning("Bot not initialized, attempting to initialize...")
+                    if not await self.initialize():
+                        finished = True
+                        return None
+
+            record = DeliveryRecord(
+                chat_id=chat_id, message_thread_id=message_thread_id, sent_at=time.time(), **(meta or {})
+            )
+
+            if self.dedup_window > 0:
+                key = self._dedup_key(chat_id, parts, message_thread_id)
+                if self.rate_limiter.seen(key, self.dedup_window):
+                    logger.info("♻️ Duplicate message to chat %s skipped", chat_id, extra={'chat_id': chat_id})
+                    metrics.inc('telegram_duplicates_skipped_total')
+                    finished = True
+                    return record
+                # 全部分段送达前发送失败（或被取消）时撤销，生产者重试不会被当作重复
+                dedup_key = key
+
+            # 同一交易员的提醒回复其在该群组（话题）的上一条提醒
+            trader_address = record.trader_address if self.reply_threads is not None else None
+            thread_key = chat_id if message_thread_id is None else f"{chat_id}/{message_thread_id}"
+            reply_to = self.reply_threads.get(thread_key, trader_address) if trader_address else None
+
+            for index, part in enumerate(parts):
+                message, attempts = await self._send_part(
+                    chat_id, part, parse_mode, disable_web_page_preview, retry_count, retry_delay,
+                    reply_to_message_id=reply_to if index == 0 else None,
+                    message_thread_id=message_thread_id
+                )
+                record.attempts += attempts
+                if message is None:
+                    if len(parts) > 1:
+                        logger.error(
+                            "❌ Multi-part send to chat %s stopped at part %d/%d", chat_id, index + 1, len(parts),
+                            extra={'chat_id': chat_id}
+                        )
+                    finished = True
+                    return None
+                record.message_ids.append(message.message_id)
+                # 只保留未发送的分段，关闭时溢出
+                job['parts'] = parts[index + 1:]
+
+            record.completed_at = time.time()
+            dedup_key = None
+            if self.delivery_index is not None:
+                self.delivery_index.add(record)
+            if trader_address:
+                self.reply_threads.put(thread_key, trader_address, record.message_id)
+
+            if len(parts) > 1:
+                logger.info(
+                    "✅ Message sent to chat %s in %d parts", chat_id, len(parts),
+                    extra={'chat_id': chat_id, **SAMPLED}
+                )
+            finished = True
+            return record
+        finally:
+            if dedup_key is not None:
+                self.rate_limiter.forget(dedup_key)
+            # 关闭过程中被取消的任务保留，用于写入溢出文件
+            if finished or not self.closing:
+                self.pending.pop(job_id, None)
+
+    async def replay(self, job: dict) -> Optional[DeliveryRecord]:
+        """
+        重放溢出文件中的发送任务
+
+        Args:
+            job: pending中的任务记录
+
+        Returns:
+            DeliveryRecord: 投递记录，发送失败返回None
+        """
+        return await self._send_parts(
+            job['chat_id'],
+            job['parts'],
+            job.get('parse_mode'),
+            job.get('disable_web_page_preview', True),
+            meta=job.get('meta'),
+            message_thread_id=job.get('message_thread_id')
+        )
+
+    async def _send_part(
+        self,
+        chat_id: Union[int, str],
+        text: str,
+        parse_mode: Optional[str],
+        disable_web_page_preview: bool,
+        retry_count: int,
+        retry_delay: float,
+        reply_to_message_id: Optional[int] = None,
+        message_thread_id: Optional[int] = None
+    ) -> tuple:
+        """
+        发送单段消息（带重试）
+
+        限流按群组计算：同一群组的不同话题共享该群组的发送频率限制。
+
+        Returns:
+            tuple: (Telegram返回的Message，失败为None, 尝试次数)
+        """
+        from telegram.error import TelegramError
 
-        for attempt in range(retry_count):
+        attempt = 0
+        while attempt < retry_count:
             try:
-                await self.bot.send_message(
-                    chat_id=chat_id,
-                    text=text,
-                    parse_mode=parse_mode,
-                    disable_web_page_preview=disable_web_page_preview
+                delay = self.rate_limiter.reserve(chat_id)
+                if delay > 0:
+                    with span('rate_wait', chat_id=str(chat_id), wait_ms=round(delay * 1000, 1)):
+                        await asyncio.sleep(delay)
+                started = time.perf_counter()
+                with span('telegram.send_message', KIND_CLIENT, chat_id=str(chat_id), attempt=attempt + 1):
+                    message = await self.bot.send_message(
+                        chat_id=chat_id,
+                        text=text,
+                        parse_mode=parse_mode,
+                        disable_web_page_preview=disable_web_page_preview,
+                        reply_to_message_id=reply_to_message_id,
+                        message_thread_id=message_thread_id,
+                        # 被回复的消息已删除时照常发送
+                        allow_sending_without_reply=True
+                    )
+                logger.info(
+                    "✅ Message sent to chat %s", chat_id,
+                    extra={
+                        'chat_id': chat_id,
+                        'attempt': attempt + 1,
+                        'latency_ms': round((time.perf_counter() - started) * 1000, 1),
+                        'rate_wait_ms': round(delay * 1000, 1),
+                        **SAMPLED,
+                    }
                 )
-                logger.info(f"✅ Message sent to chat {chat_id}")
-                return True
+                return message, attempt + 1
 
             except TelegramError as e:
-                logger.error(f"❌ Send failed (attempt {attempt + 1}/{retry_count}): {e}")
+                logger.error(
+                    "❌ Send failed (attempt %d/%d): %s", attempt + 1, retry_count, e,
+                    extra={'chat_id': chat_id, 'attempt': attempt + 1}
+                )
 
                 # 某些错误不需要重试
                 if "chat not found" in str(e).lower():
                     logger.error("Chat not found, stopping retry")
-                    return False
+                    return None, attempt + 1
                 elif "bot was blocked" in str(e).lower():
                     logger.error("Bot was blocked, stopping retry")
-                    return False
+                    return None, attempt + 1
+                elif "message is too long" in str(e).lower():
+                    logger.error("Message is too long, stopping retry")
+                    return None, attempt + 1
+                elif "can't parse entities" in str(e).lower() and parse_mode:
+                    # 重发相同内容必然失败，立即降级为纯文本
+                    logger.warning("Markdown rejected by Telegram, resending as plain text")
+                    metrics.inc('telegram_markdown_sanitized_total', outcome='rejected')
+                    parse_mode = None
+                    continue
 
                 # 如果还有重试机会，等待后重试
                 if attempt < retry_count - 1:
                     await asyncio.sleep(retry_delay * (attempt + 1))
+                attempt += 1
 
             except Exception as e:
-                logger.error(f"❌ Unknown error: {e}")
-                return False
+                logger.error("❌ Unknown error: %s", e, extra={'chat_id': chat_id})
+                return None, attempt + 1
 
-        return False
+        return None, attempt
+
+    async def edit_message(
+        self,
+        chat_id: Union[int, str],
+        message_id: int,
+        text: str,
+        parse_mode: Optional[str] = 'Markdown',
+        disable_web_page_preview: bool = True
+    ) -> bool:
+        """
+        编辑已发送的消息（编辑同样占用发送限额）
+
+        Args:
+            chat_id: 消息所在群组ID
+            message_id: 要编辑的消息ID
+            text: 新的消息文本，必须能放入一条消息
+            parse_mode: 解析模式
+            disable_web_page_preview: 是否禁用网页预览
+
+        Returns:
+            bool: 编辑是否成功（内容未变化视为成功）
+        """
+        from telegram.error import TelegramError
+
+        try:
+            parts, parse_mode = prepare_message(text, parse_mode, max_parts=1)
+        except ValueError as e:
+            logger.error("❌ Edit rejected before sending: %s", e, extra={'chat_id': chat_id})
+            return False
+
+        if not self._initialized:
+            await self._ready_event().wait()
+
+        delay = self.rate_limiter.reserve(chat_id)
+        if delay > 0:
+            with span('rate_wait', chat_id=str(chat_id), wait_ms=round(delay * 1000, 1)):
+                await asyncio.sleep(delay)
+        try:
+            with span('telegram.edit_message_text', KIND_CLIENT, chat_id=str(chat_id)):
+                await self.bot.edit_message_text(
+                    text=parts[0],
+                    chat_id=chat_id,
+                    message_id=message_id,
+                    parse_mode=parse_mode,
+                    disable_web_page_preview=disable_web_page_preview
+                )
+        except TelegramError as e:
+            if "message is not modified" in str(e).lower():
+                return True
+            logger.error("❌ Edit of message %s failed: %s", message_id, e, extra={'chat_id': chat_id})
+            return False
+
+        metrics.inc('telegram_messages_edited_total')
+        logger.info("✏️ Message %s edited in chat %s", message_id, chat_id, extra={'chat_id': chat_id, **SAMPLED})
+        return True
+
+    @staticmethod
+    def _dedup_key(chat_id: Union[int, str], parts: List[str], message_thread_id: Optional[int] = None) -> str:
+        """去重键：群组（话题）与消息内容的哈希，由限流器在多worker间共享"""
+        digest = hashlib.blake2b(digest_size=16)
+        for part in parts:
+            digest.update(part.encode('utf-8'))
+        target = chat_id if message_thread_id is None else f"{chat_id}/{message_thread_id}"
+        return f"{target}:{digest.hexdigest()}"
 
     async def send_to_multiple_chats(
         self,
@@ -104,50 +429,67 @@ class TelegramSender:
         text: str,
         parse_mode: Optional[str] = 'Markdown',
         disable_web_page_preview: bool = True,
-        delay_between_sends: float = 0.1
+        delay_between_sends: float = 0.1,
+        meta: Optional[dict] = None,
+        message_thread_ids: Optional[List[Optional[int]]] = None
     ) -> dict:
         """
         向多个群组/频道发送相同消息
 
+        消息只切分一次；各群组按顺序接收所有分段，不同群组之间流水线并行，
+        第i个群组在 i * delay_between_sends 秒后开始发送以避免限流。
+
         Args:
             chat_ids: 目标群组ID列表
             text: 消息文本
             parse_mode: 解析模式
             disable_web_page_preview: 是否禁用网页预览
             delay_between_sends: 每次发送间隔（秒）
+            meta: 写入投递索引的事件信息
+            message_thread_ids: 与 chat_ids 一一对应的话题ID，为空时都发往默认话题
 
         Returns:
-            dict: {'success': [成功的chat_id列表], 'failed': [失败的chat_id列表]}
+            dict: {'success': [成功的chat_id列表], 'failed': [失败的chat_id列表],
+                   'records': [投递记录字典列表]}
         """
-        success = []
-        failed = []
-
-        for chat_id in chat_ids:
-            result = await self.send_message(
-                chat_id=chat_id,
-                text=text,
-                parse_mode=parse_mode,
-                disable_web_page_preview=disable_web_page_preview
+        try:
+            parts, parse_mode = prepare_message(text, parse_mode, self.max_message_parts)
+        except ValueError as e:
+            logger.error("❌ Message rejected before sending: %s", e)
+            return {'success': [], 'failed': list(chat_ids), 'records': []}
+
+        thread_ids = message_thread_ids or [None] * len(chat_ids)
+
+        async def send_one(index: int, chat_id: Union[int, str]) -> Optional[DeliveryRecord]:
+            if index and delay_between_sends > 0:
+                await asyncio.sleep(delay_between_sends * index)
+            return await self._send_parts(
+                chat_id, parts, parse_mode, disable_web_page_preview, meta=meta, message_thread_id=thread_ids[index]
             )
 
-            if result:
-                success.append(chat_id)
-            else:
-                failed.append(chat_id)
+        results = await asyncio.gather(
+            *(send_one(index, chat_id) for index, chat_id in enumerate(chat_ids))
+        )
+
+        success = [chat_id for chat_id, ok in zip(chat_ids, results) if ok]
+        failed = [chat_id for chat_id, ok in zip(chat_ids, results) if not ok]
 
-            # 添加延迟避免限流
-            if delay_between_sends > 0:
-                await asyncio.sleep(delay_between_sends)
+        records = [record.to_dict() for record in results if record]
 
-        logger.info(f"📤 Batch send completed - success: {len(success)}, failed: {len(failed)}")
-        return {'success': success, 'failed': failed}
+        logger.info("📤 Batch send completed - success: %d, failed: %d", len(success), len(failed))
+        return {'success': success, 'failed': failed, 'records': records}
 
     async def close(self):
         """关闭Bot连接"""
+        self.rate_limiter.close()
+        if self.delivery_index is not None:
+            self.delivery_index.close()
+        if self.reply_threads is not None:
+            self.reply_threads.snapshot()
         try:
             await self.bot.shutdown()
             logger.info("✅ Bot connection closed")
         except AttributeError:
             pass
         except Exception as e:
-            logger.error(f"❌ Failed to close Bot: {e}")
+            logger.error("❌ Failed to close Bot: %s", e)
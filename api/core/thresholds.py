@@ -0,0 +1,242 @@
+"""
+动态阈值模块
+
+固定的“巨鲸”金额线不适用于所有代币：$1M 对BTC很小，对小币种却很大。
+这里为每个 (代币, 消息类型) 维护一个滚动窗口内 value_usd 的分位数草图，
+低于该代币指定分位数的事件视为低优先级（不单独发送，或并入摘要）。
+
+草图采用对数分桶（DDSketch思路）：
+    - 每个值落入 ceil(log_γ(value)) 号桶，分位数的相对误差不超过 relative_accuracy
+    - 桶数有上限，超出时合并最低的桶，每个代币占用固定内存
+    - 滚动窗口由若干时间片组成，过期的时间片整体清空
+单次记录只是一次对数运算和一次字典更新，阈值按时间间隔缓存，不在每个事件上重算。
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+class QuantileSketch:
+    """对数分桶的分位数草图"""
+
+    __slots__ = ('gamma', 'log_gamma', 'max_buckets', 'buckets', 'zero_count', 'count')
+
+    def __init__(self, relative_accuracy: float = 0.01, max_buckets: int = 2048):
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.max_buckets = max_buckets
+        self.buckets: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+
+    def add(self, value: float):
+        """记录一个值"""
+        self.count += 1
+        if value <= 0:
+            self.zero_count += 1
+            return
+        index = math.ceil(math.log(value) / self.log_gamma)
+        buckets = self.buckets
+        buckets[index] = buckets.get(index, 0) + 1
+        if len(buckets) > self.max_buckets:
+            self._collapse()
+
+    def _collapse(self):
+        """把最低的两个桶合并，保持桶数不超过上限（只影响最小值附近的精度）"""
+        lowest, second = sorted(self.buckets)[:2]
+        self.buckets[second] += self.buckets.pop(lowest)
+
+    def merge(self, other: 'QuantileSketch'):
+        """合并另一个草图"""
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        while len(self.buckets) > self.max_buckets:
+            self._collapse()
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        估算分位数
+
+        Args:
+            q: 0~1 之间的分位点
+
+        Returns:
+            float: 分位数估计值，没有数据时返回None
+        """
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen > rank:
+                return 2 * self.gamma ** index / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+
+    def empty_copy(self) -> 'QuantileSketch':
+        """创建参数相同的空草图"""
+        sketch = QuantileSketch.__new__(QuantileSketch)
+        sketch.gamma, sketch.log_gamma, sketch.max_buckets = self.gamma, self.log_gamma, self.max_buckets
+        sketch.buckets, sketch.zero_count, sketch.count = {}, 0, 0
+        return sketch
+
+    def clear(self):
+        self.buckets.clear()
+        self.zero_count = 0
+        self.count = 0
+
+
+class RollingSketch:
+    """
+    滚动窗口草图：窗口分为 slots 个时间片，每个时间片一个草图
+    """
+
+    __slots__ = ('slot_span', 'sketches', 'epochs')
+
+    def __init__(self, window: float, slots: int, relative_accuracy: float, max_buckets: int):
+        self.slot_span = window / slots
+        self.sketches = [QuantileSketch(relative_accuracy, max_buckets) for _ in range(slots)]
+        self.epochs = [-1] * slots
+
+    def add(self, value: float, now: float):
+        epoch = int(now // self.slot_span)
+        slot = epoch % len(self.sketches)
+        if self.epochs[slot] != epoch:
+            self.sketches[slot].clear()
+            self.epochs[slot] = epoch
+        self.sketches[slot].add(value)
+
+    def merged(self, now: float) -> QuantileSketch:
+        """合并窗口内仍有效的时间片"""
+        epoch = int(now // self.slot_span)
+        total = self.sketches[0].empty_copy()
+        for sketch, slot_epoch in zip(self.sketches, self.epochs):
+            if epoch - slot_epoch < len(self.sketches):
+                total.merge(sketch)
+        return total
+
+
+class _TokenState:
+    __slots__ = ('sketch', 'threshold', 'samples', 'refreshed_at')
+
+    def __init__(self, sketch: RollingSketch):
+        self.sketch = sketch
+        self.threshold: Optional[float] = None
+        self.samples = 0
+        self.refreshed_at = float('-inf')
+
+
+class ThresholdTracker:
+    """
+    按 (代币, 消息类型) 计算动态阈值
+    """
+
+    def __init__(
+        self,
+        percentile: float = 50.0,
+        window: float = 86400.0,
+        slots: int = 24,
+        min_samples: int = 100,
+        refresh_interval: float = 1.0,
+        relative_accuracy: float = 0.01,
+        max_buckets: int = 512,
+        max_tokens: int = 10000,
+        clock: Callable[[], float] = time.time
+    ):
+        """
+        初始化阈值跟踪
+
+        Args:
+            percentile: 阈值分位数（0~100），低于该分位数的事件为低优先级
+            window: 滚动窗口（秒）
+            slots: 窗口时间片数
+            min_samples: 样本少于该数时不设阈值（全部正常发送）
+            refresh_interval: 阈值重算间隔（秒）
+            relative_accuracy: 分位数相对误差
+            max_buckets: 每个时间片的最大桶数
+            max_tokens: 跟踪的最大 (代币, 消息类型) 数，超出时淘汰最久未出现的
+            clock: 时钟函数
+        """
+        self.percentile = percentile
+        self.window = window
+        self.slots = slots
+        self.min_samples = min_samples
+        self.refresh_interval = refresh_interval
+        self.relative_accuracy = relative_accuracy
+        self.max_buckets = max_buckets
+        self.max_tokens = max_tokens
+        self.clock = clock
+        self._states: 'OrderedDict[Tuple[str, int], _TokenState]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def observe(self, token: str, message_type: int, value: float) -> Tuple[bool, Optional[float]]:
+        """
+        记录一个事件并判断其是否达到该代币的阈值
+
+        Args:
+            token: 代币符号
+            message_type: 消息类型
+            value: 事件金额（USD）
+
+        Returns:
+            tuple: (是否正常发送, 当前阈值；样本不足时为None)
+        """
+        key = (token.upper(), message_type)
+        now = self.clock()
+        with self._lock:
+            state = self._states.get(key)
+            if state is None:
+                state = _TokenState(RollingSketch(self.window, self.slots, self.relative_accuracy, self.max_buckets))
+                self._states[key] = state
+                if len(self._states) > self.max_tokens:
+                    self._states.popitem(last=False)
+            else:
+                self._states.move_to_end(key)
+
+            if now - state.refreshed_at >= self.refresh_interval:
+                self._refresh(state, now)
+            threshold = state.threshold
+            state.sketch.add(value, now)
+
+        return threshold is None or value >= threshold, threshold
+
+    def _refresh(self, state: _TokenState, now: float):
+        merged = state.sketch.merged(now)
+        state.samples = merged.count
+        state.threshold = merged.quantile(self.percentile / 100) if merged.count >= self.min_samples else None
+        state.refreshed_at = now
+
+    def snapshot(self, token: Optional[str] = None) -> List[dict]:
+        """
+        当前各代币的阈值和分布概况
+
+        Args:
+            token: 只返回该代币，为空返回全部
+        """
+        now = self.clock()
+        result = []
+        with self._lock:
+            items = [
+                (key, state) for key, state in self._states.items()
+                if token is None or key[0] == token.upper()
+            ]
+            for (symbol, message_type), state in items:
+                merged = state.sketch.merged(now)
+                self._refresh(state, now)
+                result.append({
+                    'token': symbol,
+                    'message_type': message_type,
+                    'samples': merged.count,
+                    'percentile': self.percentile,
+                    'threshold': state.threshold,
+                    'p50': merged.quantile(0.5),
+                    'p90': merged.quantile(0.9),
+                    'p99': merged.quantile(0.99),
+                })
+        return result
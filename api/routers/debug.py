@@ -0,0 +1,147 @@
+"""
+调试路由
+
+设置 DEBUG_TOKEN 后所有调试接口需要认证（请求头 Authorization: Bearer <DEBUG_TOKEN>）；
+采样分析会占用一个请求线程并带来少量开销，未设置 DEBUG_TOKEN 时不开放。
+"""
+import hmac
+from typing import Optional
+
+from flask import Blueprint, Response, jsonify, request
+
+from api.config import settings
+from api.utils.logger import logger
+from api.utils.profiler import LoopMonitor, profile
+from api.utils.tracing import tracer
+
+debug_bp = Blueprint('debug', __name__, url_prefix='/debug')
+
+# 单次采样的最长时间（秒）
+MAX_PROFILE_SECONDS = 60
+
+# 发送事件循环的延迟监控（未开启时为None）
+loop_monitor: Optional[LoopMonitor] = None
+
+
+def set_loop_monitor(monitor: LoopMonitor):
+    """设置事件循环监控"""
+    global loop_monitor
+    loop_monitor = monitor
+
+
+@debug_bp.before_request
+def authenticate():
+    """校验 DEBUG_TOKEN（常数时间比较）"""
+    if not settings.DEBUG_TOKEN:
+        return None
+    supplied = request.headers.get('Authorization', '')
+    if supplied.startswith('Bearer '):
+        supplied = supplied[len('Bearer '):]
+    if not hmac.compare_digest(supplied.encode('utf-8'), settings.DEBUG_TOKEN.encode('utf-8')):
+        return jsonify({
+            'success': False,
+            'error': 'Unauthorized'
+        }), 401
+    return None
+
+
+@debug_bp.route('/traces', methods=['GET'])
+def get_traces():
+    """
+    最近完成的追踪中耗时最长的几个
+
+    Query:
+        limit: 条数，默认10，最多100
+
+    Returns:
+        {
+            "success": true,
+            "sample_rate": 0.01,
+            "traces": [{"trace_id": "...", "name": "POST /api/v1/whale/send", "duration_ms": 812.4,
+                        "spans": [{"name": "rate_wait", "offset_ms": 3.1, "duration_ms": 798.0, ...}]}]
+        }
+    """
+    try:
+        limit = min(max(int(request.args.get('limit', 10)), 1), 100)
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'error': 'limit must be an integer'
+        }), 400
+
+    return jsonify({
+        'success': True,
+        'sample_rate': tracer.sample_rate,
+        'traces': tracer.slowest(limit)
+    }), 200
+
+
+@debug_bp.route('/profile', methods=['GET'])
+def get_profile():
+    """
+    对运行中的进程做 N 秒的调用栈采样
+
+    Query:
+        seconds: 采样时长，默认10，最多60
+        interval_ms: 采样间隔（毫秒），默认5
+        clock: 'wall'（默认，包括等待时间）或 'cpu'（只在进程忙时采样，需要在主线程处理请求）
+        format: 'collapsed'（默认，flamegraph.pl / speedscope 可直接读取）或 'json'
+
+    Returns:
+        collapsed: 每行 "线程;栈底;...;栈顶 样本数"
+        json: {"success": true, "mode": "signal", "samples": 2000, "top": [...], "collapsed": "...",
+               "loop": {"lag_p99_ms": 1.2, "lag_max_ms": 340.5, "slow_callbacks": [{"stalled_ms", "stack"}]}}
+    """
+    if not settings.DEBUG_TOKEN:
+        return jsonify({
+            'success': False,
+            'error': 'Profiling is disabled, set DEBUG_TOKEN to enable'
+        }), 403
+
+    try:
+        seconds = min(max(float(request.args.get('seconds', 10)), 0.1), MAX_PROFILE_SECONDS)
+        interval = min(max(float(request.args.get('interval_ms', 5)), 1.0), 1000.0) / 1000
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'error': 'seconds and interval_ms must be numbers'
+        }), 400
+
+    logger.info("🔬 Profiling for %.1fs", seconds)
+    try:
+        result = profile(seconds, interval, request.args.get('clock', 'wall'), loop_monitor)
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    except RuntimeError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 409
+
+    if request.args.get('format') == 'json':
+        return jsonify({'success': True, **result}), 200
+    return Response(
+        result['collapsed'],
+        mimetype='text/plain',
+        headers={
+            'Content-Disposition': 'attachment; filename=profile.folded',
+            'X-Profile-Mode': result['mode'],
+            'X-Profile-Samples': str(result['samples']),
+        }
+    )
+
+
+@debug_bp.route('/loop', methods=['GET'])
+def get_loop():
+    """
+    发送事件循环最近约10分钟的调度延迟和慢回调（阻塞事件循环时的调用栈）
+    """
+    if loop_monitor is None:
+        return jsonify({
+            'success': False,
+            'error': 'Loop monitor is disabled'
+        }), 404
+    return jsonify({'success': True, **loop_monitor.summary()}), 200
@@ -1,7 +1,10 @@
 """
 健康检查路由
 """
-from flask import Blueprint, jsonify
+from flask import Blueprint, Response, jsonify
+from api.core import scheduler
+from api.core.dispatcher import dispatcher
+from api.utils.metrics import metrics
 
 health_bp = Blueprint('health', __name__)
 
@@ -22,7 +25,10 @@ def health_check():
         'status': 'ok',
         'service': 'telegram-sender',
         'version': '1.0.0',
-        'telegram_ready': telegram_sender is not None
+        'telegram_ready': telegram_sender is not None,
+        'telegram_connected': dispatcher.connected,
+        'admission': dispatcher.admission.snapshot() if dispatcher.admission else None,
+        'scheduled': scheduler.send_scheduler.snapshot() if scheduler.send_scheduler is not None else None
     }), 200
 
 
@@ -30,3 +36,9 @@ def health_check():
 def ping():
     """简单的ping接口"""
     return jsonify({'message': 'pong'}), 200
+
+
+@health_bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    """指标接口（Prometheus文本格式）"""
+    return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
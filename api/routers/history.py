@@ -0,0 +1,104 @@
+"""
+事件历史查询路由
+"""
+import json
+from typing import Optional
+
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+
+from api.core.event_index import EventIndex, HistoryQuery
+from api.utils.logger import logger
+
+history_bp = Blueprint('history', __name__, url_prefix='/api/v1')
+
+# 事件历史索引（未开启事件存储时为None）
+event_index: Optional[EventIndex] = None
+
+
+def set_event_index(index: EventIndex):
+    """设置事件历史索引"""
+    global event_index
+    event_index = index
+
+
+def _optional(name: str, convert):
+    value = request.args.get(name)
+    return convert(value) if value not in (None, '') else None
+
+
+@history_bp.route('/history', methods=['GET'])
+def get_history():
+    """
+    查询历史事件，从新到旧分页返回
+
+    Query:
+        token: 代币符号
+        trader_address: 交易员地址
+        message_type: 1=交易, 2=强平
+        direction: 1=做多/买入, 2=做空/卖出
+        min_value / max_value: 金额范围（USD）
+        start / end: 时间范围（Unix秒，含start不含end）
+        limit: 每页条数，默认100，最多1000
+        cursor: 上一页返回的 next_cursor
+
+    Returns:
+        {
+            "success": true,
+            "events": [{"timestamp": ..., "token": "ETH", "trader_address": "0x...", "message_type": 2,
+                        "direction": 1, "value_usd": 5200000.0}],
+            "count": 1,
+            "next_cursor": "20261018:1760781234.5:42"  // 没有更多时为null
+        }
+    """
+    if event_index is None:
+        return jsonify({
+            'success': False,
+            'error': 'Event history is disabled'
+        }), 404
+
+    try:
+        query = HistoryQuery(
+            token=request.args.get('token'),
+            trader=request.args.get('trader_address'),
+            message_type=_optional('message_type', int),
+            side=_optional('direction', int),
+            min_value=_optional('min_value', float),
+            max_value=_optional('max_value', float),
+            start=_optional('start', float) or 0.0,
+            end=_optional('end', float) or float('inf')
+        )
+        limit = min(max(int(request.args.get('limit', 100)), 1), 1000)
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': f'Invalid query parameter: {e}'
+        }), 400
+
+    if query.message_type not in (None, 1, 2) or query.side not in (None, 1, 2):
+        return jsonify({
+            'success': False,
+            'error': 'message_type and direction must be 1 or 2'
+        }), 400
+
+    try:
+        events, next_cursor = event_index.search(query, limit=limit, cursor=request.args.get('cursor'))
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    except Exception as e:
+        logger.error("❌ History query failed: %s", e, exc_info=True)
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+    def generate():
+        # 逐条输出，整页不在内存中拼成一个大字符串
+        yield '{"success": true, "events": ['
+        for i, event in enumerate(events):
+            yield (',' if i else '') + json.dumps(event)
+        yield f'], "count": {len(events)}, "next_cursor": {json.dumps(next_cursor)}}}'
+
+    return Response(stream_with_context(generate()), mimetype='application/json')
@@ -2,14 +2,23 @@
 消息发送路由
 处理所有消息发送相关的API端点
 """
-import asyncio
+from typing import Optional
+
 from flask import Blueprint, request, jsonify
 from api.config import settings
+from api.core.admission import Overloaded
+from api.core.auth import AccessDenied, authenticate_request, authorize, charge
+from api.core.dispatcher import admit, run_send
+from api.core.routing import to_thread_id
+from api.core.scheduler import ScheduledSend, parse_schedule
+from api.core.telegram import prepare_message
+from api.routers.schedule import respond_scheduled
 from api.utils.logger import logger
 from api.utils.message_formatter import (
     format_whale_trade_from_dict,
     format_liquidation_from_dict
 )
+from api.utils.tracing import span
 
 message_bp = Blueprint('message', __name__, url_prefix='/api/v1')
 
@@ -23,6 +32,46 @@ def set_telegram_sender(sender):
     telegram_sender = sender
 
 
+@message_bp.before_request
+def authenticate():
+    """校验API密钥（未配置 API_KEYS_PATH 时不认证）"""
+    authenticate_request(request.headers)
+
+
+def validate_message(message, parse_mode) -> Optional[str]:
+    """
+    校验消息能否发送（长度、分段数、解析模式）
+
+    Returns:
+        str: 错误信息，校验通过返回None
+    """
+    try:
+        with span('validate'):
+            prepare_message(message, parse_mode, settings.MESSAGE_MAX_PARTS)
+    except ValueError as e:
+        return str(e)
+    return None
+
+
+def send_charged(chat_ids: list, coro):
+    """
+    申请发送名额后扣除消息配额并发送（被拒绝时关闭协程）
+
+    先申请名额再扣配额，过载被拒绝（429）的请求不消耗消息配额。
+
+    Raises:
+        Overloaded: 发送已满
+        AccessDenied: 消息配额用完（429）
+    """
+    try:
+        with admit():
+            charge(chat_ids)
+            return run_send(coro)
+    except (Overloaded, AccessDenied):
+        coro.close()
+        raise
+
+
 @message_bp.route('/send', methods=['POST'])
 def send_message():
     """
@@ -33,7 +82,10 @@ def send_message():
             "message": "消息内容",
             "chat_id": -1234567890,  // 可选，优先级最高
             "language": "zh",  // 可选，'zh', 'en', 'both'
-            "parse_mode": "Markdown"  // 可选
+            "parse_mode": "Markdown",  // 可选
+            "message_thread_id": 11,  // 可选，发往开启话题的群组中的指定话题（不支持 language=both）
+            "send_at": "2026-10-20T14:00:00Z",  // 可选，定时发送（Unix秒或ISO 8601）
+            "delay_seconds": 600  // 可选，延迟发送，与 send_at 二选一
         }
     """
     if not telegram_sender:
@@ -43,7 +95,8 @@ def send_message():
         }), 500
 
     try:
-        data = request.get_json()
+        with span('parse'):
+            data = request.get_json()
 
         if not data:
             return jsonify({
@@ -58,6 +111,22 @@ def send_message():
                 'error': 'Missing message parameter'
             }), 400
 
+        # 预先校验，注定失败的消息不消耗API调用
+        parse_mode = data.get('parse_mode', 'Markdown')
+        error = validate_message(message, parse_mode)
+        if not error:
+            due, error = parse_schedule(data)
+        if not error:
+            try:
+                message_thread_id = to_thread_id(data.get('message_thread_id'))
+            except ValueError as e:
+                error = str(e)
+        if error:
+            return jsonify({
+                'success': False,
+                'error': error
+            }), 400
+
         # 获取目标群组ID
         # 优先级：chat_id > language > default
         chat_id = data.get('chat_id')
@@ -65,8 +134,14 @@ def send_message():
 
         if not chat_id:
             if language == 'both':
+                if message_thread_id is not None:
+                    # 话题编号只属于一个群组，不能同时用于中英文两个群组
+                    return jsonify({
+                        'success': False,
+                        'error': 'message_thread_id is not supported with language=both'
+                    }), 400
                 # 发送到所有群组
-                return send_to_both_groups(message, data.get('parse_mode', 'Markdown'))
+                return send_to_both_groups(message, parse_mode, due)
             elif language:
                 # 根据语言选择群组
                 chat_id = settings.get_chat_id(language)
@@ -87,44 +162,55 @@ def send_message():
         except ValueError:
             pass
 
-        parse_mode = data.get('parse_mode', 'Markdown')
+        authorize([chat_id])
+        if due is not None:
+            charge([chat_id])
+            return respond_scheduled('message', {
+                'chat_ids': [chat_id],
+                'text': message,
+                'parse_mode': parse_mode,
+                'message_thread_ids': [message_thread_id]
+            }, due)
 
         # 发送消息
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        success = loop.run_until_complete(
+        record = send_charged(
+            [chat_id],
             telegram_sender.send_message(
                 chat_id=chat_id,
                 text=message,
-                parse_mode=parse_mode
+                parse_mode=parse_mode,
+                message_thread_id=message_thread_id
             )
         )
 
-        if success:
-            logger.info(f"✅ Message sent to chat {chat_id}")
+        if record:
             return jsonify({
                 'success': True,
                 'message': 'Message sent successfully',
                 'chat_id': chat_id,
-                'language': language
+                'language': language,
+                'message_ids': record.message_ids
             }), 200
         else:
-            logger.error(f"❌ Failed to send message to chat {chat_id}")
+            logger.error("❌ Failed to send message to chat %s", chat_id)
             return jsonify({
                 'success': False,
                 'error': 'Failed to send message'
             }), 500
 
+    except (Overloaded, AccessDenied):
+        # 由应用返回 429 / 403
+        raise
     except Exception as e:
-        logger.error(f"❌ Error processing request: {e}", exc_info=True)
+        logger.error("❌ Error processing request: %s", e, exc_info=True)
         return jsonify({
             'success': False,
             'error': str(e)
         }), 500
 
 
-def send_to_both_groups(message: str, parse_mode: str = 'Markdown'):
-    """发送到中英文两个群组"""
+def send_to_both_groups(message: str, parse_mode: str = 'Markdown', due: float = None):
+    """发送到中英文两个群组（due 不为空时预约在该时间发送）"""
     chat_ids = settings.get_all_chat_ids()
 
     if not chat_ids:
@@ -133,9 +219,12 @@ def send_to_both_groups(message: str, parse_mode: str = 'Markdown'):
             'error': 'No chat groups configured'
         }), 400
 
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    result = loop.run_until_complete(
+    authorize(chat_ids)
+    if due is not None:
+        charge(chat_ids)
+        return respond_scheduled('message', {'chat_ids': chat_ids, 'text': message, 'parse_mode': parse_mode}, due)
+    result = send_charged(
+        chat_ids,
         telegram_sender.send_to_multiple_chats(
             chat_ids=chat_ids,
             text=message,
@@ -143,8 +232,6 @@ def send_to_both_groups(message: str, parse_mode: str = 'Markdown'):
         )
     )
 
-    logger.info(f"✅ Batch send to both groups - success: {len(result['success'])}, failed: {len(result['failed'])}")
-
     return jsonify({
         'success': True,
         'message': 'Message sent to both groups',
@@ -154,6 +241,19 @@ def send_to_both_groups(message: str, parse_mode: str = 'Markdown'):
     }), 200
 
 
+async def send_scheduled(item: ScheduledSend):
+    """发送到期的定时消息（在发送事件循环中调用）"""
+    payload = item.payload
+    result = await telegram_sender.send_to_multiple_chats(
+        chat_ids=payload['chat_ids'],
+        text=payload['text'],
+        parse_mode=payload['parse_mode'],
+        message_thread_ids=payload.get('message_thread_ids')
+    )
+    if not result['success']:
+        raise RuntimeError(f"Failed to send to {', '.join(map(str, result['failed']))}")
+
+
 @message_bp.route('/send/multiple', methods=['POST'])
 def send_to_multiple():
     """
@@ -173,7 +273,8 @@ def send_to_multiple():
         }), 500
 
     try:
-        data = request.get_json()
+        with span('parse'):
+            data = request.get_json()
 
         if not data:
             return jsonify({
@@ -188,6 +289,14 @@ def send_to_multiple():
                 'error': 'Missing message parameter'
             }), 400
 
+        parse_mode = data.get('parse_mode', 'Markdown')
+        error = validate_message(message, parse_mode)
+        if error:
+            return jsonify({
+                'success': False,
+                'error': error
+            }), 400
+
         chat_ids = data.get('chat_ids')
         if not chat_ids or not isinstance(chat_ids, list):
             return jsonify({
@@ -206,12 +315,11 @@ def send_to_multiple():
             except ValueError:
                 processed_chat_ids.append(chat_id)
 
-        parse_mode = data.get('parse_mode', 'Markdown')
+        authorize(processed_chat_ids)
 
         # 批量发送
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        result = loop.run_until_complete(
+        result = send_charged(
+            processed_chat_ids,
             telegram_sender.send_to_multiple_chats(
                 chat_ids=processed_chat_ids,
                 text=message,
@@ -219,8 +327,6 @@ def send_to_multiple():
             )
         )
 
-        logger.info(f"✅ Batch send completed - success: {len(result['success'])}, failed: {len(result['failed'])}")
-
         return jsonify({
             'success': True,
             'sent_count': len(result['success']),
@@ -228,8 +334,11 @@ def send_to_multiple():
             'results': result
         }), 200
 
+    except (Overloaded, AccessDenied):
+        # 由应用返回 429 / 403
+        raise
     except Exception as e:
-        logger.error(f"❌ Error in batch send: {e}", exc_info=True)
+        logger.error("❌ Error in batch send: %s", e, exc_info=True)
         return jsonify({
             'success': False,
             'error': str(e)
@@ -260,7 +369,8 @@ def send_formatted_message():
         }), 500
 
     try:
-        data = request.get_json()
+        with span('parse'):
+            data = request.get_json()
 
         if not data:
             return jsonify({
@@ -306,10 +416,11 @@ def send_formatted_message():
         except ValueError:
             pass
 
+        authorize([chat_id])
+
         # 发送消息
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        success = loop.run_until_complete(
+        success = send_charged(
+            [chat_id],
             telegram_sender.send_message(
                 chat_id=chat_id,
                 text=message,
@@ -328,9 +439,55 @@ def send_formatted_message():
                 'error': 'Failed to send message'
             }), 500
 
+    except (Overloaded, AccessDenied):
+        # 由应用返回 429 / 403
+        raise
     except Exception as e:
-        logger.error(f"❌ Error sending formatted message: {e}", exc_info=True)
+        logger.error("❌ Error sending formatted message: %s", e, exc_info=True)
         return jsonify({
             'success': False,
             'error': str(e)
         }), 500
+
+
+@message_bp.route('/deliveries', methods=['GET'])
+def get_deliveries():
+    """
+    查询投递记录（Telegram消息ID）
+
+    Query:
+        event_id / trader / token: 三选一
+        limit: 最多返回条数，默认100
+    """
+    index = telegram_sender.delivery_index if telegram_sender else None
+    if index is None:
+        return jsonify({
+            'success': False,
+            'error': 'Delivery index is disabled'
+        }), 404
+
+    try:
+        limit = min(int(request.args.get('limit', 100)), 1000)
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'error': 'limit must be an integer'
+        }), 400
+
+    if request.args.get('event_id'):
+        records = index.by_event(request.args['event_id'], limit)
+    elif request.args.get('trader'):
+        records = index.by_trader(request.args['trader'], limit)
+    elif request.args.get('token'):
+        records = index.by_token(request.args['token'], limit)
+    else:
+        return jsonify({
+            'success': False,
+            'error': 'One of event_id, trader or token is required'
+        }), 400
+
+    return jsonify({
+        'success': True,
+        'count': len(records),
+        'deliveries': [record.to_dict() for record in records]
+    }), 200
@@ -0,0 +1,130 @@
+"""
+定时发送路由
+
+/api/v1/send 和巨鲸提醒接口带 send_at / delay_seconds 时由 respond_scheduled() 预约发送；
+本蓝图提供查询和取消。开启API密钥认证时，每个密钥只能看到和取消自己预约的发送。
+"""
+from typing import Optional
+
+from flask import Blueprint, jsonify, request
+
+from api.core import scheduler
+from api.core.auth import authenticate_request, current_api_key
+from api.core.scheduler import Overbooked, ScheduledSend
+from api.utils.logger import logger
+
+schedule_bp = Blueprint('schedule', __name__, url_prefix='/api/v1')
+
+
+def _key_name() -> Optional[str]:
+    key = current_api_key.get()
+    return key.name if key is not None else None
+
+
+def respond_scheduled(kind: str, payload: dict, due: float) -> tuple:
+    """
+    预约发送并返回 202
+
+    Returns:
+        tuple: (response, status_code)
+    """
+    if scheduler.send_scheduler is None:
+        return jsonify({
+            'success': False,
+            'error': 'Scheduled sends are disabled'
+        }), 400
+    try:
+        item = scheduler.send_scheduler.schedule(kind, payload, due, key=_key_name())
+    except Overbooked as e:
+        response = jsonify({
+            'success': False,
+            'error': str(e),
+            'retry_after': e.retry_after
+        })
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response, 429
+    logger.info("⏰ Scheduled %s send %s at %.0f", kind, item.id, due)
+    return jsonify({
+        'success': True,
+        'message': 'Message scheduled',
+        'scheduled': item.to_dict()
+    }), 202
+
+
+def _visible(item: Optional[ScheduledSend]) -> bool:
+    key = _key_name()
+    return item is not None and (key is None or item.key == key)
+
+
+@schedule_bp.before_request
+def authenticate():
+    """校验API密钥（未配置 API_KEYS_PATH 时不认证）"""
+    authenticate_request(request.headers)
+    if scheduler.send_scheduler is None:
+        return jsonify({
+            'success': False,
+            'error': 'Scheduled sends are disabled'
+        }), 404
+    return None
+
+
+@schedule_bp.route('/scheduled', methods=['GET'])
+def list_scheduled():
+    """
+    待发送的定时消息，按发送时间排序
+
+    Query:
+        limit: 条数，默认100，最多1000
+
+    Returns:
+        {
+            "success": true,
+            "pending": 1520,
+            "scheduled": [{"id": "3f9c2a71d4e8b605", "send_at": 1760796000.0, "kind": "whale", "payload": {...}, ...}]
+        }
+    """
+    try:
+        limit = min(max(int(request.args.get('limit', 100)), 1), 1000)
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'error': 'limit must be an integer'
+        }), 400
+
+    items = scheduler.send_scheduler.list(limit, key=_key_name())
+    return jsonify({
+        'success': True,
+        'pending': len(scheduler.send_scheduler),
+        'scheduled': [item.to_dict() for item in items]
+    }), 200
+
+
+@schedule_bp.route('/scheduled/<send_id>', methods=['GET'])
+def get_scheduled(send_id: str):
+    """查询一条定时发送"""
+    item = scheduler.send_scheduler.get(send_id)
+    if not _visible(item):
+        return jsonify({
+            'success': False,
+            'error': 'Scheduled send not found'
+        }), 404
+    return jsonify({
+        'success': True,
+        'scheduled': item.to_dict()
+    }), 200
+
+
+@schedule_bp.route('/scheduled/<send_id>', methods=['DELETE'])
+def cancel_scheduled(send_id: str):
+    """取消一条定时发送（已发送或不存在时返回404）"""
+    if not _visible(scheduler.send_scheduler.get(send_id)) or not scheduler.send_scheduler.cancel(send_id):
+        return jsonify({
+            'success': False,
+            'error': 'Scheduled send not found'
+        }), 404
+    logger.info("🗑️ Cancelled scheduled send %s", send_id)
+    return jsonify({
+        'success': True,
+        'message': 'Scheduled send cancelled',
+        'id': send_id
+    }), 200
@@ -2,9 +2,24 @@
 巨鲸交易和清算消息路由
 """
 import asyncio
+import functools
+from typing import Callable, List, Optional
 from flask import Blueprint, request, jsonify
 from api.config import settings
+from api.core.admission import Overloaded
+from api.core.auth import AccessDenied, authenticate_request, authorize, charge
+from api.core.delivery import event_id_for
+from api.core.dispatcher import admit, run_async, run_send
+from api.core.events import SIDE_LONG, SIDE_SHORT, event_side, event_value
+from api.core.routing import MESSAGE_TOPICS, Destination, RoutingTable, group_destinations, to_chat_id, to_thread_id
+from api.core.scheduler import ScheduledSend, parse_schedule
+from api.core.signing import verify_request
+from api.routers.schedule import respond_scheduled
 from api.utils.logger import logger
+from api.utils.markdown import escape_markdown
+from api.utils.metrics import metrics
+from api.utils.summary_formatter import format_compact, format_digest, format_recap
+from api.utils.tracing import span
 from api.utils.message_formatter import (
     format_whale_trade_from_dict,
     format_liquidation_from_dict
@@ -32,11 +47,67 @@ MESSAGE_TYPE_MAP = {
     2: 'liquidation' # 强平
 }
 
+# 已知地址追加的标签行
+LABEL_TEXT = {
+    'zh': '🏷️ 地址标签: {label}',
+    'en': '🏷️ Label: {label}'
+}
+
+# 代币信息补充行
+PRICE_TEXT = {
+    'zh': '💹 {name} 现价: ${price}',
+    'en': '💹 {name} price: ${price}'
+}
+
+LIQUIDATION_DISTANCE_TEXT = {
+    'zh': '📏 距强平价: {pct:+.2f}%',
+    'en': '📏 Distance to liquidation: {pct:+.2f}%'
+}
+
+# 同一交易员短时间内连续同方向交易时追加的累计信息
+ACTIVITY_TEXT = {
+    'zh': '🔥 {minutes}分钟内第{count}笔{side}，合计 ${total}',
+    'en': '🔥 {ordinal} {side} in {minutes} min, ${total} total'
+}
+
+ACTIVITY_SIDE = {
+    SIDE_LONG: {'zh': '买入', 'en': 'buy'},
+    SIDE_SHORT: {'zh': '卖出', 'en': 'sell'}
+}
+
+# 合并更新后追加在提醒末尾的累计信息
+POSITION_UPDATE_TEXT = {
+    'zh': '🔁 累计 {count} 笔，合计 ${total:,.0f}',
+    'en': '🔁 {count} fills, ${total:,.0f} total'
+}
+
 whale_bp = Blueprint('whale', __name__, url_prefix='/api/v1/whale')
 
 # 全局Telegram发送器实例
 telegram_sender = None
 
+# 持仓更新合并器（未开启时为None）
+position_coalescer = None
+
+# 路由表（未设置时使用中英文两个群组）
+routing_table = None
+
+# 地址标签（未配置时为None）
+address_labels = None
+
+# 代币信息缓存（未配置时为None）
+token_cache = None
+
+# 交易员和代币的滚动统计（未开启时为None）
+aggregate_stats = None
+
+# 事件历史（用于小时/日报，未开启时为None）
+event_history = None
+
+# 动态阈值（未开启时为None）与低优先级摘要（为None时低于阈值的事件直接丢弃）
+threshold_tracker = None
+alert_digest = None
+
 
 def set_telegram_sender(sender):
     """设置Telegram发送器实例"""
@@ -44,6 +115,63 @@ def set_telegram_sender(sender):
     telegram_sender = sender
 
 
+def set_position_coalescer(coalescer):
+    """设置持仓更新合并器"""
+    global position_coalescer
+    position_coalescer = coalescer
+
+
+def set_routing_table(table: RoutingTable):
+    """设置路由表"""
+    global routing_table
+    routing_table = table
+
+
+def set_address_labels(labels):
+    """设置地址标签查询"""
+    global address_labels
+    address_labels = labels
+
+
+def set_token_cache(cache):
+    """设置代币信息缓存"""
+    global token_cache
+    token_cache = cache
+
+
+def set_aggregate_stats(stats):
+    """设置滚动统计"""
+    global aggregate_stats
+    aggregate_stats = stats
+
+
+def set_event_history(history):
+    """设置事件历史"""
+    global event_history
+    event_history = history
+
+
+def set_thresholds(tracker, digest=None):
+    """设置动态阈值和低优先级摘要"""
+    global threshold_tracker, alert_digest
+    threshold_tracker = tracker
+    alert_digest = digest
+
+
+def get_routing_table() -> RoutingTable:
+    """当前路由表"""
+    return routing_table or RoutingTable.from_settings(settings)
+
+
+@whale_bp.before_request
+def authenticate():
+    """校验API密钥（未配置 API_KEYS_PATH 时不认证）和请求签名（未配置 WEBHOOK_SECRETS 时不校验）"""
+    authenticate_request(request.headers)
+    if request.method == 'POST':
+        # 缓存原始请求体，之后的 get_json() 直接解析同一份字节
+        verify_request(request.get_data(cache=True), request.headers, request.method, request.path)
+
+
 @whale_bp.route('/send', methods=['POST'])
 def send_whale_message():
     """
@@ -59,7 +187,8 @@ def send_whale_message():
             "value_usd": 2150000,  // 必需: 交易价值或仓位价值
             "token": "BTC",  // 必需: 代币符号
             "trader_address": "0x1234567890abcdef1234567890abcdef12345678"  // 必需: 交易员地址
-            "liquidation_price": 2980.50  // 强平时必需: 强平价格
+            "liquidation_price": 2980.50,  // 强平时必需: 强平价格
+            "send_at": 1760796000,  // 可选: 定时发送（Unix秒或ISO 8601），或 "delay_seconds": 600
         }
 
     Returns:
@@ -77,7 +206,8 @@ def send_whale_message():
         }), 500
 
     try:
-        data = request.get_json()
+        with span('parse'):
+            data = request.get_json()
 
         if not data:
             return jsonify({
@@ -127,17 +257,49 @@ def send_whale_message():
                     'error': 'Invalid action. Must be 1 (buy) or 2 (sell)'
                 }), 400
 
+        invalid = invalid_value(data)
+        if invalid:
+            return invalid
+
         # 默认发送到两个群组（中英文各自格式）
         return send_to_both_groups(data, message_type)
 
+    except (Overloaded, AccessDenied):
+        # 由应用返回 429 / 403
+        raise
     except Exception as e:
-        logger.error(f"❌ Error sending whale message: {e}", exc_info=True)
+        logger.error("❌ Error sending whale message: %s", e, exc_info=True)
         return jsonify({
             'success': False,
             'error': str(e)
         }), 500
 
 
+def invalid_value(data: dict) -> Optional[tuple]:
+    """
+    金额（value_usd 或 position_value）不是有限数值时的 400 响应
+
+    Returns:
+        tuple: (response, status_code)，金额有效时返回None
+    """
+    if event_value(data) is not None:
+        return None
+    field = 'value_usd' if 'value_usd' in data else 'position_value'
+    return jsonify({
+        'success': False,
+        'error': f'{field} must be a finite number'
+    }), 400
+
+
+def delivery_meta(data: dict) -> dict:
+    """提取写入投递索引的事件信息"""
+    return {
+        'event_id': event_id_for(data),
+        'trader_address': data.get('trader_address'),
+        'token': data.get('token'),
+    }
+
+
 def convert_params_to_text(data: dict, language: str) -> dict:
     """
     将整数参数转换为对应语言的文本
@@ -168,85 +330,552 @@ def convert_params_to_text(data: dict, language: str) -> dict:
     return converted
 
 
-def send_to_both_groups(data: dict, message_type: int) -> tuple:
+def add_address_label(data: dict) -> dict:
+    """补充交易员地址的实体标签（只用于渲染，不影响事件ID）"""
+    if address_labels is None or not data.get('trader_address'):
+        return data
+    try:
+        label = address_labels.get(str(data['trader_address']))
+    except Exception as e:
+        logger.warning("⚠️ Address label lookup failed: %s", e)
+        return data
+    return dict(data, trader_label=label) if label else data
+
+
+def add_token_info(data: dict) -> dict:
+    """
+    补充代币显示名称、当前价格和距强平价的百分比（只用于渲染）
+
+    加载超过缓存的延迟预算时不补充，提醒照常发送。
+    """
+    if token_cache is None or not data.get('token'):
+        return data
+    try:
+        info = run_async(token_cache.get(str(data['token'])), timeout=token_cache.budget + 1.0)
+    except Exception as e:
+        logger.warning("⚠️ Token info unavailable: %s", e)
+        return data
+    return merge_token_info(data, info)
+
+
+async def add_token_info_async(data: dict) -> dict:
+    """
+    在发送事件循环中补充代币信息（定时发送使用）
+
+    事件循环内不能用 run_async() 等待自身，这里直接等待，加载期间事件循环照常处理其他发送。
+    """
+    if token_cache is None or not data.get('token'):
+        return data
+    try:
+        info = await asyncio.wait_for(token_cache.get(str(data['token'])), token_cache.budget + 1.0)
+    except Exception as e:
+        logger.warning("⚠️ Token info unavailable: %s", e)
+        return data
+    return merge_token_info(data, info)
+
+
+def merge_token_info(data: dict, info: Optional[dict]) -> dict:
+    """把加载到的代币信息合并到渲染用的数据中（没有价格时原样返回）"""
+    try:
+        price = float(info['price']) if info and info.get('price') else None
+    except (TypeError, ValueError) as e:
+        logger.warning("⚠️ Token info unavailable: %s", e)
+        return data
+    if not price:
+        return data
+
+    enriched = dict(data, current_price=price, token_name=info.get('name') or str(data['token']))
+    if data.get('liquidation_price'):
+        enriched['liquidation_distance_pct'] = (float(data['liquidation_price']) - price) / price * 100
+    return enriched
+
+
+def format_price(price: float) -> str:
+    """价格显示：大于1保留2位小数，小币种保留6位有效数字"""
+    return f"{price:,.2f}" if price >= 1 else f"{price:.6g}"
+
+
+def ordinal(n: int) -> str:
+    """英文序数词：1st, 2nd, 3rd, 11th"""
+    suffix = 'th' if 10 <= n % 100 <= 20 else {1: 'st', 2: 'nd', 3: 'rd'}.get(n % 10, 'th')
+    return f"{n}{suffix}"
+
+
+def record_event(data: dict, message_type: int) -> dict:
+    """
+    把事件写入事件历史并计入滚动统计（包括之后被判为低优先级的事件）
+
+    交易员短时间内第2笔及以上同方向交易时，返回附带 trader_activity 的数据（只用于渲染）。
+    """
+    value = event_value(data)
+    if value is None or not data.get('token') or not data.get('trader_address'):
+        return data
+    side = event_side(data, message_type)
+    token, trader = str(data['token']), str(data['trader_address'])
+
+    if event_history is not None:
+        try:
+            event_history.append(token, trader, message_type, side, value)
+        except Exception as e:
+            logger.warning("⚠️ Failed to record whale event: %s", e)
+
+    if aggregate_stats is None:
+        return data
+    try:
+        window = aggregate_stats.record(trader, token, message_type, side, value)
+    except Exception as e:
+        logger.warning("⚠️ Failed to record whale stats: %s", e)
+        return data
+    if message_type != 1:
+        return data
+    count, total = (window['buys'], window['buy_volume']) if side == SIDE_LONG else (window['sells'], window['sell_volume'])
+    if count < 2:
+        return data
+    return dict(data, trader_activity={'side': side, 'count': count, 'total': total, 'minutes': 15})
+
+
+def footer_lines(data: dict, language: str, parse_mode: Optional[str]) -> List[str]:
+    """补充信息（地址标签、现价、距强平价）追加在消息末尾的行"""
+    lines = []
+    if data.get('trader_label'):
+        template = LABEL_TEXT.get(language, LABEL_TEXT['en'])
+        lines.append(template.format(label=escape_markdown(data['trader_label'], parse_mode)))
+    if data.get('current_price'):
+        template = PRICE_TEXT.get(language, PRICE_TEXT['en'])
+        lines.append(template.format(
+            name=escape_markdown(str(data['token_name']), parse_mode),
+            price=format_price(data['current_price'])
+        ))
+    if data.get('liquidation_distance_pct') is not None:
+        template = LIQUIDATION_DISTANCE_TEXT.get(language, LIQUIDATION_DISTANCE_TEXT['en'])
+        lines.append(template.format(pct=data['liquidation_distance_pct']))
+    activity = data.get('trader_activity')
+    if activity:
+        template = ACTIVITY_TEXT.get(language, ACTIVITY_TEXT['en'])
+        side = ACTIVITY_SIDE[activity['side']]
+        lines.append(template.format(
+            minutes=activity['minutes'],
+            count=activity['count'],
+            ordinal=ordinal(activity['count']),
+            side=side.get(language, side['en']),
+            total=format_compact(activity['total'])
+        ))
+    return lines
+
+
+# 消息模板 {(消息类型, 模板名称): 格式化函数}
+TEMPLATES = {
+    (1, 'default'): format_whale_trade_from_dict,
+    (2, 'default'): format_liquidation_from_dict,
+}
+
+
+def make_renderer(
+    data: dict,
+    language: str,
+    message_type: int,
+    variant: str = 'default',
+    parse_mode: Optional[str] = 'Markdown'
+) -> Callable[..., str]:
     """
-    发送消息到中英文两个群组
+    创建一个分组的渲染函数，相同参数只渲染一次
 
     Args:
-        data: 消息数据
+        data: 已转换为对应语言文本的消息数据
+        language: 消息语言
         message_type: 消息类型 (1=交易, 2=强平)
+        variant: 模板名称，未知模板使用默认模板
+        parse_mode: 解析模式（用于转义补充信息）
 
     Returns:
-        tuple: (response, status_code)
+        callable: render(count=1, total=None) -> 消息文本，count>1 时附加持仓合并的累计信息
+    """
+    formatter = TEMPLATES.get((message_type, variant)) or TEMPLATES[(message_type, 'default')]
+    footer = ''.join('\n' + line for line in footer_lines(data, language, parse_mode))
+
+    @functools.lru_cache(maxsize=8)
+    def render(count: int = 1, total: Optional[float] = None) -> str:
+        if count == 1:
+            text = formatter(data, language=language)
+        else:
+            text = formatter(dict(data, value_usd=total), language=language)
+            update_text = POSITION_UPDATE_TEXT.get(language, POSITION_UPDATE_TEXT['en'])
+            text += '\n' + update_text.format(count=count, total=total)
+        return text + footer
+
+    return render
+
+
+def render_groups(data: dict, message_type: int, destinations: List[Destination]) -> tuple:
     """
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
+    按 (语言, 解析模式, 模板) 分组渲染，每组只转换参数、渲染一次
+
+    Returns:
+        tuple: (meta, groups, results)，groups 为 [(chat_ids, thread_ids, parse_mode, render)]，
+               thread_ids 为各群组中该类消息的话题ID，渲染失败的群组已计入 results['failed']
+    """
+    return render_display(data, add_token_info(add_address_label(data)), message_type, destinations)
+
 
-    results = {'success': [], 'failed': []}
+async def render_groups_async(data: dict, message_type: int, destinations: List[Destination]) -> tuple:
+    """render_groups() 的事件循环版本（定时发送使用，等待代币信息时不阻塞事件循环）"""
+    return render_display(data, await add_token_info_async(add_address_label(data)), message_type, destinations)
 
-    # 发送中文消息到中文群组
-    zh_chat_id = settings.get_chat_id('zh')
-    if zh_chat_id:
-        converted_data_zh = convert_params_to_text(data, 'zh')
+
+def render_display(data: dict, display: dict, message_type: int, destinations: List[Destination]) -> tuple:
+    """按分组渲染已补充信息的数据 display（返回值见 render_groups）"""
+    meta = delivery_meta(data)
+    results = {'success': [], 'failed': [], 'deliveries': []}
+    groups = []
+    topic = MESSAGE_TOPICS.get(message_type)
+
+    for (language, parse_mode, variant), group in group_destinations(destinations).items():
+        chat_ids = [destination.chat_id for destination in group]
+        thread_ids = [destination.thread_for(topic) for destination in group]
         try:
-            if message_type == 1:
-                message_zh = format_whale_trade_from_dict(converted_data_zh, language='zh')
-            else:
-                message_zh = format_liquidation_from_dict(converted_data_zh, language='zh')
-
-            zh_id = int(zh_chat_id) if not zh_chat_id.startswith('@') else zh_chat_id
-            success = loop.run_until_complete(
-                telegram_sender.send_message(
-                    chat_id=zh_id,
-                    text=message_zh,
-                    parse_mode='Markdown'
+            with span('render', language=language, chats=len(chat_ids)):
+                render = make_renderer(
+                    convert_params_to_text(display, language), language, message_type, variant, parse_mode
                 )
-            )
-            if success:
-                results['success'].append(zh_id)
-                logger.info(f"✅ Message sent to Chinese group: {zh_id}")
-            else:
-                results['failed'].append(zh_id)
+                render()
         except Exception as e:
-            logger.error(f"Failed to send to Chinese group: {e}")
-            results['failed'].append(zh_chat_id)
+            logger.error("Failed to render %s message: %s", language, e)
+            results['failed'].extend(chat_ids)
+            continue
+        groups.append((chat_ids, thread_ids, parse_mode, render))
+    return meta, groups, results
 
-    # 发送英文消息到英文群组
-    en_chat_id = settings.get_chat_id('en')
-    if en_chat_id:
-        converted_data_en = convert_params_to_text(data, 'en')
-        try:
-            if message_type == 1:
-                message_en = format_whale_trade_from_dict(converted_data_en, language='en')
-            else:
-                message_en = format_liquidation_from_dict(converted_data_en, language='en')
-
-            en_id = int(en_chat_id) if not en_chat_id.startswith('@') else en_chat_id
-            success = loop.run_until_complete(
-                telegram_sender.send_message(
-                    chat_id=en_id,
-                    text=message_en,
-                    parse_mode='Markdown'
-                )
+
+def send_to_destinations(data: dict, message_type: int, destinations: List[Destination]) -> dict:
+    """
+    把一条事件发送到多个目标
+
+    同一个渲染结果发往组内所有群组；所有发送在一次事件循环调用中并发执行。
+
+    Args:
+        data: 请求中的消息数据
+        message_type: 消息类型 (1=交易, 2=强平)
+        destinations: 发送目标
+
+    Returns:
+        dict: {'success': [...], 'failed': [...], 'deliveries': [...]}
+
+    Raises:
+        Overloaded: 发送已满，且不是高价值提醒
+    """
+    meta, groups, results = render_groups(data, message_type, destinations)
+    if groups:
+        run_send(deliver_groups(data, message_type, meta, groups, results), high_priority=is_high_value(data))
+    return results
+
+
+def permitted_destinations(destinations: List[Destination]) -> List[Destination]:
+    """按路由表发送时只发往当前API密钥允许的群组（只做校验，配额由 charge() 扣除）"""
+    if not destinations:
+        return destinations
+    allowed = set(authorize([destination.chat_id for destination in destinations], partial=True))
+    return [destination for destination in destinations if destination.chat_id in allowed]
+
+
+def schedule_destinations(data: dict, message_type: int, destinations: List[Destination], due: float) -> tuple:
+    """
+    预约在 due 时发送（发送时才计入事件历史，不做低优先级判断）
+
+    Returns:
+        tuple: (response, status_code)
+    """
+    destinations = permitted_destinations(destinations)
+    charge([destination.chat_id for destination in destinations])
+    data = {name: value for name, value in data.items() if name not in ('send_at', 'delay_seconds')}
+    return respond_scheduled('whale', {
+        'data': data,
+        'message_type': message_type,
+        'destinations': [destination.to_dict() for destination in destinations]
+    }, due)
+
+
+async def send_scheduled(item: ScheduledSend):
+    """发送到期的定时提醒（在发送事件循环中调用）"""
+    message_type = item.payload['message_type']
+    data = record_event(item.payload['data'], message_type)
+    destinations = [Destination(**destination) for destination in item.payload['destinations']]
+    meta, groups, results = await render_groups_async(data, message_type, destinations)
+    if groups:
+        await deliver_groups(data, message_type, meta, groups, results)
+    if results['failed'] and not results['success']:
+        raise RuntimeError(f"Failed to send to {', '.join(map(str, results['failed']))}")
+
+
+def is_high_value(data: dict) -> bool:
+    """金额达到 ADMISSION_HIGH_VALUE 的提醒在过载时仍然发送"""
+    value = event_value(data)
+    return value is not None and value >= settings.ADMISSION_HIGH_VALUE
+
+
+async def deliver_groups(data: dict, message_type: int, meta: dict, groups: list, results: dict):
+    """在发送事件循环中并发发送所有分组"""
+    coalesce = message_type == 1 and position_coalescer is not None
+    if coalesce:
+        key = (str(data['trader_address']).lower(), str(data['token']).upper(), str(data['direction']))
+        value_usd = float(data['value_usd'])
+
+    async def send_group(chat_ids: list, thread_ids: list, parse_mode: Optional[str], render) -> list:
+        if not coalesce:
+            batch = await telegram_sender.send_to_multiple_chats(
+                chat_ids, render(), parse_mode=parse_mode, delay_between_sends=0, meta=meta,
+                message_thread_ids=thread_ids
             )
-            if success:
-                results['success'].append(en_id)
-                logger.info(f"✅ Message sent to English group: {en_id}")
+            # 同一群组的不同话题各有一条投递记录
+            records = {(record['chat_id'], record['message_thread_id']): record for record in batch['records']}
+            return [(chat_id, records.get((chat_id, thread_id))) for chat_id, thread_id in zip(chat_ids, thread_ids)]
+
+        # 持仓合并按群组各自累计，相同累计值的渲染结果在组内共享
+        outcomes = await asyncio.gather(*(
+            position_coalescer.send(
+                chat_id, key, value_usd, render, parse_mode=parse_mode, meta=meta, message_thread_id=thread_id
+            )
+            for chat_id, thread_id in zip(chat_ids, thread_ids)
+        ), return_exceptions=True)
+        deliveries = []
+        for chat_id, thread_id, outcome in zip(chat_ids, thread_ids, outcomes):
+            if isinstance(outcome, Exception):
+                logger.error("Failed to send to chat %s: %s", chat_id, outcome)
+                deliveries.append((chat_id, None))
+            elif outcome['updated']:
+                deliveries.append((chat_id, {
+                    'chat_id': chat_id,
+                    'message_thread_id': thread_id,
+                    'message_id': outcome['message_id'],
+                    'event_id': meta['event_id'],
+                    'updated': True,
+                    'count': outcome['count'],
+                    'total': outcome['total'],
+                }))
             else:
-                results['failed'].append(en_id)
-        except Exception as e:
-            logger.error(f"Failed to send to English group: {e}")
-            results['failed'].append(en_chat_id)
+                record = outcome['record']
+                deliveries.append((chat_id, record.to_dict() if record else None))
+        return deliveries
+
+    for deliveries in await asyncio.gather(*(send_group(*group) for group in groups)):
+        for chat_id, delivery in deliveries:
+            if delivery:
+                results['success'].append(chat_id)
+                results['deliveries'].append(delivery)
+            else:
+                results['failed'].append(chat_id)
+
+
+def low_priority_action(data: dict, message_type: int) -> Optional[tuple]:
+    """
+    按代币的动态阈值判断事件优先级
+
+    低于阈值的事件不单独发送：开启摘要时并入下一次摘要，否则丢弃。
+
+    Returns:
+        tuple: 低优先级事件的 (处理方式 'digest' 或 'suppressed', 阈值)，正常事件返回None
+    """
+    value = event_value(data)
+    if threshold_tracker is None or value is None or not data.get('token'):
+        return None
+
+    admitted, threshold = threshold_tracker.observe(str(data['token']), message_type, value)
+    if admitted:
+        return None
+
+    if alert_digest is not None:
+        alert_digest.add({'token': str(data['token']).upper(), 'message_type': message_type, 'value': value})
+    action = 'digest' if alert_digest is not None else 'suppressed'
+    metrics.inc('whale_low_priority_total', action=action)
+    return action, threshold
+
+
+def check_priority(data: dict, message_type: int) -> Optional[tuple]:
+    """
+    低优先级事件的响应
+
+    Returns:
+        tuple: 低优先级事件的 (response, status_code)，正常事件返回None
+    """
+    low_priority = low_priority_action(data, message_type)
+    if low_priority is None:
+        return None
+    action, threshold = low_priority
+    return jsonify({
+        'success': True,
+        'message': f'Below dynamic threshold for {data["token"]}, {action}',
+        'low_priority': True,
+        'action': action,
+        'threshold': threshold,
+        'event_id': event_id_for(data)
+    }), 200
+
+
+async def send_digest(entries: List[dict], seconds: float):
+    """按路由表发送低优先级摘要（每个语言分组渲染一次，在发送事件循环中执行）"""
+    minutes = max(1, round(seconds / 60))
+    destinations = [d for d in get_routing_table().destinations if d.accepts(1) or d.accepts(2)]
+    for (language, parse_mode, _), group in group_destinations(destinations).items():
+        text = format_digest(entries, language, minutes, parse_mode)
+        await telegram_sender.send_to_multiple_chats(
+            [destination.chat_id for destination in group], text, parse_mode=parse_mode, delay_between_sends=0,
+            message_thread_ids=[destination.thread_for('digest') for destination in group]
+        )
+    logger.info("📋 Digest of %d low-priority events sent", len(entries))
+
+
+async def send_recap(period: str, recap: dict):
+    """按路由表发送小时/日报（每个语言分组渲染一次，在发送事件循环中执行）"""
+    destinations = [d for d in get_routing_table().destinations if d.accepts(1) or d.accepts(2)]
+    for (language, parse_mode, _), group in group_destinations(destinations).items():
+        text = format_recap(recap, language, parse_mode)
+        await telegram_sender.send_to_multiple_chats(
+            [destination.chat_id for destination in group], text, parse_mode=parse_mode, delay_between_sends=0,
+            message_thread_ids=[destination.thread_for('recap') for destination in group]
+        )
+    logger.info("📊 %s recap sent to %d chats", period.capitalize(), len(destinations))
+
+
+def send_to_both_groups(data: dict, message_type: int) -> tuple:
+    """
+    按路由表发送到所有目标群组（默认中英文两个群组，各自语言格式）；带 send_at / delay_seconds 时预约发送
+
+    Args:
+        data: 消息数据
+        message_type: 消息类型 (1=交易, 2=强平)
+
+    Returns:
+        tuple: (response, status_code)
+    """
+    due, error = parse_schedule(data)
+    if error:
+        return jsonify({
+            'success': False,
+            'error': error
+        }), 400
+    if due is not None:
+        return schedule_destinations(data, message_type, get_routing_table().destinations_for(message_type), due)
+
+    with span('route'):
+        destinations = permitted_destinations(get_routing_table().destinations_for(message_type))
+
+    # 先校验密钥、申请发送名额再扣配额，被拒绝的事件不写入历史、不计入统计和阈值
+    with admit(high_priority=is_high_value(data)):
+        charge([destination.chat_id for destination in destinations])
+        with span('record'):
+            data = record_event(data, message_type)
+        with span('priority'):
+            low_priority = check_priority(data, message_type)
+        if low_priority:
+            return low_priority
+
+        results = send_to_destinations(data, message_type, destinations)
 
     msg_type_name = 'trade' if message_type == 1 else 'liquidation'
     return jsonify({
         'success': True,
         'message': f'Whale {msg_type_name} alert sent to multiple groups',
         'sent_count': len(results['success']),
-        'failed_count': len(results['failed'])
+        'failed_count': len(results['failed']),
+        'event_id': event_id_for(data),
+        'deliveries': results['deliveries']
     }), 200
 
 
+def send_to_requested_chat(data: dict, message_type: int) -> tuple:
+    """
+    按请求中的 chat_id / language 发送（/trade 与 /liquidation 共用）；带 send_at / delay_seconds 时预约发送
+
+    Args:
+        data: 消息数据
+        message_type: 消息类型 (1=交易, 2=强平)
+
+    Returns:
+        tuple: (response, status_code)
+    """
+    msg_type_name = 'Whale trade' if message_type == 1 else 'Liquidation'
+
+    due, error = parse_schedule(data)
+    try:
+        message_thread_id = to_thread_id(data.get('message_thread_id'))
+    except ValueError as e:
+        error = error or str(e)
+    if error:
+        return jsonify({
+            'success': False,
+            'error': error
+        }), 400
+
+    # 获取目标群组和语言
+    language = data.get('language')
+    chat_id = data.get('chat_id')
+
+    # 处理 language='both' 的情况：按路由表分别发送中英文消息
+    both = not chat_id and language == 'both'
+    if both:
+        destinations = get_routing_table().destinations_for(message_type)
+    else:
+        # 确定chat_id和language
+        if not chat_id:
+            if language:
+                chat_id = settings.get_chat_id(language)
+            else:
+                chat_id = settings.DEFAULT_CHAT_ID
+                language = 'zh'  # 默认中文
+        elif not language:
+            language = 'zh'  # 如果指定了chat_id但没指定language，默认中文
+
+        if not chat_id:
+            return jsonify({
+                'success': False,
+                'error': 'No chat_id specified'
+            }), 400
+
+        chat_id = to_chat_id(chat_id)
+        destinations = [Destination(chat_id, language, message_thread_id=message_thread_id)]
+
+    if due is not None:
+        return schedule_destinations(data, message_type, destinations, due)
+    destinations = permitted_destinations(destinations)
+
+    # 先校验密钥、申请发送名额再扣配额，被拒绝的事件不写入历史、不计入统计和阈值
+    with admit(high_priority=is_high_value(data)):
+        charge([destination.chat_id for destination in destinations])
+        with span('record'):
+            data = record_event(data, message_type)
+        with span('priority'):
+            low_priority = check_priority(data, message_type)
+        if low_priority:
+            return low_priority
+
+        # 根据语言生成对应格式的消息并发送
+        results = send_to_destinations(data, message_type, destinations)
+
+    if both:
+        return jsonify({
+            'success': True,
+            'message': f'{msg_type_name} alert sent to multiple groups',
+            'sent_count': len(results['success']),
+            'failed_count': len(results['failed']),
+            'event_id': event_id_for(data),
+            'deliveries': results['deliveries']
+        }), 200
+
+    if results['deliveries']:
+        delivery = results['deliveries'][0]
+        return jsonify({
+            'success': True,
+            'message': f'{msg_type_name} alert sent successfully',
+            'chat_id': chat_id,
+            'event_id': delivery['event_id'],
+            'delivery': delivery
+        }), 200
+    else:
+        return jsonify({
+            'success': False,
+            'error': 'Failed to send message'
+        }), 500
+
+
 @whale_bp.route('/trade', methods=['POST'])
 def send_whale_trade():
     """
@@ -259,7 +888,8 @@ def send_whale_trade():
             "token": "BTC",
             "direction": "做多 (Long)",  // "做多 (Long)" 或 "做空 (Short)"（中文）; "Long" 或 "Short"（英文）
             "trader_address": "0x1234567890abcdef1234567890abcdef12345678",
-            "language": "zh"  // 可选: "zh", "en", "both"
+            "language": "zh",  // 可选: "zh", "en", "both"
+            "message_thread_id": 11  // 可选，指定 chat_id 时发往该群组的话题
         }
 
     Returns:
@@ -275,7 +905,8 @@ def send_whale_trade():
         }), 500
 
     try:
-        data = request.get_json()
+        with span('parse'):
+            data = request.get_json()
 
         if not data:
             return jsonify({
@@ -293,120 +924,17 @@ def send_whale_trade():
                 'error': f'Missing required fields: {", ".join(missing_fields)}'
             }), 400
 
-        # 获取目标群组和语言
-        language = data.get('language')
-        chat_id = data.get('chat_id')
-
-        # 处理 language='both' 的情况：分别发送中英文消息
-        if not chat_id and language == 'both':
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-
-            results = {'success': [], 'failed': []}
-
-            # 发送中文消息到中文群组
-            zh_chat_id = settings.get_chat_id('zh')
-            if zh_chat_id:
-                message_zh = format_whale_trade_from_dict(data, language='zh')
-                try:
-                    zh_id = int(zh_chat_id) if not zh_chat_id.startswith('@') else zh_chat_id
-                    success = loop.run_until_complete(
-                        telegram_sender.send_message(
-                            chat_id=zh_id,
-                            text=message_zh,
-                            parse_mode='Markdown'
-                        )
-                    )
-                    if success:
-                        results['success'].append(zh_id)
-                        logger.info(f"✅ Whale trade sent to Chinese group: {zh_id}")
-                    else:
-                        results['failed'].append(zh_id)
-                except Exception as e:
-                    logger.error(f"Failed to send to Chinese group: {e}")
-                    results['failed'].append(zh_chat_id)
-
-            # 发送英文消息到英文群组
-            en_chat_id = settings.get_chat_id('en')
-            if en_chat_id:
-                message_en = format_whale_trade_from_dict(data, language='en')
-                try:
-                    en_id = int(en_chat_id) if not en_chat_id.startswith('@') else en_chat_id
-                    success = loop.run_until_complete(
-                        telegram_sender.send_message(
-                            chat_id=en_id,
-                            text=message_en,
-                            parse_mode='Markdown'
-                        )
-                    )
-                    if success:
-                        results['success'].append(en_id)
-                        logger.info(f"✅ Whale trade sent to English group: {en_id}")
-                    else:
-                        results['failed'].append(en_id)
-                except Exception as e:
-                    logger.error(f"Failed to send to English group: {e}")
-                    results['failed'].append(en_chat_id)
+        invalid = invalid_value(data)
+        if invalid:
+            return invalid
 
-            return jsonify({
-                'success': True,
-                'message': 'Whale trade alert sent to multiple groups',
-                'sent_count': len(results['success']),
-                'failed_count': len(results['failed'])
-            }), 200
-
-        # 确定chat_id和language
-        if not chat_id:
-            if language:
-                chat_id = settings.get_chat_id(language)
-            else:
-                chat_id = settings.DEFAULT_CHAT_ID
-                language = 'zh'  # 默认中文
-        elif not language:
-            language = 'zh'  # 如果指定了chat_id但没指定language，默认中文
-
-        if not chat_id:
-            return jsonify({
-                'success': False,
-                'error': 'No chat_id specified'
-            }), 400
-
-        # 根据语言生成对应格式的消息
-        message = format_whale_trade_from_dict(data, language=language)
-
-        # 转换chat_id
-        try:
-            if isinstance(chat_id, str) and not chat_id.startswith('@'):
-                chat_id = int(chat_id)
-        except ValueError:
-            pass
-
-        # 发送消息
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        success = loop.run_until_complete(
-            telegram_sender.send_message(
-                chat_id=chat_id,
-                text=message,
-                parse_mode='Markdown'
-            )
-        )
-
-        if success:
-            logger.info(f"✅ Whale trade alert sent to {chat_id} ({language})")
-            return jsonify({
-                'success': True,
-                'message': 'Whale trade alert sent successfully',
-                'chat_id': chat_id
-            }), 200
-        else:
-            return jsonify({
-                'success': False,
-                'error': 'Failed to send message'
-            }), 500
+        return send_to_requested_chat(data, message_type=1)
 
+    except (Overloaded, AccessDenied):
+        # 由应用返回 429 / 403
+        raise
     except Exception as e:
-        logger.error(f"❌ Error sending whale trade alert: {e}", exc_info=True)
+        logger.error("❌ Error sending whale trade alert: %s", e, exc_info=True)
         return jsonify({
             'success': False,
             'error': str(e)
@@ -425,7 +953,8 @@ def send_liquidation():
             "position_value": 3450000,
             "liquidation_price": 2980.50,
             "trader_address": "0x1234567890abcdef1234567890abcdef12345678",
-            "language": "zh"  // 可选: "zh", "en", "both"
+            "language": "zh",  // 可选: "zh", "en", "both"
+            "message_thread_id": 11  // 可选，指定 chat_id 时发往该群组的话题
         }
 
     Returns:
@@ -441,7 +970,8 @@ def send_liquidation():
         }), 500
 
     try:
-        data = request.get_json()
+        with span('parse'):
+            data = request.get_json()
 
         if not data:
             return jsonify({
@@ -459,121 +989,82 @@ def send_liquidation():
                 'error': f'Missing required fields: {", ".join(missing_fields)}'
             }), 400
 
-        # 获取目标群组和语言
-        language = data.get('language')
-        chat_id = data.get('chat_id')
-
-        # 处理 language='both' 的情况：分别发送中英文消息
-        if not chat_id and language == 'both':
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-
-            results = {'success': [], 'failed': []}
-
-            # 发送中文消息到中文群组
-            zh_chat_id = settings.get_chat_id('zh')
-            if zh_chat_id:
-                message_zh = format_liquidation_from_dict(data, language='zh')
-                try:
-                    zh_id = int(zh_chat_id) if not zh_chat_id.startswith('@') else zh_chat_id
-                    success = loop.run_until_complete(
-                        telegram_sender.send_message(
-                            chat_id=zh_id,
-                            text=message_zh,
-                            parse_mode='Markdown'
-                        )
-                    )
-                    if success:
-                        results['success'].append(zh_id)
-                        logger.info(f"✅ Liquidation alert sent to Chinese group: {zh_id}")
-                    else:
-                        results['failed'].append(zh_id)
-                except Exception as e:
-                    logger.error(f"Failed to send to Chinese group: {e}")
-                    results['failed'].append(zh_chat_id)
-
-            # 发送英文消息到英文群组
-            en_chat_id = settings.get_chat_id('en')
-            if en_chat_id:
-                message_en = format_liquidation_from_dict(data, language='en')
-                try:
-                    en_id = int(en_chat_id) if not en_chat_id.startswith('@') else en_chat_id
-                    success = loop.run_until_complete(
-                        telegram_sender.send_message(
-                            chat_id=en_id,
-                            text=message_en,
-                            parse_mode='Markdown'
-                        )
-                    )
-                    if success:
-                        results['success'].append(en_id)
-                        logger.info(f"✅ Liquidation alert sent to English group: {en_id}")
-                    else:
-                        results['failed'].append(en_id)
-                except Exception as e:
-                    logger.error(f"Failed to send to English group: {e}")
-                    results['failed'].append(en_chat_id)
+        invalid = invalid_value(data)
+        if invalid:
+            return invalid
 
-            return jsonify({
-                'success': True,
-                'message': 'Liquidation alert sent to multiple groups',
-                'sent_count': len(results['success']),
-                'failed_count': len(results['failed'])
-            }), 200
+        return send_to_requested_chat(data, message_type=2)
 
-        # 确定chat_id和language
-        if not chat_id:
-            if language:
-                chat_id = settings.get_chat_id(language)
-            else:
-                chat_id = settings.DEFAULT_CHAT_ID
-                language = 'zh'  # 默认中文
-        elif not language:
-            language = 'zh'  # 如果指定了chat_id但没指定language，默认中文
+    except (Overloaded, AccessDenied):
+        # 由应用返回 429 / 403
+        raise
+    except Exception as e:
+        logger.error("❌ Error sending liquidation alert: %s", e, exc_info=True)
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
 
-        if not chat_id:
-            return jsonify({
-                'success': False,
-                'error': 'No chat_id specified'
-            }), 400
 
-        # 根据语言生成对应格式的消息
-        message = format_liquidation_from_dict(data, language=language)
+@whale_bp.route('/thresholds', methods=['GET'])
+def get_thresholds():
+    """
+    查看各代币当前的动态阈值
 
-        # 转换chat_id
-        try:
-            if isinstance(chat_id, str) and not chat_id.startswith('@'):
-                chat_id = int(chat_id)
-        except ValueError:
-            pass
-
-        # 发送消息
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        success = loop.run_until_complete(
-            telegram_sender.send_message(
-                chat_id=chat_id,
-                text=message,
-                parse_mode='Markdown'
-            )
-        )
+    Query:
+        token: 可选，只返回该代币
+    """
+    if threshold_tracker is None:
+        return jsonify({
+            'success': False,
+            'error': 'Dynamic thresholds are disabled'
+        }), 404
 
-        if success:
-            logger.info(f"✅ Liquidation alert sent to {chat_id} ({language})")
-            return jsonify({
-                'success': True,
-                'message': 'Liquidation alert sent successfully',
-                'chat_id': chat_id
-            }), 200
-        else:
-            return jsonify({
-                'success': False,
-                'error': 'Failed to send message'
-            }), 500
+    return jsonify({
+        'success': True,
+        'percentile': threshold_tracker.percentile,
+        'window_seconds': threshold_tracker.window,
+        'min_samples': threshold_tracker.min_samples,
+        'pending_digest': len(alert_digest) if alert_digest is not None else None,
+        'thresholds': threshold_tracker.snapshot(request.args.get('token'))
+    }), 200
 
-    except Exception as e:
-        logger.error(f"❌ Error sending liquidation alert: {e}", exc_info=True)
+
+@whale_bp.route('/stats', methods=['GET'])
+def get_stats():
+    """
+    交易员和代币的滚动窗口统计（1m/15m/1h/24h）
+
+    Query:
+        token: 可选，代币符号
+        trader: 可选，交易员地址
+        limit: 两者都未指定时返回的代币排行数量，默认10
+
+    Returns:
+        {
+            "success": true,
+            "token": {"1m": {...}, "15m": {...}, "1h": {...}, "24h": {...}},
+            "trader": {...},
+            "tracked": {"traders": 120, "tokens": 18}
+        }
+    """
+    if aggregate_stats is None:
         return jsonify({
             'success': False,
-            'error': str(e)
-        }), 500
+            'error': 'Whale stats are disabled'
+        }), 404
+
+    try:
+        limit = min(int(request.args.get('limit', 10)), 100)
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'error': 'Invalid limit'
+        }), 400
+
+    snapshot = aggregate_stats.snapshot(
+        token=request.args.get('token'),
+        trader=request.args.get('trader'),
+        limit=limit
+    )
+    return jsonify(dict(snapshot, success=True)), 200
@@ -1,23 +1,181 @@
 """
 日志配置模块
+
+导入本模块没有副作用，应用启动时调用 setup_logging() 完成配置。
+
+日志记录不在请求线程中格式化和输出：
+    - 请求线程只把日志记录放入内存队列，由后台线程格式化并写出
+    - 支持结构化JSON输出，附带 chat_id、route、latency_ms、attempt 等字段
+    - 高并发时对成功日志采样，失败日志始终保留
 """
+import contextvars
+import json
 import logging
+import logging.handlers
+import queue
 import sys
-from api.config import settings
+import time
 
-# 配置日志格式
+# 日志格式
 log_format = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 
-# 配置根日志记录器
-logging.basicConfig(
-    format=log_format,
-    level=getattr(logging, settings.LOG_LEVEL),
-    stream=sys.stdout
-)
-
-# 创建应用日志记录器
+# 应用日志记录器
 logger = logging.getLogger('telegram_api')
 
-# 配置httpx日志级别（避免太多HTTP日志）
-logging.getLogger('httpx').setLevel(logging.WARNING)
-logging.getLogger('telegram').setLevel(logging.WARNING)
+# 当前请求的日志上下文（如 route），由调度器传递到发送事件循环
+log_context: contextvars.ContextVar = contextvars.ContextVar('log_context', default={})
+
+# 标记可采样的成功日志: logger.info("...", extra=SAMPLED)
+SAMPLED = {'sample': True}
+
+# LogRecord的内置属性，其余属性视为结构化字段
+_RESERVED_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'sample'}
+
+_configured = False
+_listener = None
+_stream_handler = None
+
+
+def bind_log_context(**fields):
+    """为当前上下文（请求）绑定结构化日志字段"""
+    log_context.set({**log_context.get(), **fields})
+
+
+class ContextFilter(logging.Filter):
+    """把当前上下文中的字段附加到日志记录"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        for key, value in log_context.get().items():
+            if not hasattr(record, key):
+                setattr(record, key, value)
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    成功日志采样
+
+    每秒前 burst 条可采样日志全部保留，超出部分每 rate 条保留1条；
+    未标记为可采样的日志（警告、错误等）不受影响。
+    """
+
+    def __init__(self, burst: int = 50, rate: int = 100):
+        super().__init__()
+        self.burst = burst
+        self.rate = max(rate, 1)
+        self._second = 0
+        self._count = 0
+        self.dropped = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not getattr(record, 'sample', False):
+            return True
+        second = int(record.created)
+        if second != self._second:
+            self._second = second
+            self._count = 0
+        self._count += 1
+        if self._count <= self.burst or self._count % self.rate == 0:
+            return True
+        self.dropped += 1
+        return False
+
+
+class JsonFormatter(logging.Formatter):
+    """结构化JSON日志格式"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + f'.{int(record.msecs):03d}Z',
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class AsyncQueueHandler(logging.handlers.QueueHandler):
+    """
+    非阻塞队列日志处理器
+
+    与标准QueueHandler不同，入队前不格式化消息，格式化在后台线程完成；
+    队列满时丢弃日志而不是阻塞请求线程。
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def setup_logging(
+    level: str = None,
+    fmt: str = None,
+    sample_burst: int = None,
+    sample_rate: int = None,
+    queue_size: int = 10000
+):
+    """
+    配置根日志记录器（重复调用无副作用）
+
+    Args:
+        level: 日志级别，默认读取配置中的 LOG_LEVEL
+        fmt: 'text' 或 'json'，默认读取配置中的 LOG_FORMAT
+        sample_burst: 每秒全部保留的成功日志条数
+        sample_rate: 超出后每多少条成功日志保留1条
+        queue_size: 日志队列容量
+    """
+    global _configured, _listener, _stream_handler
+    if _configured:
+        return
+
+    from api.config import settings
+    level = level or settings.LOG_LEVEL
+    fmt = fmt or settings.LOG_FORMAT
+    sample_burst = settings.LOG_SAMPLE_BURST if sample_burst is None else sample_burst
+    sample_rate = settings.LOG_SAMPLE_RATE if sample_rate is None else sample_rate
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JsonFormatter() if fmt == 'json' else logging.Formatter(log_format))
+
+    log_queue = queue.Queue(maxsize=queue_size)
+    queue_handler = AsyncQueueHandler(log_queue)
+    queue_handler.addFilter(ContextFilter())
+    queue_handler.addFilter(SamplingFilter(sample_burst, sample_rate))
+
+    root = logging.getLogger()
+    root.setLevel(getattr(logging, level.upper(), logging.INFO))
+    root.handlers[:] = [queue_handler]
+
+    _stream_handler = stream_handler
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    _listener.start()
+
+    # 配置httpx日志级别（避免太多HTTP日志）
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+    logging.getLogger('telegram').setLevel(logging.WARNING)
+
+    _configured = True
+
+
+def shutdown_logging():
+    """停止后台写日志线程并写出队列中剩余的日志，之后的日志直接同步输出"""
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    _listener = None
+    logging.getLogger().handlers[:] = [_stream_handler]
@@ -0,0 +1,409 @@
+"""
+Markdown工具模块
+提供Telegram消息文本的实体扫描、校验、转义与安全分段
+"""
+import bisect
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+# Telegram单条消息最大长度（按UTF-16编码单元计算）
+MAX_MESSAGE_LENGTH = 4096
+
+# 支持的解析模式
+PARSE_MODES = ('Markdown', 'MarkdownV2', 'HTML')
+
+# Markdown(旧版)中可被反斜杠转义的字符
+MARKDOWN_ESCAPABLE = '_*`['
+
+# MarkdownV2中可被反斜杠转义的字符
+MARKDOWN_V2_ESCAPABLE = '_*[]()~`>#+-=|{}.!\\'
+
+# MarkdownV2的格式标记（长标记在前，保证优先匹配）
+MARKDOWN_V2_MARKERS = ('__', '||', '*', '_', '~')
+
+# MarkdownV2中必须转义的保留字符
+MARKDOWN_V2_RESERVED = '_*[]()~`>#+-=|{}.!'
+
+# 实体栈元素: (开始标记, 结束标记, 开始位置)
+Entity = Tuple[str, str, int]
+
+
+def utf16_length(text: str) -> int:
+    """按Telegram的计数方式（UTF-16编码单元）计算文本长度"""
+    return len(text.encode('utf-16-le')) // 2
+
+
+def _scan(text: str, parse_mode: Optional[str]) -> Tuple[bytearray, list, list]:
+    """
+    扫描文本中的实体
+
+    Args:
+        text: 消息文本
+        parse_mode: 解析模式
+
+    Returns:
+        tuple: (breakable, stacks, strays)
+            breakable[i] 为1表示可以在位置i之前切分
+            stacks[i] 为位置i处尚未闭合的实体栈
+            strays 为会导致Telegram解析失败的孤立字符位置
+    """
+    n = len(text)
+    breakable = bytearray(n + 1)
+    stacks = [()] * (n + 1)
+    strays = []
+    breakable[n] = 1
+
+    if parse_mode not in PARSE_MODES:
+        for i in range(n + 1):
+            breakable[i] = 1
+        return breakable, stacks, strays
+
+    stack: Tuple[Entity, ...] = ()
+    i = 0
+    while i < n:
+        breakable[i] = 1
+        stacks[i] = stack
+        if parse_mode == 'HTML':
+            i, stack = _scan_html(text, i, stack, strays)
+        else:
+            i, stack = _scan_markdown(text, i, stack, parse_mode == 'MarkdownV2', strays)
+
+    stacks[n] = stack
+    return breakable, stacks, strays
+
+
+def _scan_markdown(text: str, i: int, stack: tuple, v2: bool, strays: list) -> Tuple[int, tuple]:
+    """扫描Markdown/MarkdownV2中位置i开始的一个原子片段，返回下一个位置和新的实体栈"""
+    n = len(text)
+    c = text[i]
+
+    # 代码块/行内代码内部只识别结束标记
+    if stack and stack[-1][1] in ('```', '`'):
+        closer = stack[-1][1]
+        if v2 and c == '\\' and i + 1 < n:
+            return i + 2, stack
+        if text.startswith(closer, i):
+            return i + len(closer), stack[:-1]
+        return i + 1, stack
+
+    escapable = MARKDOWN_V2_ESCAPABLE if v2 else MARKDOWN_ESCAPABLE
+    if c == '\\' and i + 1 < n and text[i + 1] in escapable:
+        return i + 2, stack
+
+    # 旧版Markdown不支持嵌套，实体内部只识别结束标记
+    if not v2 and stack:
+        closer = stack[-1][1]
+        if text.startswith(closer, i):
+            return i + len(closer), stack[:-1]
+        return i + 1, stack
+
+    if text.startswith('```', i):
+        # 语言标识与换行作为开始标记的一部分，续段时原样补回
+        end = text.find('\n', i + 3)
+        lang = text[i + 3:end] if end != -1 else ''
+        if end != -1 and (not lang or lang.replace('-', '').replace('+', '').isalnum()):
+            opener = text[i:end + 1]
+        else:
+            opener = '```'
+        return i + len(opener), stack + ((opener, '```', i),)
+
+    if c == '`':
+        return i + 1, stack + (('`', '`', i),)
+
+    if c == '[':
+        # 链接整体不可切分
+        close = text.find('](', i + 1)
+        end = text.find(')', close + 2) if close != -1 else -1
+        if end != -1 and '\n' not in text[i:close]:
+            return end + 1, stack
+        strays.append(i)
+        return i + 1, stack
+
+    markers = MARKDOWN_V2_MARKERS if v2 else ('*', '_')
+    for marker in markers:
+        if text.startswith(marker, i):
+            if stack and stack[-1][1] == marker:
+                return i + len(marker), stack[:-1]
+            return i + len(marker), stack + ((marker, marker, i),)
+
+    if v2 and c in MARKDOWN_V2_RESERVED:
+        strays.append(i)
+
+    return i + 1, stack
+
+
+def _scan_html(text: str, i: int, stack: tuple, strays: list) -> Tuple[int, tuple]:
+    """扫描HTML中位置i开始的一个原子片段，返回下一个位置和新的实体栈"""
+    c = text[i]
+
+    if c == '&':
+        end = text.find(';', i + 1, i + 12)
+        if end != -1 and text[i + 1:end].replace('#', '').isalnum():
+            return end + 1, stack
+        strays.append(i)
+        return i + 1, stack
+
+    if c == '<':
+        end = text.find('>', i + 1)
+        if end == -1:
+            strays.append(i)
+            return i + 1, stack
+        tag = text[i:end + 1]
+        body = tag[1:-1].strip()
+        if body.startswith('/'):
+            name = body[1:].strip().lower()
+            if stack and stack[-1][1] == f'</{name}>':
+                return end + 1, stack[:-1]
+            strays.append(i)
+            return end + 1, stack
+        name = body.split()[0].lower() if body else ''
+        if name and not body.endswith('/'):
+            return end + 1, stack + ((tag, f'</{name}>', i),)
+        strays.append(i)
+        return end + 1, stack
+
+    if c == '>':
+        strays.append(i)
+
+    return i + 1, stack
+
+
+def _break_rank(text: str, pos: int) -> int:
+    """切分点优先级：段落 > 换行 > 空格 > 其他"""
+    if pos >= 2 and text[pos - 2:pos] == '\n\n':
+        return 3
+    if pos >= 1 and text[pos - 1] == '\n':
+        return 2
+    if pos >= 1 and text[pos - 1] == ' ':
+        return 1
+    return 0
+
+
+def split_message(
+    text: str,
+    parse_mode: Optional[str] = 'Markdown',
+    max_length: int = MAX_MESSAGE_LENGTH
+) -> List[str]:
+    """
+    将超长消息按Markdown安全边界切分为多段
+
+    优先在段落、换行、空格处切分，不会切断链接、转义字符或HTML标签；
+    当某个实体（如代码块）本身超长时，在切分处闭合实体并在下一段重新打开。
+
+    Args:
+        text: 消息文本
+        parse_mode: 解析模式
+        max_length: 每段最大长度
+
+    Returns:
+        List[str]: 切分后的消息段列表
+    """
+    if utf16_length(text) <= max_length:
+        return [text]
+
+    breakable, stacks, _ = _scan(text, parse_mode)
+
+    # UTF-16长度前缀和，用于按Telegram计数方式确定切分窗口
+    offsets = [0]
+    total = 0
+    for ch in text:
+        total += 2 if ord(ch) > 0xFFFF else 1
+        offsets.append(total)
+
+    parts = []
+    n = len(text)
+    start = 0
+    while start < n:
+        prefix = ''.join(entity[0] for entity in stacks[start])
+        budget = max_length - utf16_length(prefix)
+        if offsets[n] - offsets[start] <= budget:
+            parts.append(prefix + text[start:])
+            break
+
+        end = bisect.bisect_right(offsets, offsets[start] + budget) - 1
+        end = min(end, n)
+        cut = _find_cut(text, breakable, stacks, start, end, budget, offsets)
+
+        suffix = ''.join(entity[1] for entity in reversed(stacks[cut]))
+        chunk = prefix + text[start:cut] + suffix
+        if not stacks[cut]:
+            chunk = chunk.rstrip()
+        if chunk.strip():
+            parts.append(chunk)
+
+        start = cut
+        if not stacks[start]:
+            while start < n and text[start] == '\n':
+                start += 1
+
+    return parts
+
+
+def _find_cut(
+    text: str,
+    breakable: bytearray,
+    stacks: list,
+    start: int,
+    end: int,
+    budget: int,
+    offsets: list
+) -> int:
+    """在[start, end]窗口内选择最佳切分点（需为闭合标记留出空间）"""
+    def fits(pos: int) -> bool:
+        suffix_len = sum(len(entity[1]) for entity in stacks[pos])
+        return offsets[pos] - offsets[start] + suffix_len <= budget
+
+    best = None
+    best_rank = -1
+    floor = start + max((end - start) // 2, 1)
+    for pos in range(end, start, -1):
+        if not breakable[pos] or not fits(pos):
+            continue
+        rank = _break_rank(text, pos)
+        # 无实体跨越的切分点优先
+        if not stacks[pos]:
+            rank += 4
+        if rank > best_rank:
+            best, best_rank = pos, rank
+        if pos <= floor and best is not None:
+            break
+        if best_rank == 7:
+            break
+
+    if best is None:
+        # 没有安全切分点时强制切分，保证前进
+        best = max(end, start + 1)
+    return best
+
+
+def escape_markdown(text: str, parse_mode: Optional[str] = 'Markdown') -> str:
+    """
+    转义文本中的Markdown特殊字符，用于把代币符号、地址等动态内容安全地嵌入消息
+
+    Args:
+        text: 原始文本
+        parse_mode: 'Markdown'、'MarkdownV2' 或 'HTML'
+
+    Returns:
+        str: 转义后的文本
+    """
+    if parse_mode == 'MarkdownV2':
+        chars = MARKDOWN_V2_ESCAPABLE
+    elif parse_mode == 'Markdown':
+        chars = MARKDOWN_ESCAPABLE
+    elif parse_mode == 'HTML':
+        return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+    else:
+        return text
+    return ''.join('\\' + c if c in chars else c for c in text)
+
+
+def find_markdown_errors(text: str, parse_mode: Optional[str] = 'Markdown') -> List[int]:
+    """
+    本地校验消息能否被Telegram解析
+
+    Args:
+        text: 消息文本
+        parse_mode: 解析模式
+
+    Returns:
+        List[int]: 导致解析失败的字符位置（未闭合实体的开始标记和孤立保留字符），
+            为空表示校验通过
+    """
+    if parse_mode not in PARSE_MODES:
+        return []
+    _, stacks, strays = _scan(text, parse_mode)
+    return sorted(set(strays) | {entity[2] for entity in stacks[len(text)]})
+
+
+def _fix_markdown(text: str, parse_mode: str) -> Optional[str]:
+    """转义出错位置的字符，修复失败返回None"""
+    for _ in range(3):
+        errors = find_markdown_errors(text, parse_mode)
+        if not errors:
+            return text
+        chunks = []
+        last = 0
+        for pos in errors:
+            chunks.append(text[last:pos])
+            chunks.append('\\')
+            last = pos
+        chunks.append(text[last:])
+        text = ''.join(chunks)
+    return None
+
+
+class SanitizeCache:
+    """
+    消息校验结果的LRU缓存
+
+    以文本哈希为键，相同模板反复发送时只需校验一次。
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            if len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+_sanitize_cache = SanitizeCache()
+
+
+def sanitize_message(text: str, parse_mode: Optional[str] = 'Markdown') -> Tuple[str, Optional[str], str]:
+    """
+    发送前校验并修复消息
+
+    Markdown/MarkdownV2中未闭合的标记和孤立保留字符会被自动转义；
+    无法修复的消息（包括HTML标签不匹配）降级为纯文本发送。
+
+    Args:
+        text: 消息文本
+        parse_mode: 解析模式
+
+    Returns:
+        tuple: (文本, 解析模式, 处理结果)，处理结果为 'ok'、'fixed' 或 'plain'
+    """
+    if parse_mode not in PARSE_MODES:
+        return text, parse_mode, 'ok'
+
+    key = (hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest(), parse_mode)
+    cached = _sanitize_cache.get(key)
+    if cached is not None:
+        return cached
+
+    if not find_markdown_errors(text, parse_mode):
+        result = (text, parse_mode, 'ok')
+    else:
+        fixed = _fix_markdown(text, parse_mode) if parse_mode != 'HTML' else None
+        if fixed is not None:
+            result = (fixed, parse_mode, 'fixed')
+        else:
+            result = (text, None, 'plain')
+
+    _sanitize_cache.put(key, result)
+    return result
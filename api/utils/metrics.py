@@ -0,0 +1,70 @@
+"""
+指标统计模块
+进程内计数器，供 /metrics 接口导出
+"""
+import threading
+from collections import defaultdict
+from typing import Dict, Tuple
+
+
+class Metrics:
+    """
+    线程安全的计数器集合
+
+    每个计数器由名称和一组标签唯一确定。
+    """
+
+    def __init__(self):
+        self._counters: Dict[Tuple[str, tuple], float] = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, value: float = 1, **labels):
+        """
+        计数器加值
+
+        Args:
+            name: 指标名称
+            value: 增加的值
+            **labels: 指标标签
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] += value
+
+    def get(self, name: str, **labels) -> float:
+        """获取计数器当前值"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            return self._counters.get(key, 0)
+
+    def snapshot(self) -> dict:
+        """
+        导出所有计数器
+
+        Returns:
+            dict: {指标名称: [{'labels': {...}, 'value': 值}, ...]}
+        """
+        with self._lock:
+            items = list(self._counters.items())
+
+        result = defaultdict(list)
+        for (name, labels), value in sorted(items):
+            result[name].append({'labels': dict(labels), 'value': value})
+        return dict(result)
+
+    def render_prometheus(self) -> str:
+        """以Prometheus文本格式导出"""
+        lines = []
+        for name, series in self.snapshot().items():
+            lines.append(f"# TYPE {name} counter")
+            for item in series:
+                if item['labels']:
+                    labels = ','.join(f'{k}="{v}"' for k, v in item['labels'].items())
+                    lines.append(f"{name}{{{labels}}} {item['value']:g}")
+                else:
+                    lines.append(f"{name} {item['value']:g}")
+        return '\n'.join(lines) + '\n'
+
+
+# 全局指标实例
+metrics = Metrics()
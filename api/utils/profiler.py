@@ -0,0 +1,246 @@
+"""
+采样分析模块
+
+线上延迟突增时在运行中的进程内做统计采样，不需要重启或附加外部工具：
+    - StackSampler: 每隔 interval 秒记录所有线程（包括发送事件循环线程）的调用栈，
+      输出 collapsed stacks（flamegraph.pl / speedscope 可直接读取）。
+      在主线程中调用时用信号定时器采样：墙钟时间用 SIGALRM（包括等待I/O的时间），
+      CPU时间用 SIGPROF（只在进程忙时采样）；其他线程中无法安装信号处理函数，
+      改用后台线程按墙钟时间采样
+    - LoopMonitor: 事件循环中的心跳协程测量调度延迟（lag），看门狗线程发现心跳停滞超过阈值时
+      抓取事件循环线程的调用栈，即阻塞事件循环的慢回调
+"""
+import asyncio
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter, deque
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+# 同一时间只允许一次采样
+_profile_lock = threading.Lock()
+
+# 采样时钟: 名称 -> (定时器, 信号)
+CLOCKS = {
+    'wall': ('ITIMER_REAL', 'SIGALRM'),
+    'cpu': ('ITIMER_PROF', 'SIGPROF'),
+}
+
+
+def _frame_label(code) -> str:
+    # co_qualname 只在 Python 3.11+ 提供（Docker镜像使用3.9）
+    return f"{getattr(code, 'co_qualname', code.co_name)} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _stack(frame, limit: int = 128) -> tuple:
+    """从栈底到栈顶的代码对象"""
+    codes = []
+    while frame is not None and len(codes) < limit:
+        codes.append(frame.f_code)
+        frame = frame.f_back
+    codes.reverse()
+    return tuple(codes)
+
+
+class StackSampler:
+    """
+    全线程调用栈采样器
+    """
+
+    def __init__(self, interval: float = 0.005, clock: str = 'wall'):
+        """
+        Args:
+            interval: 采样间隔（秒）
+            clock: 'wall' 按墙钟时间采样，'cpu' 按进程CPU时间采样（只在信号模式下可用）
+        """
+        if clock not in CLOCKS:
+            raise ValueError(f"Unknown profile clock: {clock}")
+        self.interval = interval
+        self.clock = clock
+        self.samples: Counter = Counter()
+        self.count = 0
+        self.mode = None
+        self._ignore = set()
+        self._names: Dict[int, str] = {}
+
+    def _sample(self, *_):
+        ignore = self._ignore
+        for ident, frame in sys._current_frames().items():
+            if ident not in ignore:
+                self.samples[(ident, _stack(frame))] += 1
+        self.count += 1
+
+    def run(self, seconds: float):
+        """采样 seconds 秒（阻塞调用线程）"""
+        if not _profile_lock.acquire(blocking=False):
+            raise RuntimeError("Another profile is already running")
+        try:
+            if threading.current_thread() is threading.main_thread() and hasattr(signal, 'setitimer'):
+                self._run_signal(seconds)
+            elif self.clock == 'wall':
+                self._run_thread(seconds)
+            else:
+                raise ValueError("CPU-time sampling needs the main thread (gunicorn sync worker)")
+        finally:
+            # 线程名在线程退出后就取不到了，采样结束时记下
+            self._names = {thread.ident: thread.name for thread in threading.enumerate()}
+            _profile_lock.release()
+
+    def _run_signal(self, seconds: float):
+        self.mode = 'signal'
+        timer, signum = (getattr(signal, name) for name in CLOCKS[self.clock])
+        # 主线程在等待，本身的栈没有意义
+        self._ignore = {threading.get_ident()}
+        previous = signal.signal(signum, self._sample)
+        signal.setitimer(timer, self.interval, self.interval)
+        try:
+            time.sleep(seconds)
+        finally:
+            signal.setitimer(timer, 0, 0)
+            signal.signal(signum, previous)
+
+    def _run_thread(self, seconds: float):
+        self.mode = 'thread'
+        stopped = threading.Event()
+
+        def loop():
+            while not stopped.wait(self.interval):
+                self._sample()
+
+        sampler = threading.Thread(target=loop, name='stack-sampler', daemon=True)
+        sampler.start()
+        self._ignore = {threading.get_ident(), sampler.ident}
+        try:
+            time.sleep(seconds)
+        finally:
+            stopped.set()
+            sampler.join()
+
+    def collapsed(self) -> str:
+        """collapsed stacks: 每行 '线程;栈底;...;栈顶 次数'"""
+        lines = []
+        for (ident, codes), count in self.samples.most_common():
+            frames = [self._names.get(ident, f"thread-{ident}")] + [_frame_label(code) for code in codes]
+            lines.append(f"{';'.join(frame.replace(';', ':') for frame in frames)} {count}")
+        return '\n'.join(lines) + '\n'
+
+    def top(self, limit: int = 20) -> List[dict]:
+        """按自身样本数排序的函数（栈顶为该函数的样本）和包含子调用的总样本数"""
+        own, total = Counter(), Counter()
+        for (_, codes), count in self.samples.items():
+            if not codes:
+                continue
+            own[codes[-1]] += count
+            for code in set(codes):
+                total[code] += count
+        return [
+            {'function': _frame_label(code), 'self': count, 'total': total[code]}
+            for code, count in own.most_common(limit)
+        ]
+
+
+class LoopMonitor:
+    """
+    事件循环延迟和慢回调监控
+    """
+
+    def __init__(
+        self,
+        interval: float = 0.1,
+        slow_callback: float = 0.1,
+        keep: int = 50,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        Args:
+            interval: 心跳间隔（秒）
+            slow_callback: 心跳停滞超过该时间时记录事件循环线程的调用栈（秒）
+            keep: 保留最近的慢回调条数
+            clock: 时钟函数
+        """
+        self.interval = interval
+        self.slow_callback = slow_callback
+        self.clock = clock
+        # 最近的延迟样本 (时间, 延迟秒数)，约10分钟
+        self.lags: deque = deque(maxlen=max(int(600 / interval), 1))
+        self.slow_callbacks: deque = deque(maxlen=keep)
+        self._heartbeat = clock()
+        self._loop_thread: Optional[int] = None
+        self._captured = False
+
+    async def run(self, stopping: Callable[[], bool]):
+        """在被监控的事件循环中运行心跳，同时启动看门狗线程"""
+        self._loop_thread = threading.get_ident()
+        self._heartbeat = self.clock()
+        watchdog = threading.Thread(target=self._watch, args=(stopping,), name='loop-watchdog', daemon=True)
+        watchdog.start()
+        while not stopping():
+            expected = self.clock() + self.interval
+            await asyncio.sleep(self.interval)
+            now = self.clock()
+            self.lags.append((time.time(), max(0.0, now - expected)))
+            self._heartbeat = now
+            self._captured = False
+
+    def _watch(self, stopping: Callable[[], bool]):
+        while not stopping():
+            time.sleep(self.slow_callback / 2)
+            stalled = self.clock() - self._heartbeat - self.interval
+            if stalled < self.slow_callback or self._captured:
+                continue
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is None:
+                continue
+            # 每次停滞只记录一次
+            self._captured = True
+            self.slow_callbacks.append({
+                'at': time.time(),
+                'stalled_ms': round(stalled * 1000, 1),
+                'stack': [_frame_label(code) for code in _stack(frame)][-30:],
+            })
+
+    def summary(self, since: float = 0.0) -> dict:
+        """since（Unix时间）之后的延迟统计和慢回调"""
+        lags = np.array([lag for at, lag in list(self.lags) if at >= since])
+        return {
+            'samples': len(lags),
+            'lag_p50_ms': round(float(np.percentile(lags, 50)) * 1000, 2) if len(lags) else None,
+            'lag_p99_ms': round(float(np.percentile(lags, 99)) * 1000, 2) if len(lags) else None,
+            'lag_max_ms': round(float(lags.max()) * 1000, 2) if len(lags) else None,
+            'slow_callbacks': [item for item in list(self.slow_callbacks) if item['at'] >= since],
+        }
+
+
+def profile(
+    seconds: float,
+    interval: float = 0.005,
+    clock: str = 'wall',
+    monitor: Optional[LoopMonitor] = None
+) -> Dict:
+    """
+    采样 seconds 秒
+
+    Returns:
+        dict: {'mode', 'clock', 'seconds', 'samples', 'collapsed', 'top', 'loop'}
+
+    Raises:
+        RuntimeError: 已有采样在进行
+        ValueError: 采样时钟不可用
+    """
+    sampler = StackSampler(interval, clock)
+    started = time.time()
+    sampler.run(seconds)
+    return {
+        'mode': sampler.mode,
+        'clock': clock,
+        'seconds': seconds,
+        'interval': interval,
+        'samples': sampler.count,
+        'collapsed': sampler.collapsed(),
+        'top': sampler.top(),
+        'loop': monitor.summary(since=started) if monitor is not None else None,
+    }
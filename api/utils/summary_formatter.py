@@ -0,0 +1,177 @@
+"""
+汇总消息格式化
+
+把多条巨鲸事件汇总为一条消息（低优先级摘要、小时/日报），支持中英文。
+"""
+import time
+from typing import Dict, List, Optional, Tuple
+
+from api.utils.markdown import escape_markdown
+
+# 消息类型名称
+TYPE_NAMES = {
+    1: {'zh': '交易', 'en': 'trades'},
+    2: {'zh': '强平', 'en': 'liquidations'},
+}
+
+DIGEST_TEXT = {
+    'zh': {
+        'title': '📋 *低优先级巨鲸摘要*（过去 {minutes} 分钟，共 {count} 条）',
+        'line': '• {token} {type_name} {count} 笔，合计 ${total:,.0f}',
+        'more': '…其余 {count} 项',
+    },
+    'en': {
+        'title': '📋 *Low-priority whale digest* (last {minutes} min, {count} events)',
+        'line': '• {token} {type_name}: {count}, ${total:,.0f} total',
+        'more': '…and {count} more',
+    },
+}
+
+
+RECAP_TEXT = {
+    'zh': {
+        'hourly': '📊 *巨鲸小时汇总*',
+        'daily': '📊 *巨鲸日报*',
+        'range': '🕐 {start} – {end} UTC',
+        'summary': '交易 {trades} 笔，合计 ${volume}；强平 {liquidations} 笔，合计 ${liquidation_volume}',
+        'top_trades': '🐋 *最大交易*',
+        'net_flows': '📈 *净流入*',
+        'top_liquidations': '💥 *最大强平*',
+        'flow': '• {token} {net_flow}（成交 ${volume}）',
+        'trade_side': {1: '买入', 2: '卖出'},
+        'position_side': {1: '多头', 2: '空头'},
+    },
+    'en': {
+        'hourly': '📊 *Hourly whale recap*',
+        'daily': '📊 *Daily whale recap*',
+        'range': '🕐 {start} – {end} UTC',
+        'summary': '{trades} trades, ${volume} total; {liquidations} liquidations, ${liquidation_volume} total',
+        'top_trades': '🐋 *Top trades*',
+        'net_flows': '📈 *Net flow*',
+        'top_liquidations': '💥 *Biggest liquidations*',
+        'flow': '• {token} {net_flow} (volume ${volume})',
+        'trade_side': {1: 'Buy', 2: 'Sell'},
+        'position_side': {1: 'Long', 2: 'Short'},
+    },
+}
+
+
+def format_compact(value: float) -> str:
+    """金额简写：8400000 -> 8.4M"""
+    for unit, scale in (('B', 1e9), ('M', 1e6), ('K', 1e3)):
+        if abs(value) >= scale:
+            return f"{value / scale:.1f}{unit}"
+    return f"{value:,.0f}"
+
+
+def short_address(address: str) -> str:
+    """地址缩写：0x1234…5678"""
+    return f"{address[:6]}…{address[-4:]}" if len(address) > 12 else address
+
+
+def aggregate_by_token(entries: List[dict]) -> List[Tuple[str, int, int, float]]:
+    """
+    按 (代币, 消息类型) 汇总笔数和金额，按金额从大到小排列
+
+    Returns:
+        list: [(代币, 消息类型, 笔数, 合计金额)]
+    """
+    totals: Dict[Tuple[str, int], List[float]] = {}
+    for entry in entries:
+        bucket = totals.setdefault((entry['token'], entry['message_type']), [0, 0.0])
+        bucket[0] += 1
+        bucket[1] += entry['value']
+    rows = [(token, message_type, int(count), total) for (token, message_type), (count, total) in totals.items()]
+    rows.sort(key=lambda row: row[3], reverse=True)
+    return rows
+
+
+def format_digest(
+    entries: List[dict],
+    language: str = 'zh',
+    minutes: int = 15,
+    parse_mode: Optional[str] = 'Markdown',
+    max_lines: int = 20
+) -> str:
+    """
+    格式化低优先级摘要
+
+    Args:
+        entries: 事件列表 [{'token', 'message_type', 'value'}]
+        language: 'zh' 或 'en'（其他语言使用英文）
+        minutes: 摘要覆盖的分钟数
+        parse_mode: 解析模式（用于转义代币符号）
+        max_lines: 最多列出的代币行数
+
+    Returns:
+        str: 摘要消息
+    """
+    text = DIGEST_TEXT.get(language, DIGEST_TEXT['en'])
+    rows = aggregate_by_token(entries)
+
+    lines = [text['title'].format(minutes=minutes, count=len(entries))]
+    for token, message_type, count, total in rows[:max_lines]:
+        type_names = TYPE_NAMES.get(message_type, TYPE_NAMES[1])
+        lines.append(text['line'].format(
+            token=escape_markdown(token, parse_mode),
+            type_name=type_names.get(language, type_names['en']),
+            count=count,
+            total=total
+        ))
+    if len(rows) > max_lines:
+        lines.append(text['more'].format(count=len(rows) - max_lines))
+    return '\n'.join(lines)
+
+
+def format_recap(recap: dict, language: str = 'zh', parse_mode: Optional[str] = 'Markdown') -> str:
+    """
+    格式化小时/日报
+
+    Args:
+        recap: api.core.recap.build_recap() 的结果（附带 period、start、end）
+        language: 'zh' 或 'en'（其他语言使用英文）
+        parse_mode: 解析模式（用于转义代币符号）
+
+    Returns:
+        str: 汇总消息
+    """
+    text = RECAP_TEXT.get(language, RECAP_TEXT['en'])
+    time_format = '%m-%d %H:%M' if recap['period'] == 'daily' else '%H:%M'
+    lines = [
+        text[recap['period']],
+        text['range'].format(
+            start=time.strftime(time_format, time.gmtime(recap['start'])),
+            end=time.strftime(time_format, time.gmtime(recap['end']))
+        ),
+        text['summary'].format(
+            trades=recap['trades'],
+            volume=format_compact(recap['volume']),
+            liquidations=recap['liquidations'],
+            liquidation_volume=format_compact(recap['liquidation_volume'])
+        ),
+    ]
+
+    def event_lines(title: str, events: List[dict], sides: dict):
+        if not events:
+            return
+        lines.append('')
+        lines.append(text[title])
+        for rank, event in enumerate(events, 1):
+            lines.append(
+                f"{rank}. {escape_markdown(event['token'], parse_mode)} {sides.get(event['side'], '')} "
+                f"${format_compact(event['value'])} `{short_address(event['trader'])}`"
+            )
+
+    event_lines('top_trades', recap['top_trades'], text['trade_side'])
+    if recap['net_flows']:
+        lines.append('')
+        lines.append(text['net_flows'])
+        for flow in recap['net_flows']:
+            sign = '+' if flow['net_flow'] >= 0 else '-'
+            lines.append(text['flow'].format(
+                token=escape_markdown(flow['token'], parse_mode),
+                net_flow=f"{sign}${format_compact(abs(flow['net_flow']))}",
+                volume=format_compact(flow['volume'])
+            ))
+    event_lines('top_liquidations', recap['top_liquidations'], text['position_side'])
+    return '\n'.join(lines)
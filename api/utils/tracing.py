@@ -0,0 +1,335 @@
+"""
+请求追踪模块
+
+每个请求一个追踪（trace），请求处理中的各阶段记录为其中的区间（span）：
+解析、校验、渲染、准入排队、事件循环排队、限流等待、每次 Telegram 调用。
+用于判断延迟来自哪里。
+
+    - 头部采样：请求开始时按 sample_rate 决定是否追踪，未被采样的请求 span() 只做一次
+      上下文变量读取，几乎没有开销；上游请求头带 W3C traceparent 时沿用其追踪ID和采样标记
+    - 当前区间保存在上下文变量中，asyncio 子任务自动继承；跨线程提交到发送事件循环时由调度器传递
+    - 完成的追踪由后台线程按 OTLP/JSON 格式写入文件（每行一个 ExportTraceServiceRequest），
+      或POST到 OTLP/HTTP 收集器的 /v1/traces
+    - 最近完成的追踪保存在内存中，供调试接口列出最慢的几个
+"""
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+from collections import deque
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+# OTLP 区间类型
+KIND_INTERNAL = 1
+KIND_SERVER = 2
+KIND_CLIENT = 3
+
+# OTLP 状态码
+STATUS_ERROR = 2
+
+_TRACEPARENT = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+
+# 当前区间（未被采样时为None）
+current_span: contextvars.ContextVar = contextvars.ContextVar('current_span', default=None)
+
+
+class Trace:
+    """一次请求的追踪"""
+
+    __slots__ = ('trace_id', 'spans', 'root')
+
+    def __init__(self, trace_id: str):
+        self.trace_id = trace_id
+        self.spans: List['Span'] = []
+        self.root: Optional['Span'] = None
+
+
+class Span:
+    """
+    追踪中的一个区间，同时是上下文管理器:
+
+        with span('render', language='zh'):
+            ...
+    """
+
+    __slots__ = ('trace', 'span_id', 'parent_id', 'name', 'kind', 'start', 'end', 'attributes', 'error', '_token')
+
+    def __init__(self, trace: Trace, name: str, parent_id: str = '', kind: int = KIND_INTERNAL, **attributes):
+        self.trace = trace
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start = time.time_ns()
+        self.end = 0
+        self.attributes = attributes
+        self.error: Optional[str] = None
+        self._token = None
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end or time.time_ns()) - self.start) / 1e6
+
+    def set(self, key: str, value):
+        """设置区间属性"""
+        self.attributes[key] = value
+
+    def finish(self, end: int = None):
+        """结束区间"""
+        self.end = end or time.time_ns()
+        self.trace.spans.append(self)
+
+    def __enter__(self) -> 'Span':
+        self._token = current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is not None and self.error is None:
+            self.error = f"{exc_type.__name__}: {exc}"
+        current_span.reset(self._token)
+        self.finish()
+        return False
+
+
+class _NoopSpan:
+    """未被采样时的区间"""
+
+    __slots__ = ()
+
+    def set(self, key: str, value):
+        pass
+
+    def __enter__(self) -> '_NoopSpan':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NOOP = _NoopSpan()
+
+
+def span(name: str, kind: int = KIND_INTERNAL, **attributes):
+    """当前追踪中的子区间；请求未被采样时返回空操作"""
+    parent = current_span.get()
+    if parent is None:
+        return NOOP
+    return Span(parent.trace, name, parent.span_id, kind, **attributes)
+
+
+def record_span(name: str, start: int, end: int = None, **attributes):
+    """补记一个已经结束的子区间（如排队等待，开始时间在别处记录）"""
+    parent = current_span.get()
+    if parent is None:
+        return
+    child = Span(parent.trace, name, parent.span_id, **attributes)
+    child.start = start
+    child.finish(end)
+
+
+def trace_id() -> Optional[str]:
+    """当前追踪ID，未被采样时为None"""
+    parent = current_span.get()
+    return parent.trace.trace_id if parent is not None else None
+
+
+def to_otlp(traces: List[Trace], service_name: str) -> dict:
+    """转换为 OTLP/JSON 的 ExportTraceServiceRequest"""
+    spans = []
+    for trace in traces:
+        for item in trace.spans:
+            entry = {
+                'traceId': trace.trace_id,
+                'spanId': item.span_id,
+                'parentSpanId': item.parent_id,
+                'name': item.name,
+                'kind': item.kind,
+                'startTimeUnixNano': str(item.start),
+                'endTimeUnixNano': str(item.end),
+                'attributes': [_attribute(key, value) for key, value in item.attributes.items()],
+            }
+            if item.error:
+                entry['status'] = {'code': STATUS_ERROR, 'message': item.error}
+            spans.append(entry)
+    return {'resourceSpans': [{
+        'resource': {'attributes': [_attribute('service.name', service_name)]},
+        'scopeSpans': [{'scope': {'name': 'telegram_api'}, 'spans': spans}],
+    }]}
+
+
+def _attribute(key: str, value) -> dict:
+    if isinstance(value, bool):
+        typed = {'boolValue': value}
+    elif isinstance(value, int):
+        typed = {'intValue': str(value)}
+    elif isinstance(value, float):
+        typed = {'doubleValue': value}
+    else:
+        typed = {'stringValue': str(value)}
+    return {'key': key, 'value': typed}
+
+
+class Tracer:
+    """
+    追踪的采样、收集和导出
+    """
+
+    def __init__(self):
+        self.sample_rate = 0.0
+        self.service_name = 'telegram-sender'
+        self.export_path = ''
+        self.endpoint = ''
+        self.recent: deque = deque(maxlen=500)
+        self._queue: Optional[queue.Queue] = None
+        self._exporter: Optional[threading.Thread] = None
+        self.dropped = 0
+
+    def configure(
+        self,
+        sample_rate: float,
+        export_path: str = '',
+        endpoint: str = '',
+        keep_recent: int = 500,
+        service_name: str = 'telegram-sender'
+    ):
+        """
+        配置追踪（sample_rate 为0时关闭）
+
+        Args:
+            sample_rate: 头部采样比例（0~1）
+            export_path: OTLP/JSON 导出文件，为空不写文件
+            endpoint: OTLP/HTTP 收集器地址（如 http://localhost:4318），为空不发送
+            keep_recent: 内存中保留的最近追踪数（调试接口）
+            service_name: 资源属性 service.name
+        """
+        self.sample_rate = sample_rate
+        self.export_path = export_path
+        self.endpoint = endpoint.rstrip('/')
+        self.service_name = service_name
+        self.recent = deque(maxlen=keep_recent)
+        if (export_path or endpoint) and self._exporter is None:
+            if export_path and os.path.dirname(export_path):
+                os.makedirs(os.path.dirname(export_path), exist_ok=True)
+            self._queue = queue.Queue(maxsize=10000)
+            self._exporter = threading.Thread(target=self._run_exporter, name='trace-exporter', daemon=True)
+            self._exporter.start()
+
+    def start(self, name: str, traceparent: Optional[str] = None, **attributes) -> Optional[Span]:
+        """
+        开始一个请求的追踪（头部采样），被采样时设为当前区间
+
+        Args:
+            name: 根区间名称，如 'POST /api/v1/whale/send'
+            traceparent: 上游的 W3C traceparent 请求头
+
+        Returns:
+            Span: 根区间，未被采样时返回None
+        """
+        if self.sample_rate <= 0:
+            return None
+        match = _TRACEPARENT.match(traceparent or '')
+        if match:
+            # 沿用上游的采样决定
+            if not int(match.group(3), 16) & 1:
+                return None
+            ident, parent_id = match.group(1), match.group(2)
+        elif random.random() >= self.sample_rate:
+            return None
+        else:
+            ident, parent_id = os.urandom(16).hex(), ''
+
+        root = Span(Trace(ident), name, parent_id, KIND_SERVER, **attributes)
+        root.trace.root = root
+        root._token = current_span.set(root)
+        return root
+
+    def finish(self, root: Optional[Span]):
+        """结束请求的追踪并导出（之后才结束的后台区间不再计入）"""
+        if root is None:
+            return
+        if root._token is not None:
+            try:
+                current_span.reset(root._token)
+            except ValueError:
+                # 在其他上下文中结束
+                current_span.set(None)
+            root._token = None
+        root.finish()
+        self.recent.append(root.trace)
+        if self._queue is not None:
+            try:
+                self._queue.put_nowait(root.trace)
+            except queue.Full:
+                self.dropped += 1
+
+    def slowest(self, limit: int = 10) -> List[dict]:
+        """最近完成的追踪中耗时最长的几个"""
+        traces = sorted(list(self.recent), key=lambda trace: trace.root.duration_ms, reverse=True)[:limit]
+        return [self.describe(trace) for trace in traces]
+
+    @staticmethod
+    def describe(trace: Trace) -> dict:
+        """追踪的可读形式：各区间相对根区间开始的偏移和耗时"""
+        root = trace.root
+        spans = sorted(trace.spans, key=lambda item: item.start)
+        return {
+            'trace_id': trace.trace_id,
+            'name': root.name,
+            'start': root.start / 1e9,
+            'duration_ms': round(root.duration_ms, 3),
+            'attributes': root.attributes,
+            'spans': [{
+                'name': item.name,
+                'span_id': item.span_id,
+                'parent_id': item.parent_id,
+                'offset_ms': round((item.start - root.start) / 1e6, 3),
+                'duration_ms': round(item.duration_ms, 3),
+                'attributes': item.attributes,
+                'error': item.error,
+            } for item in spans],
+        }
+
+    def _run_exporter(self):
+        while True:
+            traces = [self._queue.get()]
+            # 攒一小批再写，减少写文件/请求次数
+            time.sleep(0.5)
+            while len(traces) < 512:
+                try:
+                    traces.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.export(traces)
+            except Exception as e:
+                logger.warning("⚠️ Failed to export %d traces: %s", len(traces), e)
+
+    def export(self, traces: List[Trace]):
+        """写入导出文件并发送到收集器"""
+        payload = json.dumps(to_otlp(traces, self.service_name), ensure_ascii=False, default=str)
+        if self.export_path:
+            with open(self.export_path, 'a', encoding='utf-8') as f:
+                f.write(payload + '\n')
+        if self.endpoint:
+            # urllib.request 导入较慢，只在配置了收集器时导入
+            import urllib.request
+
+            request = urllib.request.Request(
+                f"{self.endpoint}/v1/traces",
+                data=payload.encode('utf-8'),
+                headers={'Content-Type': 'application/json'},
+                method='POST'
+            )
+            with urllib.request.urlopen(request, timeout=5) as response:
+                response.read()
+
+
+# 全局追踪器
+tracer = Tracer()
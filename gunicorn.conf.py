@@ -0,0 +1,40 @@
+"""
+gunicorn配置
+
+使用方法:
+    gunicorn -c gunicorn.conf.py wsgi:app
+"""
+import multiprocessing
+import os
+
+# 监听地址
+bind = f"{os.getenv('API_HOST', '0.0.0.0')}:{os.getenv('API_PORT', '8032')}"
+
+# worker配置：默认每个CPU核心一个进程
+workers = int(os.getenv('GUNICORN_WORKERS', multiprocessing.cpu_count()))
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', 4))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 60))
+
+# 收到SIGTERM后等待在途请求的时间，需大于 SHUTDOWN_DRAIN_TIMEOUT 并小于Kubernetes的宽限期
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 25))
+
+# 不预加载应用，每个worker各自创建应用和发送器
+preload_app = False
+
+# 日志
+accesslog = '-'
+errorlog = '-'
+loglevel = os.getenv('LOG_LEVEL', 'INFO').lower()
+
+# 多worker共享限流和去重状态（worker继承master的环境变量）
+os.environ.setdefault('RATE_STATE_PATH', '/tmp/tg-signal/rate_state.db')
+
+# 告诉worker共有几个worker（只支持单worker的功能启动时据此检查）
+os.environ['GUNICORN_WORKERS'] = str(workers)
+
+
+def worker_exit(server, worker):
+    """worker退出时排空发送队列并溢出未发完的消息"""
+    from main import shutdown
+    shutdown()
@@ -8,78 +8,300 @@ Telegram Signal API - 主启动文件
 
 API文档: http://localhost:5001/health
 """
-import asyncio
-from flask import Flask
+import os
+import signal
+import sys
+from flask import Flask, g, jsonify, request
 from api.config import settings
+from api.core.admission import AdmissionController, Overloaded
+from api.core.auth import AccessDenied, ApiKeys, set_api_keys
+from api.core.coalescer import PositionCoalescer
+from api.core.delivery import DeliveryIndex
+from api.core.digest import AlertDigest
+from api.core.enrichment import TokenCache, create_token_provider
+from api.core.event_index import EventIndex
+from api.core.event_store import EventStore
+from api.core.history import EventHistory
+from api.core.labels import AddressLabels
+from api.core.dispatcher import dispatcher, run_async
+from api.core.rate_limiter import create_quota, create_rate_limiter
+from api.core.recap import RecapScheduler
+from api.core.reply_threads import create_reply_threads
+from api.core.routing import load_routing
+from api.core.scheduler import SendScheduler, set_send_scheduler
+from api.core.signing import SignatureVerifier, set_signature_verifier
+from api.core.stats import AggregateStats
+from api.core.thresholds import ThresholdTracker
 from api.core.telegram import TelegramSender
-from api.routers import health, message, whale
-from api.utils.logger import logger
+from api.routers import debug, health, history, message, schedule, whale
+from api.utils.logger import bind_log_context, logger, setup_logging, shutdown_logging
+from api.utils.profiler import LoopMonitor
+from api.utils.tracing import tracer
 
 
-def create_app() -> Flask:
+def create_app(sender: TelegramSender = None) -> Flask:
     """
     创建Flask应用
 
+    应用立即可以接收请求：Bot握手在后台事件循环中进行，握手完成前的发送排队等待。
+    gunicorn的每个worker各自调用本函数。
+
+    Args:
+        sender: Telegram发送器，默认根据配置创建
+
     Returns:
         Flask: Flask应用实例
     """
+    setup_logging()
     app = Flask(__name__)
 
+    if sender is None:
+        sender = create_sender()
+    admission = None
+    if settings.ADMISSION_MAX_IN_FLIGHT > 0:
+        admission = AdmissionController(
+            max_in_flight=settings.ADMISSION_MAX_IN_FLIGHT,
+            max_queue=settings.ADMISSION_MAX_QUEUE,
+            high_priority_reserve=settings.ADMISSION_HIGH_PRIORITY_RESERVE
+        )
+    dispatcher.start(
+        sender,
+        send_timeout=settings.MESSAGE_SEND_TIMEOUT,
+        spill_dir=settings.SPILL_DIR,
+        admission=admission
+    )
+
+    if settings.LOOP_SLOW_CALLBACK_MS > 0:
+        monitor = LoopMonitor(slow_callback=settings.LOOP_SLOW_CALLBACK_MS / 1000)
+        dispatcher.submit(monitor.run(lambda: dispatcher.stopping))
+        debug.set_loop_monitor(monitor)
+    tracer.configure(
+        settings.TRACE_SAMPLE_RATE,
+        export_path=settings.TRACE_EXPORT_PATH,
+        endpoint=settings.TRACE_OTLP_ENDPOINT
+    )
+
+    @app.before_request
+    def start_trace():
+        """按采样比例为请求开始追踪"""
+        g.trace = tracer.start(
+            f"{request.method} {request.path}", request.headers.get('traceparent'), **{'http.route': request.path}
+        )
+        if g.trace is not None:
+            bind_log_context(trace_id=g.trace.trace.trace_id)
+
+    @app.after_request
+    def tag_trace(response):
+        root = g.get('trace')
+        if root is not None:
+            root.set('http.status_code', response.status_code)
+            response.headers['X-Trace-Id'] = root.trace.trace_id
+        return response
+
+    @app.teardown_request
+    def finish_trace(error=None):
+        tracer.finish(g.pop('trace', None))
+
+    @app.before_request
+    def reject_when_stopping():
+        """关闭过程中拒绝新请求"""
+        bind_log_context(route=request.path)
+        if dispatcher.stopping:
+            response = jsonify({
+                'success': False,
+                'error': 'Service is shutting down'
+            })
+            response.headers['Retry-After'] = '5'
+            return response, 503
+
+    @app.errorhandler(Overloaded)
+    def reject_overloaded(e: Overloaded):
+        """发送已满：按排空速度告诉调用方多久后重试"""
+        logger.warning("⚠️ Send rejected, queue full (retry after %ds)", e.retry_after)
+        response = jsonify({
+            'success': False,
+            'error': str(e),
+            'retry_after': e.retry_after
+        })
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response, 429
+
+    @app.errorhandler(AccessDenied)
+    def reject_access_denied(e: AccessDenied):
+        """API密钥无效（401）、目标群组不允许（403）或密钥配额用完（429）"""
+        logger.warning("⚠️ Request rejected (%d): %s", e.status, e)
+        body = {
+            'success': False,
+            'error': str(e)
+        }
+        if e.retry_after is not None:
+            body['retry_after'] = e.retry_after
+        response = jsonify(body)
+        if e.retry_after is not None:
+            response.headers['Retry-After'] = str(e.retry_after)
+        return response, e.status
+
+    # 配额状态与发送限流保存在同一个限流器中（多worker时共享，按 API_KEY_QUOTA_SYNC_INTERVAL 批量同步）
+    set_api_keys(ApiKeys(
+        settings.API_KEYS_PATH, limiter=create_quota(sender.rate_limiter, settings.API_KEY_QUOTA_SYNC_INTERVAL)
+    ) if settings.API_KEYS_PATH else None)
+    webhook_secrets = [secret.strip() for secret in settings.WEBHOOK_SECRETS.split(',') if secret.strip()]
+    set_signature_verifier(
+        SignatureVerifier(
+            webhook_secrets,
+            tolerance=settings.WEBHOOK_TOLERANCE,
+            max_nonces=settings.WEBHOOK_MAX_NONCES,
+            # 配置了 RATE_STATE_PATH 时随机串保存在共享状态中，重放给其他worker也会被拒绝
+            limiter=sender.rate_limiter
+        ) if webhook_secrets else None
+    )
+    health.set_telegram_sender(sender)
+    message.set_telegram_sender(sender)
+    whale.set_telegram_sender(sender)
+    whale.set_routing_table(load_routing(settings.ROUTES_PATH, settings))
+    if settings.ADDRESS_LABELS_PATH:
+        whale.set_address_labels(AddressLabels(settings.ADDRESS_LABELS_PATH))
+    if settings.STATS_MAX_TRADERS > 0:
+        if settings.GUNICORN_WORKERS > 1:
+            # 滚动统计在各worker内存中，每个worker只统计自己收到的事件
+            logger.warning(
+                "⚠️ Rolling stats are kept per worker (GUNICORN_WORKERS=%d), /whale/stats and trader activity "
+                "lines cover about 1/%d of events; set GUNICORN_WORKERS=1 for exact counts",
+                settings.GUNICORN_WORKERS, settings.GUNICORN_WORKERS
+            )
+        whale.set_aggregate_stats(AggregateStats(
+            max_traders=settings.STATS_MAX_TRADERS,
+            max_tokens=settings.STATS_MAX_TOKENS
+        ))
+    recap_periods = [period.strip() for period in settings.RECAP_PERIODS.split(',') if period.strip()]
+    if settings.EVENT_STORE_DIR:
+        store = EventStore(settings.EVENT_STORE_DIR)
+        whale.set_event_history(store)
+        history.set_event_index(EventIndex(store))
+    elif recap_periods:
+        whale.set_event_history(EventHistory())
+    if recap_periods:
+        recaps = RecapScheduler(
+            whale.event_history,
+            whale.send_recap,
+            recap_periods,
+            limit=settings.RECAP_TOP_N,
+            lock_path=os.path.join(settings.EVENT_STORE_DIR, '.recap.lock') if settings.EVENT_STORE_DIR else None
+        )
+        dispatcher.submit(recaps.run(lambda: dispatcher.stopping))
+    if settings.THRESHOLD_PERCENTILE > 0 and settings.LOW_PRIORITY_ACTION == 'digest' and settings.GUNICORN_WORKERS > 1:
+        # 每个worker各有摘要缓冲区和摘要循环，每个周期会发出多份不完整的摘要
+        logger.error(
+            "❌ Low-priority digests need a single worker (GUNICORN_WORKERS=%d), dynamic thresholds disabled",
+            settings.GUNICORN_WORKERS
+        )
+    elif settings.THRESHOLD_PERCENTILE > 0:
+        if settings.GUNICORN_WORKERS > 1:
+            logger.warning(
+                "⚠️ Dynamic thresholds are tracked per worker (GUNICORN_WORKERS=%d), each sees about 1/%d of events",
+                settings.GUNICORN_WORKERS, settings.GUNICORN_WORKERS
+            )
+        digest = None
+        if settings.LOW_PRIORITY_ACTION == 'digest':
+            digest = AlertDigest(whale.send_digest, interval=settings.DIGEST_INTERVAL)
+            dispatcher.submit(digest.run(lambda: dispatcher.stopping))
+        whale.set_thresholds(ThresholdTracker(
+            percentile=settings.THRESHOLD_PERCENTILE,
+            window=settings.THRESHOLD_WINDOW,
+            min_samples=settings.THRESHOLD_MIN_SAMPLES
+        ), digest)
+    token_provider = create_token_provider(settings.TOKEN_INFO_SOURCE)
+    if token_provider is not None:
+        whale.set_token_cache(TokenCache(
+            token_provider,
+            ttl=settings.TOKEN_INFO_TTL,
+            stale_ttl=settings.TOKEN_INFO_STALE_TTL,
+            budget=settings.ENRICHMENT_BUDGET_MS / 1000
+        ))
+    scheduler = SendScheduler(
+        {'message': message.send_scheduled, 'whale': whale.send_scheduled},
+        journal_path=settings.SCHEDULE_JOURNAL_PATH or None,
+        max_pending=settings.SCHEDULE_MAX_PENDING
+    )
+    set_send_scheduler(scheduler)
+    dispatcher.submit(scheduler.run(lambda: dispatcher.stopping))
+    if settings.POSITION_UPDATE_WINDOW > 0:
+        if settings.GUNICORN_WORKERS > 1:
+            # 合并状态在各worker内存中，同一持仓的交易落在不同worker时分别发送新消息
+            logger.warning(
+                "⚠️ Position updates are coalesced per worker (GUNICORN_WORKERS=%d), set GUNICORN_WORKERS=1 "
+                "to merge every fill into one message", settings.GUNICORN_WORKERS
+            )
+        whale.set_position_coalescer(PositionCoalescer(
+            sender,
+            window=settings.POSITION_UPDATE_WINDOW,
+            debounce=settings.POSITION_EDIT_DEBOUNCE
+        ))
+
     # 注册蓝图
     app.register_blueprint(health.health_bp)
     app.register_blueprint(message.message_bp)
     app.register_blueprint(whale.whale_bp)
+    app.register_blueprint(history.history_bp)
+    app.register_blueprint(schedule.schedule_bp)
+    app.register_blueprint(debug.debug_bp)
 
     logger.info("✅ Flask app created")
     return app
 
 
-def init_telegram() -> TelegramSender:
+def create_sender() -> TelegramSender:
     """
-    初始化Telegram发送器
+    创建Telegram发送器（不连接Telegram，握手由调度器在后台完成）
 
     Returns:
         TelegramSender: Telegram发送器实例
-
-    Raises:
-        RuntimeError: 初始化失败时抛出
     """
-    try:
-        sender = TelegramSender(bot_token=settings.BOT_TOKEN)
+    telegram_config = settings.get_telegram_config()
+    return TelegramSender(
+        bot_token=telegram_config['bot_token'],
+        max_message_parts=telegram_config['max_message_parts'],
+        rate_limiter=create_rate_limiter(**settings.get_rate_limit_config()),
+        dedup_window=telegram_config['dedup_window'],
+        delivery_index=DeliveryIndex(settings.DELIVERY_INDEX_PATH) if settings.DELIVERY_INDEX_PATH else None,
+        # 设置了 RATE_STATE_PATH 时保存在共享SQLite中，多个worker共用一份映射
+        reply_threads=create_reply_threads(
+            settings.REPLY_THREADS_SIZE,
+            snapshot_path=settings.REPLY_THREADS_PATH or None,
+            state_path=settings.RATE_STATE_PATH or None
+        ) if settings.REPLY_THREADS_SIZE > 0 else None
+    )
 
-        # 在新的event loop中初始化
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        success = loop.run_until_complete(sender.initialize())
 
-        if not success:
-            raise RuntimeError("Failed to initialize Telegram Bot")
+def shutdown():
+    """优雅关闭：关闭代币数据源，排空发送队列、溢出未发完的消息、关闭Bot连接池，写入剩余事件"""
+    if whale.token_cache is not None and dispatcher.running:
+        try:
+            run_async(whale.token_cache.close(), timeout=2)
+        except Exception as e:
+            logger.warning("⚠️ Failed to close token info source: %s", e)
+    dispatcher.shutdown(deadline=settings.SHUTDOWN_DRAIN_TIMEOUT)
+    if isinstance(whale.event_history, EventStore):
+        whale.event_history.close()
+    shutdown_logging()
 
-        logger.info("✅ Telegram sender initialized")
-        return sender
 
-    except Exception as e:
-        logger.error(f"❌ Telegram initialization failed: {e}")
-        raise
+def _handle_sigterm(signum, frame):
+    """SIGTERM时退出服务器主循环，由main()的finally完成优雅关闭"""
+    logger.info("⚠️  Received SIGTERM")
+    sys.exit(0)
 
 
 def main():
     """主函数"""
     try:
         # 打印启动信息
+        setup_logging()
         logger.info("=" * 60)
         logger.info("🚀 Starting Telegram Signal API")
         logger.info("=" * 60)
 
-        # 初始化Telegram发送器
-        telegram_sender = init_telegram()
-
-        # 设置Telegram发送器到路由
-        health.set_telegram_sender(telegram_sender)
-        message.set_telegram_sender(telegram_sender)
-        whale.set_telegram_sender(telegram_sender)
-
-        # 创建Flask应用
+        # 创建Flask应用（Telegram握手在后台进行）
         app = create_app()
 
         # 获取API配置
@@ -101,10 +323,13 @@ def main():
         logger.info(f"  • POST /api/v1/whale/send   - Send whale message (unified)")
         logger.info(f"  • POST /api/v1/whale/trade  - Send whale trade alert")
         logger.info(f"  • POST /api/v1/whale/liquidation - Send liquidation alert")
+        logger.info(f"  • GET  /api/v1/scheduled    - List scheduled sends")
         logger.info("=" * 60)
         logger.info("💡 Press CTRL+C to stop")
         logger.info("=" * 60)
 
+        signal.signal(signal.SIGTERM, _handle_sigterm)
+
         # 启动Flask服务器
         app.run(host=host, port=port, debug=debug)
 
@@ -114,6 +339,7 @@ def main():
         logger.error(f"❌ Server startup failed: {e}", exc_info=True)
         exit(1)
     finally:
+        shutdown()
         logger.info("=" * 60)
         logger.info("🔚 Server stopped")
         logger.info("=" * 60)
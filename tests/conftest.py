@@ -0,0 +1,20 @@
+"""
+测试公共夹具
+"""
+import pytest
+
+
+class FakeClock:
+    """可手动推进的时钟"""
+
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(request):
+    """可手动推进的时钟，起始时间取测试模块的 CLOCK_START（默认1000秒）"""
+    return FakeClock(getattr(request.module, 'CLOCK_START', 1000.0))
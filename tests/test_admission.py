@@ -0,0 +1,140 @@
+"""
+准入控制测试
+"""
+import asyncio
+import contextvars
+
+import pytest
+
+from api.core.admission import AdmissionController, Overloaded
+from api.core.dispatcher import SendDispatcher
+
+
+def test_low_priority_rejected_when_full(clock):
+    """排队满后拒绝低优先级请求，高优先级请求使用保留名额"""
+    admission = AdmissionController(max_in_flight=2, max_queue=2, high_priority_reserve=1, clock=clock)
+
+    assert [admission.try_acquire() for _ in range(4)] == [None] * 4
+    assert admission.try_acquire() is not None
+    assert admission.try_acquire(high_priority=True) is None
+    assert admission.try_acquire(high_priority=True) is not None
+    assert admission.pending == 5
+
+    admission.release()
+    assert admission.try_acquire() is not None  # 高优先级仍占着名额
+    admission.release()
+    assert admission.try_acquire() is None
+
+
+def test_retry_after_follows_drain_rate(clock):
+    """Retry-After 按最近的每秒完成数估计"""
+    admission = AdmissionController(max_in_flight=1, max_queue=9, rate_window=10, max_retry_after=60, clock=clock)
+
+    # 还没有完成过的请求：无法估计，返回上限
+    clock.now = 900.0
+    for _ in range(10):
+        admission.try_acquire()
+    assert admission.try_acquire() == 60
+    for _ in range(10):
+        admission.release()
+
+    # 10秒内完成20个：每秒2个
+    for second in range(10):
+        clock.now = 1000.0 + second
+        for _ in range(2):
+            admission.try_acquire()
+            admission.release()
+    for _ in range(10):
+        admission.try_acquire()
+    for _ in range(4):
+        admission.try_acquire(high_priority=True)
+    assert admission.drain_rate() == 2.0
+    # 超出上限5个，按每秒2个需要3秒
+    assert admission.try_acquire() == 3
+
+
+def test_guard_limits_concurrency_and_prefers_high_priority():
+    """同时执行的不超过 max_in_flight，空出的名额先给高优先级"""
+    admission = AdmissionController(max_in_flight=1, max_queue=10)
+    order = []
+    running = []
+
+    async def job(name):
+        running.append(name)
+        assert len(running) == 1
+        await asyncio.sleep(0.01)
+        running.remove(name)
+        order.append(name)
+
+    async def main():
+        first = asyncio.ensure_future(admission.guard(job('first')))
+        await asyncio.sleep(0)
+        low = asyncio.ensure_future(admission.guard(job('low')))
+        high = asyncio.ensure_future(admission.guard(job('high'), high_priority=True))
+        await asyncio.gather(first, low, high)
+
+    asyncio.run(main())
+
+    assert order == ['first', 'high', 'low']
+
+
+def test_cancelled_waiter_releases_slot():
+    """排队中被取消（如请求超时）的发送不占用执行名额"""
+    admission = AdmissionController(max_in_flight=1, max_queue=10)
+
+    async def main():
+        blocker = asyncio.Event()
+        first = asyncio.ensure_future(admission.guard(blocker.wait()))
+        await asyncio.sleep(0)
+        waiting = asyncio.ensure_future(admission.guard(asyncio.sleep(0)))
+        await asyncio.sleep(0)
+        waiting.cancel()
+        blocker.set()
+        await first
+        assert await admission.guard(asyncio.sleep(0, result='done')) == 'done'
+        assert admission._running == 0
+
+    asyncio.run(main())
+
+
+class FakeSender:
+    """握手立即成功的发送器"""
+
+    deferred_handshake = False
+    closing = False
+
+    def __init__(self):
+        self.pending = {}
+
+    async def initialize(self):
+        return True
+
+    async def close(self):
+        pass
+
+
+def test_admit_before_side_effects(clock):
+    """admit() 先占名额再执行副作用，块内的发送复用该名额；名额用完时块内代码不执行"""
+    admission = AdmissionController(max_in_flight=1, max_queue=0, high_priority_reserve=0, clock=clock)
+    dispatcher = SendDispatcher()
+    dispatcher.start(FakeSender(), send_timeout=5, admission=admission)
+    recorded = []
+
+    def other_request():
+        with dispatcher.admit():
+            recorded.append('other')
+
+    async def send():
+        return admission.pending
+
+    try:
+        with dispatcher.admit():
+            recorded.append('event')
+            assert dispatcher.run_admitted(send()) == 1
+            # 另一个请求（独立的上下文）被拒绝，不留下记录
+            with pytest.raises(Overloaded):
+                contextvars.Context().run(other_request)
+        assert admission.pending == 0
+        assert recorded == ['event']
+    finally:
+        dispatcher.shutdown(deadline=1)
@@ -0,0 +1,143 @@
+"""
+API密钥认证测试
+"""
+import pytest
+
+from api.core import auth
+from api.core.auth import AccessDenied, ApiKeys, authorize, charge, current_api_key, hash_key
+from api.core.rate_limiter import BatchedQuota, SharedRateLimiter
+from tools.api_keys import add_key
+
+
+def test_unknown_key_and_request_quota(tmp_path, clock):
+    """未知密钥返回401；请求配额用完返回429并给出重试时间，被拒绝的请求不占配额"""
+    path = str(tmp_path / 'keys.json')
+    add_key(path, {'name': 'producer', 'sha256': hash_key('secret'), 'requests_per_minute': 60, 'request_burst': 2})
+    keys = ApiKeys(path, clock=clock)
+
+    with pytest.raises(AccessDenied) as denied:
+        keys.authenticate('wrong')
+    assert denied.value.status == 401
+    with pytest.raises(AccessDenied):
+        keys.authenticate(None)
+
+    assert keys.authenticate('secret').name == 'producer'
+    keys.authenticate('secret')
+    with pytest.raises(AccessDenied) as denied:
+        keys.authenticate('secret')
+    assert (denied.value.status, denied.value.retry_after) == (429, 1)
+
+    clock.now += 1
+    keys.authenticate('secret')
+
+
+def test_destinations_and_message_quota(tmp_path, clock):
+    """直接指定的群组不允许时拒绝，按路由发送时只发往允许的群组；校验不扣配额，charge() 按群组数扣除"""
+    path = str(tmp_path / 'keys.json')
+    add_key(path, {
+        'name': 'producer', 'sha256': hash_key('secret'),
+        'messages_per_minute': 60, 'message_burst': 3, 'destinations': ['-1001', '@whale']
+    })
+    keys = ApiKeys(path, clock=clock)
+    auth.set_api_keys(keys)
+    token = current_api_key.set(keys.authenticate('secret'))
+    try:
+        with pytest.raises(AccessDenied) as denied:
+            authorize([-1001, -1002])
+        assert denied.value.status == 403
+        assert authorize([-1001, -1002], partial=True) == [-1001]
+        assert authorize(['@whale', '-1001']) == ['@whale', '-1001']
+
+        charge(['@whale', '-1001'])
+        charge([-1001])
+        with pytest.raises(AccessDenied) as denied:
+            charge([-1001])
+        assert (denied.value.status, denied.value.retry_after) == (429, 1)
+    finally:
+        current_api_key.reset(token)
+        auth.set_api_keys(None)
+
+    # 未开启认证时原样放行
+    assert authorize([-1002]) == [-1002]
+    charge([-1002])
+
+
+def test_message_burst_exceeded_is_forbidden(tmp_path, clock):
+    """一次发往的群组数超过消息突发条数时返回403（重试也不会成功），且不扣配额"""
+    path = str(tmp_path / 'keys.json')
+    add_key(path, {'name': 'producer', 'sha256': hash_key('secret'), 'messages_per_minute': 60, 'message_burst': 2})
+    keys = ApiKeys(path, clock=clock)
+    key = keys.authenticate('secret')
+    auth.set_api_keys(keys)
+    token = current_api_key.set(key)
+    try:
+        with pytest.raises(AccessDenied) as denied:
+            authorize([-1001, -1002, -1003])
+        assert denied.value.status == 403
+    finally:
+        current_api_key.reset(token)
+        auth.set_api_keys(None)
+
+    with pytest.raises(AccessDenied) as denied:
+        keys.charge_messages(key, 3)
+    assert denied.value.status == 403
+    keys.charge_messages(key, 2)
+
+
+def test_reload_keeps_quota_state(tmp_path, clock):
+    """密钥文件更新后换入新密钥，已有密钥的配额状态保留"""
+    path = str(tmp_path / 'keys.json')
+    add_key(path, {'name': 'a', 'sha256': hash_key('key-a'), 'requests_per_minute': 60, 'request_burst': 1})
+    keys = ApiKeys(path, check_interval=3600, clock=clock)
+    keys.authenticate('key-a')
+
+    add_key(path, {'name': 'b', 'sha256': hash_key('key-b')})
+
+    assert keys.reload()
+    assert len(keys) == 2
+    assert keys.authenticate('key-b').name == 'b'
+    with pytest.raises(AccessDenied):
+        keys.authenticate('key-a')
+
+
+def test_quota_shared_across_workers(tmp_path, clock):
+    """配置共享限流器时各worker合计配额（按密钥哈希保存）"""
+    path = str(tmp_path / 'keys.json')
+    add_key(path, {'name': 'a', 'sha256': hash_key('key-a'), 'requests_per_minute': 60, 'request_burst': 2})
+    state = str(tmp_path / 'rate.db')
+    workers = [ApiKeys(path, limiter=SharedRateLimiter(state, clock=clock)) for _ in range(2)]
+
+    workers[0].authenticate('key-a')
+    workers[1].authenticate('key-a')
+    with pytest.raises(AccessDenied) as denied:
+        workers[0].authenticate('key-a')
+    assert denied.value.status == 429
+
+
+def test_batched_quota_syncs_across_workers(tmp_path, clock):
+    """按批同步时各worker在进程内判断，同步后看到其他worker的占用"""
+    path = str(tmp_path / 'keys.json')
+    add_key(path, {'name': 'a', 'sha256': hash_key('key-a'), 'requests_per_minute': 60, 'request_burst': 2})
+    state = str(tmp_path / 'rate.db')
+    quotas = [BatchedQuota(SharedRateLimiter(state, clock=clock), sync_interval=1.0) for _ in range(2)]
+    workers = [ApiKeys(path, limiter=quota) for quota in quotas]
+
+    # 同步间隔内不执行SQLite事务，各worker只看到自己的占用
+    workers[0].authenticate('key-a')
+    workers[0].authenticate('key-a')
+    workers[1].authenticate('key-a')
+    with pytest.raises(AccessDenied):
+        workers[0].authenticate('key-a')
+
+    # 同步后合计三次占用，恢复一个名额也只有一个worker能使用
+    clock.now += 1.0
+    quotas[0].sync()
+    quotas[1].sync()
+    with pytest.raises(AccessDenied):
+        workers[1].authenticate('key-a')
+    clock.now += 1.0
+    workers[0].authenticate('key-a')
+    quotas[0].sync()
+    quotas[1].sync()
+    with pytest.raises(AccessDenied):
+        workers[1].authenticate('key-a')
@@ -0,0 +1,86 @@
+"""
+持仓更新合并测试
+"""
+import asyncio
+
+from api.core.coalescer import PositionCoalescer
+from api.core.delivery import DeliveryRecord
+
+
+class FakeSender:
+    """记录发送和编辑调用的发送器"""
+
+    def __init__(self):
+        self.sent = []
+        self.edits = []
+        self.parse_modes = []
+
+    async def send_message(self, chat_id, text, parse_mode=None, meta=None, message_thread_id=None):
+        self.sent.append(text)
+        self.parse_modes.append(('send', parse_mode))
+        return DeliveryRecord(chat_id=chat_id, message_ids=[len(self.sent)])
+
+    async def edit_message(self, chat_id, message_id, text, parse_mode='Markdown'):
+        self.edits.append((message_id, text))
+        self.parse_modes.append(('edit', parse_mode))
+        return True
+
+
+def render(count, total):
+    return f'{count} fills ${total:,.0f}'
+
+
+def test_updates_within_window_edit_once(clock):
+    """窗口内的后续交易合并为一次防抖编辑"""
+    sender = FakeSender()
+    coalescer = PositionCoalescer(sender, window=60, debounce=0.05, clock=clock)
+    key = ('0xabc', 'BTC', '1')
+
+    async def run():
+        first = await coalescer.send(-1, key, 100, render)
+        second = await coalescer.send(-1, key, 200, render)
+        third = await coalescer.send(-1, key, 300, render)
+        clock.now += 0.05
+        await asyncio.sleep(0.1)
+        return first, second, third
+
+    first, second, third = asyncio.run(run())
+
+    assert not first['updated'] and first['message_id'] == 1
+    assert second['updated'] and third['count'] == 3 and third['total'] == 600
+    assert sender.sent == ['1 fills $100']
+    assert sender.edits == [(1, '3 fills $600')]
+
+
+def test_new_message_after_window_or_other_key(clock):
+    """超过窗口或不同方向时发送新消息"""
+    sender = FakeSender()
+    coalescer = PositionCoalescer(sender, window=60, debounce=0, clock=clock)
+
+    async def run():
+        await coalescer.send(-1, ('0xabc', 'BTC', '1'), 100, render)
+        await coalescer.send(-1, ('0xabc', 'BTC', '2'), 100, render)
+        await coalescer.send(-2, ('0xabc', 'BTC', '1'), 100, render)
+        clock.now += 61
+        await coalescer.send(-1, ('0xabc', 'BTC', '1'), 100, render)
+
+    asyncio.run(run())
+
+    assert len(sender.sent) == 4
+    assert sender.edits == []
+
+
+def test_edit_keeps_parse_mode(clock):
+    """编辑使用首条消息的解析模式"""
+    sender = FakeSender()
+    coalescer = PositionCoalescer(sender, window=60, debounce=0, clock=clock)
+    key = ('0xabc', 'BTC', '1')
+
+    async def run():
+        await coalescer.send(-1, key, 100, render, parse_mode='HTML')
+        await coalescer.send(-1, key, 200, render, parse_mode='HTML')
+        await asyncio.sleep(0.01)
+
+    asyncio.run(run())
+
+    assert sender.parse_modes == [('send', 'HTML'), ('edit', 'HTML')]
@@ -0,0 +1,81 @@
+"""
+投递记录索引测试
+"""
+import sqlite3
+import time
+
+from api.core.delivery import DeliveryIndex, DeliveryRecord, event_id_for
+
+
+def test_event_id_stable_and_explicit():
+    """相同事件字段得到相同ID，请求中的 event_id 优先"""
+    data = {'message_type': 1, 'token': 'BTC', 'value_usd': 2150000, 'trader_address': '0xabc'}
+
+    assert event_id_for(data) == event_id_for(dict(data, language='en'))
+    assert event_id_for(data) != event_id_for(dict(data, value_usd=1))
+    assert event_id_for(dict(data, event_id='evt-1')) == 'evt-1'
+
+
+def test_index_lookups(tmp_path):
+    """按事件、交易员、代币查询，批量缓冲的记录查询前写入"""
+    index = DeliveryIndex(str(tmp_path / 'deliveries.db'), batch_size=100, flush_interval=60)
+    for i in range(5):
+        index.add(DeliveryRecord(
+            chat_id=-100 - i % 2,
+            message_ids=[i * 10, i * 10 + 1],
+            sent_at=1000.0 + i,
+            completed_at=1000.5 + i,
+            attempts=1,
+            event_id=f'evt-{i}',
+            trader_address='0xABC' if i < 3 else '0xdef',
+            token='btc',
+        ))
+
+    [record] = index.by_event('evt-2')
+    assert record.chat_id == -100
+    assert record.message_id == 20
+    assert record.message_ids == [20, 21]
+
+    assert [r.event_id for r in index.by_trader('0xabc')] == ['evt-2', 'evt-1', 'evt-0']
+    assert len(index.by_token('BTC', limit=4)) == 4
+    index.close()
+
+
+def test_background_writer(tmp_path):
+    """add() 只写入缓冲区，由后台线程写入数据库"""
+    path = str(tmp_path / 'deliveries.db')
+    index = DeliveryIndex(path, batch_size=100, flush_interval=0.05)
+    index.add(DeliveryRecord(chat_id=-100, message_ids=[1], sent_at=1000.0, event_id='evt-1'))
+
+    deadline = time.monotonic() + 5
+    count = 0
+    while not count and time.monotonic() < deadline:
+        time.sleep(0.02)
+        count = sqlite3.connect(path).execute("SELECT COUNT(*) FROM deliveries").fetchone()[0]
+    assert count == 1
+    index.close()
+
+
+def test_message_thread_id_round_trip(tmp_path):
+    """话题ID写入并查询回来；旧版本创建的数据库打开时补上该列"""
+    path = str(tmp_path / 'deliveries.db')
+    with sqlite3.connect(path) as conn:
+        conn.execute(
+            "CREATE TABLE deliveries (id INTEGER PRIMARY KEY, event_id TEXT, chat_id TEXT NOT NULL, "
+            "message_id INTEGER, message_ids TEXT NOT NULL, trader_address TEXT, token TEXT, "
+            "sent_at REAL NOT NULL, completed_at REAL NOT NULL, attempts INTEGER NOT NULL)"
+        )
+        conn.execute(
+            "INSERT INTO deliveries (event_id, chat_id, message_id, message_ids, sent_at, completed_at, attempts) "
+            "VALUES ('evt-old', '-100', 1, '[1]', 1000.0, 1000.0, 1)"
+        )
+    conn.close()
+
+    index = DeliveryIndex(path, flush_interval=60)
+    index.add(DeliveryRecord(chat_id=-100, message_ids=[2], sent_at=1001.0, event_id='evt-new', message_thread_id=11))
+
+    [record] = index.by_event('evt-new')
+    assert record.message_thread_id == 11
+    assert record.to_dict()['message_thread_id'] == 11
+    assert index.by_event('evt-old')[0].message_thread_id is None
+    index.close()
@@ -0,0 +1,80 @@
+"""
+代币信息缓存测试
+"""
+import asyncio
+import json
+
+from api.core.enrichment import FileTokenProvider, TokenCache, TokenProvider
+
+
+class SlowProvider(TokenProvider):
+    """记录调用次数、可设置延迟的数据源"""
+
+    def __init__(self, delay: float = 0.01):
+        self.delay = delay
+        self.calls = 0
+
+    async def fetch(self, token):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return {'name': token.title(), 'price': 100.0 * self.calls}
+
+
+def test_single_flight_burst():
+    """同一代币的突发请求只加载一次"""
+    provider = SlowProvider()
+    cache = TokenCache(provider, budget=1.0)
+
+    async def run():
+        return await asyncio.gather(*(cache.get('btc') for _ in range(100)))
+
+    results = asyncio.run(run())
+
+    assert provider.calls == 1
+    assert all(info == {'name': 'Btc', 'price': 100.0} for info in results)
+
+
+def test_stale_while_revalidate(clock):
+    """过期后先返回旧值，后台刷新完成后返回新值"""
+    provider = SlowProvider(delay=0)
+    cache = TokenCache(provider, ttl=30, stale_ttl=300, budget=1.0, clock=clock)
+
+    async def run():
+        first = await cache.get('ETH')
+        clock.now += 60
+        stale = await cache.get('ETH')
+        await asyncio.sleep(0.01)
+        fresh = await cache.get('ETH')
+        return first, stale, fresh
+
+    first, stale, fresh = asyncio.run(run())
+
+    assert first['price'] == stale['price'] == 100.0
+    assert fresh['price'] == 200.0
+
+
+def test_budget_timeout_still_fills_cache():
+    """超过延迟预算时返回None，加载完成后缓存可用"""
+    provider = SlowProvider(delay=0.05)
+    cache = TokenCache(provider, budget=0.01)
+
+    async def run():
+        timed_out = await cache.get('SOL')
+        await asyncio.sleep(0.1)
+        return timed_out, await cache.get('SOL')
+
+    timed_out, cached = asyncio.run(run())
+
+    assert timed_out is None
+    assert cached['price'] == 100.0
+    assert provider.calls == 1
+
+
+def test_file_provider(tmp_path):
+    """本地文件数据源按代币符号查询（不区分大小写）"""
+    path = tmp_path / 'tokens.json'
+    path.write_text(json.dumps({'btc': {'name': 'Bitcoin', 'price': 67250.5}}))
+    provider = FileTokenProvider(str(path))
+
+    assert asyncio.run(provider.fetch('BTC')) == {'name': 'Bitcoin', 'price': 67250.5}
+    assert asyncio.run(provider.fetch('DOGE')) is None
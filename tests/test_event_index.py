@@ -0,0 +1,97 @@
+"""
+事件历史索引测试
+"""
+import os
+import random
+
+from api.core import event_index
+from api.core.event_index import EventIndex, HistoryQuery
+from api.core.event_store import EventStore
+
+
+CLOCK_START = 1_760_000_000.0
+
+
+def fill(tmp_path, clock, count=3000):
+    """写入跨越多天的随机事件，返回存储和事件列表"""
+    store = EventStore(str(tmp_path), clock=clock)
+    rng = random.Random(3)
+    events = []
+    for _ in range(count):
+        clock.now += rng.uniform(0, 200)
+        event = (clock.now, rng.choice(['BTC', 'ETH', 'SOL']), rng.choice(['0xa', '0xb', '0xc', '0xd']),
+                 rng.choice([1, 2]), rng.choice([1, 2]), float(rng.randrange(1, 10_000_000)))
+        store.append(*event[1:])
+        events.append(event)
+    store.flush()
+    return store, events
+
+
+def expected(events, token=None, trader=None, message_type=None, side=None, min_value=None, start=0.0, end=1e12):
+    """逐条过滤的参照结果（从新到旧）"""
+    return [
+        e for e in reversed(events)
+        if (token is None or e[1] == token) and (trader is None or e[2] == trader)
+        and (message_type is None or e[3] == message_type) and (side is None or e[4] == side)
+        and (min_value is None or e[5] >= min_value) and start <= e[0] < end
+    ]
+
+
+def fetch_all(index, query, limit):
+    """按游标翻完所有页"""
+    results, cursor = [], None
+    while True:
+        page, cursor = index.search(query, limit=limit, cursor=cursor)
+        results.extend(page)
+        if cursor is None:
+            return results
+
+
+def test_queries_match_reference(tmp_path, clock):
+    """各种条件组合的分页结果与逐条过滤一致"""
+    store, events = fill(tmp_path, clock)
+    index = EventIndex(store)
+    middle = events[len(events) // 2][0]
+    cases = [
+        {},
+        {'token': 'ETH', 'message_type': 2, 'min_value': 5_000_000},
+        {'trader': '0xb'},
+        {'trader': '0xc', 'token': 'SOL', 'side': 1},
+        {'start': middle - 86400, 'end': middle},
+    ]
+    for case in cases:
+        query = HistoryQuery(**case)
+        got = fetch_all(index, query, limit=97)
+        want = expected(events, **case)
+        assert [(e['timestamp'], e['value_usd']) for e in got] == [(e[0], e[5]) for e in want], case
+    store.close()
+
+
+def test_unindexed_tail_and_sealed_index(tmp_path, clock):
+    """索引建立后新写入的行也能查到；已结束分区的索引保存到磁盘"""
+    store, events = fill(tmp_path, clock, count=1500)
+    index = EventIndex(store)
+    assert len(index.search(HistoryQuery(trader='0xa'), limit=1000)[0]) == len(expected(events, trader='0xa'))
+
+    store.append('BTC', '0xa', 1, 1, 123.0)
+    page, _ = index.search(HistoryQuery(trader='0xa'), limit=1)
+    assert page[0]['value_usd'] == 123.0
+
+    first_day = store.days()[0]
+    assert any(name.startswith('index.') for name in os.listdir(os.path.join(str(tmp_path), first_day)))
+    store.close()
+
+
+def test_unknown_values_and_bad_cursor(tmp_path, clock, monkeypatch):
+    """未知代币直接返回空；游标格式错误抛出ValueError"""
+    monkeypatch.setattr(event_index, 'CHUNK_ROWS', 8)
+    store, _ = fill(tmp_path, clock, count=50)
+    index = EventIndex(store)
+    assert index.search(HistoryQuery(token='DOGE')) == ([], None)
+    try:
+        index.search(HistoryQuery(), cursor='bogus')
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('expected ValueError')
+    store.close()
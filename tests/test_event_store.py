@@ -0,0 +1,99 @@
+"""
+列式事件存储测试
+"""
+import os
+import sys
+import threading
+
+from api.core.event_store import DictionaryFile, EventStore
+from api.core.events import SIDE_LONG, SIDE_SHORT
+
+
+CLOCK_START = 1_760_000_000.0  # 2025-10-09 08:53 UTC
+
+
+def test_round_trip_across_days(tmp_path, clock):
+    """事件按UTC日期分区写入，重新打开后按时间范围读回"""
+    store = EventStore(str(tmp_path), clock=clock)
+    start = clock.now
+    store.append('btc', '0xAAA', 1, SIDE_LONG, 1_000_000)
+    clock.now += 86400
+    store.append('ETH', '0xbbb', 2, SIDE_SHORT, 2_000_000)
+    store.append('BTC', '0xbbb', 1, SIDE_SHORT, 3_000_000)
+    store.close()
+
+    reopened = EventStore(str(tmp_path), clock=clock)
+    assert reopened.days() == ['20251009', '20251010']
+    columns = reopened.columns(start, clock.now + 1)
+    assert list(columns['value']) == [1e6, 2e6, 3e6]
+    assert [reopened.tokens.values[i] for i in columns['token']] == ['BTC', 'ETH', 'BTC']
+    assert [reopened.traders.values[i] for i in columns['trader']] == ['0xaaa', '0xbbb', '0xbbb']
+    assert list(reopened.columns(start + 1, clock.now + 1)['message_type']) == [2, 1]
+    reopened.close()
+
+
+def test_shared_directory_dictionaries(tmp_path, clock):
+    """两个进程（实例）共用目录时字典ID一致"""
+    first = EventStore(str(tmp_path), clock=clock)
+    second = EventStore(str(tmp_path), clock=clock)
+    first.append('BTC', '0x1', 1, SIDE_LONG, 1)
+    first.flush()
+    second.append('ETH', '0x2', 1, SIDE_LONG, 2)
+    second.append('BTC', '0x1', 1, SIDE_LONG, 3)
+    second.flush()
+
+    columns = first.columns(0, clock.now + 1)
+    assert [first.tokens.values[i] for i in columns['token']] == ['BTC', 'ETH', 'BTC']
+    first.close()
+    second.close()
+
+
+def test_torn_write_is_repaired(tmp_path, clock):
+    """崩溃留下的不完整行在下次写入前被截掉"""
+    store = EventStore(str(tmp_path), clock=clock)
+    store.append('BTC', '0x1', 1, SIDE_LONG, 1)
+    store.flush()
+    day = store.days()[0]
+    with open(os.path.join(str(tmp_path), day, 'value.col'), 'ab') as f:
+        f.write(b'\x00' * 5)
+    with open(os.path.join(str(tmp_path), 'tokens.txt'), 'ab') as f:
+        f.write(b'DO')
+
+    store.append('DOGE', '0x1', 1, SIDE_LONG, 2)
+    store.close()
+    reopened = EventStore(str(tmp_path), clock=clock)
+    columns = reopened.columns(0, clock.now + 1)
+    assert list(columns['value']) == [1, 2]
+    assert reopened.tokens.values == ['BTC', 'DOGE']
+    reopened.close()
+
+
+def test_dictionary_sync_is_thread_safe(tmp_path):
+    """多个请求线程同时 sync() 时，另一个进程追加的每一行只读入一次，ID与值一致"""
+    path = str(tmp_path / 'tokens.txt')
+    writer = DictionaryFile(path)
+    reader = DictionaryFile(path)
+    done = threading.Event()
+
+    def read():
+        while not done.is_set():
+            reader.sync()
+
+    # 频繁切换线程，让并发的 sync() 交错执行
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    threads = [threading.Thread(target=read) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    try:
+        for batch in range(300):
+            writer.encode_many([f"T{batch}-{i}" for i in range(10)])
+    finally:
+        done.set()
+        for thread in threads:
+            thread.join()
+        sys.setswitchinterval(interval)
+    reader.sync()
+
+    assert reader.values == writer.values
+    assert all(reader.lookup(value) == i for i, value in enumerate(writer.values))
@@ -0,0 +1,60 @@
+"""
+启动耗时测试
+
+使用 python -X importtime 测量核心模块的导入耗时，防止冷启动变慢。
+预算可通过环境变量 IMPORT_TIME_BUDGET_MS 调整。
+"""
+import os
+import subprocess
+import sys
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 冷启动路径上的核心模块（不含Flask本身）
+CORE_MODULES = [
+    'api.config',
+    'api.utils.logger',
+    'api.utils.markdown',
+    'api.core.rate_limiter',
+    'api.core.telegram',
+    'api.core.dispatcher',
+]
+
+IMPORT_TIME_BUDGET_MS = float(os.getenv('IMPORT_TIME_BUDGET_MS', 120))
+
+
+def _import_time_ms(modules: list) -> float:
+    """在子进程中导入模块，返回总导入耗时（毫秒）"""
+    code = '; '.join(f'import {module}' for module in modules)
+    env = dict(os.environ, BOT_TOKEN='')
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        cwd=PROJECT_ROOT, env=env, capture_output=True, text=True, check=True
+    )
+    total_us = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # 只累加被测模块的顶层导入（嵌套导入已包含在累计耗时中，site等解释器启动开销不计）
+        if cumulative.strip().isdigit() and name.strip() in modules and not name[1:].startswith(' '):
+            total_us += int(cumulative)
+    return total_us / 1000
+
+
+def test_core_imports_have_no_side_effects():
+    """导入核心模块不加载.env、不校验配置、不导入python-telegram-bot"""
+    code = (
+        "import sys; "
+        + '; '.join(f'import {module}' for module in CORE_MODULES)
+        + "; assert 'telegram' not in sys.modules; assert 'dotenv' not in sys.modules"
+    )
+    env = dict(os.environ, BOT_TOKEN='')
+    subprocess.run([sys.executable, '-c', code], cwd=PROJECT_ROOT, env=env, check=True)
+
+
+def test_core_import_time_budget():
+    """核心模块导入耗时在预算内"""
+    total_ms = _import_time_ms(CORE_MODULES)
+
+    assert total_ms < IMPORT_TIME_BUDGET_MS, f"api imports took {total_ms:.1f}ms (budget {IMPORT_TIME_BUDGET_MS}ms)"
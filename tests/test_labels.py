@@ -0,0 +1,41 @@
+"""
+地址标签索引测试
+"""
+from api.core.labels import AddressLabels, address_key
+from tools.build_labels import write_index
+
+BINANCE = '0x28C6c06298d514Db089934071355E5743bf21d60'
+JUMP = '0xf584f8728b874a6a5c7a8d4d387c9aae9172d621'
+
+
+def test_lookup_hits_and_misses(tmp_path):
+    """EVM地址不区分大小写，其他格式的地址按哈希查找"""
+    path = str(tmp_path / 'labels.bin')
+    labels = {address_key(BINANCE): 'Binance 14', address_key(JUMP): 'Jump Trading'}
+    labels.update({address_key(f'0x{i:040x}'): f'wallet {i}' for i in range(1000)})
+    labels[address_key('9WzDXwBbmkg8ZTbNMqUxvQRAyrZzDsGYdLVL9zYtAWWM')] = 'Solana Whale'
+    write_index(labels, path)
+
+    index = AddressLabels(path)
+
+    assert len(index) == 1003
+    assert index.get(BINANCE.lower()) == 'Binance 14'
+    assert index.get(JUMP) == 'Jump Trading'
+    assert index.get(f'0x{777:040x}') == 'wallet 777'
+    assert index.get('9WzDXwBbmkg8ZTbNMqUxvQRAyrZzDsGYdLVL9zYtAWWM') == 'Solana Whale'
+    assert index.get('0x' + 'ab' * 20) is None
+
+
+def test_hot_swap(tmp_path):
+    """索引文件被替换后重新加载，缓存随之失效"""
+    path = str(tmp_path / 'labels.bin')
+    write_index({address_key(JUMP): 'Jump'}, path)
+    index = AddressLabels(path, check_interval=3600)
+    assert index.get(JUMP) == 'Jump'
+
+    write_index({address_key(JUMP): 'Jump Trading', address_key(BINANCE): 'Binance'}, path)
+
+    assert index.reload()
+    assert index.get(JUMP) == 'Jump Trading'
+    assert index.get(BINANCE) == 'Binance'
+    assert not index.reload()
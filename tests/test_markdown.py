@@ -0,0 +1,106 @@
+"""
+Markdown工具测试
+"""
+from api.utils.markdown import (
+    escape_markdown,
+    find_markdown_errors,
+    sanitize_message,
+    split_message,
+    utf16_length
+)
+
+
+def test_short_message_is_not_split():
+    """未超长的消息原样返回"""
+    assert split_message("hello *world*", 'Markdown') == ["hello *world*"]
+
+
+def test_split_respects_limit_and_prefers_newlines():
+    """切分后每段不超过限制，且在换行处切分"""
+    text = "\n".join(f"line {i} with `code{i}` and _italic_" for i in range(400))
+    parts = split_message(text, 'Markdown', 1000)
+
+    assert len(parts) > 1
+    for part in parts:
+        assert utf16_length(part) <= 1000
+        assert part.count('`') % 2 == 0
+        assert part.count('_') % 2 == 0
+        assert part.startswith('line ')
+
+
+def test_long_code_block_is_closed_and_reopened():
+    """超长代码块在切分处闭合，并在下一段以相同语言重新打开"""
+    text = "```python\n" + "\n".join(f"x = {i}" for i in range(500)) + "\n```"
+    parts = split_message(text, 'Markdown', 500)
+
+    assert len(parts) > 1
+    for part in parts:
+        assert utf16_length(part) <= 500
+        assert part.startswith("```python\n")
+        assert part.endswith("```")
+
+
+def test_html_tags_are_balanced():
+    """HTML标签在分段间保持配对"""
+    text = "<b>" + "word " * 500 + "</b>"
+    parts = split_message(text, 'HTML', 300)
+
+    for part in parts:
+        assert part.startswith("<b>")
+        assert part.endswith("</b>")
+
+
+def test_links_are_not_broken():
+    """链接不会被切断"""
+    link = "[example](https://example.com/some/long/path)"
+    text = " ".join([link] * 100)
+    parts = split_message(text, 'Markdown', 200)
+
+    for part in parts:
+        assert part.count('[') == part.count('](') == part.count(')')
+
+
+def test_surrogate_pairs_count_double():
+    """表情符号按UTF-16计为两个单位"""
+    text = "🐋" * 3000
+    parts = split_message(text, None)
+
+    assert [utf16_length(p) for p in parts] == [4096, 1904]
+
+
+def test_unclosed_markdown_is_escaped():
+    """未闭合的标记被自动转义"""
+    text, parse_mode, outcome = sanitize_message("Token *PEPE_2 traded", 'Markdown')
+
+    assert outcome == 'fixed'
+    assert parse_mode == 'Markdown'
+    assert find_markdown_errors(text, 'Markdown') == []
+
+
+def test_markdown_v2_reserved_chars_are_escaped():
+    """MarkdownV2中的保留字符被自动转义"""
+    text, _, outcome = sanitize_message("*Price* 1.5 (up!)", 'MarkdownV2')
+
+    assert outcome == 'fixed'
+    assert text == "*Price* 1\\.5 \\(up\\!\\)"
+
+
+def test_broken_html_falls_back_to_plain_text():
+    """无法修复的HTML降级为纯文本"""
+    text, parse_mode, outcome = sanitize_message("<b>unclosed", 'HTML')
+
+    assert outcome == 'plain'
+    assert parse_mode is None
+    assert text == "<b>unclosed"
+
+
+def test_valid_message_is_unchanged():
+    """合法消息原样返回"""
+    message = "*Bold* and _italic_ with `snake_case` [link](https://t.me)"
+    assert sanitize_message(message, 'Markdown') == (message, 'Markdown', 'ok')
+
+
+def test_escape_markdown():
+    """动态内容转义后可安全嵌入"""
+    assert escape_markdown("my_token*", 'Markdown') == "my\\_token\\*"
+    assert find_markdown_errors(f"*{escape_markdown('a_b', 'Markdown')}*", 'Markdown') == []
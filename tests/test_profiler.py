@@ -0,0 +1,70 @@
+"""
+采样分析测试
+"""
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+from api.utils.profiler import LoopMonitor, StackSampler, _frame_label
+
+
+def _spin(stop: threading.Event):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_sampler_collects_other_threads():
+    """采样到其他线程的调用栈，输出 collapsed stacks"""
+    stop = threading.Event()
+    worker = threading.Thread(target=_spin, args=(stop,), name='spinner')
+    worker.start()
+    sampler = StackSampler(interval=0.002)
+    try:
+        # 在子线程中运行，走后台线程采样
+        runner = threading.Thread(target=sampler.run, args=(0.2,))
+        runner.start()
+        runner.join()
+    finally:
+        stop.set()
+        worker.join()
+
+    assert sampler.mode == 'thread'
+    assert sampler.count > 10
+    lines = sampler.collapsed().splitlines()
+    spinner = [line for line in lines if line.startswith('spinner;')]
+    assert spinner and all('_spin (test_profiler.py:' in line for line in spinner)
+    assert all(line.rsplit(' ', 1)[1].isdigit() for line in lines)
+    assert any(item['function'].startswith('_spin') for item in sampler.top())
+
+
+def test_loop_monitor_catches_blocking_callback():
+    """阻塞事件循环的回调被记录调用栈，延迟计入统计"""
+    monitor = LoopMonitor(interval=0.01, slow_callback=0.05)
+    done = False
+
+    def block():
+        time.sleep(0.2)
+
+    async def main():
+        nonlocal done
+        task = asyncio.ensure_future(monitor.run(lambda: done))
+        await asyncio.sleep(0.05)
+        block()
+        await asyncio.sleep(0.05)
+        done = True
+        await task
+
+    asyncio.run(main())
+
+    summary = monitor.summary()
+    assert summary['lag_max_ms'] >= 100
+    assert summary['slow_callbacks']
+    assert any(frame.startswith('test_loop_monitor_catches_blocking_callback.<locals>.block')
+               for frame in summary['slow_callbacks'][0]['stack'])
+
+
+def test_frame_label_without_qualname():
+    """Python 3.11 之前的代码对象没有 co_qualname，使用函数名"""
+    code = SimpleNamespace(co_name='send', co_filename='/app/api/core/telegram.py', co_firstlineno=120)
+    assert _frame_label(code) == 'send (telegram.py:120)'
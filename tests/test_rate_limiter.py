@@ -0,0 +1,80 @@
+"""
+限流器测试
+"""
+import asyncio
+from types import SimpleNamespace
+
+from api.core.rate_limiter import RateLimiter, SharedRateLimiter
+from api.core.telegram import TelegramSender
+
+
+def test_chat_burst_then_wait(clock):
+    """群组突发额度用完后需要等待"""
+    limiter = RateLimiter(global_rate=1000, chat_rate=1.0, chat_burst=3, clock=clock)
+
+    waits = [limiter.reserve(-1) for _ in range(5)]
+
+    assert waits[:3] == [0.0, 0.0, 0.0]
+    assert waits[3] == 1.0
+    assert waits[4] == 2.0
+    assert limiter.reserve(-2) == 0.0
+
+
+def test_slots_recover_over_time(clock):
+    """时间推进后恢复额度"""
+    limiter = RateLimiter(global_rate=1000, chat_rate=1.0, chat_burst=1, clock=clock)
+
+    assert limiter.reserve(-1) == 0.0
+    assert limiter.reserve(-1) == 1.0
+    clock.now += 10
+    assert limiter.reserve(-1) == 0.0
+
+
+def test_shared_state_across_instances(tmp_path, clock):
+    """两个实例（模拟两个worker）共享同一份限流和去重状态"""
+    path = str(tmp_path / 'rate.db')
+    worker_a = SharedRateLimiter(path, global_rate=1000, chat_rate=1.0, chat_burst=2, clock=clock)
+    worker_b = SharedRateLimiter(path, global_rate=1000, chat_rate=1.0, chat_burst=2, clock=clock)
+
+    assert worker_a.reserve(-1) == 0.0
+    assert worker_b.reserve(-1) == 0.0
+    assert worker_a.reserve(-1) == 1.0
+    assert worker_b.reserve(-1) == 2.0
+
+    assert worker_a.seen('msg', 30) is False
+    assert worker_b.seen('msg', 30) is True
+    clock.now += 31
+    assert worker_b.seen('msg', 30) is False
+
+
+class FlakyBot:
+    """第一次发送失败，之后成功"""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def send_message(self, chat_id, text, **kwargs):
+        from telegram.error import TelegramError
+
+        self.calls += 1
+        if self.calls == 1:
+            raise TelegramError('Chat not found')
+        return SimpleNamespace(message_id=self.calls)
+
+
+def test_failed_send_is_not_deduplicated(tmp_path):
+    """发送失败时撤销去重键，窗口内的重试照常发送；发送成功后再重复才跳过"""
+    limiter = SharedRateLimiter(str(tmp_path / 'rate.db'), global_rate=1000, chat_rate=1000)
+    sender = TelegramSender(bot_token='test:token', rate_limiter=limiter, dedup_window=60)
+    sender.bot = FlakyBot()
+    sender._initialized = True
+
+    async def run():
+        return [await sender.send_message(-1, 'BTC', parse_mode=None) for _ in range(3)]
+
+    failed, retried, duplicate = asyncio.run(run())
+
+    assert failed is None
+    assert retried.message_ids == [2]
+    assert duplicate is not None and duplicate.message_ids == []
+    assert sender.bot.calls == 2
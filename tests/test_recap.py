@@ -0,0 +1,54 @@
+"""
+事件历史和定时汇总测试
+"""
+from api.core.events import SIDE_LONG, SIDE_SHORT
+from api.core.history import EventHistory
+from api.core.recap import RecapScheduler, build_recap
+from api.utils.summary_formatter import format_recap
+
+
+CLOCK_START = 1_700_000_000.0
+
+
+def test_history_time_range_and_retention(clock):
+    """按时间范围取列；写满时丢弃超过保留时长的事件"""
+    history = EventHistory(retention=100, initial_capacity=4, clock=clock)
+    for i in range(10):
+        history.append('btc', '0xABC', 1, SIDE_LONG, float(i))
+        clock.now += 30
+
+    assert list(history.columns(clock.now - 95, clock.now)['value']) == [7.0, 8.0, 9.0]
+    assert history.columns(0, clock.now)['value'][0] > 0
+    assert history.tokens.values == ['BTC']
+    assert history.traders.values == ['0xabc']
+
+
+def test_build_recap(clock):
+    """净流入按代币分组，最大交易和强平分开排序"""
+    history = EventHistory(clock=clock)
+    history.append('BTC', '0x1', 1, SIDE_LONG, 5_000_000)
+    history.append('BTC', '0x2', 1, SIDE_SHORT, 2_000_000)
+    history.append('ETH', '0x3', 1, SIDE_SHORT, 3_000_000)
+    history.append('ETH', '0x4', 2, SIDE_LONG, 9_000_000)
+
+    recap = build_recap(history.columns(0, clock.now + 1), history.tokens.values, history.traders.values, limit=2)
+    assert recap['trades'] == 3 and recap['liquidations'] == 1
+    assert [trade['value'] for trade in recap['top_trades']] == [5_000_000, 3_000_000]
+    assert recap['top_liquidations'][0]['trader'] == '0x4'
+    assert [(flow['token'], flow['net_flow']) for flow in recap['net_flows']] == [('BTC', 3e6), ('ETH', -3e6)]
+
+
+def test_format_recap(clock):
+    """中英文汇总包含各部分"""
+    history = EventHistory(clock=clock)
+    history.append('BTC', '0x1234567890abcdef1234567890abcdef12345678', 1, SIDE_LONG, 8_400_000)
+    history.append('ETH', '0x1', 2, SIDE_SHORT, 1_500_000)
+    clock.now += 10
+    recap = RecapScheduler(history, send=None, periods=['hourly'], clock=clock).build('hourly', clock.now)
+
+    en = format_recap(recap, 'en')
+    assert 'Hourly whale recap' in en
+    assert '1. BTC Buy $8.4M `0x1234…5678`' in en
+    assert '• BTC +$8.4M (volume $8.4M)' in en
+    assert '1. ETH Short $1.5M' in en
+    assert '巨鲸小时汇总' in format_recap(recap, 'zh')
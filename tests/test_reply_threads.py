@@ -0,0 +1,55 @@
+"""
+回复串联映射测试
+"""
+from api.core.reply_threads import ReplyThreads, SharedReplyThreads
+
+
+def test_lru_eviction():
+    """超出容量时淘汰最久未使用的交易员"""
+    threads = ReplyThreads(capacity=2)
+    threads.put(-1, '0xAAA', 10)
+    threads.put(-1, '0xbbb', 20)
+    assert threads.get(-1, '0xaaa') == 10  # 访问后变为最近使用
+
+    threads.put(-1, '0xccc', 30)
+
+    assert len(threads) == 2
+    assert threads.get(-1, '0xbbb') is None
+    assert threads.get(-1, '0xaaa') == 10
+    assert threads.get(-2, '0xaaa') is None
+
+
+def test_snapshot_roundtrip(tmp_path):
+    """快照恢复后映射和LRU顺序不变"""
+    path = str(tmp_path / 'threads.json')
+    threads = ReplyThreads(capacity=10, snapshot_path=path, snapshot_interval=3600)
+    for i in range(5):
+        threads.put(-1, f'0x{i}', i)
+    threads.snapshot()
+
+    restored = ReplyThreads(capacity=3, snapshot_path=path)
+
+    assert len(restored) == 3
+    assert restored.get(-1, '0x1') is None
+    assert restored.get(-1, '0x4') == 4
+
+
+def test_shared_across_workers(tmp_path, clock):
+    """共享映射保存在SQLite中，一个worker记录的消息ID其他worker也能查到；超出容量时淘汰最早记录的"""
+    path = str(tmp_path / 'rate_state.db')
+    workers = [SharedReplyThreads(path, capacity=2, prune_interval=0, clock=clock) for _ in range(2)]
+
+    workers[0].put(-1, '0xAAA', 10)
+    assert workers[1].get(-1, '0xaaa') == 10
+    clock.now += 1
+    workers[1].put(-1, '0xaaa', 11)
+    assert workers[0].get(-1, '0xaaa') == 11
+
+    clock.now += 1
+    workers[0].put(-1, '0xbbb', 20)
+    clock.now += 1
+    workers[1].put(-1, '0xccc', 30)
+
+    assert len(workers[0]) == 2
+    assert workers[0].get(-1, '0xaaa') is None
+    assert workers[1].get(-2, '0xbbb') is None
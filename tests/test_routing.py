@@ -0,0 +1,97 @@
+"""
+消息路由测试
+"""
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from api.core.rate_limiter import RateLimiter
+from api.core.routing import Destination, RoutingTable, group_destinations, parse_topics
+from api.core.telegram import TelegramSender
+
+
+def test_group_by_render_key():
+    """相同语言、解析模式、模板的目标归为一组，保持顺序"""
+    destinations = [
+        Destination('-1', 'zh'),
+        Destination(-2, 'en'),
+        Destination(-3, 'zh'),
+        Destination(-4, 'zh', parse_mode='HTML'),
+        Destination('@channel', 'en', variant='compact'),
+    ]
+
+    groups = group_destinations(destinations)
+
+    assert [[d.chat_id for d in group] for group in groups.values()] == [[-1, -3], [-2], [-4], ['@channel']]
+    assert list(groups)[0] == ('zh', 'Markdown', 'default')
+
+
+def test_routing_table_from_file(tmp_path):
+    """从文件加载路由表并按消息类型过滤"""
+    path = tmp_path / 'routes.json'
+    path.write_text(json.dumps({'destinations': [
+        {'chat_id': -1, 'language': 'zh'},
+        {'chat_id': -2, 'language': 'en', 'message_types': [2]},
+    ]}))
+
+    table = RoutingTable.from_file(str(path))
+
+    assert [d.chat_id for d in table.destinations_for(1)] == [-1]
+    assert [d.chat_id for d in table.destinations_for(2)] == [-1, -2]
+
+
+def test_topics():
+    """各类消息发往配置的话题，未配置的发往默认话题；话题名称未知时报错"""
+    assert parse_topics('trade=11, liquidation=12,recap=13') == {'trade': 11, 'liquidation': 12, 'recap': 13}
+    assert parse_topics('') == {}
+    with pytest.raises(ValueError):
+        parse_topics('trade=abc')
+    with pytest.raises(ValueError):
+        Destination(-1, topics={'news': 5})
+
+    destination = Destination(-1, message_thread_id=1, topics={'trade': 11, 'recap': 13})
+    assert [destination.thread_for(topic) for topic in ('trade', 'liquidation', 'recap')] == [11, 1, 13]
+    assert Destination(**destination.to_dict()).thread_for('trade') == 11
+
+    settings = SimpleNamespace(CHAT_ID_ZH='-1', CHAT_ID_EN='-2', CHAT_TOPICS_ZH='liquidation=12', CHAT_TOPICS_EN='')
+    zh, en = RoutingTable.from_settings(settings).destinations
+    assert (zh.thread_for('liquidation'), en.thread_for('liquidation')) == (12, None)
+
+
+class RecordingLimiter(RateLimiter):
+    """记录限流预约的键"""
+
+    def __init__(self):
+        super().__init__()
+        self.reserved = []
+
+    def reserve(self, chat_id):
+        self.reserved.append(chat_id)
+        return 0.0
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent.append((chat_id, kwargs.get('message_thread_id')))
+        return SimpleNamespace(message_id=len(self.sent))
+
+
+def test_topics_share_chat_rate_limit():
+    """同一群组的不同话题按群组限流，相同内容在不同话题中不算重复"""
+    limiter = RecordingLimiter()
+    sender = TelegramSender(bot_token='test:token', rate_limiter=limiter, dedup_window=60)
+    sender.bot = FakeBot()
+    sender._initialized = True
+
+    result = asyncio.run(sender.send_to_multiple_chats(
+        [-1, -1, -2], 'BTC', parse_mode=None, delay_between_sends=0, message_thread_ids=[11, 12, None]
+    ))
+
+    assert result['failed'] == []
+    assert sorted(sender.bot.sent, key=str) == sorted([(-1, 11), (-1, 12), (-2, None)], key=str)
+    assert sorted(limiter.reserved) == [-2, -1, -1]
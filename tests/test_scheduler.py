@@ -0,0 +1,141 @@
+"""
+定时发送测试
+"""
+import asyncio
+import fcntl
+import threading
+import time
+
+import pytest
+
+from api.core.scheduler import MAX_DELAY, Overbooked, ScheduledSend, SendScheduler, TimerWheel, parse_schedule
+
+
+CLOCK_START = 1_760_000_000.0
+
+
+async def _noop(item):
+    pass
+
+
+HANDLERS = {'message': _noop}
+
+
+def test_parse_schedule():
+    """send_at 支持Unix秒和ISO 8601，已过的时间立即发送，不能同时指定两种方式"""
+    now = 1_760_000_000.0
+    assert parse_schedule({}, now) == (None, None)
+    assert parse_schedule({'delay_seconds': 90}, now) == (now + 90, None)
+    assert parse_schedule({'send_at': now + 60}, now) == (now + 60, None)
+    assert parse_schedule({'send_at': '2025-10-09T09:00:00Z'}, now) == (1_760_000_400.0, None)
+    assert parse_schedule({'send_at': '2025-10-09T17:00:00+08:00'}, now) == (1_760_000_400.0, None)
+    assert parse_schedule({'send_at': now - 5}, now) == (None, None)
+    assert parse_schedule({'send_at': now + 60, 'delay_seconds': 1}, now)[1]
+    assert parse_schedule({'delay_seconds': -1}, now)[1]
+    assert parse_schedule({'send_at': 'tomorrow'}, now)[1]
+    assert parse_schedule({'delay_seconds': MAX_DELAY + 1}, now)[1]
+    # 非有限的数（JSON中的 NaN / Infinity）和超出float范围的整数被拒绝
+    for value in (float('nan'), float('inf'), -float('inf'), 10 ** 400):
+        assert parse_schedule({'delay_seconds': value}, now)[1]
+        assert parse_schedule({'send_at': value}, now)[1]
+
+
+def test_timer_wheel_rounds():
+    """超过一圈的条目在经过时留在原格，到期才取出；已取消的丢弃"""
+    wheel = TimerWheel(slots=8, now=100)
+    items = [ScheduledSend(str(due), due, 'message', {}, 100) for due in (99, 103, 111, 105)]
+    for item in items:
+        wheel.add(item)
+    items[3].cancelled = True
+
+    assert [item.id for item in wheel.advance(101)] == ['99']
+    assert [item.id for item in wheel.advance(104)] == ['103']
+    assert wheel.advance(108) == []
+    assert [item.id for item in wheel.advance(111.5)] == ['111']
+
+
+def test_journal_shared_and_reloaded(tmp_path, clock):
+    """日志在worker之间共享，重启后重新加载；到期发送后不再加载"""
+    path = str(tmp_path / 'scheduled.jsonl')
+    first = SendScheduler(HANDLERS, journal_path=path, clock=clock)
+    second = SendScheduler(HANDLERS, journal_path=path, clock=clock)
+
+    kept = first.schedule('message', {'chat_ids': [-1001], 'text': 'hi'}, clock.now + 60, key='producer')
+    later = first.schedule('message', {'chat_ids': [-1001], 'text': 'later'}, clock.now + 7200)
+    cancelled = second.schedule('message', {'chat_ids': [-1002], 'text': 'bye'}, clock.now + 30)
+
+    assert [item.id for item in second.list()] == [cancelled.id, kept.id, later.id]
+    assert [item.id for item in second.list(key='producer')] == [kept.id]
+    assert first.cancel(cancelled.id)
+    assert not second.cancel(cancelled.id)
+
+    restarted = SendScheduler(HANDLERS, journal_path=path, clock=clock)
+    assert [item.id for item in restarted.list()] == [kept.id, later.id]
+    assert restarted.get(kept.id).payload == {'chat_ids': [-1001], 'text': 'hi'}
+
+    clock.now += 61
+    assert restarted.is_leader()
+    assert [item.id for item in restarted.take_due()] == [kept.id]
+    assert [item.id for item in first.list()] == [later.id]
+    assert len(SendScheduler(HANDLERS, journal_path=path, clock=clock)) == 1
+
+
+def test_malformed_journal_records_skipped(tmp_path, clock):
+    """日志中损坏或发送时间不合法的记录被跳过，不影响其他记录，也不留在待发送中"""
+    path = str(tmp_path / 'scheduled.jsonl')
+    first = SendScheduler(HANDLERS, journal_path=path, clock=clock)
+    kept = first.schedule('message', {'chat_ids': [-1001], 'text': 'hi'}, clock.now + 60)
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('{"op": "add", "id": "truncated", "due"\n')
+        f.write('{"op": "add", "id": "nan", "due": NaN, "kind": "message", "payload": {}, "created_at": 0}\n')
+        f.write('{"op": "add", "id": "text", "due": "soon", "kind": "message", "payload": {}, "created_at": 0}\n')
+        f.write('{"id": "no-op"}\n')
+    later = first.schedule('message', {'chat_ids': [-1001], 'text': 'later'}, clock.now + 120)
+
+    assert [item.id for item in first.list()] == [kept.id, later.id]
+    restarted = SendScheduler(HANDLERS, journal_path=path, clock=clock)
+    assert [item.id for item in restarted.list()] == [kept.id, later.id]
+    assert restarted.get('nan') is None
+
+
+def test_overbooked_retry_after(clock):
+    """待发送已满时拒绝，并给出下一条到期发送（腾出空位）的时间"""
+    scheduler = SendScheduler(HANDLERS, max_pending=1, clock=clock)
+    scheduler.schedule('message', {}, clock.now + 30.5)
+    with pytest.raises(Overbooked) as overbooked:
+        scheduler.schedule('message', {}, clock.now + 60)
+    assert overbooked.value.retry_after == 31
+
+
+def test_journal_lock_does_not_block_loop(tmp_path):
+    """另一个进程持有日志锁时，等待锁的是线程池而不是发送事件循环"""
+    path = str(tmp_path / 'scheduled.jsonl')
+    sent = []
+
+    async def send(item):
+        sent.append(item.id)
+
+    scheduler = SendScheduler({'message': send}, journal_path=path)
+    item = scheduler.schedule('message', {}, time.time())
+
+    async def main():
+        stopped = []
+        running = asyncio.ensure_future(scheduler.run(lambda: bool(stopped)))
+        gaps = []
+        last = time.monotonic()
+        while not sent:
+            await asyncio.sleep(0.05)
+            now = time.monotonic()
+            gaps.append(now - last)
+            last = now
+        stopped.append(True)
+        await running
+        return max(gaps)
+
+    with open(path, 'a') as journal:
+        fcntl.flock(journal, fcntl.LOCK_EX)
+        threading.Timer(1.5, fcntl.flock, (journal, fcntl.LOCK_UN)).start()
+        longest_gap = asyncio.run(main())
+
+    assert sent == [item.id]
+    assert longest_gap < 0.5
@@ -0,0 +1,77 @@
+"""
+请求签名校验测试
+"""
+import pytest
+
+from api.core.auth import AccessDenied
+from api.core.rate_limiter import NONCE_PRUNE_INTERVAL, SharedRateLimiter
+from api.core.signing import NonceCache, SignatureVerifier, sign
+
+BODY = b'{"message_type": 1, "value_usd": 2150000}'
+PATH = '/api/v1/whale/send'
+
+
+def test_verify_signature_and_reject_replay():
+    """签名覆盖方法、路径和原始请求体；篡改、过期、重放、换接口的请求被拒绝；轮换期间新旧密钥都有效"""
+    now = 1_760_000_000
+    verifier = SignatureVerifier(['old-secret', 'new-secret'], tolerance=300, clock=lambda: now)
+
+    def signed(secret, timestamp, nonce, body=BODY, path=PATH):
+        return body, str(timestamp), nonce, sign(secret, body, timestamp, nonce, 'POST', path)
+
+    verifier.verify(*signed('new-secret', now, 'nonce-0001'), 'POST', PATH)
+    verifier.verify(*signed('old-secret', now - 200, 'nonce-0002'), 'POST', PATH)
+
+    rejected = [
+        signed('new-secret', now, 'nonce-0001'),  # 重放
+        (BODY + b' ',) + signed('new-secret', now, 'nonce-0003')[1:],  # 篡改
+        signed('new-secret', now - 301, 'nonce-0004'),  # 过期
+        signed('other-secret', now, 'nonce-0005'),
+        signed('new-secret', now, 'bad.nonce'),
+        signed('new-secret', now, 'nonce-0007', path='/api/v1/whale/trade'),  # 签给其他接口
+        (BODY, None, 'nonce-0006', 'sha256=00'),
+    ]
+    for request in rejected:
+        with pytest.raises(AccessDenied) as denied:
+            verifier.verify(*request, 'POST', PATH)
+        assert denied.value.status == 401
+
+
+def test_nonces_shared_across_workers(tmp_path):
+    """配置共享限流器时随机串保存在SQLite中，发给一个worker的请求不能重放给另一个worker"""
+    now = 1_760_000_000
+    state = str(tmp_path / 'rate.db')
+    workers = [
+        SignatureVerifier(['secret'], tolerance=300, clock=lambda: now, limiter=SharedRateLimiter(state))
+        for _ in range(2)
+    ]
+    request = (BODY, str(now), 'nonce-0001', sign('secret', BODY, now, 'nonce-0001', 'POST', PATH), 'POST', PATH)
+
+    workers[0].verify(*request)
+    with pytest.raises(AccessDenied):
+        workers[1].verify(*request)
+    assert len(workers[1].nonces) == 1
+
+    # 过期的随机串被清理
+    later = now + 301 + NONCE_PRUNE_INTERVAL
+    assert workers[1].nonces.add('nonce-0002', later, later)
+    assert len(workers[1].nonces) == 1
+
+
+def test_nonce_cache_is_bounded():
+    """过期的桶被丢弃；达到上限时丢弃最早的桶，并拒绝该桶内时间戳的请求"""
+    cache = NonceCache(tolerance=100, max_entries=4, buckets=10)
+    now = 1000.0
+
+    assert cache.add('a', 901, now) and cache.add('b', 925, now) and cache.add('c', 945, now)
+    assert not cache.add('a', 901, now)
+    assert cache.add('d', 995, now)
+    assert cache.add('e', 995, now)
+    assert len(cache) == 4
+    # 最早的桶已被丢弃，其中的随机串不能借机重放
+    assert not cache.add('a', 901, now)
+
+    # 时间推进后早于 now - tolerance 的桶（b）整桶丢弃
+    assert cache.add('f', 1040, now=1040)
+    assert len(cache) == 4
+    assert not cache.add('c', 945, now=1040)
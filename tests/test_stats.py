@@ -0,0 +1,66 @@
+"""
+滚动聚合统计测试
+"""
+from api.core.events import SIDE_LONG, SIDE_SHORT, event_side
+from api.core.stats import AggregateStats
+
+
+CLOCK_START = 1_000_000.0
+
+
+def test_trader_window_counts_same_side(clock):
+    """连续买入累计笔数和金额，卖出单独统计"""
+    stats = AggregateStats(clock=clock)
+    stats.record('0xABC', 'btc', 1, SIDE_LONG, 2_000_000)
+    clock.now += 120
+    stats.record('0xabc', 'BTC', 1, SIDE_SHORT, 500_000)
+    clock.now += 120
+    window = stats.record('0xabc', 'ETH', 1, SIDE_LONG, 6_400_000)
+
+    assert window['buys'] == 2
+    assert window['buy_volume'] == 8_400_000
+    assert window['sells'] == 1
+    assert window['net_flow'] == 7_900_000
+
+
+def test_windows_expire(clock):
+    """超过窗口长度的事件不再计入"""
+    stats = AggregateStats(clock=clock)
+    stats.record('0xabc', 'BTC', 2, SIDE_LONG, 1_000_000)
+    clock.now += 1800
+
+    token = stats.snapshot(token='btc')['token']
+    assert token['15m']['liquidations'] == 0
+    assert token['1h']['liquidations'] == 1
+    assert token['24h']['liquidation_volume'] == 1_000_000
+
+    clock.now += 86400
+    assert stats.snapshot(token='BTC')['token']['24h']['events'] == 0
+
+
+def test_idle_traders_evicted(clock):
+    """交易员数达到上限时淘汰最久未活动的"""
+    stats = AggregateStats(max_traders=32, clock=clock)
+    for i in range(32):
+        stats.record(f'0x{i}', 'BTC', 1, SIDE_LONG, 1000)
+        clock.now += 1
+    stats.record('0xnew', 'BTC', 1, SIDE_LONG, 1000)
+
+    assert len(stats.traders) <= 32
+    assert stats.snapshot(trader='0x0')['trader'] is None
+    assert stats.snapshot(trader='0x31')['trader']['24h']['buys'] == 1
+    assert stats.snapshot(trader='0xnew')['trader']['1m']['buys'] == 1
+
+
+def test_top_tokens_and_event_side(clock):
+    """代币排行按成交额排序；中英文和整数参数的方向解析一致"""
+    stats = AggregateStats(clock=clock)
+    stats.record('0x1', 'ETH', 1, SIDE_LONG, 100)
+    stats.record('0x1', 'BTC', 1, SIDE_LONG, 300)
+    top = stats.snapshot(limit=1)['top_tokens']['1h']
+    assert [entry['token'] for entry in top] == ['BTC']
+
+    assert event_side({'action': 2}, 1) == SIDE_SHORT
+    assert event_side({'action': '卖出'}, 1) == SIDE_SHORT
+    assert event_side({'action': 'Long'}, 1) == SIDE_LONG
+    assert event_side({'position_type': '做空'}, 2) == SIDE_SHORT
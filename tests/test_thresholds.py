@@ -0,0 +1,80 @@
+"""
+动态阈值和低优先级摘要测试
+"""
+import asyncio
+import random
+
+from api.core.digest import AlertDigest
+from api.core.events import event_value
+from api.core.thresholds import QuantileSketch, ThresholdTracker
+from api.utils.summary_formatter import format_digest
+
+
+def test_sketch_relative_accuracy():
+    """分位数估计的相对误差在精度范围内"""
+    rng = random.Random(1)
+    values = [rng.lognormvariate(12, 2) for _ in range(50000)]
+    sketch = QuantileSketch(relative_accuracy=0.01)
+    for value in values:
+        sketch.add(value)
+
+    values.sort()
+    for q in (0.1, 0.5, 0.9, 0.99):
+        exact = values[int(q * (len(values) - 1))]
+        assert abs(sketch.quantile(q) - exact) / exact < 0.02
+
+
+def test_event_value_must_be_finite():
+    """NaN、无穷大和超出浮点范围的金额不进入阈值草图"""
+    assert event_value({'value_usd': '2150000'}) == 2150000.0
+    assert event_value({'position_value': 3.5e6}) == 3.5e6
+    for value in (float('nan'), 'nan', 'inf', '1e400', 'abc', None):
+        assert event_value({'value_usd': value}) is None
+
+
+def test_tracker_admits_until_enough_samples(clock):
+    """样本不足时全部正常发送，之后低于阈值的事件为低优先级"""
+    tracker = ThresholdTracker(percentile=50, min_samples=10, refresh_interval=0, clock=clock)
+    for value in range(1, 11):
+        assert tracker.observe('btc', 1, value * 1000) == (True, None)
+
+    admitted, threshold = tracker.observe('BTC', 1, 2000)
+    assert not admitted
+    assert 4900 < threshold < 6100
+    assert tracker.observe('BTC', 1, 9000)[0]
+    # 其他代币、其他消息类型各自独立
+    assert tracker.observe('BTC', 2, 1)[0]
+    assert tracker.observe('DOGE', 1, 1)[0]
+
+
+def test_tracker_window_expires(clock):
+    """滚动窗口过期后阈值清空"""
+    tracker = ThresholdTracker(percentile=50, window=3600, slots=6, min_samples=5, refresh_interval=0, clock=clock)
+    for _ in range(10):
+        tracker.observe('ETH', 1, 1_000_000)
+    assert not tracker.observe('ETH', 1, 10)[0]
+
+    clock.now += 3601
+    assert tracker.observe('ETH', 1, 10) == (True, None)
+    [entry] = tracker.snapshot('eth')
+    assert entry['samples'] == 1
+
+
+def test_digest_flush():
+    """摘要汇总累积的事件，发送后清空"""
+    sent = []
+
+    async def flush(entries, seconds):
+        sent.append(format_digest(entries, 'en', round(seconds / 60)))
+
+    digest = AlertDigest(flush, interval=60)
+    digest.add({'token': 'BTC', 'message_type': 1, 'value': 100000.0})
+    digest.add({'token': 'BTC', 'message_type': 1, 'value': 50000.0})
+    digest.add({'token': 'ETH', 'message_type': 2, 'value': 20000.0})
+    asyncio.run(digest.flush_now())
+    asyncio.run(digest.flush_now())
+
+    assert len(sent) == 1
+    assert 'BTC trades: 2, $150,000 total' in sent[0]
+    assert 'ETH liquidations: 1' in sent[0]
+    assert len(digest) == 0
@@ -0,0 +1,79 @@
+"""
+请求追踪测试
+"""
+import asyncio
+import json
+
+from api.utils.tracing import NOOP, Tracer, span, to_otlp, trace_id
+
+
+def test_unsampled_request_has_no_spans():
+    """未被采样时 span() 为空操作"""
+    tracer = Tracer()
+    tracer.configure(0.0)
+
+    assert tracer.start('POST /api/v1/send') is None
+    assert span('parse') is NOOP
+    assert trace_id() is None
+
+
+def test_spans_nest_across_tasks():
+    """子区间挂在当前区间下，asyncio 子任务继承当前区间"""
+    tracer = Tracer()
+    tracer.configure(1.0)
+    root = tracer.start('POST /api/v1/whale/send')
+
+    async def send(chat_id):
+        with span('telegram.send_message', chat_id=chat_id):
+            await asyncio.sleep(0)
+
+    async def deliver():
+        await asyncio.gather(send(-1), send(-2))
+
+    with span('render') as render:
+        pass
+    asyncio.run(deliver())
+    tracer.finish(root)
+
+    assert trace_id() is None
+    trace = tracer.recent[-1]
+    assert trace.root is root
+    sends = [item for item in trace.spans if item.name == 'telegram.send_message']
+    assert render.parent_id == root.span_id
+    assert sorted(item.attributes['chat_id'] for item in sends) == [-2, -1]
+    assert tracer.slowest(1)[0]['trace_id'] == trace.trace_id
+
+
+def test_traceparent_continues_upstream_trace():
+    """沿用上游 traceparent 的追踪ID和采样标记"""
+    tracer = Tracer()
+    tracer.configure(0.001)
+    upstream = '00-' + 'a' * 32 + '-' + 'b' * 16
+
+    root = tracer.start('GET /health', upstream + '-01')
+    assert root.trace.trace_id == 'a' * 32
+    assert root.parent_id == 'b' * 16
+    tracer.finish(root)
+
+    assert tracer.start('GET /health', upstream + '-00') is None
+
+
+def test_otlp_export_format():
+    """导出为 OTLP/JSON，失败的区间带错误状态"""
+    tracer = Tracer()
+    tracer.configure(1.0)
+    root = tracer.start('POST /api/v1/send')
+    try:
+        with span('telegram.send_message', attempt=1):
+            raise RuntimeError('timed out')
+    except RuntimeError:
+        pass
+    tracer.finish(root)
+
+    payload = json.loads(json.dumps(to_otlp([root.trace], 'telegram-sender')))
+    spans = payload['resourceSpans'][0]['scopeSpans'][0]['spans']
+    failed = next(item for item in spans if item['name'] == 'telegram.send_message')
+    assert failed['parentSpanId'] == root.span_id
+    assert failed['status'] == {'code': 2, 'message': 'RuntimeError: timed out'}
+    assert failed['attributes'] == [{'key': 'attempt', 'value': {'intValue': '1'}}]
+    assert int(failed['endTimeUnixNano']) >= int(failed['startTimeUnixNano'])
@@ -0,0 +1,90 @@
+"""
+巨鲸提醒发送测试（定时发送经过发送事件循环、同一群组多个话题的投递记录）
+"""
+import asyncio
+import time
+
+from api.core.dispatcher import dispatcher
+from api.core.enrichment import TokenCache, TokenProvider
+from api.core.routing import Destination
+from api.core.scheduler import SendScheduler
+from api.routers import whale
+
+
+class SlowProvider(TokenProvider):
+    """在事件循环中异步加载的代币信息"""
+
+    async def fetch(self, token):
+        await asyncio.sleep(0.05)
+        return {'price': 2.5, 'name': 'Test Token'}
+
+
+class RecordingSender:
+    """记录发出的消息"""
+
+    deferred_handshake = False
+    closing = False
+
+    def __init__(self):
+        self.pending = {}
+        self.sent = []
+
+    async def initialize(self):
+        return True
+
+    async def close(self):
+        pass
+
+    async def send_to_multiple_chats(self, chat_ids, text, message_thread_ids=None, **kwargs):
+        thread_ids = message_thread_ids or [None] * len(chat_ids)
+        records = []
+        for chat_id, thread_id in zip(chat_ids, thread_ids):
+            self.sent.append((chat_id, text))
+            records.append({'chat_id': chat_id, 'message_thread_id': thread_id, 'message_ids': [len(self.sent)]})
+        return {'success': list(chat_ids), 'failed': [], 'records': records}
+
+
+def test_scheduled_whale_alert_enriched_on_dispatcher_loop(monkeypatch):
+    """定时提醒在发送事件循环中补充代币信息，直接等待加载，不阻塞事件循环"""
+    sender = RecordingSender()
+    monkeypatch.setattr(whale, 'telegram_sender', sender)
+    monkeypatch.setattr(whale, 'token_cache', TokenCache(SlowProvider(), budget=0.5))
+    scheduler = SendScheduler({'whale': whale.send_scheduled})
+    data = {
+        'token': 'TEST', 'value_usd': 2150000, 'direction': 1, 'action': 1,
+        'trader_address': '0x' + '1' * 40, 'amount': 1, 'price': 2.4,
+    }
+    scheduler.schedule('whale', {
+        'data': data, 'message_type': 1, 'destinations': [Destination(-1001, 'en').to_dict()]
+    }, time.time())
+
+    dispatcher.start(sender, send_timeout=5)
+    stopped = []
+    try:
+        running = asyncio.run_coroutine_threadsafe(scheduler.run(lambda: bool(stopped)), dispatcher.loop)
+        deadline = time.monotonic() + 5
+        while not sender.sent and time.monotonic() < deadline:
+            time.sleep(0.05)
+        stopped.append(True)
+        running.result(5)
+    finally:
+        dispatcher.shutdown(deadline=1)
+
+    assert len(sender.sent) == 1
+    chat_id, text = sender.sent[0]
+    assert chat_id == -1001
+    assert 'Test Token' in text and '2.50' in text
+
+
+def test_topics_in_same_chat_keep_their_own_delivery(monkeypatch):
+    """同一群组的两个话题各自返回自己的投递记录"""
+    sender = RecordingSender()
+    monkeypatch.setattr(whale, 'telegram_sender', sender)
+    monkeypatch.setattr(whale, 'position_coalescer', None)
+    results = {'success': [], 'failed': [], 'deliveries': []}
+    groups = [([-1001, -1001], [11, 12], 'Markdown', lambda: 'alert')]
+
+    asyncio.run(whale.deliver_groups({}, 1, {'event_id': 'e1'}, groups, results))
+
+    assert results['success'] == [-1001, -1001]
+    assert [(d['message_thread_id'], d['message_ids']) for d in results['deliveries']] == [(11, [1]), (12, [2])]
@@ -0,0 +1,119 @@
+"""
+API密钥管理工具
+
+生成新的API密钥并写入密钥文件（文件中只保存 SHA-256，明文只在生成时打印一次）。
+写入先写临时文件再原子重命名，运行中的服务会在几秒内自动加载。
+
+使用方法:
+    python tools/api_keys.py new producer-a --file data/api_keys.json --rpm 600 --mpm 120 --destinations -1001 @whale_liq
+    python tools/api_keys.py hash <密钥>                       # 打印密钥的 SHA-256
+    python tools/api_keys.py bench                            # 测量认证+配额检查的耗时
+    python tools/api_keys.py bench --shared                   # 配额状态保存在多worker共享的SQLite中（每秒批量同步）
+    python tools/api_keys.py bench --shared --sync-interval 0 # 每次请求都执行SQLite事务
+"""
+import argparse
+import json
+import os
+import secrets
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api.core.auth import ApiKeys, hash_key  # noqa: E402
+from api.core.rate_limiter import SharedRateLimiter, create_quota  # noqa: E402
+
+
+def add_key(path: str, entry: dict):
+    """把密钥条目追加到密钥文件（同名条目被替换）"""
+    config = {'keys': []}
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            config = json.load(f)
+    config['keys'] = [key for key in config.get('keys', []) if key.get('name') != entry['name']] + [entry]
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(config, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+def new_key(args):
+    raw_key = secrets.token_urlsafe(32)
+    entry = {'name': args.name, 'sha256': hash_key(raw_key)}
+    if args.rpm:
+        entry.update(requests_per_minute=args.rpm, request_burst=args.request_burst)
+    if args.mpm:
+        entry.update(messages_per_minute=args.mpm, message_burst=args.message_burst)
+    if args.destinations:
+        entry['destinations'] = args.destinations
+
+    if args.file:
+        add_key(args.file, entry)
+        print(f"✅ Added key {args.name} to {args.file}")
+    else:
+        print(json.dumps(entry, ensure_ascii=False))
+    print(f"🔑 {raw_key}")
+
+
+def bench(count: int, shared: bool = False, sync_interval: float = 1.0):
+    """测量认证（哈希+查找）加请求配额和消息配额检查的单次耗时"""
+    raw_key = secrets.token_urlsafe(32)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'keys.json')
+        add_key(path, {
+            'name': 'bench', 'sha256': hash_key(raw_key),
+            'requests_per_minute': 1e9, 'messages_per_minute': 1e9, 'destinations': [-1001, -1002]
+        })
+        limiter = SharedRateLimiter(os.path.join(directory, 'rate.db')) if shared else None
+        keys = ApiKeys(path, limiter=create_quota(limiter, sync_interval) if limiter else None)
+
+        started = time.perf_counter()
+        for _ in range(count):
+            key = keys.authenticate(raw_key)
+            keys.charge_messages(key, 2)
+            key.allows(-1001)
+        elapsed = time.perf_counter() - started
+    if not shared:
+        state = 'in-process'
+    elif sync_interval > 0:
+        state = f'shared SQLite, synced every {sync_interval:g}s'
+    else:
+        state = 'shared SQLite, every request'
+    print(f"auth + quota ({state}): {elapsed / count * 1e6:.2f} µs/request ({count:,} requests)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Manage API keys')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    new = commands.add_parser('new', help='生成新密钥')
+    new.add_argument('name', help='密钥名称')
+    new.add_argument('--file', help='写入的密钥文件，不指定时只打印条目')
+    new.add_argument('--rpm', type=float, default=0, help='每分钟请求数，0为不限')
+    new.add_argument('--request-burst', type=int, default=10, help='请求突发条数')
+    new.add_argument('--mpm', type=float, default=0, help='每分钟消息数，0为不限')
+    new.add_argument('--message-burst', type=int, default=10, help='消息突发条数')
+    new.add_argument('--destinations', nargs='+', help='允许发往的群组')
+
+    hash_command = commands.add_parser('hash', help='打印密钥的 SHA-256')
+    hash_command.add_argument('key')
+
+    bench_command = commands.add_parser('bench', help='测量认证耗时')
+    bench_command.add_argument('--count', type=int, default=200000)
+    bench_command.add_argument('--shared', action='store_true', help='配额状态保存在共享SQLite中')
+    bench_command.add_argument('--sync-interval', type=float, default=1.0, help='共享配额的同步间隔（秒），0为每次请求同步')
+
+    args = parser.parse_args()
+    if args.command == 'new':
+        new_key(args)
+    elif args.command == 'hash':
+        print(hash_key(args.key))
+    else:
+        bench(args.count, args.shared, args.sync_interval)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""
+多群组分发基准测试
+
+1条巨鲸事件发往 500 个群组（5种语言各100个），对比：
+    - per-chat: 每个群组各自转换参数、渲染模板、切分校验消息
+    - grouped:  按 (语言, 解析模式, 模板) 分组，每组只渲染一次
+并测量经过发送器（不访问网络的FakeBot，关闭限流）的端到端分发耗时。
+
+使用方法:
+    python tools/bench_fanout.py --chats 500 --languages zh en ja ko ru --rounds 20
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('BOT_TOKEN', 'bench:token')
+
+from tools.bench_workers import FakeBot  # noqa: E402
+
+EVENT = {
+    'message_type': 1,
+    'action': 1,
+    'direction': 1,
+    'value_usd': 2150000,
+    'token': 'BTC',
+    'trader_address': '0x1234567890abcdef1234567890abcdef12345678',
+}
+
+
+def build_destinations(chats: int, languages: list) -> list:
+    from api.core.routing import Destination
+    return [Destination(-1000000 - i, languages[i % len(languages)]) for i in range(chats)]
+
+
+def render_per_chat(destinations: list) -> int:
+    """旧方式：每个群组单独渲染"""
+    from api.core.telegram import prepare_message
+    from api.routers.whale import convert_params_to_text, make_renderer
+
+    for destination in destinations:
+        payload = convert_params_to_text(EVENT, destination.language)
+        text = make_renderer(payload, destination.language, 1, destination.variant)()
+        prepare_message(text, destination.parse_mode)
+    return len(destinations)
+
+
+def render_grouped(destinations: list) -> int:
+    """新方式：每个 (语言, 解析模式, 模板) 分组渲染一次"""
+    from api.core.routing import group_destinations
+    from api.core.telegram import prepare_message
+    from api.routers.whale import convert_params_to_text, make_renderer
+
+    renders = 0
+    for (language, parse_mode, variant), group in group_destinations(destinations).items():
+        text = make_renderer(convert_params_to_text(EVENT, language), language, 1, variant)()
+        prepare_message(text, parse_mode)
+        renders += 1
+    return renders
+
+
+def bench(label: str, func, destinations: list, rounds: int):
+    started = time.perf_counter()
+    for _ in range(rounds):
+        renders = func(destinations)
+    elapsed = (time.perf_counter() - started) / rounds
+    print(f"{label:<10} renders={renders:<5} {elapsed * 1000:>9.2f} ms/event")
+    return elapsed
+
+
+def bench_end_to_end(destinations: list, rounds: int):
+    """经过路由、渲染和发送器的完整分发"""
+    from api.core.dispatcher import dispatcher
+    from api.core.rate_limiter import RateLimiter
+    from api.core.telegram import TelegramSender
+    from api.routers import whale
+
+    sender = TelegramSender(bot_token='bench:token', rate_limiter=RateLimiter(global_rate=0, chat_rate=0))
+    sender.bot = FakeBot()
+    dispatcher.start(sender)
+    whale.set_telegram_sender(sender)
+
+    started = time.perf_counter()
+    for _ in range(rounds):
+        results = whale.send_to_destinations(EVENT, 1, destinations)
+    elapsed = (time.perf_counter() - started) / rounds
+    dispatcher.shutdown(deadline=5)
+
+    print(f"{'end-to-end':<10} sent={len(results['success']):<8} {elapsed * 1000:>9.2f} ms/event")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fan-out render benchmark')
+    parser.add_argument('--chats', type=int, default=500)
+    parser.add_argument('--languages', nargs='+', default=['zh', 'en', 'ja', 'ko', 'ru'])
+    parser.add_argument('--rounds', type=int, default=20)
+    args = parser.parse_args()
+
+    destinations = build_destinations(args.chats, args.languages)
+    print(f"1 event -> {args.chats} chats, {len(args.languages)} languages")
+    print("=" * 60)
+    per_chat = bench('per-chat', render_per_chat, destinations, args.rounds)
+    grouped = bench('grouped', render_grouped, destinations, args.rounds)
+    print(f"render speedup x{per_chat / grouped:.1f}")
+    bench_end_to_end(destinations, args.rounds)
+    print("=" * 60)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+历史查询基准测试
+
+直接按列生成 days × per_day 条事件写入事件存储（跳过逐条 append），
+然后随机执行常见查询（代币+强平+金额、交易员、时间范围），输出 p50/p99 延迟。
+第一轮查询包含建索引的耗时，单独列出。
+
+使用方法:
+    python tools/bench_history.py /tmp/history --days 100 --per-day 1000000   # 1亿条
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api.core.event_index import EventIndex, HistoryQuery  # noqa: E402
+from api.core.event_store import DTYPES, EventStore, day_of  # noqa: E402
+
+
+def generate(store: EventStore, days: int, per_day: int, tokens: int, traders: int, end: float):
+    """按天生成随机事件"""
+    rng = np.random.default_rng(42)
+    store.tokens.encode_many([f"T{i}" for i in range(tokens)])
+    store.traders.encode_many([f"0x{i:040x}" for i in range(traders)])
+    for d in range(days, 0, -1):
+        day_start = (end // 86400 - d) * 86400
+        batch = {
+            'ts': np.sort(rng.uniform(day_start, day_start + 86400, per_day)),
+            'token': rng.zipf(1.5, per_day) % tokens,
+            'trader': rng.integers(0, traders, per_day),
+            'message_type': np.where(rng.random(per_day) < 0.8, 1, 2),
+            'side': rng.integers(1, 3, per_day),
+            'value': rng.lognormal(13, 1.5, per_day),
+        }
+        store._write_segment(day_of(day_start), {name: batch[name].astype(DTYPES[name]) for name in DTYPES})
+
+
+def percentile(values: list, q: float) -> float:
+    return sorted(values)[min(len(values) - 1, int(q * len(values)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark indexed history queries')
+    parser.add_argument('directory', help='存储目录（为空时先生成数据）')
+    parser.add_argument('--days', type=int, default=10)
+    parser.add_argument('--per-day', type=int, default=1_000_000)
+    parser.add_argument('--tokens', type=int, default=300)
+    parser.add_argument('--traders', type=int, default=200_000)
+    parser.add_argument('--queries', type=int, default=300)
+    args = parser.parse_args()
+
+    end = time.time()
+    store = EventStore(args.directory)
+    if not store.days():
+        started = time.perf_counter()
+        generate(store, args.days, args.per_day, args.tokens, args.traders, end)
+        print(f"generated {args.days * args.per_day:,} events in {time.perf_counter() - started:.1f}s")
+
+    index = EventIndex(store)
+    started = time.perf_counter()
+    index.search(HistoryQuery(token='T1'), limit=1, cursor=None)
+    for day in store.days():
+        index._load_or_build(day, store.segment(day))
+    print(f"index load/build {time.perf_counter() - started:.1f}s")
+
+    rng = random.Random(1)
+    span = args.days * 86400
+    kinds = {
+        'token+liquidation+value': lambda: HistoryQuery(
+            token=f"T{rng.randrange(20)}", message_type=2, min_value=5_000_000, start=end - 7 * 86400),
+        'trader': lambda: HistoryQuery(trader=f"0x{rng.randrange(args.traders):040x}"),
+        'time range': lambda: HistoryQuery(start=end - rng.uniform(0, span), end=end - rng.uniform(0, span / 2)),
+    }
+    for name, make in kinds.items():
+        timings = []
+        for _ in range(args.queries):
+            query = make()
+            started = time.perf_counter()
+            index.search(query, limit=100)
+            timings.append((time.perf_counter() - started) * 1000)
+        print(f"{name:<26} p50 {percentile(timings, 0.5):7.2f}ms  p99 {percentile(timings, 0.99):7.2f}ms")
+    store.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+汇总生成基准测试
+
+生成N条随机事件写入 EventHistory，测量生成一份日报（向量化聚合 + 中英文渲染）的耗时。
+
+使用方法:
+    python tools/bench_recap.py --events 1000000 --tokens 300 --traders 50000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api.core.history import COLUMNS, EventHistory  # noqa: E402
+from api.core.recap import RecapScheduler  # noqa: E402
+from api.utils.summary_formatter import format_recap  # noqa: E402
+
+
+def fill(history: EventHistory, events: int, tokens: int, traders: int, end: float):
+    """直接写入列数组（逐条 append 的耗时不在本测试范围内）"""
+    rng = np.random.default_rng(42)
+    for i in range(tokens):
+        history.tokens.encode(f"T{i}")
+    for i in range(traders):
+        history.traders.encode(f"0x{i:040x}")
+    history._columns = {name: np.zeros(events, dtype=dtype) for name, dtype in COLUMNS}
+    history._columns['ts'][:] = np.sort(rng.uniform(end - 86400, end, events))
+    history._columns['token'][:] = rng.zipf(1.5, events) % tokens
+    history._columns['trader'][:] = rng.integers(0, traders, events)
+    history._columns['message_type'][:] = np.where(rng.random(events) < 0.8, 1, 2)
+    history._columns['side'][:] = rng.integers(1, 3, events)
+    history._columns['value'][:] = rng.lognormal(13, 1.5, events)
+    history._size = events
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark daily recap generation')
+    parser.add_argument('--events', type=int, default=1_000_000)
+    parser.add_argument('--tokens', type=int, default=300)
+    parser.add_argument('--traders', type=int, default=50_000)
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    end = time.time()
+    history = EventHistory()
+    fill(history, args.events, args.tokens, args.traders, end)
+    scheduler = RecapScheduler(history, send=None, periods=['daily'])
+
+    timings = []
+    for _ in range(args.rounds):
+        started = time.perf_counter()
+        recap = scheduler.build('daily', end)
+        for language in ('zh', 'en'):
+            format_recap(recap, language)
+        timings.append((time.perf_counter() - started) * 1000)
+
+    print(f"events={args.events:,}  daily recap {min(timings):.1f}ms (best of {args.rounds}), "
+          f"median {sorted(timings)[len(timings) // 2]:.1f}ms")
+    print(format_recap(recap, 'en'))
+
+
+if __name__ == '__main__':
+    main()
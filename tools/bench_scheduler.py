@@ -0,0 +1,81 @@
+"""
+定时发送基准测试
+
+预约N条在未来一天内随机时间发送的消息，测量插入（含写日志）、每秒前进一格、
+重启时重新加载日志和到期取出的耗时。
+
+使用方法:
+    python tools/bench_scheduler.py --pending 100000
+    python tools/bench_scheduler.py --pending 100000 --memory     # 不写日志，只测时间轮
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api.core.scheduler import SendScheduler  # noqa: E402
+
+
+class FakeClock:
+    """可手动推进的时钟"""
+
+    def __init__(self):
+        self.now = time.time()
+
+    def __call__(self):
+        return self.now
+
+
+async def _noop(item):
+    pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the send scheduler')
+    parser.add_argument('--pending', type=int, default=100_000)
+    parser.add_argument('--memory', action='store_true', help='不写日志')
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    clock = FakeClock()
+    start = clock.now
+    with tempfile.TemporaryDirectory() as directory:
+        path = None if args.memory else os.path.join(directory, 'scheduled.jsonl')
+        scheduler = SendScheduler({'message': _noop}, journal_path=path, max_pending=args.pending, clock=clock)
+        payload = {'chat_ids': [-1001], 'text': 'x' * 200, 'parse_mode': 'Markdown'}
+
+        started = time.perf_counter()
+        for _ in range(args.pending):
+            scheduler.schedule('message', payload, start + rng.uniform(1, 86400))
+        insert = (time.perf_counter() - started) / args.pending
+        print(f"schedule: {insert * 1e6:.1f} µs each ({args.pending:,} pending)")
+
+        started = time.perf_counter()
+        scheduler.list(100)
+        print(f"list first 100: {(time.perf_counter() - started) * 1000:.1f}ms")
+
+        if path:
+            started = time.perf_counter()
+            reloaded = SendScheduler({'message': _noop}, journal_path=path, clock=clock)
+            print(f"reload journal ({os.path.getsize(path) / 1e6:.1f} MB): "
+                  f"{(time.perf_counter() - started) * 1000:.0f}ms, {len(reloaded):,} pending")
+
+        # 一小时内每秒前进一格
+        assert scheduler.is_leader()
+        sent, ticks = 0, []
+        for _ in range(3600):
+            clock.now += 1
+            started = time.perf_counter()
+            sent += len(scheduler.take_due())
+            ticks.append(time.perf_counter() - started)
+        ticks.sort()
+        print(f"tick: median {ticks[len(ticks) // 2] * 1e6:.0f} µs, max {ticks[-1] * 1000:.2f}ms, "
+              f"{sent:,} sent in the first hour, {len(scheduler):,} still pending")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+"""
+多worker扩展性基准测试
+
+模拟gunicorn的多进程部署，测量不同worker数量下的吞吐，并验证共享限流状态
+使多个worker合计不超过限流值。
+
+使用方法:
+    python tools/bench_workers.py app --workers 1 2 4 8 --seconds 5
+    python tools/bench_workers.py limiter --workers 1 2 4 8 --seconds 5
+    python tools/bench_workers.py limits --workers 4 --seconds 5 --chat-rate 10
+"""
+import argparse
+import asyncio
+import itertools
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('BOT_TOKEN', 'bench:token')
+
+
+class FakeMessage:
+    """send_message 返回的消息对象"""
+
+    def __init__(self, chat_id, message_id: int):
+        self.chat_id = chat_id
+        self.message_id = message_id
+
+
+class FakeBot:
+    """不访问网络的Bot，用于隔离测量本服务自身的开销"""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.sent = []
+        self._message_ids = itertools.count(1)
+
+    async def get_me(self):
+        class Me:
+            username = 'bench_bot'
+        return Me()
+
+    async def send_message(self, chat_id, text, **kwargs):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.sent.append(time.time())
+        return FakeMessage(chat_id, next(self._message_ids))
+
+    async def edit_message_text(self, text, chat_id, message_id, **kwargs):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return True
+
+    async def shutdown(self):
+        pass
+
+
+def _app_worker(state_path: str, seconds: float, results):
+    """在一个进程内用Flask测试客户端持续请求 /api/v1/send"""
+    from api.core.rate_limiter import create_rate_limiter
+    from api.core.telegram import TelegramSender
+    from main import create_app
+
+    limiter = create_rate_limiter(state_path, global_rate=1e9, chat_rate=1e9, chat_burst=1)
+    sender = TelegramSender(bot_token='bench:token', rate_limiter=limiter)
+    sender.bot = FakeBot()
+    client = create_app(sender).test_client()
+
+    body = {'message': '*Whale Alert* BTC long $2,150,000', 'chat_id': -1001}
+    count = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        client.post('/api/v1/send', json=body)
+        count += 1
+    results.put(count)
+
+
+def _limiter_worker(state_path: str, seconds: float, results):
+    """在一个进程内持续预约共享限流时间槽"""
+    from api.core.rate_limiter import SharedRateLimiter
+
+    limiter = SharedRateLimiter(state_path, global_rate=1e9, chat_rate=1e9, chat_burst=1)
+    count = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        limiter.reserve(-1001 - count % 16)
+        count += 1
+    results.put(count)
+
+
+def _limits_worker(state_path: str, seconds: float, chat_rate: float, results):
+    """按共享限流发送到同一群组，返回实际发送的时间戳"""
+    from api.core.rate_limiter import SharedRateLimiter
+    from api.core.telegram import TelegramSender
+
+    limiter = SharedRateLimiter(state_path, global_rate=1000, chat_rate=chat_rate, chat_burst=1)
+    sender = TelegramSender(bot_token='bench:token', rate_limiter=limiter)
+    sender.bot = FakeBot()
+
+    async def run():
+        deadline = time.time() + seconds
+        while time.time() < deadline:
+            await sender.send_message(-1001, 'rate test', parse_mode=None, retry_count=1)
+
+    asyncio.run(run())
+    results.put(sender.bot.sent)
+
+
+def run_processes(target, workers: int, args: tuple) -> list:
+    """启动workers个进程运行target，收集各进程结果"""
+    results = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(target=target, args=args + (results,))
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    collected = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return collected
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Multi-worker scaling benchmark')
+    parser.add_argument('mode', choices=['app', 'limiter', 'limits'])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--chat-rate', type=float, default=10.0, help='limits模式下单群组每秒发送数')
+    args = parser.parse_args()
+
+    print(f"CPU cores: {multiprocessing.cpu_count()}")
+    print("=" * 60)
+
+    baseline = None
+    for workers in args.workers:
+        with tempfile.TemporaryDirectory() as tmp:
+            state_path = os.path.join(tmp, 'rate_state.db')
+
+            if args.mode == 'limits':
+                sent = sorted(t for stamps in run_processes(
+                    _limits_worker, workers, (state_path, args.seconds, args.chat_rate)
+                ) for t in stamps)
+                elapsed = sent[-1] - sent[0] if len(sent) > 1 else 0.0
+                rate = (len(sent) - 1) / elapsed if elapsed else 0.0
+                print(f"workers={workers:<3} sent={len(sent):<6} observed={rate:.2f}/s  limit={args.chat_rate:.2f}/s")
+                continue
+
+            target = _app_worker if args.mode == 'app' else _limiter_worker
+            total = sum(run_processes(target, workers, (state_path, args.seconds)))
+            throughput = total / args.seconds
+            baseline = baseline or throughput
+            print(f"workers={workers:<3} {throughput:>12,.0f} ops/s   speedup x{throughput / baseline:.2f}")
+
+    print("=" * 60)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,367 @@
+"""
+事件回放模拟器
+
+把记录的事件按原始时间间隔回放一遍完整的发送流程——路由、动态阈值过滤、低优先级摘要、
+持仓合并、去重、限流——但Bot不访问网络，时间由模拟时钟推进：事件循环没有可执行的任务时
+直接跳到下一个定时器，一整天的事件几秒内回放完。用于在上线前评估配置改动
+（路由、限流、阈值、合并窗口）对各群组消息数和排队延迟的影响。
+
+事件来源:
+    --store DIR --day YYYYMMDD   事件存储中某一天的分区
+    --jsonl FILE                 每行一个请求体（/api/v1/whale/send 的格式），带 timestamp 字段
+
+配置取自环境变量（与服务相同，可用 --routes 等参数覆盖）。
+
+使用方法:
+    python tools/replay.py --store data/events --day 20261018
+    RATE_LIMIT_PER_CHAT=10 POSITION_UPDATE_WINDOW=300 python tools/replay.py --jsonl events.jsonl --json
+"""
+import argparse
+import asyncio
+import contextvars
+import itertools
+import json
+import logging
+import os
+import selectors
+import sys
+import time
+from collections import defaultdict
+from typing import Iterator, List, Tuple
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('BOT_TOKEN', 'replay:token')
+
+from api.config import settings  # noqa: E402
+from api.core.coalescer import PositionCoalescer  # noqa: E402
+from api.core.digest import AlertDigest  # noqa: E402
+from api.core.event_store import EventStore  # noqa: E402
+from api.core.rate_limiter import RateLimiter  # noqa: E402
+from api.core.routing import load_routing  # noqa: E402
+from api.core.stats import AggregateStats  # noqa: E402
+from api.core.telegram import TelegramSender  # noqa: E402
+from api.core.thresholds import ThresholdTracker  # noqa: E402
+from api.routers import whale  # noqa: E402
+from api.utils.metrics import metrics  # noqa: E402
+
+# 当前正在处理的事件的到达时间（模拟时钟），用于计算排队延迟
+arrival = contextvars.ContextVar('arrival', default=None)
+
+
+class VirtualClock:
+    """
+    模拟时钟：offset 为自回放开始经过的秒数，time() 为对应的Unix时间
+
+    事件循环使用 offset（数值小，浮点误差远小于事件循环的时钟精度），
+    限流器、阈值等组件使用 time()。
+    """
+
+    def __init__(self, start: float):
+        self.start = start
+        self.offset = 0.0
+
+    def time(self) -> float:
+        return self.start + self.offset
+
+    def advance(self, seconds: float):
+        self.offset += seconds
+
+
+class _VirtualSelector(selectors.DefaultSelector):
+    """没有就绪的I/O时不阻塞，而是把模拟时钟拨到下一个定时器"""
+
+    def __init__(self, clock: VirtualClock):
+        super().__init__()
+        self.clock = clock
+
+    def select(self, timeout=None):
+        if timeout is None:
+            # 没有定时器：只可能被其他线程唤醒
+            return super().select(None)
+        events = super().select(0)
+        if not events and timeout > 0:
+            self.clock.advance(timeout)
+        return events
+
+
+class SimulatedLoop(asyncio.SelectorEventLoop):
+    """时间由模拟时钟决定的事件循环"""
+
+    def __init__(self, clock: VirtualClock):
+        super().__init__(_VirtualSelector(clock))
+        self.clock = clock
+
+    def time(self) -> float:
+        return self.clock.offset
+
+
+class FakeMessage:
+    def __init__(self, chat_id, message_id: int):
+        self.chat_id = chat_id
+        self.message_id = message_id
+
+
+class SimBot:
+    """记录每次调用的模拟Bot"""
+
+    def __init__(self, clock: VirtualClock, latency: float = 0.0):
+        self.clock = clock
+        self.latency = latency
+        # {chat_id: {'sent': 条数, 'edited': 条数, 'delays': [排队延迟]}}
+        self.chats = defaultdict(lambda: {'sent': 0, 'edited': 0, 'delays': []})
+        self.calls: List[float] = []
+        self._message_ids = itertools.count(1)
+
+    async def get_me(self):
+        class Me:
+            username = 'replay_bot'
+        return Me()
+
+    def _record(self, chat_id, kind: str):
+        now = self.clock.time()
+        chat = self.chats[str(chat_id)]
+        chat[kind] += 1
+        self.calls.append(now)
+        started = arrival.get()
+        if started is not None:
+            chat['delays'].append(now - started)
+
+    async def send_message(self, chat_id, text, **kwargs):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self._record(chat_id, 'sent')
+        return FakeMessage(chat_id, next(self._message_ids))
+
+    async def edit_message_text(self, text, chat_id, message_id, **kwargs):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self._record(chat_id, 'edited')
+        return True
+
+    async def shutdown(self):
+        pass
+
+
+def store_events(directory: str, day: str) -> Iterator[Tuple[float, int, dict]]:
+    """
+    事件存储中一天的事件，按时间排序
+
+    存储只有代币、交易员、类型、方向和金额，其余字段（价格等）为空，消息内容与线上不完全相同，
+    但消息数、合并、限流与线上一致。
+    """
+    store = EventStore(directory)
+    try:
+        segment = store.segment(day)
+        order = np.argsort(np.asarray(segment['ts']), kind='stable')
+        columns = {name: np.asarray(column)[order] for name, column in segment.items()}
+        tokens, traders = store.tokens.values, store.traders.values
+    finally:
+        store.close()
+
+    for ts, token, trader, message_type, side, value in zip(
+        columns['ts'].tolist(), columns['token'].tolist(), columns['trader'].tolist(),
+        columns['message_type'].tolist(), columns['side'].tolist(), columns['value'].tolist()
+    ):
+        data = {
+            'message_type': message_type,
+            'token': tokens[token],
+            'trader_address': traders[trader],
+            'direction': side,
+            'value_usd': value,
+            'timestamp': int(ts),
+        }
+        if message_type == 1:
+            data['action'] = side
+        else:
+            data['liquidation_price'] = 0
+        yield ts, message_type, data
+
+
+def jsonl_events(path: str) -> Iterator[Tuple[float, int, dict]]:
+    """JSONL文件中的请求体，按 timestamp 排序"""
+    events = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                data = json.loads(line)
+                events.append((float(data['timestamp']), int(data.get('message_type', 1)), data))
+    events.sort(key=lambda event: event[0])
+    return iter(events)
+
+
+def percentile(values: List[float], q: float) -> float:
+    return float(np.percentile(values, q)) if values else 0.0
+
+
+async def replay(events: list, clock: VirtualClock, args) -> dict:
+    """按模拟时间回放事件，返回统计结果"""
+    limiter = RateLimiter(
+        global_rate=args.global_rate, chat_rate=args.chat_rate / 60.0, chat_burst=args.chat_burst, clock=clock.time
+    )
+    sender = TelegramSender(
+        bot_token='replay:token', rate_limiter=limiter, dedup_window=settings.MESSAGE_DEDUP_WINDOW
+    )
+    bot = sender.bot = SimBot(clock, latency=args.latency)
+    await sender.initialize()
+
+    whale.set_telegram_sender(sender)
+    whale.set_routing_table(load_routing(args.routes, settings))
+    whale.set_aggregate_stats(AggregateStats(clock=clock.time))
+    whale.set_position_coalescer(
+        PositionCoalescer(sender, args.coalesce_window, settings.POSITION_EDIT_DEBOUNCE, clock=clock.time)
+        if args.coalesce_window > 0 else None
+    )
+    digest = None
+    if args.threshold_percentile > 0:
+        tracker = ThresholdTracker(
+            percentile=args.threshold_percentile,
+            window=settings.THRESHOLD_WINDOW,
+            min_samples=settings.THRESHOLD_MIN_SAMPLES,
+            clock=clock.time
+        )
+        if settings.LOW_PRIORITY_ACTION == 'digest':
+            digest = AlertDigest(whale.send_digest, interval=settings.DIGEST_INTERVAL, clock=clock.time)
+        whale.set_thresholds(tracker, digest)
+    else:
+        whale.set_thresholds(None, None)
+
+    counts = defaultdict(int)
+    duplicates_before = metrics.get('telegram_duplicates_skipped_total')
+    done = False
+    digest_task = asyncio.ensure_future(digest.run(lambda: done)) if digest is not None else None
+
+    async def process(ts: float, message_type: int, data: dict):
+        arrival.set(ts)
+        data = whale.record_event(data, message_type)
+        low_priority = whale.low_priority_action(data, message_type)
+        if low_priority:
+            counts[low_priority[0]] += 1
+            return
+        destinations = whale.get_routing_table().destinations_for(message_type)
+        meta, groups, results = await whale.render_groups_async(data, message_type, destinations)
+        if not groups:
+            counts['unrouted' if not destinations else 'render_failed'] += 1
+            return
+        try:
+            await asyncio.wait_for(
+                whale.deliver_groups(data, message_type, meta, groups, results), settings.MESSAGE_SEND_TIMEOUT
+            )
+        except asyncio.TimeoutError:
+            counts['timed_out'] += 1
+            return
+        counts['admitted'] += 1
+        counts['failed_deliveries'] += len(results['failed'])
+
+    tasks = []
+    for ts, message_type, data in events:
+        delay = ts - clock.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        # 每个事件相当于一个并发请求，不等待前一个发送完成
+        tasks.append(asyncio.ensure_future(process(ts, message_type, dict(data))))
+    await asyncio.gather(*tasks)
+    if digest is not None:
+        await digest.flush_now()
+        done = True
+        await digest_task
+    # 等待防抖中的编辑
+    while len(asyncio.all_tasks()) > 1:
+        await asyncio.sleep(1.0)
+
+    counts['duplicates'] = int(metrics.get('telegram_duplicates_skipped_total') - duplicates_before)
+    return {'counts': dict(counts), 'bot': bot}
+
+
+def report(events: list, result: dict, clock: VirtualClock, elapsed: float) -> dict:
+    """汇总回放结果"""
+    bot = result['bot']
+    chats = {}
+    for chat_id, chat in sorted(bot.chats.items()):
+        delays = chat['delays']
+        chats[chat_id] = {
+            'sent': chat['sent'],
+            'edited': chat['edited'],
+            'delay_p50': round(percentile(delays, 50), 3),
+            'delay_p99': round(percentile(delays, 99), 3),
+            'delay_max': round(max(delays, default=0.0), 3),
+        }
+    calls = np.asarray(bot.calls)
+    peak = int(np.bincount((calls - calls.min()).astype(np.int64)).max()) if len(calls) else 0
+    return {
+        'events': len(events),
+        'start': events[0][0] if events else None,
+        'end': events[-1][0] if events else None,
+        'simulated_seconds': round(clock.offset, 1),
+        'wall_seconds': round(elapsed, 2),
+        'telegram_calls': len(calls),
+        'peak_calls_per_second': peak,
+        'events_by_outcome': result['counts'],
+        'chats': chats,
+    }
+
+
+def print_report(summary: dict):
+    span = ''
+    if summary['start'] is not None:
+        fmt = '%Y-%m-%d %H:%M:%S'
+        span = f" ({time.strftime(fmt, time.gmtime(summary['start']))} → " \
+               f"{time.strftime(fmt, time.gmtime(summary['end']))} UTC)"
+    print(f"Replayed {summary['events']:,} events{span}")
+    print(f"  simulated {summary['simulated_seconds']:,.0f}s in {summary['wall_seconds']:.2f}s wall time")
+    print(f"  Telegram calls: {summary['telegram_calls']:,} (peak {summary['peak_calls_per_second']}/s)")
+    print("  events: " + ', '.join(f"{name} {count:,}" for name, count in sorted(summary['events_by_outcome'].items())))
+    print()
+    print(f"  {'chat':>16} {'sent':>8} {'edited':>8} {'p50 delay':>10} {'p99 delay':>10} {'max delay':>10}")
+    for chat_id, chat in summary['chats'].items():
+        print(
+            f"  {chat_id:>16} {chat['sent']:>8,} {chat['edited']:>8,} {chat['delay_p50']:>9.1f}s "
+            f"{chat['delay_p99']:>9.1f}s {chat['delay_max']:>9.1f}s"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='按模拟时间回放事件，评估路由/限流/阈值/合并配置')
+    parser.add_argument('--store', help='事件存储目录')
+    parser.add_argument('--day', help='回放的分区（YYYYMMDD），与 --store 一起使用')
+    parser.add_argument('--jsonl', help='请求体JSONL文件（每行带 timestamp）')
+    parser.add_argument('--routes', default=settings.ROUTES_PATH or None, help='路由配置文件，默认 ROUTES_PATH')
+    parser.add_argument('--global-rate', type=float, default=settings.RATE_LIMIT_GLOBAL, help='全局每秒发送数')
+    parser.add_argument('--chat-rate', type=float, default=settings.RATE_LIMIT_PER_CHAT, help='单个群组每分钟发送数')
+    parser.add_argument('--chat-burst', type=int, default=settings.RATE_LIMIT_CHAT_BURST, help='单个群组突发条数')
+    parser.add_argument('--coalesce-window', type=float, default=settings.POSITION_UPDATE_WINDOW,
+                        help='持仓合并窗口（秒），0为关闭')
+    parser.add_argument('--threshold-percentile', type=float, default=settings.THRESHOLD_PERCENTILE,
+                        help='动态阈值百分位，0为关闭')
+    parser.add_argument('--latency', type=float, default=0.0, help='模拟的Telegram接口延迟（秒）')
+    parser.add_argument('--json', action='store_true', help='以JSON输出结果')
+    parser.add_argument('--verbose', action='store_true', help='输出服务日志')
+    args = parser.parse_args()
+
+    if args.jsonl:
+        events = list(jsonl_events(args.jsonl))
+    elif args.store and args.day:
+        events = list(store_events(args.store, args.day))
+    else:
+        parser.error('either --jsonl or --store with --day is required')
+    if not args.verbose:
+        logging.disable(logging.CRITICAL)
+
+    clock = VirtualClock(events[0][0] if events else time.time())
+    loop = SimulatedLoop(clock)
+    started = time.perf_counter()
+    try:
+        result = loop.run_until_complete(replay(events, clock, args))
+    finally:
+        loop.close()
+    summary = report(events, result, clock, time.perf_counter() - started)
+
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        print_report(summary)
+
+
+if __name__ == '__main__':
+    main()
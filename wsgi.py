@@ -0,0 +1,13 @@
+"""
+WSGI入口 - gunicorn多worker部署
+
+使用方法:
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+每个worker进程导入本模块时各自创建Flask应用和Telegram发送器，
+Telegram握手在后台进行，不阻塞启动；限流和去重状态通过 RATE_STATE_PATH
+指定的SQLite文件在worker之间共享。
+"""
+from main import create_app
+
+app = create_app()